@@ -0,0 +1,83 @@
+# Bytes sent by delta uploads compared with whole-file uploads.
+#
+#   python -m benchmarks.bench_delta                  # 64 MiB file
+#   python -m benchmarks.bench_delta --size 512
+#
+# A random file is sent once, edited in a few typical ways and sent again, to
+# a local directory and to the in-memory S3 stand-in, with and without delta.
+
+import os
+import time
+import shutil
+import random
+import argparse
+import tempfile
+from pathlib import Path
+
+from src.utils.Delta import SignatureCache
+from src.utils.Backends import LocalDirectoryBackend, S3Backend, FakeS3Client
+
+MiB = 1024 * 1024
+
+
+def edits(size):
+    return {
+        "one line": lambda data: data[:size // 2] + b"an edited line\n" + data[size // 2 + 15:],
+        "insert 1 KiB": lambda data: data[:size // 3] + os.urandom(1024) + data[size // 3:],
+        "append 1 MiB": lambda data: data + os.urandom(MiB),
+        "scattered": lambda data: b"".join(
+            data[offset:offset + 8 * MiB - 4] + b"edit" for offset in range(0, len(data), 8 * MiB))[:len(data)],
+    }
+
+
+def make_target(name, directory, use_delta):
+    signatures = SignatureCache(directory / "signatures")
+    if name == "local":
+        target = LocalDirectoryBackend(directory / "remote", delta=use_delta, signatures=signatures)
+        return target, lambda: target.bytes_written
+    client = FakeS3Client()
+    target = S3Backend("bench", client=client, delta=use_delta, signatures=signatures)
+    return target, lambda: client.bytes_uploaded
+
+
+def bench(size, target_name, edit, use_delta):
+    directory = Path(tempfile.mkdtemp(prefix="vimpi-delta-"))
+    try:
+        data = random.Random(size).randbytes(size)
+        local_path = directory / "data.bin"
+        local_path.write_bytes(data)
+
+        target, bytes_sent = make_target(target_name, directory, use_delta)
+        file_id = target.upload(local_path, "data.bin", "")
+
+        local_path.write_bytes(edit(data))
+        later = time.time() + 60
+        os.utime(local_path, (later, later))
+
+        sent = bytes_sent()
+        start = time.perf_counter()
+        target.upload(local_path, "data.bin", "", file_id)
+        return time.perf_counter() - start, bytes_sent() - sent
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare delta and whole-file uploads")
+    parser.add_argument("--size", type=int, default=64, help="file size in MiB")
+    parser.add_argument("--targets", nargs="+", choices=["local", "s3"], default=["local", "s3"])
+    args = parser.parse_args(argv)
+    size = args.size * MiB
+
+    print(f"{'target':<7} {'edit':<14} {'full bytes':>12} {'delta bytes':>12} {'saved':>7} {'full s':>8} {'delta s':>8}")
+    for target_name in args.targets:
+        for name, edit in edits(size).items():
+            full_seconds, full_bytes = bench(size, target_name, edit, False)
+            delta_seconds, delta_bytes = bench(size, target_name, edit, True)
+            saved = 1 - delta_bytes / full_bytes if full_bytes else 0
+            print(f"{target_name:<7} {name:<14} {full_bytes:>12} {delta_bytes:>12} {saved:>7.1%} "
+                  f"{full_seconds:>8.3f} {delta_seconds:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# Sync throughput against in-memory Drive and S3 stand-ins, or a local directory.
+#
+#   python -m benchmarks.bench_sync                      # 10 .. 100k files
+#   python -m benchmarks.bench_sync --sizes 10 1000 --latency 0.001
+#   python -m benchmarks.bench_sync --target local    # or s3
+#
+# Each tree is synced three times: the initial upload, a sync with nothing
+# changed and a sync after touching 1% of the files.
+
+import os
+import io
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+
+from src.utils.Utils import Drive
+from src.utils.Sync import SyncEngine
+from src.utils.Backends import FakeDriveBackend, LocalDirectoryBackend, S3Backend, FakeS3Client
+
+DEFAULT_SIZES = [10, 100, 1000, 10_000, 100_000]
+FILES_PER_FOLDER = 100
+FILE_SIZE = 1024
+
+
+# Synthetic tree of count files, FILES_PER_FOLDER per folder
+def make_tree(root, count, file_size=FILE_SIZE):
+    content = os.urandom(file_size)
+    paths = []
+    for index in range(count):
+        folder = root / f"dir_{index // FILES_PER_FOLDER:05d}"
+        if index % FILES_PER_FOLDER == 0:
+            folder.mkdir(parents=True)
+        path = folder / f"file_{index:06d}.bin"
+        path.write_bytes(content)
+        paths.append(path)
+    return paths
+
+
+# Make every step-th file newer than its remote copy
+def touch_files(paths, step):
+    later = time.time() + 60
+    for path in paths[::step]:
+        path.write_bytes(path.read_bytes()[::-1])
+        os.utime(path, (later, later))
+    return len(paths[::step])
+
+
+# Sync target and the object counting its requests and bytes
+def make_target(name, directory, latency=0.0, quota_error_rate=0.0, page_size=100):
+    if name == "local":
+        return LocalDirectoryBackend(directory / "remote"), None
+    if name == "s3":
+        client = FakeS3Client(latency=latency, max_keys=page_size)
+        return S3Backend("bench", client=client), client
+    backend = FakeDriveBackend(page_size=page_size, latency=latency, quota_error_rate=quota_error_rate)
+    return Drive(backend=backend), backend
+
+
+def run_sync(target, counter, local_path, folder_id):
+    requests = counter.request_count() if counter else 0
+    uploaded, downloaded = (counter.bytes_uploaded, counter.bytes_downloaded) if counter else (0, 0)
+
+    # Drive reports every transfer on stdout
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        SyncEngine(target).synchronize(local_path, folder_id)
+    elapsed = time.perf_counter() - start
+
+    if counter is None:
+        return {"seconds": elapsed, "requests": 0, "bytes": 0}
+    return {
+        "seconds": elapsed,
+        "requests": counter.request_count() - requests,
+        "bytes": counter.bytes_uploaded - uploaded + counter.bytes_downloaded - downloaded,
+    }
+
+
+def bench(count, target_name="drive", latency=0.0, quota_error_rate=0.0, page_size=100):
+    directory = Path(tempfile.mkdtemp(prefix="vimpi-bench-"))
+    root = directory / "local"
+    try:
+        target, counter = make_target(target_name, directory, latency, quota_error_rate, page_size)
+        paths = make_tree(root, count)
+        with contextlib.redirect_stdout(io.StringIO()):
+            folder_id = target.get_or_create_folder("bench")
+
+        results = [("initial", count, run_sync(target, counter, root, folder_id)),
+                   ("unchanged", count, run_sync(target, counter, root, folder_id))]
+        modified = touch_files(paths, 100)
+        results.append(("1% modified", modified, run_sync(target, counter, root, folder_id)))
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark SyncEngine against offline sync targets")
+    parser.add_argument("--target", choices=["drive", "local", "s3"], default="drive")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--quota-error-rate", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.quota_error_rate:
+        Drive.RETRY_DELAY = 0
+
+    print(f"{'files':>8} {'sync':<12} {'seconds':>9} {'files/s':>10} {'requests':>9} {'req/file':>9} {'bytes':>12}")
+    for count in args.sizes:
+        for name, files, result in bench(count, args.target, args.latency, args.quota_error_rate, args.page_size):
+            rate = count / result["seconds"] if result["seconds"] else float("inf")
+            print(f"{count:>8} {name:<12} {result['seconds']:>9.3f} {rate:>10.0f} {result['requests']:>9} "
+                  f"{result['requests'] / max(files, 1):>9.2f} {result['bytes']:>12}")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
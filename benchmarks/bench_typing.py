@@ -0,0 +1,101 @@
+# Sustained typing speed of the editor, in keystrokes per second at 60 fps.
+#
+#   python -m benchmarks.bench_typing                     # 10k line text file
+#   python -m benchmarks.bench_typing --lines 100000 --language python
+#
+# Keys arrive the way a terminal delivers a held key or a pasted text typed
+# out: a burst every frame, in real time. Bursts grow until handling a
+# frame's keys takes longer than the frame; the last burst the editor kept
+# up with is the sustained rate. --no-batching writes every key as its own edit, as before
+# batching.
+
+import time
+import asyncio
+import argparse
+
+from textual import events
+
+from src.main import VimPi, TextViewer
+from src.utils.Render import FRAME_INTERVAL
+
+# Frames may run this much longer than 1/60 s, for timer jitter, and still count as kept up
+KEEPING_UP = 1.25
+SAMPLE = {
+    None: "line {number} of some plain text to type into",
+    "python": "def function_{number}(value):\n    return value * {number}  # a comment",
+}
+
+
+# Average time a frame of typing took, keys in and painted, and the number
+# of edits the keys took
+async def type_bursts(pilot, editor, per_frame, frames):
+    edits = 0
+    edit = editor.edit
+
+    def counting_edit(change):
+        nonlocal edits
+        edits += 1
+        return edit(change)
+
+    editor.edit = counting_edit
+    started = time.perf_counter()
+    for frame in range(1, frames + 1):
+        for _ in range(per_frame):
+            editor.post_message(events.Key("x", "x"))
+        # Sleeps past the end of the frame when handling the keys takes longer
+        await asyncio.sleep(max(started + frame * FRAME_INTERVAL - time.perf_counter(), 0))
+    await pilot._wait_for_screen()
+    await pilot._wait_for_screen()
+    pilot.app.screen._on_timer_update()
+    del editor.edit
+    return (time.perf_counter() - started) / frames, edits
+
+
+async def bench(lines, language, batching, frames):
+    app = VimPi()
+    results = []
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        editor = app.query_one(TextViewer)
+        editor.disabled = False
+        sample = SAMPLE[language]
+        text = "\n".join(sample.format(number=number) for number in range(lines))
+        # A wide first line, so typing doesn't widen the document on every key
+        editor.load_text("#" * 1000 + "\n" + text)
+        editor.language = language
+        editor.focus()
+        editor.move_cursor((editor.document.line_count // 2, 0))
+        if not batching:
+            editor._queue_typing = lambda text: editor._replace_via_keyboard(text, *editor.selection)
+        await pilot.pause()
+
+        per_frame = 1
+        while per_frame <= 1024:
+            frame_time, edits = await type_bursts(pilot, editor, per_frame, frames)
+            results.append((per_frame, frame_time, edits))
+            if frame_time > KEEPING_UP * FRAME_INTERVAL:
+                break
+            per_frame *= 2
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=10_000)
+    parser.add_argument("--language", default=None, choices=[name for name in SAMPLE if name])
+    parser.add_argument("--frames", type=int, default=60, help="frames of typing per burst size")
+    parser.add_argument("--no-batching", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(bench(args.lines, args.language, not args.no_batching, args.frames))
+    print(f"{'keys/frame':>10} {'keys/s':>8} {'edits':>6} {'frame ms':>9}")
+    sustained = 0
+    for per_frame, frame_time, edits in results:
+        print(f"{per_frame:>10} {per_frame / FRAME_INTERVAL:>8.0f} {edits:>6} {frame_time * 1000:>9.1f}")
+        if frame_time <= KEEPING_UP * FRAME_INTERVAL:
+            sustained = per_frame / FRAME_INTERVAL
+    print(f"sustained at 60 fps: {sustained:.0f} keys/s")
+
+
+if __name__ == "__main__":
+    main()
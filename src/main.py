@@ -1,6 +1,6 @@
 import os
-import threading
-import time
+import dataclasses
+import itertools
 from pathlib import Path
 
 from textual.app import App, ComposeResult
@@ -10,14 +10,56 @@ from textual.message import Message
 
 from textual import on
 from textual import log
+from textual import work
+from textual import events
+from textual._time import get_time
+from textual.worker import get_current_worker
 
-from textual.widgets import Header, Footer, Button
-from textual.widgets import Static, DirectoryTree, TextArea
+from textual.widgets import Header, Footer, Button, Input
+from textual.widgets import Static, DirectoryTree, TextArea, Tabs, Tab, ProgressBar
+from textual.widgets.text_area import Selection, Edit, EditResult
+from textual.document._document import Document
+from textual.document._syntax_aware_document import SyntaxAwareDocumentError
+from textual.document._wrapped_document import WrappedDocument
+from textual.document._document_navigator import DocumentNavigator
+from textual.geometry import Size, Region
+from textual._tree_sitter import TREE_SITTER
+from rich.style import Style
+from rich.text import Text
+from rich.cells import cell_len
+from textual.strip import Strip
 
 from textual.containers import Vertical, Horizontal, VerticalScroll, Container
-import pyperclip
+from textual.scroll_view import ScrollView
+from textual.binding import Binding
 
 from src.utils.Utils import Drive
+from src.utils.Sync import SyncEngine
+from src.utils.BlobCache import BlobCache
+from src.utils.Clipboard import Clipboard
+from src.utils.Vim import Vim, TextAreaBuffer, INSERT, LESS_THAN
+from src.utils.Ex import ExError
+from src.utils.Render import DirtyRows, TypingBatch, TO_BOTTOM
+from src.utils.LongLines import LongLineWrappedDocument, LongLineNavigator, LONG_LINE_LIMIT, has_long_line
+from src.utils.SyncService import SyncService, CONNECTING, SYNCING, IDLE, PAUSED, WAITING, ERROR, STOPPED
+from src.utils.Throttle import BandwidthLimiter
+from src.utils.SyncStats import describe as describe_sync_stats
+from src.synchronize import request_sync
+from src.utils.Search import SearchIndex
+from src.utils.Buffers import Buffer, BufferCache
+from src.utils.Sniff import FileKind, sniff, read_text, encode_text, hex_lines
+from src.utils.Hex import HexFile, BYTES_PER_ROW, HEX_COLUMN, ASCII_COLUMN, parse_pattern, parse_offset
+from src.utils.Journal import SwapJournal, FSYNC_INTERVAL
+from src.utils.Follow import LogTail, watch
+from src.utils.Undo import UndoStore, text_hash
+from src.utils.Syntax import (
+    IndexedSyntaxDocument,
+    detect_language,
+    SYNTAX_SIZE_LIMIT,
+    BACKGROUND_LINE_LIMIT,
+    VIEWPORT_MARGIN,
+    BACKGROUND_CHUNK,
+)
 
 HomePageText = r"""
  _____ _                     _
@@ -44,9 +86,44 @@ class Home(Screen):
     pass
 
 
+class SyncDashboard(Static):
+    # Live counters of the sync service, redrawn only when they change
+    def show(self, snapshot) -> None:
+        text = describe_sync_stats(snapshot)
+        if text != self.renderable:
+            self.update(text)
+
+
 class DriveSyncScreen(Screen):
+    # Drive sync runs as a SyncService in a thread worker, which reports back
+    # through the messages below; nothing here waits on the network.
     drive_status = reactive("inactive")
-    sync_thread = None
+    SYNC_INTERVAL = 60.0
+    # Seconds between dashboard redraws
+    DASHBOARD_REFRESH = 0.5
+    dashboard_timer = None
+    STATUS_TEXT = {
+        "inactive": "Drive Sync is inactive.",
+        CONNECTING: "Activating Drive Sync...",
+        SYNCING: "Drive Sync is synchronizing...",
+        IDLE: "Drive Sync is active.",
+        PAUSED: "Drive Sync is paused.",
+        WAITING: "Drive Sync is waiting for its transfer window.",
+        ERROR: "Drive Sync failed, retrying later.",
+        STOPPED: "Drive Sync is stopped.",
+    }
+
+    class StatusChanged(Message):
+        def __init__(self, state: str, text: str) -> None:
+            self.state = state
+            self.text = text
+            super().__init__()
+
+    class Progressed(Message):
+        def __init__(self, done: int, total: int) -> None:
+            self.done = done
+            self.total = total
+            super().__init__()
 
     def __init__(self, name: str, drive):
         super().__init__(name=name)
@@ -58,53 +135,107 @@ class DriveSyncScreen(Screen):
 
         with Vertical(id="drive-sync-content"):
             yield Static(id="status-message")
+            yield Static(id="sync-detail")
+            yield ProgressBar(id="sync-progress", show_eta=False)
+            yield SyncDashboard(id="sync-dashboard")
+            yield Static(id="plan-summary")
+            yield Button("Preview", id="preview-button", variant="default")
             yield Button("Synchronize", id="sync-button", variant="primary")
+            yield Button("Pause", id="pause-button", variant="default", disabled=True)
             yield Button("Return to Main Menu", id="main-menu-button", variant="primary")
 
     def on_mount(self):
         self.update_status()
+        self.dashboard_timer = self.set_interval(self.DASHBOARD_REFRESH, self.refresh_dashboard,
+                                                 pause=not self.is_current)
+
+    # The dashboard only ticks while the screen is shown
+    def on_screen_resume(self) -> None:
+        if self.dashboard_timer is not None:
+            self.dashboard_timer.resume()
+            self.refresh_dashboard()
+
+    def on_screen_suspend(self) -> None:
+        if self.dashboard_timer is not None:
+            self.dashboard_timer.pause()
+
+    def refresh_dashboard(self) -> None:
+        if self.app.sync_service is not None:
+            self.query_one(SyncDashboard).show(self.app.sync_service.stats.snapshot())
 
     def watch_drive_status(self, status: str):
         self.update_status()
 
     def update_status(self):
-        status_widget = self.query_one("#status-message", Static)
-        sync_button = self.query_one("#sync-button", Button)
-
-        if self.drive_status == "inactive":
-            status_widget.update("Drive Sync is inactive.")
-            sync_button.disabled = False
-        elif self.drive_status == "activating":
-            status_widget.update("Activating Drive Sync...")
-            sync_button.disabled = True
-        else:  # active
-            status_widget.update("Drive Sync is active.")
-            sync_button.disabled = True
+        self.query_one("#status-message", Static).update(self.STATUS_TEXT.get(self.drive_status, ""))
+        running = self.drive_status not in ("inactive", STOPPED)
+        self.query_one("#sync-button", Button).disabled = running
+        pause_button = self.query_one("#pause-button", Button)
+        pause_button.disabled = not running
+        pause_button.label = "Resume" if self.drive_status == PAUSED else "Pause"
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "sync-button":
             self.action_enable_drive_sync()
+        elif event.button.id == "pause-button":
+            self.action_toggle_pause()
+        elif event.button.id == "preview-button":
+            self.query_one("#plan-summary", Static).update("Computing what a sync would do...")
+            self.preview_sync()
         elif event.button.id == "main-menu-button":
             self.app.pop_screen()
 
     def action_enable_drive_sync(self):
-        if self.drive_status == "inactive":
-            self.drive_status = "activating"
-            self.app.call_after_refresh(self.perform_sync)
+        if self.app.sync_service is None or self.app.sync_service.is_stopped():
+            self.drive_status = CONNECTING
+            self.app.sync_service = SyncService(
+                self.connect, self.app.CURRENT_DIR, "vim_pi", interval=self.SYNC_INTERVAL,
+                on_status=lambda state, text: self.post_message(self.StatusChanged(state, text)),
+                on_progress=lambda done, total: self.post_message(self.Progressed(done, total)),
+                limiter=self.app.bandwidth,
+            )
+            self.run_sync_service(self.app.sync_service)
         else:
             self.notify("Drive Sync is already active or activating.")
 
-    def sync_thead(self):
-        while True:
-            time.sleep(60)
-            self.drive.synchronize(self.app.CURRENT_DIR, self.drive.get_or_create_folder("vim_pi"))
+    def action_toggle_pause(self):
+        service = self.app.sync_service
+        if service is None:
+            return
+        if service.is_paused():
+            service.resume()
+        else:
+            service.pause()
+            self.drive_status = PAUSED
+
+    # Called on the service thread, so authentication doesn't block the UI
+    def connect(self):
+        if self.drive is None:
+            self.drive = self.app.drive = Drive(credentials_path=main_path.parent, cache=BlobCache())
+        return self.drive
+
+    @work(thread=True, exclusive=True, group="sync")
+    def run_sync_service(self, service):
+        service.run()
 
-    def perform_sync(self):
-        self.drive = self.app.drive = Drive(credentials_path=main_path.parent)
-        self.drive.synchronize(self.app.CURRENT_DIR, self.drive.get_or_create_folder("vim_pi"))
-        self.sync_thread = threading.Thread(target=self.sync_loop)
-        self.sync_thread.start()
-        self.drive_status = "active"
+    def on_drive_sync_screen_status_changed(self, message: StatusChanged) -> None:
+        self.drive_status = message.state
+        self.query_one("#sync-detail", Static).update(message.text)
+
+    def on_drive_sync_screen_progressed(self, message: Progressed) -> None:
+        self.query_one("#sync-progress", ProgressBar).update(total=message.total, progress=message.done)
+
+    # Show what a sync would transfer, without changing anything on either side
+    @work(thread=True, exclusive=True, group="preview")
+    def preview_sync(self):
+        try:
+            drive = self.connect()
+            plan = SyncEngine(drive).plan(self.app.CURRENT_DIR, drive.find_folder("vim_pi"), "vim_pi")
+            summary = plan.summary()
+        except Exception as error:
+            summary = f"Could not compute the sync plan: {error}"
+        if not get_current_worker().is_cancelled:
+            self.app.call_from_thread(self.query_one("#plan-summary", Static).update, summary)
 
 
 class FileExplorer(DirectoryTree):
@@ -116,14 +247,18 @@ class FileExplorer(DirectoryTree):
         id: str | None = None,
         classes: str | None = None,
         disabled: bool = False,
-        SelectedFile=None
+        SelectedFile=None,
+        buffers=None
     ) -> None:
         self.SelectedFile = SelectedFile
+        self.buffers = buffers
         super().__init__(path, name=name, id=id, classes=classes, disabled=disabled)
 
     class TextViewerUpdated(Message):
-        def __init__(self, lines: str, SelectedFile=None) -> None:
+        def __init__(self, lines: str | None, SelectedFile=None, kind=None) -> None:
             self.lines = lines
+            self.SelectedFile = SelectedFile
+            self.kind = kind
             super().__init__()
 
     @on(DirectoryTree.FileSelected)
@@ -131,14 +266,49 @@ class FileExplorer(DirectoryTree):
         # Access the properties of the message and perform actions accordingly
         file_path = message.path
         self.SelectedFile = file_path
-        # ... do something with the file_path
-        text = open(file_path).readlines()
-        FILE_TEXT = "".join(text)
-        # log(text)
-        log("-----------------------------------------------------------")
-        log(FILE_TEXT)
-        log("-----------------------------------------------------------")
-        self.post_message(self.TextViewerUpdated(FILE_TEXT))
+        # Files that already have a buffer are not read again
+        kind = None
+        if self.buffers is not None and str(file_path) in self.buffers:
+            FILE_TEXT = None
+        else:
+            # The first few KB tell binaries, which open in the hex view, from text and its encoding
+            try:
+                kind = sniff(file_path)
+                FILE_TEXT = "" if kind.binary else read_text(file_path, kind)
+            except OSError as error:
+                self.notify(f"Could not open {file_path}: {error.strerror}", severity="error")
+                return
+            log(f"Opened {file_path} as {kind}")
+        self.post_message(self.TextViewerUpdated(FILE_TEXT, SelectedFile=file_path, kind=kind))
+
+
+# Terminal key names as the Vim engine writes them
+VIM_KEYS = {
+    "escape": "<esc>",
+    "enter": "<cr>",
+    "backspace": "<bs>",
+    "delete": "<del>",
+    "tab": "<tab>",
+    "insert": "<insert>",
+    "left": "<left>",
+    "right": "<right>",
+    "up": "<up>",
+    "down": "<down>",
+    "home": "<home>",
+    "end": "<end>",
+}
+
+
+# The Vim key for a key event, None for keys the engine has no name for
+def vim_key(event: events.Key):
+    if event.key in VIM_KEYS:
+        return VIM_KEYS[event.key]
+    if event.is_printable and event.character:
+        return LESS_THAN if event.character == "<" else event.character
+    modifier, _, name = event.key.partition("+")
+    if modifier == "ctrl" and len(name) == 1:
+        return f"<c-{name}>"
+    return None
 
 
 class TextViewer(TextArea):
@@ -147,19 +317,778 @@ class TextViewer(TextArea):
         ("ctrl+w", "close_current_file()", "Close file"),
         ("ctrl+insert", "copy_selected_text()", "Copy"),
         ("alt+insert", "paste_selected_text()", "Paste"),
+        ("shift+insert", "paste_system_clipboard()", "Paste from system"),
+        ("f3", "find_next()", "Find next"),
+        ("shift+f3", "find_previous()", "Find previous"),
     ]
+    SEARCH_MATCH_STYLE = Style(bgcolor="yellow", color="black")
+    # Lines longer than this are drawn plain, a screen at a time
+    long_line_limit = LONG_LINE_LIMIT
+
+    def __init__(self, *args, **kwargs):
+        # TextArea builds its highlight map while initialising, so these must exist first
+        self.search_index = SearchIndex()
+        self._search_stale = True
+        self._search_origin = 0
+        self._search_rows = []
+        self.journal = None
+        self.undo_store = UndoStore()
+        self.undo_path = None
+        self.undo_base_hash = None
+        self.persisted_undo = None
+        self._highlighted_rows = (0, 0)
+        self._highlight_timer = None
+        self._document_width = None
+        self._edited_rows = (0, -1)
+        self._typing = TypingBatch()
+        self._dirty = DirtyRows()
+        self._painted_offset = None
+        # Version of the followed file's text the editor holds, see LogTail
+        self.follow_version = 0
+        super().__init__(*args, **kwargs)
+        # Typing works as before until escape switches to normal mode
+        self.vim = Vim(TextAreaBuffer(self), on_command=self._run_command, native_insert=True)
+        self.vim.enter_insert()
+
+    def on_mount(self) -> None:
+        clipboard = getattr(self.app, "clipboard", None)
+        if clipboard is not None:
+            self.vim.registers = clipboard
+        self.call_after_refresh(self._show_mode)
+
+    async def _on_key(self, event: events.Key) -> None:
+        key = vim_key(event)
+        if self.vim.mode == INSERT and event.is_printable and event.character and not self.read_only:
+            # Recorded for . and macros; the text waits for the rest of the burst
+            self.vim.feed(key)
+            self._restart_blink()
+            self._queue_typing(event.character)
+            event.stop()
+            event.prevent_default()
+        else:
+            # Every other key sees the text typed before it
+            self._flush_typing()
+            if key is not None and not self.read_only and self.vim.feed(key):
+                event.stop()
+                event.prevent_default()
+                self._show_mode()
+            elif self.vim.mode != INSERT and (event.is_printable or event.key in ("enter", "tab")):
+                # Keys with no meaning in normal mode never type
+                event.stop()
+                event.prevent_default()
+            else:
+                await super()._on_key(event)
+        # Time from the key press until its edit is on screen; sync backs off when it grows
+        pressed = event.time
+        report = getattr(self.app, "report_keystroke_latency", None)
+        if report is not None:
+            self.call_after_refresh(lambda: report(get_time() - pressed))
+
+    def _queue_typing(self, text):
+        if self._typing.add(text, self.selection):
+            # Behind the keys already queued, so a burst of them lands as one edit
+            self.call_later(self._flush_typing)
+
+    # Write the text typed since the last flush, as one edit
+    def _flush_typing(self):
+        batch = self._typing.take()
+        if batch is not None:
+            text, (start, end) = batch
+            self._replace_via_keyboard(text, start, end)
+
+    # Text typed but not written yet is part of the text
+    @property
+    def text(self) -> str:
+        self._flush_typing()
+        return self.document.text
+
+    @text.setter
+    def text(self, text: str) -> None:
+        self.load_text(text)
+
+    async def _on_mouse_down(self, event: events.MouseDown) -> None:
+        # TextArea's own handler moves the cursor next
+        self._flush_typing()
+
+    def _on_blur(self, event: events.Blur) -> None:
+        self._flush_typing()
+
+    def _show_mode(self):
+        for mode_line in self.screen.query("#mode-line"):
+            mode_line.update(self.vim.status())
+
+    # Lines entered after ":"; all but the file commands are ex commands
+    def _run_command(self, vim, text):
+        command = text.strip()
+        screen = self.screen
+        if command in ("w", "write") and hasattr(screen, "action_save_current_file"):
+            screen.action_save_current_file()
+        elif command in ("q", "quit", "q!") and hasattr(screen, "action_close_current_file"):
+            screen.action_close_current_file()
+        elif command in ("wq", "x") and hasattr(screen, "action_save_current_file"):
+            screen.action_save_current_file()
+            screen.action_close_current_file()
+        else:
+            try:
+                message = vim.execute(command)
+            except ExError as error:
+                self.notify(str(error), severity="error")
+            else:
+                if message:
+                    self.notify(message)
+
+    def _set_theme(self, theme: str) -> None:
+        super()._set_theme(theme)
+        # Copy the styles so the builtin theme shared by other widgets is left untouched
+        self._theme.syntax_styles = {**self._theme.syntax_styles, "search.match": self.SEARCH_MATCH_STYLE}
+
+    def edit(self, edit: Edit) -> EditResult:
+        self._flush_typing()
+        self._edited_rows = (edit.top[0], edit.top[0] + edit.text.count("\n"))
+        # The last display row moves when rows were added, removed or rewrapped
+        bottom, gutter_width = self._display_row(TO_BOTTOM, last=True), self.gutter_width
+        first = self._display_row(edit.top[0])
+        result = super().edit(edit)
+        self._record_edit(edit.top, edit.bottom, edit.text)
+        moved = self._display_row(TO_BOTTOM, last=True) != bottom
+        if moved or self.gutter_width != gutter_width or self._highlight_query:
+            # The rows below moved, or their highlighting may have changed
+            self._dirty.add(first, TO_BOTTOM)
+        else:
+            self._dirty.add(first, self._display_row(result.end_location[0], last=True))
+        return result
+
+    # Row of the display where document row starts, or ends
+    def _display_row(self, row, last=False):
+        row = min(row, self.document.line_count - 1)
+        column = len(self.document[row]) if last else 0
+        return self.wrapped_document.location_to_offset((row, column)).y
+
+    def _watch_selection(self, previous_selection: Selection, selection: Selection) -> None:
+        # The old and new selection, cursor line and matched bracket all change looks
+        dirty = self._dirty
+        bracket = self._matching_bracket_location
+        for first, last in (sorted(previous_selection), sorted(selection)):
+            dirty.add(self._display_row(first[0]), self._display_row(last[0], last=True))
+        super()._watch_selection(previous_selection, selection)
+        for location in (bracket, self._matching_bracket_location):
+            if location is not None:
+                row = self._display_row(location[0])
+                dirty.add(row, self._display_row(location[0], last=True))
+
+    # While the view stays put, a full repaint only redraws the rows that edits
+    # and cursor moves dirtied; the lines above and below come from the cache
+    def refresh(self, *regions, repaint=True, layout=False, recompose=False):
+        dirty = self._dirty.take()
+        if (dirty is not None and not regions and repaint and not layout and not recompose
+                and self.is_mounted and self.scroll_offset == self._painted_offset):
+            top = self.scroll_offset.y
+            first, last = max(dirty[0], top), min(dirty[1], top + self.size.height - 1)
+            if first <= last:
+                self.refresh_lines(first, last - first + 1)
+            return self
+        if not regions and repaint:
+            self._painted_offset = self.scroll_offset
+        return super().refresh(*regions, repaint=repaint, layout=layout, recompose=recompose)
+
+    # Add text read from a followed file at the end, and drop the lines that
+    # scrolled out of its ring. A cursor on the last line stays there, like tail -f.
+    def append_followed(self, text, dropped):
+        following = self.cursor_location[0] == self.document.line_count - 1
+        self.insert(text, self.document.end)
+        if dropped:
+            self.delete((0, 0), (dropped, 0))
+        # Nothing to undo in a followed file, and its history would grow all day
+        self.history.clear()
+        if following:
+            self.move_cursor(self.document.end)
+
+    def _undo_batch(self, edits) -> None:
+        # The locations undone are only known before the batch is applied
+        undone = [
+            (edit.top, edit._edit_result.end_location, edit._edit_result.replaced_text)
+            for edit in reversed(edits)
+            if edit._edit_result is not None
+        ]
+        self._edited_rows = self._rows_touched(undone)
+        self._dirty.add_all()
+        super()._undo_batch(edits)
+        for start, end, text in undone:
+            self._record_edit(start, end, text)
+
+    def _redo_batch(self, edits) -> None:
+        redone = [(edit.top, edit.bottom, edit.text) for edit in edits]
+        self._edited_rows = self._rows_touched(redone)
+        self._dirty.add_all()
+        super()._redo_batch(edits)
+        for start, end, text in redone:
+            self._record_edit(start, end, text)
+
+    def _rows_touched(self, ops):
+        if not ops:
+            return (0, -1)
+        return (
+            min(start[0] for start, _, _ in ops),
+            max(start[0] + text.count("\n") for start, _, text in ops),
+        )
+
+    # Undo past the in-session history into the history saved for this file
+    def undo(self) -> None:
+        if not self.history.undo_stack and self.undo_path is not None:
+            if self.persisted_undo is None:
+                self.persisted_undo = self.undo_store.load(self.undo_path, text_hash(self.text))
+            if self.persisted_undo:
+                self.history._undo_stack.append(self.persisted_undo.pop())
+        super().undo()
+
+    # Write the undo history of the current file, older saved batches first, keyed
+    # to the text just saved; like Vim's undofile, only called when the file is saved
+    def save_persistent_undo(self):
+        if self.undo_path is None:
+            return
+        session = self.history.undo_stack
+        if not session and self.persisted_undo is None:
+            # Nothing done or undone since the file was saved: it is still right as it is
+            return
+        if len(session) >= self.history.max_checkpoints:
+            # The oldest session batches may have been dropped, so older ones no longer chain
+            older = []
+        else:
+            if self.persisted_undo is None:
+                self.persisted_undo = self.undo_store.load(self.undo_path, self.undo_base_hash)
+            older = self.persisted_undo
+        self.undo_store.save(self.undo_path, text_hash(self.text), older + session)
+
+    # Every change to the document, in the order it was applied, ends up here
+    def _record_edit(self, start, end, text):
+        if self.journal is not None:
+            self.journal.record(start, end, text)
+
+    def on_text_area_changed(self, message: TextArea.Changed) -> None:
+        # The index is rebuilt lazily, on the next search or find-next
+        self._search_stale = True
+        self.workers.cancel_group(self, "search")
+
+    # Incremental search, called on every change of the search bar
+    def search(self, query: str):
+        index = self.search_index
+        if self._search_stale:
+            index.set_text(self.text)
+            self._search_stale = False
+            self._search_origin = index.offset_of(self.cursor_location)
+
+        self.workers.cancel_group(self, "search")
+        if query and index.is_large() and not (index.query and query.startswith(index.query)):
+            self._scan_in_background(query)
+        else:
+            index.search(query)
+            self._search_finished()
+
+    @work(thread=True, exclusive=True, group="search")
+    def _scan_in_background(self, query: str):
+        worker = get_current_worker()
+        for _ in self.search_index.scan(query):
+            if worker.is_cancelled:
+                return
+        self.app.call_from_thread(self._search_finished)
+
+    def _search_finished(self):
+        self._jump_to_match(self.search_index.next_match(self._search_origin - 1))
+        self._refresh_search_highlights()
+
+    def action_find_next(self):
+        self._find(self.search_index.next_match)
+
+    def action_find_previous(self):
+        self._find(self.search_index.previous_match)
+
+    def _find(self, find):
+        index = self.search_index
+        if not index.query:
+            self.notify("No search pattern.")
+        elif self._search_stale:
+            # The document changed since the last search, so scan it again from the cursor
+            self.search(index.query)
+        else:
+            self._search_origin = index.offset_of(min(self.selection))
+            self._jump_to_match(find(self._search_origin))
+
+    def _jump_to_match(self, offset):
+        if offset is None:
+            return
+        index = self.search_index
+        start = index.location_of(offset)
+        end = index.location_of(offset + len(index.query))
+        self.selection = Selection(start, end)
+        self.scroll_cursor_visible(center=True)
+
+    def _refresh_size(self) -> None:
+        if self.soft_wrap or self._document_width is None:
+            super()._refresh_size()
+            self._document_width = self.virtual_size.width - self.gutter_width - 1
+            return
+
+        # Only measure the rows just edited; the width can overestimate after deletions
+        # until the next load, which costs some horizontal scroll room and nothing else
+        first_row, last_row = self._edited_rows
+        line_count = self.document.line_count
+        for row in range(first_row, min(last_row + 1, line_count)):
+            self._document_width = max(self._document_width, self.wrapped_document.line_width(row))
+        self.virtual_size = Size(self._document_width + self.gutter_width + 1, line_count)
+
+    # Builds the document as TextArea does, but parsed text gets an
+    # IndexedSyntaxDocument so edits don't rescan the lines above them
+    def _set_document(self, text: str, language: str | None) -> None:
+        if language and len(text) > SYNTAX_SIZE_LIMIT:
+            log(f"Document too large to parse, highlighting disabled for {language}")
+            language = None
+        elif language and has_long_line(text, self.long_line_limit):
+            # Long lines are drawn without highlights, and parsing a minified file
+            # on every edit would cost more than the rest of the editor together
+            log(f"Document has lines too long to highlight, highlighting disabled for {language}")
+            language = None
+        elif language and not TREE_SITTER:
+            log.warning(f"tree-sitter not available in this environment, highlighting disabled for {language}")
+            language = None
+
+        document, highlight_query = Document(text), None
+        if language:
+            text_area_language = self._languages.get(language)
+            if text_area_language:
+                document_language, query = text_area_language.language, text_area_language.highlight_query
+            else:
+                document_language, query = language, self._get_builtin_highlight_query(language)
+            try:
+                document = IndexedSyntaxDocument(text, document_language)
+            except SyntaxAwareDocumentError:
+                log.warning(f"Parser not found for language {document_language!r}. Parsing disabled.")
+            else:
+                highlight_query = document.prepare_query(query)
+        self._use_document(document, highlight_query)
+
+    # Show a document parsed before, with the highlight query prepared for it,
+    # as load_text would show its text but without parsing it again
+    def show_document(self, document, highlight_query):
+        self.history.clear()
+        self._use_document(document, highlight_query)
+        self.post_message(self.Changed(self).set_sender(self))
+
+    # Put document in the editor, wrapped and highlighted, with the cursor at the top.
+    # What was typed belongs to the document being replaced, so it is flushed first
+    def _use_document(self, document, highlight_query):
+        self._flush_typing()
+        self._dirty.add_all()
+        self._document_width = None
+        self._highlight_query = highlight_query
+        self.document = document
+        self.wrapped_document = WrappedDocument(document, tab_width=self.indent_width)
+        self.navigator = DocumentNavigator(self.wrapped_document)
+        self._build_highlight_map()
+        self.move_cursor((0, 0))
+        self._rewrap_and_refresh_virtual_size()
+
+    # _set_document wraps a new document with TextArea's WrappedDocument; swap
+    # it for one that handles long lines before the document is wrapped to size
+    def _rewrap_and_refresh_virtual_size(self) -> None:
+        if type(self.wrapped_document) is WrappedDocument:
+            self.wrapped_document = LongLineWrappedDocument(
+                self.document, self.wrap_width, self.indent_width, self.long_line_limit
+            )
+            self.navigator = LongLineNavigator(self.wrapped_document)
+            self._refresh_size()
+        else:
+            super()._rewrap_and_refresh_virtual_size()
+
+    # Long lines are drawn a screen at a time, from their column maps. TextArea
+    # pads every row out to the widest line, which costs as much as the long line
+    # itself, so while there is one, the short rows are drawn the same way.
+    def render_line(self, y):
+        wrapped = self.wrapped_document
+        y_offset = y + self.scroll_offset.y
+        if y_offset >= wrapped.height:
+            return super().render_line(y)
+        row, section = wrapped._offset_to_line_info[y_offset]
+        if wrapped.is_long(row) or (not self.soft_wrap and self.virtual_size.width > self.long_line_limit):
+            return self._render_window(row, section)
+        return super().render_line(y)
+
+    # The part of row on screen, with the cursor, selection, brackets and search
+    # matches; long rows go without syntax highlighting
+    def _render_window(self, row, section):
+        theme = self._theme
+        if theme:
+            theme.apply_css(self)
+        wrapped = self.wrapped_document
+        column_map = wrapped.column_map(row)
+        line = self.document[row]
+        width = self.size.width - self.gutter_width
+        if self.soft_wrap:
+            wrap_offsets = wrapped.get_offsets(row)
+            start = wrap_offsets[section - 1] if section else 0
+            end = wrap_offsets[section] if section < len(wrap_offsets) else len(line)
+            left = column_map.cell(start)
+        else:
+            left = self.scroll_offset.x
+            start = column_map.column_at(left)
+            end = min(column_map.column_at(left + width) + 1, len(line))
+        first_cell = column_map.cell(start)
+        # Tabs expand from the first cell drawn, so pad up to where it sits between tab stops
+        padding = first_cell % self.indent_width
+        text = Text(" " * padding + line[start:end] + (" " if end == len(line) else ""), end="")
+
+        def stylize(style, first, last):
+            first, last = max(first, start), min(last, end + 1)
+            if style and first < last:
+                text.stylize(style, first - start + padding, last - start + padding)
+
+        selection = self.selection
+        (top_row, top_column), (bottom_row, bottom_column) = sorted(selection)
+        cursor_row, cursor_column = selection.end
+        if cursor_row == row and theme:
+            stylize(theme.cursor_line_style, start, end + 1)
+        if top_row <= row <= bottom_row and selection.start != selection.end and theme:
+            stylize(
+                theme.selection_style,
+                top_column if row == top_row else 0,
+                bottom_column if row == bottom_row else len(line),
+            )
+        if not wrapped.is_long(row) and theme:
+            line_bytes = line.encode("utf-8")
+            for first, last, name in self._highlights[row]:
+                last = len(line_bytes) if last is None else last
+                stylize(
+                    theme.syntax_styles.get(name),
+                    len(line_bytes[:first].decode("utf-8", "ignore")),
+                    len(line_bytes[:last].decode("utf-8", "ignore")),
+                )
+        elif not self._search_stale and self.search_index.query:
+            query = self.search_index.query
+            visible = line[start:end + len(query) - 1]
+            found = visible.find(query)
+            while found != -1:
+                stylize(self.SEARCH_MATCH_STYLE, start + found, start + found + len(query))
+                found = visible.find(query, found + 1)
+        if self.match_cursor_bracket and self._matching_bracket_location and selection.is_empty and theme:
+            for bracket_row, bracket_column in (selection.end, self._matching_bracket_location):
+                if bracket_row == row:
+                    stylize(theme.bracket_matching_style, bracket_column, bracket_column + 1)
+        draw_cursor = self.has_focus and not self.cursor_blink or (self.cursor_blink and self._cursor_visible)
+        if cursor_row == row and draw_cursor and theme:
+            stylize(theme.cursor_style, cursor_column, cursor_column + 1)
+        text.expand_tabs(self.indent_width)
+
+        gutter_width = self.gutter_width
+        if self.show_line_numbers:
+            gutter_style = theme.cursor_line_gutter_style if cursor_row == row else theme.gutter_style
+            number = str(row + self.line_number_start) if section == 0 else ""
+            gutter = Text(f"{number:>{gutter_width - 2}}  ", style=gutter_style or "", end="")
+        else:
+            gutter = Text("", end="")
+        console = self.app.console
+        gutter_strip = Strip(console.render(gutter), cell_length=gutter_width)
+        skip = padding + left - first_cell
+        text_strip = Strip(console.render(text, console.options.update_width(max(text.cell_len, 1))))
+        text_strip = text_strip.crop(skip, skip + width)
+        line_style = theme.cursor_line_style if theme and cursor_row == row else (theme.base_style if theme else None)
+        text_strip = text_strip.extend_cell_length(width, line_style)
+        strip = Strip.join([gutter_strip, text_strip]).simplify()
+        return strip.apply_style(theme.base_style if theme and theme.base_style is not None else self.rich_style)
+
+    # Bracket matching walks the text a character at a time; not through a long line
+    def find_matching_bracket(self, bracket, search_from):
+        if len(self.document[search_from[0]]) > self.long_line_limit:
+            return None
+        return super().find_matching_bracket(bracket, search_from)
+
+    def get_column_width(self, row: int, column: int) -> int:
+        if self.wrapped_document.is_long(row):
+            return self.wrapped_document.column_map(row).cell(column)
+        return super().get_column_width(row, column)
+
+    # Highlight the rows around the viewport now and the rest of the file when idle,
+    # instead of querying the whole syntax tree after every edit
+    def _build_highlight_map(self) -> None:
+        self._highlights.clear()
+        self._search_rows = []
+        self._highlighted_rows = (0, 0)
+        if self._highlight_timer is not None:
+            self._highlight_timer.stop()
+            self._highlight_timer = None
+
+        if self._highlight_query:
+            top, bottom = self._visible_line_indices
+            self._highlight_rows(max(top - VIEWPORT_MARGIN, 0), bottom + VIEWPORT_MARGIN)
+            if self.is_mounted:
+                self._highlight_timer = self.set_timer(0.2, self._highlight_next_chunk)
+        self._highlight_search_matches()
+
+    # Add syntax highlights for rows [start, end), next to the rows already covered
+    def _highlight_rows(self, start, end):
+        end = min(end, self.document.line_count)
+        if start >= end:
+            return
+        highlights = self._highlights
+        captures = self.document.query_syntax_tree(self._highlight_query, start_point=(start, 0), end_point=(end, 0))
+        for node, highlight_name in captures:
+            node_start_row, node_start_column = node.start_point
+            node_end_row, node_end_column = node.end_point
+            if node_start_row == node_end_row:
+                if start <= node_start_row < end:
+                    highlights[node_start_row].append((node_start_column, node_end_column, highlight_name))
+                continue
+            for row in range(max(node_start_row, start), min(node_end_row, end - 1) + 1):
+                highlights[row].append((
+                    node_start_column if row == node_start_row else 0,
+                    node_end_column if row == node_end_row else None,
+                    highlight_name,
+                ))
+
+        covered_start, covered_end = self._highlighted_rows
+        if covered_start == covered_end:
+            self._highlighted_rows = (start, end)
+        else:
+            self._highlighted_rows = (min(covered_start, start), max(covered_end, end))
+
+    def _highlight_next_chunk(self):
+        self._highlight_timer = None
+        if getattr(self.document, "needs_reparse", False):
+            # Typing has paused, so bring the syntax tree up to date and redo the viewport
+            self.document.reparse()
+            self._build_highlight_map()
+            self.refresh()
+            return
+
+        covered_start, covered_end = self._highlighted_rows
+        if self.document.line_count > BACKGROUND_LINE_LIMIT:
+            return
+        if covered_end < self.document.line_count:
+            self._highlight_rows(covered_end, covered_end + BACKGROUND_CHUNK)
+        elif covered_start > 0:
+            self._highlight_rows(max(covered_start - BACKGROUND_CHUNK, 0), covered_start)
+        else:
+            return
+        self._highlight_timer = self.set_timer(0.01, self._highlight_next_chunk)
+
+    def watch_scroll_y(self, old_value: float, new_value: float) -> None:
+        # Moves the scrollbar along
+        super().watch_scroll_y(old_value, new_value)
+        top, bottom = self._visible_line_indices
+        covered_start, covered_end = self._highlighted_rows
+        if self._highlight_query and (top < covered_start or min(bottom, self.document.line_count) > covered_end):
+            self._build_highlight_map()
+            self.refresh()
+        else:
+            self._refresh_search_highlights()
+
+    def _refresh_search_highlights(self):
+        highlights = self._highlights
+        for row in self._search_rows:
+            highlights[row] = [item for item in highlights[row] if item[2] != "search.match"]
+        self._search_rows = []
+        self._highlight_search_matches()
+        self.refresh()
+
+    # Only the rows in the viewport get match highlights
+    def _highlight_search_matches(self):
+        index = self.search_index
+        if self._search_stale or not index.matches:
+            return
+
+        top, bottom = self._visible_line_indices
+        starts = index.line_starts()
+        first_offset = starts[min(top, len(starts) - 1)]
+        last_offset = starts[bottom] if bottom < len(starts) else len(index.text)
+        query_bytes = len(index.query.encode("utf-8"))
+
+        for offset in index.matches_between(first_offset, last_offset):
+            row, column = index.location_of(offset)
+            if self.wrapped_document.is_long(row):
+                # Drawn from the visible part of the line instead
+                continue
+            start_byte = len(self.document[row][:column].encode("utf-8"))
+            self._highlights[row].append((start_byte, start_byte + query_bytes, "search.match"))
+            self._search_rows.append(row)
+
+    # Copies go to the registers at once; the system clipboard gets them in the background
     def action_copy_selected_text(self):
-        textToCopy = self.selected_text
-        pyperclip.copy(textToCopy)
+        self.app.clipboard.copy(self.selected_text)
 
     # default behavior is paste keep here for features like replace paste etc.
     def action_paste_selected_text(self):
-        log("".join(['--']*30))
-        sel=self.selection
-        log(pyperclip.paste())
-        self.replace(pyperclip.paste(),sel.start,sel.end)
-        pass
-    pass
+        text = self.app.clipboard.paste()
+        if text is None:
+            # Nothing copied in the editor yet
+            self.action_paste_system_clipboard()
+        else:
+            self._paste(text)
+
+    def action_paste_system_clipboard(self):
+        self._read_system_clipboard()
+
+    # Reading the system clipboard runs a helper process, so it stays off the event loop
+    @work(thread=True, exclusive=True, group="clipboard")
+    def _read_system_clipboard(self):
+        text = self.app.clipboard.read_system()
+        if text and not get_current_worker().is_cancelled:
+            self.app.call_from_thread(self._paste, text)
+
+    def _paste(self, text):
+        selection = self.selection
+        self.replace(text, selection.start, selection.end)
+
+
+class SearchBar(Input):
+    BINDINGS = [
+        ("escape", "close_search()", "Close search"),
+    ]
+    # Set while the bar asks the hex view for an offset to go to
+    going_to_offset = False
+
+    def action_close_search(self):
+        self.display = False
+        for view in self.screen.query("#editor, #hex-view"):
+            if view.display:
+                view.focus()
+
+
+class HexView(ScrollView, can_focus=True):
+    # Offset, hex and ASCII rows of a binary file, read from a memory map as
+    # they are drawn. The cursor is a byte offset; searches run in a worker.
+    BINDINGS = [
+        Binding("up", "move(-16)", "Up", show=False),
+        Binding("down", "move(16)", "Down", show=False),
+        Binding("left", "move(-1)", "Left", show=False),
+        Binding("right", "move(1)", "Right", show=False),
+        Binding("pageup", "move_page(-1)", "Page up", show=False),
+        Binding("pagedown", "move_page(1)", "Page down", show=False),
+        Binding("home", "move_to(0)", "Start", show=False),
+        Binding("end", "move_to(-1)", "End", show=False),
+        ("ctrl+g", "go_to_offset()", "Go to offset"),
+        ("f3", "find_next()", "Find next"),
+    ]
+    ROW_WIDTH = ASCII_COLUMN + BYTES_PER_ROW + 2
+    CURSOR_STYLE = Style(reverse=True)
+    MATCH_STYLE = Style(bgcolor="yellow", color="black")
+
+    cursor = reactive(0)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hex_file = None
+        self.pattern = None
+        self.match = None
+
+    def open(self, path):
+        self.close()
+        self.hex_file = HexFile(path)
+        self.match = None
+        self.virtual_size = Size(self.ROW_WIDTH, self.hex_file.rows)
+        self.cursor = 0
+        self.scroll_to(0, 0, animate=False)
+        self.refresh()
+
+    def close(self):
+        self.workers.cancel_group(self, "hex-search")
+        if self.hex_file is not None:
+            self.hex_file.close()
+            self.hex_file = None
+
+    def on_unmount(self) -> None:
+        self.close()
+
+    def render_line(self, y):
+        width = self.size.width
+        row = self.scroll_offset.y + y
+        if self.hex_file is None or row >= self.hex_file.rows:
+            return Strip.blank(width, self.rich_style)
+        offset = row * BYTES_PER_ROW
+        text = Text(hex_lines(self.hex_file.row(row), offset)[0], end="")
+        if self.match is not None:
+            self._stylize_bytes(text, offset, *self.match, self.MATCH_STYLE)
+        self._stylize_bytes(text, offset, self.cursor, 1, self.CURSOR_STYLE)
+        strip = Strip(self.app.console.render(text), text.cell_len)
+        scroll_x = self.scroll_offset.x
+        return strip.crop(scroll_x, scroll_x + width).extend_cell_length(width).apply_style(self.rich_style)
+
+    # Style the bytes [start, start + length) that fall on the row at offset, in both columns
+    def _stylize_bytes(self, text, offset, start, length, style):
+        first = max(start - offset, 0)
+        last = min(start + length - offset, BYTES_PER_ROW)
+        if first < last:
+            text.stylize(style, HEX_COLUMN + first * 3, HEX_COLUMN + last * 3 - 1)
+            text.stylize(style, ASCII_COLUMN + first, ASCII_COLUMN + last)
+
+    def watch_cursor(self, previous, cursor):
+        for offset in (previous, cursor):
+            self.refresh_line(offset // BYTES_PER_ROW - self.scroll_offset.y)
+        # Keep the cursor's hex digits in sight, scrolling sideways in a narrow view
+        column = HEX_COLUMN + cursor % BYTES_PER_ROW * 3
+        self.scroll_to_region(Region(column, cursor // BYTES_PER_ROW, 2, 1), animate=False)
+        self._show_position()
+
+    def _show_position(self):
+        if self.hex_file is None:
+            return
+        for mode_line in self.screen.query("#mode-line"):
+            mode_line.update(f"HEX  0x{self.cursor:08x} / 0x{self.hex_file.size:08x}")
+
+    def jump(self, offset):
+        if self.hex_file is not None:
+            self.cursor = min(max(offset, 0), max(self.hex_file.size - 1, 0))
+
+    def action_move(self, delta):
+        self.jump(self.cursor + delta)
+
+    def action_move_page(self, pages):
+        self.jump(self.cursor + pages * max(self.size.height - 1, 1) * BYTES_PER_ROW)
+
+    def action_move_to(self, offset):
+        if self.hex_file is not None:
+            self.jump(offset if offset >= 0 else self.hex_file.size - 1)
+
+    def action_go_to_offset(self):
+        self.screen.start_search(offset=True)
+
+    # Jump to the offset typed in the search bar
+    def go_to(self, text):
+        try:
+            self.jump(parse_offset(text, self.cursor, self.hex_file.size if self.hex_file else 0))
+        except ValueError as error:
+            self.notify(str(error), severity="error")
+
+    # Search for the byte pattern typed in the search bar, after the cursor
+    def search(self, text):
+        try:
+            self.pattern = parse_pattern(text)
+        except ValueError as error:
+            self.notify(str(error), severity="error")
+            return
+        self._find(self.cursor + 1)
+
+    def action_find_next(self):
+        if self.pattern:
+            self._find(self.cursor + 1)
+
+    def _find(self, start):
+        if self.hex_file is not None:
+            self._scan(self.hex_file, self.pattern, start)
+
+    @work(thread=True, exclusive=True, group="hex-search")
+    def _scan(self, hex_file, pattern, start):
+        worker = get_current_worker()
+        found = hex_file.find(pattern, start, cancelled=lambda: worker.is_cancelled)
+        if not worker.is_cancelled:
+            self.app.call_from_thread(self._found, hex_file, pattern, found)
+
+    def _found(self, hex_file, pattern, found):
+        if hex_file is not self.hex_file:
+            return
+        if found is None:
+            self.notify("Pattern not found")
+            return
+        self.match = (found, len(pattern))
+        self.refresh()
+        self.jump(found)
 
 
 class FileExplorerAndEditorScreen(Screen):
@@ -167,12 +1096,20 @@ class FileExplorerAndEditorScreen(Screen):
         ("ctrl+f", "toggle_file_explorer()", "Home Screen"),
         ("ctrl+s", "save_current_file()", "Save File"),
         ("ctrl+w", "close_current_file()", "Close file"),
+        ("ctrl+k", "start_search()", "Find"),
+        ("ctrl+t", "toggle_follow()", "Follow"),
     ]
 
     def __init__(self, name, CURRENT_DIR, isFileOpen: bool = False, drive = None):
         self.CURRENT_DIR = CURRENT_DIR
         self.isFileOpen = isFileOpen
         self.drive = drive
+        self.buffers = BufferCache()
+        self.current_path = None
+        self.buffer_tabs = {}
+        self.tab_ids = itertools.count(1)
+        # Files followed as they grow: the tail read so far and the watcher waking its worker
+        self.followers = {}
         super().__init__(name=name)
 
     # The composition of the Editing screen
@@ -181,27 +1118,323 @@ class FileExplorerAndEditorScreen(Screen):
         yield Footer()
         with Horizontal():
             with VerticalScroll(id="left-pane"):
-                yield FileExplorer(path=self.CURRENT_DIR, id="FileExplorerPanel")
+                yield FileExplorer(path=self.CURRENT_DIR, id="FileExplorerPanel", buffers=self.buffers)
             with Container(id="right-pane"):
+                BufferTabs = Tabs(id="buffer-tabs")
+                # Keep tab moving focus from the explorer straight to the editor
+                BufferTabs.can_focus = False
+                yield BufferTabs
                 TextViewerObject = TextViewer(id="editor", disabled=True).code_editor(
                     id="editor"
                 )
                 TextViewerObject.load_text("Open file to edit")
                 TextViewerObject.disabled=True
                 yield TextViewerObject
+                yield HexView(id="hex-view")
+                yield SearchBar(placeholder="Search", id="search-bar")
+                yield Static("", id="mode-line")
+
+    def action_start_search(self):
+        self.start_search()
+
+    # Open the search bar, to search or, in the hex view, to type an offset to go to
+    def start_search(self, offset=False):
+        search_bar = self.query_one("#search-bar", SearchBar)
+        search_bar.going_to_offset = offset
+        search_bar.placeholder = "Offset: 4096, 0x1f00, +16, 50%" if offset else "Search"
+        if offset:
+            search_bar.value = ""
+        search_bar.display = True
+        search_bar.focus()
+
+    def on_mount(self) -> None:
+        self.set_interval(FSYNC_INTERVAL, self.flush_journal)
+
+    @on(FileExplorer.TextViewerUpdated)
+    def load_new_file(self, message: FileExplorer.TextViewerUpdated) -> None:
+        path = str(message.SelectedFile)
+        if path in self.buffers:
+            self.switch_buffer(path)
+        else:
+            kind = message.kind or FileKind()
+            language = None if kind.binary else detect_language(path, len(message.lines))
+            buffer = Buffer(path, message.lines, language)
+            buffer.kind = kind
+            buffer.journal = SwapJournal(path)
+            self.buffers.put(buffer)
+            self.switch_buffer(path)
+            if not kind.binary:
+                self.recover_unsaved_edits(buffer.journal)
+        log("The editor has updated")
+
+    # Replay the swap journal left behind by a session that did not save
+    def recover_unsaved_edits(self, journal):
+        ops = journal.recover()
+        if not ops:
+            return
+        editor = self.query_one("#editor", TextViewer)
+        # The edits are already in the journal, so do not record them twice
+        editor.journal = None
+        try:
+            for start, end, text in ops:
+                editor.replace(text, start, end)
+        except ValueError:
+            self.notify("The swap file does not match this file and was ignored.")
+            editor.load_text(self.buffers.get(journal.path).text)
+            journal.discard()
+        else:
+            self.notify(f"Recovered {len(ops)} unsaved edits from the swap file.")
+        finally:
+            editor.journal = journal
+
+    # Batched write and fsync of the current buffer's journal, off the event loop
+    def flush_journal(self):
+        journal = self.query_one("#editor", TextViewer).journal
+        if journal is not None and journal.has_pending():
+            self.run_worker(journal.flush, thread=True, group="journal")
+
+    # Show the buffer for path in the editor, keeping the state of the current one.
+    # reload shows the current buffer again, from what its state was changed to.
+    def switch_buffer(self, path, reload=False):
+        if path == self.current_path and not reload:
+            return
+        editor = self.query_one("#editor", TextViewer)
+        if not reload:
+            self.stash_current_buffer()
+
+        buffer = self.buffers.get(path)
+        # load_text clears the history it is given, so hand it a fresh one first
+        editor.history = dataclasses.replace(editor.history)
+        # Set the language without its watcher, which would reparse the old text
+        editor.set_reactive(TextViewer.language, buffer.language)
+        follower = self.followers.get(path)
+        if follower is not None:
+            # The tail may have grown while another buffer was shown
+            text, editor.follow_version = follower[0].snapshot()
+            editor.load_text(text)
+        elif buffer.document is not None:
+            editor.show_document(buffer.document, buffer.highlight_query)
+        else:
+            editor.load_text(buffer.text)
+        if buffer.history is not None:
+            editor.history = buffer.history
+            editor.undo_base_hash, editor.persisted_undo = buffer.undo_state
+        else:
+            # Saved undo history is only read if the user undoes this far back
+            editor.undo_base_hash, editor.persisted_undo = text_hash(buffer.text), None
+        editor.undo_path = None if follower is not None else path
+        if buffer.selection is not None:
+            start, end = buffer.selection
+            editor.selection = Selection(tuple(start), tuple(end))
+        editor.scroll_to(*buffer.scroll, animate=False)
+        editor.disabled = False
+        editor.read_only = buffer.kind.binary or follower is not None
+        self.show_hex_view(path if buffer.kind.binary else None)
+        if buffer.journal is None:
+            buffer.journal = SwapJournal(path)
+        editor.journal = None if follower is not None else buffer.journal
+        if follower is not None:
+            editor.move_cursor(editor.document.end)
+
+        self.current_path = path
+        self.query_one(FileExplorer).SelectedFile = Path(path)
+        self.isFileOpen = True
+
+        tabs = self.query_one("#buffer-tabs", Tabs)
+        if path not in self.buffer_tabs:
+            tab_id = f"buffer-{next(self.tab_ids)}"
+            self.buffer_tabs[path] = tab_id
+            tabs.add_tab(Tab(os.path.basename(path), id=tab_id))
+        tabs.active = self.buffer_tabs[path]
+
+        if self.buffers.has_pending_evictions():
+            self.run_worker(self.buffers.evict, thread=True, group="buffers")
+
+    # Binary files are shown in the hex view in place of the editor; None shows the editor
+    def show_hex_view(self, path):
+        hex_view = self.query_one(HexView)
+        editor = self.query_one("#editor", TextViewer)
+        if path is None:
+            hex_view.close()
+        else:
+            hex_view.open(path)
+        hex_view.display = path is not None
+        editor.display = path is None
+        (editor if path is None else hex_view).focus()
+
+    # Follow the current file as it grows, like tail -f, or stop following it
+    def action_toggle_follow(self):
+        path = self.current_path
+        if path is None:
+            self.notify("No file selected.")
+            return
+        if path in self.followers:
+            self.stop_following(path)
+            self.reload_buffer(path)
+            self.notify(f"Stopped following {os.path.basename(path)}.")
+            return
+        buffer = self.buffers.get(path)
+        editor = self.query_one("#editor", TextViewer)
+        if buffer.kind.binary:
+            self.notify("Binary files can't be followed.")
+        elif editor.journal is not None and editor.journal.has_edits():
+            self.notify("Save the file before following it.")
+        else:
+            tail = LogTail(path, buffer.kind)
+            watcher = watch(path)
+            self.stash_current_buffer()
+            self.followers[path] = (tail, watcher)
+            buffer.history = None
+            buffer.selection = None
+            # Shows the tail read so far; the worker's reads add the rest
+            self.switch_buffer(path, reload=True)
+            self.follow_file(path, tail, watcher)
+            self.notify(f"Following {os.path.basename(path)}.")
+
+    # Read whatever the file gains, as the watcher tells, until stopped
+    @work(thread=True, group="follow")
+    def follow_file(self, path, tail, watcher):
+        try:
+            while True:
+                text, dropped, event = tail.read()
+                if text or event:
+                    self.app.call_from_thread(self.followed, path, tail, text, dropped, event, tail.version)
+                # Catch up on a backlog without waiting, but still stop when told
+                if not watcher.wait(0 if tail.has_more() else None):
+                    break
+        finally:
+            watcher.close()
+            tail.close()
+
+    def followed(self, path, tail, text, dropped, event, version):
+        name = os.path.basename(path)
+        if event == "truncated":
+            self.notify(f"{name} was truncated, following it from the start.")
+        elif event == "rotated":
+            self.notify(f"{name} was rotated, following the new file.")
+        follower = self.followers.get(path)
+        if path != self.current_path or follower is None or follower[0] is not tail:
+            return
+        editor = self.query_one("#editor", TextViewer)
+        # Reads already in the text the editor was loaded with
+        if version <= editor.follow_version:
+            return
+        editor.follow_version = version
+        if text:
+            editor.append_followed(text, dropped)
+
+    def stop_following(self, path):
+        follower = self.followers.pop(path, None)
+        if follower is not None:
+            # The worker closes the tail and watcher once it wakes up
+            follower[1].stop()
+
+    # Load the whole file again into its buffer, as editable text
+    def reload_buffer(self, path):
+        self.stash_current_buffer()
+        buffer = self.buffers.get(path)
+        try:
+            buffer.text = read_text(path, buffer.kind)
+        except OSError as error:
+            self.notify(f"Could not read {path}: {error.strerror}", severity="error")
+            buffer.text = self.query_one("#editor", TextViewer).text
+        buffer.document = None
+        buffer.history = None
+        buffer.selection = None
+        buffer.scroll = (0, 0)
+        self.switch_buffer(path, reload=True)
+
+    # Copy the editor state back into the current buffer
+    def stash_current_buffer(self):
+        if self.current_path is None:
+            return
+        editor = self.query_one("#editor", TextViewer)
+        buffer = self.buffers.get(self.current_path)
+        if buffer is None:
+            return
+        buffer.text = editor.text
+        # A followed file's text is the tail's, loaded again on every switch
+        following = self.current_path in self.followers
+        buffer.document = None if following else editor.document
+        buffer.highlight_query = None if following else editor._highlight_query
+        buffer.history = editor.history
+        # The undo file is only written on save; unsaved history stays with the buffer
+        buffer.undo_state = (editor.undo_base_hash, editor.persisted_undo)
+        buffer.selection = editor.selection
+        buffer.scroll = (editor.scroll_x, editor.scroll_y)
+        self.buffers.put(buffer)
+        if buffer.journal is not None and buffer.journal.has_pending():
+            self.run_worker(buffer.journal.flush, thread=True, group="journal")
+
+    @on(Tabs.TabActivated, "#buffer-tabs")
+    def buffer_tab_activated(self, message: Tabs.TabActivated) -> None:
+        for path, tab_id in self.buffer_tabs.items():
+            if tab_id == message.tab.id:
+                self.switch_buffer(path)
+                break
+
+    @on(Input.Changed, "#search-bar")
+    def search_changed(self, message: Input.Changed) -> None:
+        # Byte patterns are searched once submitted, being incomplete while typed
+        if not self.query_one(HexView).display:
+            self.query_one("#editor", TextViewer).search(message.value)
+
+    @on(Input.Submitted, "#search-bar")
+    def search_submitted(self, message: Input.Submitted) -> None:
+        hex_view = self.query_one(HexView)
+        if hex_view.display:
+            search_bar = self.query_one("#search-bar", SearchBar)
+            if search_bar.going_to_offset:
+                hex_view.go_to(message.value)
+                # Leave the bar empty for the next search, not holding the offset
+                search_bar.value = ""
+                search_bar.display = False
+            else:
+                hex_view.search(message.value)
+            hex_view.focus()
+            return
+        editor = self.query_one("#editor", TextViewer)
+        editor.action_find_next()
+        editor.focus()
+
+    # Let a running vimpi-sync daemon know, if one takes care of this file
+    @work(thread=True, group="sync-daemon")
+    def notify_sync_daemon(self, file_path):
+        request_sync(file_path)
 
     def action_save_current_file(self):
         try:
             file_path = self.query_one(FileExplorer).SelectedFile
-            if file_path:
+            buffer = self.buffers.get(file_path) if file_path else None
+            kind = buffer.kind if buffer is not None else FileKind()
+            if file_path and kind.binary:
+                self.notify("Binary files are only previewed and can't be saved.")
+            elif file_path and str(file_path) in self.followers:
+                self.notify("Followed files are read-only; stop following to edit.")
+            elif file_path:
                 data = self.query_one("#editor", TextViewer).text
                 if os.path.isfile(file_path):
-                    # File exists, write data to the file
-                    with open(file_path, "w") as f:
-                        f.write(data)
+                    # File exists, write data to the file in the encoding and line endings it was read with.
+                    # Encoded before the file is opened, so a refused save leaves it as it was
+                    try:
+                        encoded = encode_text(data, kind)
+                    except UnicodeEncodeError as error:
+                        character = error.object[error.start]
+                        self.notify(f"Not saved: {character!r} can't be written in {kind.encoding}, "
+                                    f"the encoding {os.path.basename(file_path)} was read with.", severity="error")
+                        return
+                    with open(file_path, "wb") as f:
+                        f.write(encoded)
                     self.isFileOpen = True
-                    if self.drive:
-                        self.drive.synchronize(self.app.CURRENT_DIR, self.drive.get_or_create_folder("vim_pi"))
+                    editor = self.query_one("#editor", TextViewer)
+                    if editor.journal is not None:
+                        editor.journal.reset()
+                    editor.save_persistent_undo()
+                    if self.app.sync_service is not None:
+                        # Don't wait for the interval, and don't block the editor either
+                        self.app.sync_service.sync_now()
+                    else:
+                        self.notify_sync_daemon(file_path)
                     self.notify("File Saved Successfully.")
                 else:
                     self.notify("File does not exist. At least, not anymore.")
@@ -213,10 +1446,35 @@ class FileExplorerAndEditorScreen(Screen):
 
     def action_close_current_file(self):
         if self.isFileOpen:
+            path = self.current_path
+            self.current_path = None
+            self.stop_following(path)
+            editor = self.query_one("#editor", TextViewer)
+            # Unsaved edits are dropped, so the undo file keeps the history of the text on disk
+            editor.undo_path = None
+            if editor.journal is not None:
+                editor.journal.discard()
+                editor.journal = None
+            self.buffers.remove(path)
+            tab_id = self.buffer_tabs.pop(path, None)
+            if tab_id is not None:
+                self.query_one("#buffer-tabs", Tabs).remove_tab(tab_id)
+
+            if self.buffer_tabs:
+                # Removing the tab activates a neighbour, which switches to its buffer
+                return
+            self.isFileOpen = False
+            self.show_hex_view(None)
+            self.query_one(FileExplorer).SelectedFile = None
             self.query_one("#editor", TextViewer).load_text("Open File to edit")
             self.query_one("#editor", TextViewer).disabled = True
         else:
             self.notify("file not open")
+
+    def on_unmount(self) -> None:
+        for path in list(self.followers):
+            self.stop_following(path)
+        self.buffers.close()
     pass
 
 
@@ -237,6 +1495,10 @@ class VimPi(App):
             self.CURRENT_DIR = CURRENT_DIR
         super().__init__()
         self.drive = None
+        self.sync_service = None
+        # Paces background sync, backing off while typing gets slow
+        self.bandwidth = BandwidthLimiter()
+        self.clipboard = Clipboard(terminal=self.write_to_terminal)
 
     def on_mount(self) -> None:
         # register home screen
@@ -264,16 +1526,33 @@ class VimPi(App):
     def action_enable_drive_sync(self):
         self.push_screen("DriveSyncScreen")
 
-    @on(FileExplorer.TextViewerUpdated)
-    def load_new_file(self, message: FileExplorer.TextViewerUpdated) -> None:
-        self.query_one("#editor", TextViewer).load_text(message.lines)
-        self.query_one(FileExplorerAndEditorScreen).isFileOpen=True
-        self.query_one("#editor", TextViewer).disabled = False
-        log("The editor has updated")
+    # Raw output for the terminal, like the OSC 52 clipboard sequences; any thread
+    def write_to_terminal(self, data):
+        if self._driver is not None:
+            self._driver.write(data)
+
+    # Something may have been copied in another window; "+p and "*p read what it was from here
+    def on_app_focus(self, event: events.AppFocus) -> None:
+        self.clipboard.refresh_system()
+
+    def report_keystroke_latency(self, seconds):
+        self.bandwidth.report_latency(seconds)
 
     def action_quit_app(self):
+        self.stop_sync()
         self.app.exit()
 
+    def stop_sync(self):
+        if self.sync_service is not None:
+            self.sync_service.stop()
+
+    # The sync thread has to end before the process can
+    def on_unmount(self) -> None:
+        self.stop_sync()
+        # A copy made just before quitting still gets to the system clipboard
+        self.clipboard.flush(timeout=1.0)
+        self.clipboard.close()
+
 
 # initialise
 if __name__ == "__main__":
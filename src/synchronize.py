@@ -1,248 +1,301 @@
-import pathlib
-import pickle
-import json
 import os
-import io
 import sys
+import errno
+import json
+import argparse
+import secrets
+import threading
+from datetime import datetime
 from pathlib import Path
-
-from utils.Utils import Utils
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
-
-API_URL = ['https://www.googleapis.com/auth/drive']
-CONFIGS = None
-
-class Drive():
-    def __init__(self):
-        creds = None
-        
-        # Checks if authentication token exists, then load it
-        if os.path.exists('token.pickle'):
-            with open('token.pickle', 'rb') as token:
-                creds = pickle.load(token)
-
-        # Create new authentication token if it does not exist or has expired
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    'credentials.json', API_URL)
-                creds = flow.run_local_server(port=0)
-
-            with open('token.pickle', 'wb') as token:
-                pickle.dump(creds, token)
-
-        self.__service = build('drive', 'v3', credentials=creds)
-    
-
-    # List all files inside specified Drive folder
-    def list_files(self, folder_id):
-        # Call API
-        response = self.__service.files().list(q="'{}' in parents".format(folder_id), fields='files(id,name,modifiedTime,mimeType)').execute()
-
-        # Return all file names
-        files_dic = {"all": response.get('files', []), "names": []}
-        for item in files_dic['all']:
-            files_dic['names'].append(item['name'])
-        
-        return files_dic
-    
-
-    # Download file from drive to local folder
-    def download_file(self, filename, local_path, file_id, update=False):
-        local_absolute_path = Path(f"{local_path}") / f"{filename}"
-
-        # Request for download API
-        request = self.__service.files().get_media(fileId=file_id)
-        
-        # File stream
-        fh = io.BytesIO()
-
-        # Setup request and file stream
-        downloader = MediaIoBaseDownload(fh, request)
-        
-        # Wait while file is being downloaded
-        done = False
-        while done is False:
-            done = downloader.next_chunk()
-
-        # Save download buffer to file
-        with open(local_absolute_path, 'wb') as out: 
-            out.write(fh.getbuffer())
-
-        # Change local modification time to match remote
-        modified_time = self.__service.files().get(fileId=file_id, fields='modifiedTime').execute()['modifiedTime']
-        modified_timestamp = Utils.convert_datetime_timestamp(modified_time)
-        os.utime(local_absolute_path, (modified_timestamp, modified_timestamp))
-
-        if update != False:
-            print("\nLocal file '{}' updated successfully in folder '{}'.".format(filename, local_absolute_path))
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+from src.utils.Sync import open_target
+from src.utils.SyncScheduler import SyncScheduler, SyncRoot
+from src.utils.Throttle import BandwidthLimiter
+
+# vimpi-sync: one headless sync process per user, shared by every VimPi
+# session on the machine. It keeps the configured roots in sync with the
+# same engine as the editor, and takes commands (status, sync, focus, pause,
+# resume, stop) over a local socket only processes of the same user can
+# authenticate to.
+#
+#   python -m src.synchronize run [--config FILE]
+#   python -m src.synchronize status
+#   python -m src.synchronize sync [PATH]
+
+DEFAULTS = {
+    "credentials": ".",
+    "interval": 60.0,
+    "jitter": 0.1,
+    "max_workers": 4,
+    "requests_per_minute": None,
+    # KiB per second, None for no limit
+    "upload_limit": None,
+    "download_limit": None,
+    # Daily time ranges transfers are allowed in, like "22:00-07:00"; always when empty
+    "transfer_windows": [],
+    "log_file": None,
+    "roots": [],
+}
+
+
+def config_dir():
+    config_home = os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config"
+    return Path(config_home) / "vimpi"
+
+
+def default_config_path():
+    return config_dir() / "sync.json"
+
+
+# Settings from the JSON config file. Each root is {"path": ..., "folder":
+# "vim_pi", "target": "drive"}, target being drive, local:DIRECTORY or s3:BUCKET,
+# and may set its own "interval", "priority" (higher first) and "share" of
+# the transfers among roots of the same priority.
+def load_config(path=None):
+    path = Path(path) if path else default_config_path()
+    with open(path) as config_file:
+        config = dict(DEFAULTS, **json.load(config_file))
+    base = path.parent
+    roots = []
+    for root in config["roots"]:
+        root = dict({"folder": "vim_pi", "target": "drive", "interval": config["interval"], "priority": 0,
+                     "share": 1.0}, **root)
+        root["path"] = str((base / Path(root["path"]).expanduser()).resolve())
+        roots.append(root)
+    config["roots"] = roots
+    config["credentials"] = str((base / Path(config["credentials"]).expanduser()).resolve())
+    return config
+
+
+# Where the daemon listens: a Unix socket, or a named pipe on Windows
+def daemon_address():
+    if sys.platform == "win32":
+        return r"\\.\pipe\vimpi-sync-" + os.environ.get("USERNAME", "user")
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or config_dir()
+    return str(Path(runtime_dir) / "vimpi-sync.sock")
+
+
+def key_path():
+    return config_dir() / "sync.key"
+
+
+# Key clients authenticate with, readable by the user only
+def create_key():
+    path = key_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    key = secrets.token_bytes(32)
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, "wb") as key_file:
+        key_file.write(key)
+    return key
+
+
+# Whether a daemon answers at address. One started with another key still
+# answers, failing the handshake, and counts as running.
+def daemon_running(address=None):
+    try:
+        with open(key_path(), "rb") as key_file:
+            authkey = key_file.read()
+    except OSError:
+        authkey = secrets.token_bytes(32)
+    try:
+        Client(address or daemon_address(), authkey=authkey).close()
+    except AuthenticationError:
+        return True
+    except (OSError, EOFError):
+        return False
+    return True
+
+
+def kib_per_second(limit):
+    return int(limit * 1024) if limit else None
+
+
+class SyncDaemon:
+    # A SyncScheduler serving every configured root from one thread, and a
+    # listener answering the commands of local clients.
+    def __init__(self, config, address=None, connect=None):
+        self.config = config
+        self.address = address or daemon_address()
+        # Builds the target of a root; open_target unless given
+        self.connect = connect or (lambda root: open_target(root["target"], config["credentials"]))
+        self.scheduler = None
+        self.thread = None
+        self.listener = None
+        self.authkey = None
+        self.__stopping = threading.Event()
+
+    def start(self):
+        roots = [SyncRoot(root["path"], lambda root=root: self.connect(root), root["folder"], root["interval"],
+                          root["priority"], root["share"])
+                 for root in self.config["roots"]]
+        limiter = BandwidthLimiter(kib_per_second(self.config["upload_limit"]),
+                                   kib_per_second(self.config["download_limit"]), self.config["transfer_windows"])
+        self.scheduler = SyncScheduler(roots, self.config["max_workers"], self.config["requests_per_minute"],
+                                       self.config["jitter"],
+                                       on_status=lambda root, state, text: self.log(f"{root.path}: {text}"),
+                                       limiter=limiter)
+        self.thread = threading.Thread(target=self.scheduler.run, name="vimpi-sync")
+        self.thread.start()
+
+    def log(self, text):
+        print(f"[{datetime.now().strftime('%d/%m/%Y %H:%M:%S')}] {text}", flush=True)
+
+    def handle(self, request):
+        command = request.get("command")
+        path = request.get("path")
+        roots = self.scheduler.roots
+        if path is not None:
+            root = self.scheduler.root_for(path)
+            if root is None:
+                return {"ok": False, "error": f"{path} is not under a synchronized root"}
+            roots = [root]
+
+        if command == "status":
+            return {"ok": True, "roots": {root.path: {"state": root.state, "passes": root.passes,
+                                                      "priority": root.priority,
+                                                      "focused": root is self.scheduler.focused,
+                                                      "error": str(root.last_error or "") or None}
+                                          for root in roots}}
+        if command == "sync":
+            self.scheduler.sync_now(path)
+        elif command == "focus" and path is not None:
+            self.scheduler.focus(path)
+        elif command == "pause":
+            self.scheduler.pause(path)
+        elif command == "resume":
+            self.scheduler.resume(path)
+        elif command == "stop":
+            self.stop()
         else:
-            print("\nFile '{}' downloaded successfully in folder '{}'.".format(filename, local_absolute_path))
-
-
-    # Upload file from local to drive folder
-    def upload_file(self, filename, local_path, folder_id, update=False):
-        local_absolute_path = Path(f"{local_path}") / f"{filename}"
-
-        # Custom file metadata for upload (modification time matches local)
-        modified_timestamp = Utils.get_local_file_timestamp(local_absolute_path)
-        file_metadata = {'name': filename, 'modifiedTime': Utils.convert_timestamp_datetime(modified_timestamp), 'parents': [folder_id]}
-
-        # File definitions for upload
-        media = MediaFileUpload(local_absolute_path)
-
-        # Send POST request for upload API
+            return {"ok": False, "error": f"unknown command {command!r}"}
+        return {"ok": True}
+
+    def __serve(self, connection):
+        with connection:
+            try:
+                while True:
+                    connection.send(self.handle(connection.recv()))
+            except (EOFError, OSError):
+                pass
+
+    # Answer clients until stop(), then wait for the services to finish
+    def serve(self, authkey):
+        if sys.platform != "win32" and os.path.exists(self.address):
+            if daemon_running(self.address):
+                raise OSError(errno.EADDRINUSE, "vimpi-sync is already running", self.address)
+            # Left over from a daemon that didn't exit cleanly
+            os.remove(self.address)
+        self.authkey = authkey
+        self.listener = Listener(self.address, authkey=authkey)
+        self.log(f"Listening on {self.address}")
         try:
-            if update != False:
-                uploaded_file = self.__service.files().update(fileId=update, media_body=media).execute()
-                print("\nRemote file '{}' updated successfully in folder '{}'.".format(filename, local_absolute_path))
-            else:
-                uploaded_file = self.__service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-                print("\nFile '{}' uploaded successfully in folder '{}'.".format(filename, local_absolute_path))
-
-            return uploaded_file
-        except:
-            print('\nError uploading file: {}'.format(filename))
-
-            return False
-
-
-    # Create folder with respective parent Folder ID
-    def upload_folder(self, foldername, folder_id):
-        # Custom folder metadata for upload
-        folder_metadata = {'name': foldername, 'parents': [folder_id], 'mimeType': 'application/vnd.google-apps.folder'}
-
+            while not self.__stopping.is_set():
+                try:
+                    connection = self.listener.accept()
+                except (OSError, EOFError, AuthenticationError):
+                    # A client that went away or failed to authenticate
+                    continue
+                if self.__stopping.is_set():
+                    connection.close()
+                    break
+                threading.Thread(target=self.__serve, args=(connection,), daemon=True).start()
+        finally:
+            self.listener.close()
+            self.join()
+
+    def stop(self):
+        self.__stopping.set()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        if self.listener is not None:
+            # Closing the listener doesn't interrupt accept(), connecting does
+            try:
+                Client(self.address, authkey=self.authkey).close()
+            except (OSError, EOFError, AuthenticationError):
+                pass
+
+    def join(self):
+        if self.thread is not None:
+            self.thread.join()
+
+
+class DaemonClient:
+    # Connection to a running daemon; raises OSError when there is none
+    def __init__(self, address=None, authkey=None):
+        if authkey is None:
+            with open(key_path(), "rb") as key_file:
+                authkey = key_file.read()
+        self.connection = Client(address or daemon_address(), authkey=authkey)
+
+    def send(self, command, **arguments):
+        self.connection.send(dict(arguments, command=command))
+        return self.connection.recv()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Ask a running daemon to sync the root holding path, serving it before the
+# others. False when no daemon takes care of it, so the caller can sync by itself.
+def request_sync(path, address=None, authkey=None):
+    try:
+        with DaemonClient(address, authkey) as client:
+            return client.send("focus", path=str(path)).get("ok", False)
+    except (OSError, EOFError):
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="vimpi-sync", description="Headless VimPi sync daemon")
+    parser.add_argument("command", nargs="?", default="run",
+                        choices=["run", "status", "sync", "focus", "pause", "resume", "stop"])
+    parser.add_argument("path", nargs="?", help="root to act on, by a path inside it (focus needs one)")
+    parser.add_argument("--config", help=f"config file (default {default_config_path()})")
+    args = parser.parse_args(argv)
+
+    if args.command != "run":
+        arguments = {"path": os.path.abspath(args.path)} if args.path else {}
         try:
-            # Send POST request for upload API
-            uploaded_folder = self.__service.files().create(body=folder_metadata).execute()
-            print('\nRemote folder created: {}'.format(uploaded_folder['name']))
-
-            return uploaded_folder['id']
-        except:
-            print('\nError creating folder...')
-
-            return False
-
-
-    # Verifies if file was modified or not
-    def compare_files(self, local_file_data, remote_file_data):
-        modified = False
-
-        if local_file_data['modifiedTime'] > remote_file_data['modifiedTime']:
-            modified = 'local'    
-        elif local_file_data['modifiedTime'] < remote_file_data['modifiedTime']:
-            modified = 'remote'
-
-        return modified
-
-
-    # Recursive method to synchronize all folder and files
-    def synchronize(self, local_path, folder_id):
-        print("------------- Synchronizing folder '{}' -------------".format(local_path), end="\r")
-
-        # Check if local path exists, if not, creates folder
-        if not os.path.exists(local_path):
-            os.makedirs(local_path)
-
-        # List remote and local files
-        drive_files = self.list_files(folder_id)
-        local_files = Utils.list_local_files(local_path)
-
-        # Compare files with same name in both origins and check which is newer, updating
-        same_files = list(set(drive_files['names']) & set(local_files))
-        for sm_file in same_files:
-            local_absolute_path = pathlib.Path(f"{local_path}") / f"{sm_file}"
-
-            remote_file_data = next(item for item in drive_files['all'] if item["name"] == sm_file) # Filter to respective file
-            remote_file_data["modifiedTime"] = Utils.convert_datetime_timestamp(remote_file_data["modifiedTime"])
-
-            local_file_data = {}
-            local_file_data["name"] = sm_file
-            local_file_data["modifiedTime"] = Utils.get_local_file_timestamp(local_absolute_path)
-
-            # Checks if files were modified on any origin
-            modified = self.compare_files(local_file_data, remote_file_data)
-
-            if modified == 'local':
-                if os.path.isdir(local_absolute_path):
-                    self.synchronize(local_absolute_path, remote_file_data['id'])
-                else:
-                    self.upload_file(sm_file, local_path, folder_id, remote_file_data['id'])
-    
-            elif modified == 'remote':
-                if remote_file_data["mimeType"] == 'application/vnd.google-apps.folder':
-                    self.synchronize(local_absolute_path, remote_file_data['id'])
-                else:
-                    self.download_file(sm_file, local_path, remote_file_data['id'], True)
-
-        # Compare different files in both origins and download/upload what is needed
-        different_files = list(set(drive_files['names']) ^ set(local_files))
-        for diff_file in different_files:
-            # IF file is only on Google Drive (DOWNLOAD)
-            if diff_file in drive_files['names']:
-                for remote_file in drive_files['all']:
-                    if remote_file['name'] == diff_file:
-                        if remote_file['mimeType'] == 'application/vnd.google-apps.folder':
-                            local_absolute_path = Path(f"{local_path}") / f"{diff_file}"
-                            self.synchronize(local_absolute_path, remote_file['id']) # Recursive to download files inside folders
-                        else:
-                            self.download_file(remote_file['name'], local_path, remote_file['id'])
-
-            # IF file is only on local (UPLOAD)
-            else:
-                local_absolute_path = Path(f"{local_path}") / f"{diff_file}"
-
-                # Check if path redirects to a file or folder
-                if os.path.isdir(local_absolute_path):
-                    created_folder_id = self.upload_folder(diff_file, folder_id)
-                    if created_folder_id != False:
-                        self.synchronize(local_absolute_path, created_folder_id) # Recursive to upload files inside folders
-                else:
-                    self.upload_file(diff_file, local_path, folder_id)
-
-
-    # Check if folder exists, if not, create it
-    def get_or_create_folder(self, folder_name):
-        # Search for the folder in the root directory (parent is 'root')
-        query = f"name = '{folder_name}' and mimeType = 'application/vnd.google-apps.folder' and 'root' in parents"
-        response = self.__service.files().list(q=query, fields='files(id, name)').execute()
-        files = response.get('files', [])
-
-        if files:
-            # Folder exists, return its ID
-            folder_id = files[0]['id']
-            print(f"Folder '{folder_name}' found with ID: {folder_id}")
-            return folder_id
-        else:
-            # Folder does not exist, create it
-            folder_metadata = {'name': folder_name, 'mimeType': 'application/vnd.google-apps.folder', 'parents': ['root']}
-            created_folder = self.__service.files().create(body=folder_metadata, fields='id').execute()
-            folder_id = created_folder['id']
-            print(f"Folder '{folder_name}' created with ID: {folder_id}")
-            return folder_id
-
-def main():
-    CONFIGS = {"log_file_path": False}
-    # Logs STDOUT to file if exists
-    if CONFIGS["log_file_path"] != False:
-        sys.stdout = open(CONFIGS["log_file_path"], 'a')
-        
-        from datetime import datetime
-        print("\n******* Log date: {} *******\n".format(datetime.now().strftime("%d/%m/%Y %H:%M:%S")))
-
-    # Instantiate Drive class and synchronize files
-    my_drive = Drive()
-
-    folder = my_drive.get_or_create_folder("vim_pi")
-    CONFIGS["drive_folder_id"] = folder
-    CONFIGS["local_folder_path"] = "proj"
-    my_drive.synchronize(CONFIGS['local_folder_path'], CONFIGS['drive_folder_id'])
+            with DaemonClient() as client:
+                reply = client.send(args.command, **arguments)
+        except (OSError, EOFError):
+            print("vimpi-sync is not running.")
+            return 1
+        print(json.dumps(reply, indent=2))
+        return 0 if reply.get("ok") else 1
+
+    config = load_config(args.config)
+    # Logs STDOUT to file if set
+    if config["log_file"]:
+        sys.stdout = open(config["log_file"], "a")
+
+    # Before the key is replaced, which would lock the clients out of the running one
+    if daemon_running():
+        print("vimpi-sync is already running.")
+        return 1
+    daemon = SyncDaemon(config)
+    daemon.start()
+    try:
+        daemon.serve(create_key())
+    except KeyboardInterrupt:
+        daemon.stop()
+        daemon.join()
+    except OSError as error:
+        print(f"vimpi-sync could not listen on {daemon.address}: {error.strerror}")
+        daemon.stop()
+        daemon.join()
+        return 1
+    return 0
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,727 @@
+import io
+import os
+import time
+import random
+import shutil
+import hashlib
+import itertools
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload, MediaIoBaseDownload
+from googleapiclient.errors import HttpError
+
+from src.utils.Sync import SyncTarget, local_timestamp
+from src.utils.Compression import CompressionStats, compressed_upload, restore_download
+from src.utils.Throttle import ThrottledReader
+from src.utils.Delta import (DELTA_MIN_SIZE, SignatureCache, signature, delta, literal_size,
+                             apply_delta, plan_parts)
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Multipart uploads to S3: size of a part and parts sent at once
+S3_PART_SIZE = 8 * 1024 * 1024
+S3_MAX_WORKERS = 4
+# S3 rejects multipart parts smaller than this, except the last one
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+# Chunks of paced Drive transfers; uploads need a multiple of 256 KiB
+DRIVE_CHUNK_SIZE = 1024 * 1024
+
+
+class BackendQuotaError(Exception):
+    # Raised when the storage rejects a request for rate or quota reasons; Drive retries these
+    pass
+
+
+class DriveBackend(ABC):
+    # Storage operations used by Drive. Files are dicts with the Google Drive v3
+    # fields Drive relies on: id, name, modifiedTime (RFC 3339) and mimeType.
+
+    # BandwidthLimiter pacing file contents, if any
+    limiter = None
+
+    # One page of the children of a folder, and the token of the next page or None
+    @abstractmethod
+    def list_files(self, folder_id, page_token=None):
+        raise NotImplementedError
+
+    # Id of the folder called name inside parent_id, or None
+    @abstractmethod
+    def find_folder(self, name, parent_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_folder(self, name, parent_id):
+        raise NotImplementedError
+
+    # properties are appProperties to store with the file; on update a None value removes one
+    @abstractmethod
+    def create_file(self, name, parent_id, local_path, modified_time, properties=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_file(self, file_id, local_path, modified_time=None, properties=None):
+        raise NotImplementedError
+
+    # Write the content of a file to the binary stream fh
+    @abstractmethod
+    def download_file(self, file_id, fh):
+        raise NotImplementedError
+
+    # modifiedTime and appProperties of a file
+    @abstractmethod
+    def get_metadata(self, file_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, file_id):
+        raise NotImplementedError
+
+
+class GoogleDriveBackend(DriveBackend):
+    # The Google Drive v3 API, through an authenticated googleapiclient service
+    def __init__(self, service):
+        self.service = service
+
+    def __execute(self, request):
+        try:
+            return request.execute()
+        except HttpError as error:
+            if error.resp.status in (403, 429) and b'ateLimitExceeded' in (error.content or b''):
+                raise BackendQuotaError(str(error)) from error
+            if error.resp.status == 429:
+                raise BackendQuotaError(str(error)) from error
+            raise
+
+    # Send a request with a file, in paced chunks when there is a limiter
+    def __send(self, make_request, local_path):
+        if self.limiter is None:
+            return self.__execute(make_request(MediaFileUpload(local_path)))
+
+        with open(local_path, 'rb') as local_file:
+            media = MediaIoBaseUpload(self.limiter.reader(local_file), mimetype='application/octet-stream',
+                                      chunksize=DRIVE_CHUNK_SIZE, resumable=True)
+            request = make_request(media)
+            response = None
+            while response is None:
+                _, response = self.__execute(_NextChunk(request))
+        return response
+
+    def list_files(self, folder_id, page_token=None):
+        response = self.__execute(self.service.files().list(
+            q="'{}' in parents".format(folder_id),
+            fields='nextPageToken, files(id,name,modifiedTime,mimeType,size,md5Checksum)',
+            pageToken=page_token))
+
+        return response.get('files', []), response.get('nextPageToken')
+
+    def find_folder(self, name, parent_id):
+        query = f"name = '{name}' and mimeType = '{FOLDER_MIME_TYPE}' and '{parent_id}' in parents"
+        files = self.__execute(self.service.files().list(q=query, fields='files(id, name)')).get('files', [])
+
+        return files[0]['id'] if files else None
+
+    def create_folder(self, name, parent_id):
+        folder_metadata = {'name': name, 'parents': [parent_id], 'mimeType': FOLDER_MIME_TYPE}
+
+        return self.__execute(self.service.files().create(body=folder_metadata, fields='id, name'))
+
+    def create_file(self, name, parent_id, local_path, modified_time, properties=None):
+        file_metadata = {'name': name, 'modifiedTime': modified_time, 'parents': [parent_id]}
+        if properties:
+            file_metadata['appProperties'] = properties
+        return self.__send(lambda media: self.service.files().create(body=file_metadata, media_body=media, fields='id'),
+                           local_path)
+
+    def update_file(self, file_id, local_path, modified_time=None, properties=None):
+        body = {}
+        if modified_time:
+            body['modifiedTime'] = modified_time
+        if properties:
+            body['appProperties'] = properties
+        return self.__send(lambda media: self.service.files().update(fileId=file_id, body=body or None,
+                                                                     media_body=media),
+                           local_path)
+
+    def download_file(self, file_id, fh):
+        request = self.service.files().get_media(fileId=file_id)
+        if self.limiter is None:
+            downloader = MediaIoBaseDownload(fh, request)
+        else:
+            downloader = MediaIoBaseDownload(self.limiter.writer(fh), request, chunksize=DRIVE_CHUNK_SIZE)
+
+        # Wait while file is being downloaded
+        done = False
+        while done is False:
+            _, done = downloader.next_chunk()
+
+    def get_metadata(self, file_id):
+        return self.__execute(self.service.files().get(fileId=file_id, fields='modifiedTime, appProperties'))
+
+    def delete(self, file_id):
+        self.__execute(self.service.files().delete(fileId=file_id))
+
+
+class _NextChunk:
+    # One chunk of a resumable upload, run like a request so errors are mapped the same way
+    def __init__(self, request):
+        self.request = request
+
+    def execute(self):
+        return self.request.next_chunk()
+
+
+class FakeDriveBackend(DriveBackend):
+    # In-memory stand-in for Google Drive, for tests and offline benchmarks. It
+    # follows the semantics Drive depends on (paginated listings, server-side
+    # modifiedTime when none is sent) and can add latency and quota errors.
+    def __init__(self, page_size=100, latency=0.0, quota_error_rate=0.0, seed=0):
+        self.page_size = page_size
+        self.latency = latency
+        self.quota_error_rate = quota_error_rate
+        self.files = {'root': {'id': 'root', 'name': 'My Drive', 'mimeType': FOLDER_MIME_TYPE, 'parents': []}}
+        self.requests = Counter()
+        self.bytes_uploaded = 0
+        self.bytes_downloaded = 0
+        self.__children = {'root': []}
+        self.__ids = itertools.count(1)
+        self.__random = random.Random(seed)
+
+    # Every call goes through here, like one HTTP request
+    def __request(self, kind):
+        self.requests[kind] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.quota_error_rate and self.__random.random() < self.quota_error_rate:
+            raise BackendQuotaError(f"User rate limit exceeded ({kind})")
+
+    def __now(self):
+        return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+    def __add(self, name, parent_id, mime_type, modified_time, content=None, properties=None):
+        file_id = f"fake{next(self.__ids)}"
+        self.files[file_id] = {'id': file_id, 'name': name, 'mimeType': mime_type, 'parents': [parent_id],
+                               'modifiedTime': modified_time or self.__now(), 'content': content,
+                               'appProperties': {}}
+        self.__set_properties(self.files[file_id], properties)
+        self.__children.setdefault(parent_id, []).append(file_id)
+        if mime_type == FOLDER_MIME_TYPE:
+            self.__children[file_id] = []
+        return file_id
+
+    def __set_properties(self, item, properties):
+        for key, value in (properties or {}).items():
+            if value is None:
+                item['appProperties'].pop(key, None)
+            else:
+                item['appProperties'][key] = value
+
+    def __metadata(self, file_id):
+        item = self.files[file_id]
+        metadata = {key: item[key] for key in ('id', 'name', 'modifiedTime', 'mimeType')}
+        if item['content'] is not None:
+            # Drive sends sizes as strings, and none for folders
+            metadata['size'] = str(len(item['content']))
+            metadata['md5Checksum'] = hashlib.md5(item['content']).hexdigest()
+        return metadata
+
+    def __read(self, local_path):
+        with open(local_path, 'rb') as local_file:
+            content = (self.limiter.reader(local_file) if self.limiter else local_file).read()
+        self.bytes_uploaded += len(content)
+        return content
+
+    def request_count(self):
+        return sum(self.requests.values())
+
+    def list_files(self, folder_id, page_token=None):
+        self.__request('list')
+        children = self.__children.get(folder_id, [])
+        start = int(page_token or 0)
+        end = start + self.page_size
+
+        page = [self.__metadata(file_id) for file_id in children[start:end]]
+        return page, (str(end) if end < len(children) else None)
+
+    def find_folder(self, name, parent_id):
+        self.__request('list')
+        for file_id in self.__children.get(parent_id, []):
+            item = self.files[file_id]
+            if item['name'] == name and item['mimeType'] == FOLDER_MIME_TYPE:
+                return file_id
+        return None
+
+    def create_folder(self, name, parent_id):
+        self.__request('create')
+        file_id = self.__add(name, parent_id, FOLDER_MIME_TYPE, None)
+        return {'id': file_id, 'name': name}
+
+    def create_file(self, name, parent_id, local_path, modified_time, properties=None):
+        self.__request('create')
+        return {'id': self.__add(name, parent_id, 'application/octet-stream', modified_time, self.__read(local_path),
+                                 properties)}
+
+    def update_file(self, file_id, local_path, modified_time=None, properties=None):
+        self.__request('update')
+        item = self.files[file_id]
+        item['content'] = self.__read(local_path)
+        item['modifiedTime'] = modified_time or self.__now()
+        self.__set_properties(item, properties)
+        return {'id': file_id}
+
+    def download_file(self, file_id, fh):
+        self.__request('get_media')
+        content = self.files[file_id]['content'] or b''
+        self.bytes_downloaded += len(content)
+        (self.limiter.writer(fh) if self.limiter else fh).write(content)
+
+    def get_metadata(self, file_id):
+        self.__request('get')
+        item = self.files[file_id]
+        return {'modifiedTime': item['modifiedTime'], 'appProperties': dict(item['appProperties'])}
+
+    def delete(self, file_id):
+        self.__request('delete')
+        item = self.files.pop(file_id)
+        for parent_id in item['parents']:
+            self.__children[parent_id].remove(file_id)
+
+        # Deleting a folder deletes everything below it
+        stack = self.__children.pop(file_id, [])
+        while stack:
+            child_id = stack.pop()
+            self.files.pop(child_id, None)
+            stack.extend(self.__children.pop(child_id, []))
+
+
+class LocalDirectoryBackend(SyncTarget):
+    # A directory on this machine or a mounted NAS share. Ids are paths relative
+    # to root, written with forward slashes; the root itself is ''. In delta
+    # mode big files already on the share are patched with the changed blocks
+    # only, instead of being copied whole.
+    max_parallel = 4
+
+    def __init__(self, root, delta=False, signatures=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.delta = delta
+        self.signatures = signatures or SignatureCache()
+        self.bytes_written = 0
+
+    def __path(self, file_id):
+        return self.root / file_id if file_id else self.root
+
+    def __child(self, parent_id, name):
+        return f"{parent_id}/{name}" if parent_id else name
+
+    # Copy through a temporary file so readers of the share never see half a file,
+    # paced by consume when given
+    def __copy(self, source, destination, modified, consume=None):
+        temporary_path = destination.with_name(f".{destination.name}.vimpi-tmp")
+        if consume is None:
+            shutil.copyfile(source, temporary_path)
+        else:
+            with open(source, 'rb') as source_file, open(temporary_path, 'wb') as destination_file:
+                shutil.copyfileobj(ThrottledReader(source_file, consume), destination_file)
+        os.utime(temporary_path, (modified, modified))
+        os.replace(temporary_path, destination)
+
+    def get_or_create_folder(self, folder_name):
+        self.__path(folder_name).mkdir(exist_ok=True)
+        return folder_name
+
+    def find_folder(self, folder_name):
+        return folder_name if self.__path(folder_name).is_dir() else None
+
+    def list_entries(self, folder_id):
+        entries = []
+        with os.scandir(self.__path(folder_id)) as scanner:
+            for item in scanner:
+                if item.name.endswith(".vimpi-tmp"):
+                    continue
+                stat = item.stat()
+                entries.append({'id': self.__child(folder_id, item.name), 'name': item.name,
+                                'modified': int(stat.st_mtime), 'is_folder': item.is_dir(),
+                                'size': 0 if item.is_dir() else stat.st_size})
+        return entries
+
+    def create_folder(self, name, parent_id):
+        folder_id = self.__child(parent_id, name)
+        self.__path(folder_id).mkdir(exist_ok=True)
+        return folder_id
+
+    def upload(self, local_path, name, parent_id, file_id=None):
+        file_id = file_id or self.__child(parent_id, name)
+        destination = self.__path(file_id)
+        modified = local_timestamp(local_path)
+
+        if self.delta and destination.is_file() and os.path.getsize(local_path) >= DELTA_MIN_SIZE:
+            self.__patch(local_path, destination, modified)
+        else:
+            self.__copy(local_path, destination, modified, self.limiter and self.limiter.consume_upload)
+            self.bytes_written += os.path.getsize(destination)
+        return file_id
+
+    def __signature_token(self, path):
+        stat = os.stat(path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    # Bring destination up to date with local_path by writing the changed blocks only
+    def __patch(self, local_path, destination, modified):
+        key = str(destination.resolve())
+        old_signature = self.signatures.get(key, self.__signature_token(destination)) or signature(destination)
+        segments = delta(local_path, old_signature)
+
+        # Built next to the old version and swapped in whole, so a reader or an
+        # interrupted patch never sees a half written file, and the old version
+        # keeps its modification time until the new one replaces it
+        temporary_path = destination.with_name(f".{destination.name}.vimpi-tmp")
+        try:
+            with open(destination, 'rb') as base, open(local_path, 'rb') as source, \
+                    open(temporary_path, 'wb') as target:
+                apply_delta(segments, base, source, target)
+            os.utime(temporary_path, (modified, modified))
+            os.replace(temporary_path, destination)
+        except BaseException:
+            temporary_path.unlink(missing_ok=True)
+            raise
+
+        self.bytes_written += literal_size(segments)
+        self.signatures.put(key, self.__signature_token(destination), signature(local_path))
+
+    def download(self, file_id, local_path, update=False):
+        remote_path = self.__path(file_id)
+        self.__copy(remote_path, Path(local_path), local_timestamp(remote_path),
+                    self.limiter and self.limiter.consume_download)
+
+    def delete(self, file_id):
+        path = self.__path(file_id)
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+
+
+class S3Backend(SyncTarget):
+    # A bucket of an S3-compatible store (AWS, MinIO, Ceph...), through a boto3
+    # style client. Folders are key prefixes ending in '/', marked by an empty
+    # object so empty folders survive. S3 sets LastModified itself, so the local
+    # modification time travels in the object metadata. Files bigger than
+    # part_size are sent as a multipart upload, max_workers parts at a time.
+    # Objects can't be patched, so delta mode rebuilds a changed object with a
+    # multipart upload whose unchanged ranges are copied from the old object
+    # on the server side. With a compression policy, matching files are stored
+    # compressed and the 'encoding' metadata says how to restore them.
+    def __init__(self, bucket, client=None, prefix='', part_size=S3_PART_SIZE, max_workers=S3_MAX_WORKERS,
+                 delta=False, signatures=None, compression=None):
+        if client is None:
+            # Only needed for real S3, the sync works without it otherwise
+            import boto3
+            client = boto3.client('s3')
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self.delta = delta
+        self.signatures = signatures or SignatureCache()
+        self.compression = compression
+        self.compression_stats = CompressionStats()
+        # Modification times by (key, ETag), to avoid a HEAD request per object and sync
+        self.__modified = {}
+        self.__etags = {}
+
+    @property
+    def max_parallel(self):
+        return self.max_workers
+
+    def get_or_create_folder(self, folder_name):
+        return self.create_folder(folder_name, self.prefix)
+
+    def find_folder(self, folder_name):
+        folder_id = f"{self.prefix}{folder_name}/"
+        response = self.client.list_objects_v2(Bucket=self.bucket, Prefix=folder_id, MaxKeys=1)
+        return folder_id if response.get('Contents') else None
+
+    def __timestamp(self, key, etag, last_modified):
+        modified = self.__modified.get((key, etag))
+        if modified is None:
+            metadata = self.client.head_object(Bucket=self.bucket, Key=key).get('Metadata', {})
+            modified = int(metadata['mtime']) if 'mtime' in metadata else int(last_modified.timestamp())
+            self.__modified[(key, etag)] = modified
+        return modified
+
+    def list_entries(self, folder_id):
+        entries = []
+        arguments = {'Bucket': self.bucket, 'Prefix': folder_id, 'Delimiter': '/'}
+        while True:
+            response = self.client.list_objects_v2(**arguments)
+            for common_prefix in response.get('CommonPrefixes', []):
+                key = common_prefix['Prefix']
+                entries.append({'id': key, 'name': key[len(folder_id):-1], 'modified': 0, 'is_folder': True,
+                                'size': 0})
+            for item in response.get('Contents', []):
+                key = item['Key']
+                if key == folder_id:
+                    continue
+                self.__etags[key] = item['ETag']
+                entries.append({'id': key, 'name': key[len(folder_id):], 'is_folder': False, 'size': item['Size'],
+                                'modified': self.__timestamp(key, item['ETag'], item['LastModified'])})
+            if not response.get('IsTruncated'):
+                return entries
+            arguments['ContinuationToken'] = response['NextContinuationToken']
+
+    def create_folder(self, name, parent_id):
+        folder_id = f"{parent_id}{name}/"
+        self.client.put_object(Bucket=self.bucket, Key=folder_id, Body=b'')
+        return folder_id
+
+    def upload(self, local_path, name, parent_id, file_id=None):
+        key = file_id or f"{parent_id}{name}"
+        modified = local_timestamp(local_path)
+        metadata = {'mtime': str(modified)}
+        size = os.path.getsize(local_path)
+        signature_key = f"s3://{self.bucket}/{key}"
+
+        old_signature = None
+        delta_sized = self.delta and size >= max(DELTA_MIN_SIZE, S3_MIN_PART_SIZE)
+        if delta_sized and file_id:
+            old_signature = self.signatures.get(signature_key, self.__etags.get(key))
+
+        if old_signature is not None:
+            parts = plan_parts(delta(local_path, old_signature), S3_MIN_PART_SIZE, self.part_size)
+            etag = self.__upload_multipart(local_path, key, metadata, parts)
+        else:
+            # Files sent by delta are stored raw, compression would hide the unchanged blocks
+            policy = None if delta_sized else self.compression
+            with compressed_upload(local_path, policy, self.compression_stats) as (send_path, encoding):
+                if encoding:
+                    metadata['encoding'] = encoding
+                etag = self.__upload_whole(send_path, key, metadata)
+
+        self.__modified[(key, etag)] = modified
+        self.__etags[key] = etag
+        if delta_sized:
+            self.signatures.put(signature_key, etag, signature(local_path))
+        return key
+
+    def __reader(self, local_file):
+        return self.limiter.reader(local_file) if self.limiter is not None else local_file
+
+    def __upload_whole(self, local_path, key, metadata):
+        size = os.path.getsize(local_path)
+        if size > self.part_size:
+            parts = [('upload', offset, min(self.part_size, size - offset)) for offset in range(0, size, self.part_size)]
+            return self.__upload_multipart(local_path, key, metadata, parts)
+
+        with open(local_path, 'rb') as local_file:
+            return self.client.put_object(Bucket=self.bucket, Key=key, Body=self.__reader(local_file).read(),
+                                          Metadata=metadata)['ETag']
+
+    # Send one part, either read from the local file or copied from the current object
+    def __upload_part(self, key, upload_id, number, local_path, part):
+        kind, offset, length = part
+        if kind == 'copy':
+            response = self.client.upload_part_copy(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                    PartNumber=number,
+                                                    CopySource={'Bucket': self.bucket, 'Key': key},
+                                                    CopySourceRange=f"bytes={offset}-{offset + length - 1}")
+            return {'PartNumber': number, 'ETag': response['CopyPartResult']['ETag']}
+
+        with open(local_path, 'rb') as local_file:
+            local_file.seek(offset)
+            data = self.__reader(local_file).read(length)
+        response = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                           PartNumber=number, Body=data)
+        return {'PartNumber': number, 'ETag': response['ETag']}
+
+    def __upload_multipart(self, local_path, key, metadata, parts):
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key, Metadata=metadata)['UploadId']
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                parts = list(executor.map(
+                    lambda numbered: self.__upload_part(key, upload_id, numbered[0], local_path, numbered[1]),
+                    enumerate(parts, start=1)))
+        except Exception:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+
+        return self.client.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                     MultipartUpload={'Parts': parts})['ETag']
+
+    def download(self, file_id, local_path, update=False):
+        response = self.client.get_object(Bucket=self.bucket, Key=file_id)
+        metadata = response.get('Metadata', {})
+        modified = int(metadata['mtime']) if 'mtime' in metadata else int(response['LastModified'].timestamp())
+
+        local_path = Path(local_path)
+        temporary_path = local_path.with_name(f".{local_path.name}.vimpi-tmp")
+        with open(temporary_path, 'wb') as local_file:
+            body = response['Body']
+            if self.limiter is not None:
+                body = ThrottledReader(body, self.limiter.consume_download)
+            restore_download(body, local_file, metadata.get('encoding'), self.compression_stats)
+        os.utime(temporary_path, (modified, modified))
+        os.replace(temporary_path, local_path)
+
+    def delete(self, file_id):
+        if not file_id.endswith('/'):
+            self.client.delete_object(Bucket=self.bucket, Key=file_id)
+            return
+
+        # A folder is every key under its prefix
+        arguments = {'Bucket': self.bucket, 'Prefix': file_id}
+        while True:
+            response = self.client.list_objects_v2(**arguments)
+            keys = [{'Key': item['Key']} for item in response.get('Contents', [])]
+            if keys:
+                self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': keys})
+            if not response.get('IsTruncated'):
+                return
+            arguments['ContinuationToken'] = response['NextContinuationToken']
+
+
+class FakeS3Client:
+    # In-memory stand-in for a boto3 S3 client, covering the calls S3Backend
+    # makes, like a local MinIO. Safe to call from several threads, and it
+    # records how many part uploads ran at once.
+    def __init__(self, latency=0.0, max_keys=1000):
+        self.latency = latency
+        self.max_keys = max_keys
+        self.objects = {}
+        self.requests = Counter()
+        self.bytes_uploaded = 0
+        self.bytes_downloaded = 0
+        self.bytes_copied = 0
+        self.max_concurrent_parts = 0
+        self.__uploads = {}
+        self.__running_parts = 0
+        self.__ids = itertools.count(1)
+        self.__lock = threading.Lock()
+
+    def __request(self, kind):
+        with self.__lock:
+            self.requests[kind] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def __store(self, key, data, metadata, etag, counted=False):
+        with self.__lock:
+            if not counted:
+                self.bytes_uploaded += len(data)
+            self.objects[key] = {'Body': data, 'Metadata': dict(metadata or {}), 'ETag': etag,
+                                 'LastModified': datetime.now(timezone.utc)}
+        return {'ETag': etag}
+
+    def request_count(self):
+        return sum(self.requests.values())
+
+    def put_object(self, Bucket, Key, Body=b'', Metadata=None):
+        self.__request('put')
+        return self.__store(Key, bytes(Body), Metadata, f'"{hashlib.md5(Body).hexdigest()}"')
+
+    def head_object(self, Bucket, Key):
+        self.__request('head')
+        item = self.objects[Key]
+        return {'Metadata': dict(item['Metadata']), 'ETag': item['ETag'], 'LastModified': item['LastModified'],
+                'ContentLength': len(item['Body'])}
+
+    def get_object(self, Bucket, Key):
+        self.__request('get')
+        item = self.objects[Key]
+        with self.__lock:
+            self.bytes_downloaded += len(item['Body'])
+        return {'Body': io.BytesIO(item['Body']), 'Metadata': dict(item['Metadata']), 'ETag': item['ETag'],
+                'LastModified': item['LastModified'], 'ContentLength': len(item['Body'])}
+
+    def delete_object(self, Bucket, Key):
+        self.__request('delete')
+        self.objects.pop(Key, None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        self.__request('delete')
+        for item in Delete['Objects']:
+            self.objects.pop(item['Key'], None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', Delimiter=None, ContinuationToken=None, MaxKeys=None):
+        self.__request('list')
+        results = []
+        seen_prefixes = set()
+        for key in sorted(self.objects):
+            if not key.startswith(Prefix):
+                continue
+            rest = key[len(Prefix):]
+            if Delimiter and Delimiter in rest:
+                common_prefix = Prefix + rest[:rest.index(Delimiter) + 1]
+                if common_prefix not in seen_prefixes:
+                    seen_prefixes.add(common_prefix)
+                    results.append(('prefix', common_prefix))
+            else:
+                results.append(('key', key))
+
+        start = int(ContinuationToken or 0)
+        end = start + (MaxKeys or self.max_keys)
+        response = {'Contents': [], 'CommonPrefixes': [], 'IsTruncated': end < len(results)}
+        for kind, key in results[start:end]:
+            if kind == 'prefix':
+                response['CommonPrefixes'].append({'Prefix': key})
+            else:
+                item = self.objects[key]
+                response['Contents'].append({'Key': key, 'ETag': item['ETag'], 'Size': len(item['Body']),
+                                             'LastModified': item['LastModified']})
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(end)
+        return response
+
+    def create_multipart_upload(self, Bucket, Key, Metadata=None):
+        self.__request('create_multipart')
+        upload_id = f"upload{next(self.__ids)}"
+        with self.__lock:
+            self.__uploads[upload_id] = {'Key': Key, 'Metadata': Metadata, 'Parts': {}}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self.__lock:
+            self.__running_parts += 1
+            self.max_concurrent_parts = max(self.max_concurrent_parts, self.__running_parts)
+        try:
+            self.__request('upload_part')
+            etag = f'"{hashlib.md5(Body).hexdigest()}"'
+            with self.__lock:
+                self.__uploads[UploadId]['Parts'][PartNumber] = (bytes(Body), etag)
+                self.bytes_uploaded += len(Body)
+            return {'ETag': etag}
+        finally:
+            with self.__lock:
+                self.__running_parts -= 1
+
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, CopySourceRange):
+        self.__request('upload_part_copy')
+        first, last = (int(value) for value in CopySourceRange[len('bytes='):].split('-'))
+        data = self.objects[CopySource['Key']]['Body'][first:last + 1]
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with self.__lock:
+            self.__uploads[UploadId]['Parts'][PartNumber] = (data, etag)
+            self.bytes_copied += len(data)
+        return {'CopyPartResult': {'ETag': etag}}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.__request('complete_multipart')
+        with self.__lock:
+            upload = self.__uploads.pop(UploadId)
+        data = b''.join(upload['Parts'][part['PartNumber']][0] for part in MultipartUpload['Parts'])
+        etag = f'"{hashlib.md5(data).hexdigest()}-{len(MultipartUpload["Parts"])}"'
+        return self.__store(Key, data, upload['Metadata'], etag, counted=True)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.__request('abort_multipart')
+        with self.__lock:
+            self.__uploads.pop(UploadId, None)
+        return {}
@@ -0,0 +1,157 @@
+import os
+import shutil
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Linux ioctl sharing the blocks of one file with another (btrfs, XFS...)
+FICLONE = 0x40049409
+# Bytes kept in the cache before the least recently used blobs go
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+
+def blob_dir():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "vimpi" / "blobs"
+
+
+# Copy source to destination sharing its blocks when the filesystem can,
+# copying them otherwise
+def clone_file(source, destination):
+    if fcntl is not None:
+        try:
+            with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file:
+                fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source, destination)
+
+
+class BlobCache:
+    # Contents of downloaded files by the MD5 checksum the store reports for
+    # them, so the same bytes are only fetched once: after a revert, or for a
+    # file present in several folders. Files are handed out as clones or copies,
+    # so editing them never touches the cache; hard links share the inode and
+    # are opt-in, for trees that are only read. The least recently used blobs
+    # are dropped once the cache grows past max_size.
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE, hardlink=False):
+        self.directory = Path(directory) if directory else blob_dir()
+        self.max_size = max_size
+        self.hardlink = hardlink
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.__lock = threading.Lock()
+        # Blob sizes by checksum, least recently used first
+        self.__blobs = None
+        self.__size = 0
+
+    def __path(self, checksum):
+        return self.directory / checksum[:2] / checksum
+
+    # Recency survives restarts as the blobs' modification times
+    def __load(self):
+        if self.__blobs is not None:
+            return
+        found = []
+        if self.directory.is_dir():
+            for folder in self.directory.iterdir():
+                if not folder.is_dir():
+                    continue
+                for blob in folder.iterdir():
+                    if blob.name.endswith(".tmp"):
+                        continue
+                    stat = blob.stat()
+                    found.append((stat.st_mtime_ns, blob.name, stat.st_size))
+        self.__blobs = {name: size for _, name, size in sorted(found)}
+        self.__size = sum(self.__blobs.values())
+
+    def __touch(self, checksum):
+        self.__blobs[checksum] = self.__blobs.pop(checksum)
+        if self.hardlink:
+            # The blob is also a synced file, whose modification time matters
+            return
+        try:
+            os.utime(self.__path(checksum))
+        except OSError:
+            pass
+
+    def __contains__(self, checksum):
+        with self.__lock:
+            self.__load()
+            return checksum in self.__blobs
+
+    def size(self):
+        with self.__lock:
+            self.__load()
+            return self.__size
+
+    # Write the blob for checksum to destination; False when it isn't cached
+    def get(self, checksum, destination):
+        with self.__lock:
+            self.__load()
+            if not checksum or checksum not in self.__blobs:
+                self.misses += 1
+                return False
+            self.__touch(checksum)
+            size = self.__blobs[checksum]
+            blob = self.__path(checksum)
+
+        destination = Path(destination)
+        temporary_path = destination.with_name(f".{destination.name}.vimpi-tmp")
+        try:
+            if self.hardlink:
+                os.link(blob, temporary_path)
+            else:
+                clone_file(blob, temporary_path)
+        except FileNotFoundError:
+            # Removed behind our back
+            with self.__lock:
+                self.__size -= self.__blobs.pop(checksum, 0)
+                self.misses += 1
+            return False
+        os.replace(temporary_path, destination)
+
+        with self.__lock:
+            self.hits += 1
+            self.bytes_saved += size
+        return True
+
+    # Keep a copy of path as the content of checksum
+    def put(self, checksum, path):
+        if not checksum:
+            return
+        size = os.path.getsize(path)
+        if size > self.max_size:
+            return
+        with self.__lock:
+            self.__load()
+            if checksum in self.__blobs:
+                self.__touch(checksum)
+                return
+
+        blob = self.__path(checksum)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = blob.with_name(blob.name + ".tmp")
+        clone_file(path, temporary_path)
+        os.replace(temporary_path, blob)
+
+        with self.__lock:
+            if checksum not in self.__blobs:
+                self.__blobs[checksum] = size
+                self.__size += size
+            self.__evict()
+
+    def __evict(self):
+        while self.__size > self.max_size and self.__blobs:
+            checksum = next(iter(self.__blobs))
+            self.__size -= self.__blobs.pop(checksum)
+            try:
+                os.remove(self.__path(checksum))
+            except OSError:
+                pass
@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import zlib
+import hashlib
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from src.utils.Sniff import FileKind
+
+DEFAULT_MEMORY_BUDGET = 32 * 1024 * 1024
+
+
+class Buffer:
+    # An open file: its text plus the editor state worth keeping between switches
+    def __init__(self, path, text, language=None):
+        self.path = str(path)
+        self.text = text
+        self.language = language
+        self.history = None
+        self.undo_state = (None, None)
+        self.journal = None
+        self.selection = None
+        self.scroll = (0, 0)
+        # The document the editor parsed and its prepared highlight query, kept
+        # so that switching back to the buffer doesn't parse it all over again
+        self.document = None
+        self.highlight_query = None
+        # Encoding and line endings to save with; binary files open as a read-only preview
+        self.kind = FileKind()
+
+    # Approximate memory held by the buffer; a document holds its text a second time, as lines
+    def size(self):
+        return sys.getsizeof(self.text) * (1 if self.document is None else 2)
+
+
+class BufferCache:
+    # LRU cache of open buffers bounded by a memory budget. Buffers pushed out of
+    # the budget are queued for eviction and written to a compressed swap file by
+    # evict(), which is meant to run off the event loop.
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, swap_dir=None):
+        self.memory_budget = memory_budget
+        self.__swap_dir = Path(swap_dir) if swap_dir else None
+        self.__buffers = OrderedDict()
+        self.__pending = OrderedDict()
+        self.__swapped = {}
+        # Size each buffer in memory was counted at, as it grows while it is edited
+        self.__sizes = {}
+        self.__memory = 0
+        self.__lock = threading.Lock()
+
+    def __contains__(self, path):
+        path = str(path)
+        return path in self.__buffers or path in self.__pending or path in self.__swapped
+
+    def __len__(self):
+        return len(self.__buffers) + len(self.__pending) + len(self.__swapped)
+
+    def memory_used(self):
+        return self.__memory
+
+    # Return the buffer for path, bringing it back from swap if needed
+    def get(self, path):
+        path = str(path)
+        with self.__lock:
+            buffer = self.__buffers.get(path) or self.__pending.pop(path, None)
+            swap_file = self.__swapped.get(path) if buffer is None else None
+
+        if buffer is None and swap_file is None:
+            return None
+        if buffer is None:
+            buffer = self.__read_swap(path, swap_file)
+
+        self.put(buffer)
+        return buffer
+
+    # Add or refresh a buffer as the most recently used one
+    def put(self, buffer):
+        with self.__lock:
+            if self.__buffers.pop(buffer.path, None) is not None:
+                self.__memory -= self.__sizes.pop(buffer.path)
+            self.__pending.pop(buffer.path, None)
+            swap_file = self.__swapped.pop(buffer.path, None)
+
+            self.__buffers[buffer.path] = buffer
+            self.__sizes[buffer.path] = buffer.size()
+            self.__memory += self.__sizes[buffer.path]
+
+            # Always keep the buffer just used in memory, however big it is
+            while self.__memory > self.memory_budget and len(self.__buffers) > 1:
+                path, cold = self.__buffers.popitem(last=False)
+                self.__memory -= self.__sizes.pop(path)
+                self.__pending[path] = cold
+
+        if swap_file is not None:
+            self.__remove_file(swap_file)
+
+    def has_pending_evictions(self):
+        return bool(self.__pending)
+
+    # Write every queued buffer to swap, dropping it from memory
+    def evict(self):
+        while True:
+            with self.__lock:
+                if not self.__pending:
+                    return
+                path, buffer = next(iter(self.__pending.items()))
+
+            swap_file = self.__write_swap(buffer)
+
+            with self.__lock:
+                # The buffer may have been reopened while it was being written
+                if self.__pending.get(path) is buffer:
+                    del self.__pending[path]
+                    self.__swapped[path] = swap_file
+                    swap_file = None
+
+            if swap_file is not None:
+                self.__remove_file(swap_file)
+
+    # Forget a buffer entirely
+    def remove(self, path):
+        path = str(path)
+        with self.__lock:
+            if self.__buffers.pop(path, None) is not None:
+                self.__memory -= self.__sizes.pop(path)
+            self.__pending.pop(path, None)
+            swap_file = self.__swapped.pop(path, None)
+
+        if swap_file is not None:
+            self.__remove_file(swap_file)
+
+    # Remove every swap file written by this cache
+    def close(self):
+        with self.__lock:
+            self.__buffers.clear()
+            self.__pending.clear()
+            self.__swapped.clear()
+            self.__sizes.clear()
+            self.__memory = 0
+        if self.__swap_dir is not None:
+            shutil.rmtree(self.__swap_dir, ignore_errors=True)
+            self.__swap_dir = None
+
+    def __swap_path(self, path):
+        if self.__swap_dir is None:
+            self.__swap_dir = Path(tempfile.mkdtemp(prefix="vimpi-buffers-"))
+        self.__swap_dir.mkdir(parents=True, exist_ok=True)
+        return self.__swap_dir / (hashlib.sha1(path.encode("utf-8")).hexdigest() + ".swp")
+
+    # Swap form: one JSON header line followed by the zlib-compressed text. The
+    # undo history does not survive eviction, only the text and cursor state.
+    def __write_swap(self, buffer):
+        swap_file = self.__swap_path(buffer.path)
+        header = {"path": buffer.path, "language": buffer.language,
+                  "selection": buffer.selection, "scroll": buffer.scroll, "kind": buffer.kind.header()}
+
+        with open(swap_file, "wb") as swap:
+            swap.write(json.dumps(header).encode("utf-8") + b"\n")
+            swap.write(zlib.compress(buffer.text.encode("utf-8"), 1))
+
+        return swap_file
+
+    def __read_swap(self, path, swap_file):
+        with open(swap_file, "rb") as swap:
+            header = json.loads(swap.readline())
+            text = zlib.decompress(swap.read()).decode("utf-8")
+
+        buffer = Buffer(path, text, header["language"])
+        buffer.selection = header["selection"]
+        buffer.scroll = tuple(header["scroll"])
+        buffer.kind = FileKind.from_header(header.get("kind"))
+
+        return buffer
+
+    def __remove_file(self, swap_file):
+        try:
+            os.remove(swap_file)
+        except OSError:
+            pass
@@ -0,0 +1,261 @@
+import os
+import sys
+import base64
+import shutil
+import threading
+import subprocess
+from string import ascii_lowercase
+
+UNNAMED = '"'
+# Last copy, and the last cuts from "1 (newest) to "9
+YANK = '0'
+CUTS = '123456789'
+# Discards whatever is written to it
+BLACK_HOLE = '_'
+# The system clipboard and, on X11, the primary selection
+CLIPBOARD = '+'
+SELECTION = '*'
+# Characters encoded and written to a clipboard helper at a time
+STREAM_CHUNK = 1024 * 1024
+# Longest OSC 52 payload sent; many terminals silently drop longer sequences
+OSC52_LIMIT = 1024 * 1024
+# Seconds a clipboard helper gets to take or give the text
+HELPER_TIMEOUT = 10
+
+
+class Registers:
+    # Vim-style registers holding text for copy and paste inside the editor:
+    # the unnamed register, "0 for the last copy, "1 to "9 for the last cuts,
+    # "a to "z by name (an uppercase name appends to the register) and "_ that
+    # keeps nothing. Texts are kept as they are, never copied.
+    def __init__(self):
+        self.__registers = {}
+        self.__lock = threading.Lock()
+
+    def set(self, text, name=None, cut=False):
+        name = name or UNNAMED
+        if name == BLACK_HOLE:
+            return
+        with self.__lock:
+            if name.lower() in ascii_lowercase and name.isupper():
+                name = name.lower()
+                text = self.__registers.get(name, "") + text
+            if name == UNNAMED:
+                if cut:
+                    for older, newer in zip(CUTS[::-1], CUTS[-2::-1]):
+                        if newer in self.__registers:
+                            self.__registers[older] = self.__registers[newer]
+                    self.__registers[CUTS[0]] = text
+                else:
+                    self.__registers[YANK] = text
+            else:
+                self.__registers[name] = text
+            self.__registers[UNNAMED] = text
+
+    # Text of register name, None when nothing was put there
+    def get(self, name=None):
+        with self.__lock:
+            return self.__registers.get((name or UNNAMED).lower())
+
+    # Same interface as Clipboard, for editing without the system clipboard
+    def copy(self, text, name=None, cut=False):
+        self.set(text, name, cut)
+
+    def paste(self, name=None):
+        return self.get(name)
+
+    def names(self):
+        with self.__lock:
+            return sorted(self.__registers)
+
+
+# Commands copying stdin to the system clipboard and printing it, for the
+# first helper found on this system; None when there is none
+def find_helper():
+    if sys.platform == 'darwin':
+        return ['pbcopy'], ['pbpaste']
+    if os.environ.get('WAYLAND_DISPLAY') and shutil.which('wl-copy'):
+        return ['wl-copy'], ['wl-paste', '--no-newline']
+    if os.environ.get('DISPLAY'):
+        if shutil.which('xclip'):
+            return ['xclip', '-selection', 'clipboard'], ['xclip', '-selection', 'clipboard', '-o']
+        if shutil.which('xsel'):
+            return ['xsel', '--clipboard', '--input'], ['xsel', '--clipboard', '--output']
+    return None
+
+
+# Whether the editor runs over SSH, where only the terminal can reach the user's clipboard
+def is_remote():
+    return bool(os.environ.get('SSH_TTY') or os.environ.get('SSH_CONNECTION'))
+
+
+class ClipboardHelper:
+    # The system clipboard through helper processes like xclip or pbcopy. Text
+    # is streamed to the helper in chunks, so a large copy is never encoded as
+    # a whole in memory.
+    def __init__(self, copy_command, paste_command):
+        self.copy_command = copy_command
+        self.paste_command = paste_command
+
+    def copy(self, text):
+        process = subprocess.Popen(self.copy_command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
+        try:
+            for start in range(0, len(text), STREAM_CHUNK):
+                process.stdin.write(text[start:start + STREAM_CHUNK].encode('utf-8'))
+        finally:
+            process.stdin.close()
+        process.wait(HELPER_TIMEOUT)
+
+    def paste(self):
+        result = subprocess.run(self.paste_command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                timeout=HELPER_TIMEOUT)
+        return result.stdout.decode('utf-8', errors='replace')
+
+
+class PyperclipHelper:
+    # Whatever pyperclip finds, when no helper of our own is available
+    def copy(self, text):
+        import pyperclip
+        pyperclip.copy(text)
+
+    def paste(self):
+        import pyperclip
+        return pyperclip.paste()
+
+
+# Write text to the clipboard of the terminal with an OSC 52 sequence, in
+# pieces; False when it is too long for terminals to take it
+def write_osc52(write, text, limit=OSC52_LIMIT):
+    data = text.encode('utf-8')
+    if (len(data) + 2) // 3 * 4 > limit:
+        return False
+    write("\x1b]52;c;")
+    # Multiples of 3 bytes encode without padding, so the pieces join up
+    step = STREAM_CHUNK // 4 * 3
+    for start in range(0, len(data), step):
+        write(base64.b64encode(data[start:start + step]).decode('ascii'))
+    write("\a")
+    return True
+
+
+class Clipboard:
+    # Copy and paste for the editor: texts go to the registers right away and
+    # reach the system clipboard later, from a background thread, so a copy
+    # never waits for a helper process. Only the latest text is sent when
+    # several copies pile up. Over SSH, or when no helper is installed, the
+    # text is sent to the terminal with OSC 52 through terminal(text) instead.
+    # Pasting "+ or "* gives the system clipboard as last known and reads it
+    # again on that thread; read_system blocks and is meant for worker threads.
+    def __init__(self, registers=None, helper=None, terminal=None, osc52=None):
+        self.registers = registers or Registers()
+        commands = find_helper() if helper is None or osc52 is None else None
+        if helper is None:
+            helper = ClipboardHelper(*commands) if commands else PyperclipHelper()
+        self.helper = helper
+        self.terminal = terminal
+        self.osc52 = (is_remote() or commands is None) if osc52 is None else osc52
+        self.last_error = None
+        # Last text read from the system clipboard, for when reading it fails
+        self.__system = None
+        self.__pending = None
+        self.__refresh = False
+        self.__busy = False
+        self.__closed = False
+        self.__thread = None
+        self.__condition = threading.Condition()
+
+    # Keep text in register (the unnamed one by default) and send it to the
+    # system clipboard unless it went to a named register
+    def copy(self, text, register=None, cut=False):
+        self.registers.set(text, register, cut)
+        if register in (None, UNNAMED, CLIPBOARD, SELECTION):
+            self.__system = text
+            self.__send(text)
+
+    # Text of register, None if it's empty. "+ and "* never wait for a helper:
+    # they give the system clipboard as last copied or read, and read it again
+    # in the background for the next paste. The other registers never leave the process
+    def paste(self, register=None):
+        if register in (CLIPBOARD, SELECTION):
+            self.refresh_system()
+            return self.__system
+        return self.registers.get(register)
+
+    # Current text of the system clipboard, once the copies still on their way got there
+    def read_system(self):
+        self.flush()
+        return self.__read()
+
+    # Read the system clipboard in the background, after the copies on their way,
+    # so that the next paste from "+ or "* has what other applications copied
+    def refresh_system(self):
+        with self.__condition:
+            self.__refresh = True
+            self.__start()
+            self.__condition.notify_all()
+
+    def __read(self):
+        try:
+            text = self.helper.paste()
+        except Exception as error:
+            self.last_error = error
+            return self.__system
+        with self.__condition:
+            # A copy made while reading is newer than what was read
+            if self.__pending is None:
+                self.__system = text
+        return text
+
+    def __send(self, text):
+        with self.__condition:
+            self.__pending = text
+            self.__start()
+            self.__condition.notify_all()
+
+    def __start(self):
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__run, name="clipboard", daemon=True)
+            self.__thread.start()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while self.__pending is None and not self.__refresh and not self.__closed:
+                    self.__condition.wait()
+                if self.__pending is None and (self.__closed or not self.__refresh):
+                    return
+                # Copies go first, so a refresh reads what they left on the clipboard
+                text, self.__pending = self.__pending, None
+                if text is None:
+                    self.__refresh = False
+                self.__busy = True
+            try:
+                if text is None:
+                    self.__read()
+                else:
+                    self.__push(text)
+            except Exception as error:
+                self.last_error = error
+            finally:
+                with self.__condition:
+                    self.__busy = False
+                    self.__condition.notify_all()
+
+    def __push(self, text):
+        sent = self.osc52 and self.terminal is not None and write_osc52(self.terminal, text)
+        if sent and is_remote():
+            # A helper would only reach the clipboard of the remote machine
+            return
+        self.helper.copy(text)
+
+    # Wait until the pending copies reached the system clipboard, and a refresh asked for was read
+    def flush(self, timeout=None):
+        with self.__condition:
+            return self.__condition.wait_for(
+                lambda: self.__pending is None and not self.__refresh and not self.__busy, timeout)
+
+    def close(self):
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
@@ -0,0 +1,194 @@
+import os
+import gzip
+import shutil
+import tempfile
+import mimetypes
+import threading
+import contextlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD = 'zstd'
+GZIP = 'gzip'
+
+# Metadata key naming the compression of a stored file
+ENCODING_KEY = 'vimpiEncoding'
+
+# Smaller files gain too little to be worth it
+MIN_SIZE = 4096
+CHUNK_SIZE = 1024 * 1024
+
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/xml',
+    'application/javascript',
+    'application/x-javascript',
+    'application/x-sh',
+    'application/x-yaml',
+    'application/yaml',
+    'application/toml',
+    'application/sql',
+    'application/x-tex',
+    'image/svg+xml',
+)
+# Text files mimetypes has no type for
+TEXT_EXTENSIONS = {'.log', '.md', '.toml', '.yaml', '.yml', '.ini', '.cfg', '.conf', '.tcss', '.jsonl', '.ndjson',
+                   '.rs', '.go', '.kt', '.sql', '.env', '.lock'}
+
+
+def default_algorithm():
+    return ZSTD if zstandard is not None else GZIP
+
+
+class CompressionPolicy:
+    # Which files are compressed before they are sent, and how. Files are picked
+    # by MIME type (guessed from the name) and size; images, archives and other
+    # already compressed types are sent as they are.
+    def __init__(self, algorithm=None, min_size=MIN_SIZE, level=None, types=COMPRESSIBLE_TYPES,
+                 extensions=TEXT_EXTENSIONS):
+        self.algorithm = algorithm or default_algorithm()
+        if self.algorithm == ZSTD and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        self.min_size = min_size
+        self.level = level
+        self.types = tuple(types)
+        self.extensions = set(extensions)
+
+    # Algorithm to compress path with, or None to send it as it is
+    def choose(self, path, size):
+        if size < self.min_size:
+            return None
+        mime_type, encoding = mimetypes.guess_type(str(path))
+        if encoding is not None:
+            return None
+        if mime_type is not None and mime_type.startswith(self.types):
+            return self.algorithm
+        if os.path.splitext(str(path))[1].lower() in self.extensions:
+            return self.algorithm
+        return None
+
+
+def compress_stream(source, destination, algorithm, level=None):
+    if algorithm == ZSTD:
+        compressor = zstandard.ZstdCompressor(level=level or 3)
+        compressor.copy_stream(source, destination, read_size=CHUNK_SIZE)
+    elif algorithm == GZIP:
+        # mtime=0 keeps the output the same for the same input
+        with gzip.GzipFile(fileobj=destination, mode='wb', compresslevel=level or 6, mtime=0) as compressed:
+            shutil.copyfileobj(source, compressed, CHUNK_SIZE)
+    else:
+        raise ValueError(f"unknown compression {algorithm!r}")
+
+
+def decompress_stream(source, destination, algorithm):
+    if algorithm == ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        zstandard.ZstdDecompressor().copy_stream(source, destination, read_size=CHUNK_SIZE)
+    elif algorithm == GZIP:
+        with gzip.GzipFile(fileobj=source, mode='rb') as compressed:
+            shutil.copyfileobj(compressed, destination, CHUNK_SIZE)
+    else:
+        raise ValueError(f"unknown compression {algorithm!r}")
+
+
+class CompressionStats:
+    # Bytes before and after compression, for uploads and downloads. Updated
+    # from transfer threads, read by whoever reports on a sync pass.
+    FIELDS = ('files', 'raw_bytes', 'sent_bytes', 'downloaded_files', 'downloaded_raw_bytes', 'received_bytes')
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            setattr(self, field, values.get(field, 0))
+        self.__lock = threading.Lock()
+
+    def record_upload(self, raw_bytes, sent_bytes):
+        with self.__lock:
+            self.files += 1
+            self.raw_bytes += raw_bytes
+            self.sent_bytes += sent_bytes
+
+    def record_download(self, raw_bytes, received_bytes):
+        with self.__lock:
+            self.downloaded_files += 1
+            self.downloaded_raw_bytes += raw_bytes
+            self.received_bytes += received_bytes
+
+    def snapshot(self):
+        with self.__lock:
+            return CompressionStats(**{field: getattr(self, field) for field in self.FIELDS})
+
+    # Counters accumulated since an earlier snapshot
+    def since(self, snapshot):
+        return CompressionStats(**{field: getattr(self, field) - getattr(snapshot, field) for field in self.FIELDS})
+
+    # Transferred bytes over the bytes they stand for, both directions
+    def ratio(self):
+        raw = self.raw_bytes + self.downloaded_raw_bytes
+        return (self.sent_bytes + self.received_bytes) / raw if raw else 1.0
+
+    def saved_bytes(self):
+        return self.raw_bytes + self.downloaded_raw_bytes - self.sent_bytes - self.received_bytes
+
+    def summary(self):
+        return (f"Compression: {self.files} files sent, {self.downloaded_files} received, "
+                f"ratio {self.ratio():.2f}, {self.saved_bytes()} bytes saved")
+
+
+# Path and encoding to send for a local file: the file itself, or a compressed
+# temporary copy that is removed afterwards. A copy that doesn't come out
+# smaller is dropped and the file is sent as it is.
+@contextlib.contextmanager
+def compressed_upload(path, policy, stats=None):
+    size = os.path.getsize(path)
+    algorithm = policy.choose(path, size) if policy is not None else None
+    if algorithm is None:
+        if stats is not None and policy is not None:
+            stats.record_upload(size, size)
+        yield path, None
+        return
+
+    descriptor, temporary_path = tempfile.mkstemp(prefix="vimpi-upload-")
+    try:
+        with open(path, 'rb') as source, os.fdopen(descriptor, 'wb') as destination:
+            compress_stream(source, destination, algorithm, policy.level)
+        compressed_size = os.path.getsize(temporary_path)
+
+        if compressed_size >= size:
+            if stats is not None:
+                stats.record_upload(size, size)
+            yield path, None
+        else:
+            if stats is not None:
+                stats.record_upload(size, compressed_size)
+            yield temporary_path, algorithm
+    finally:
+        os.remove(temporary_path)
+
+
+class _CountingReader:
+    # Binary stream wrapper counting the bytes read through it
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.count += len(data)
+        return data
+
+
+# Write a downloaded stream to destination, undoing the compression it was stored with
+def restore_download(source, destination, encoding, stats=None):
+    source = _CountingReader(source)
+    start = destination.tell()
+    if encoding:
+        decompress_stream(source, destination, encoding)
+    else:
+        shutil.copyfileobj(source, destination, CHUNK_SIZE)
+    if stats is not None:
+        stats.record_download(destination.tell() - start, source.count)
@@ -0,0 +1,274 @@
+import os
+import mmap
+import zlib
+import array
+import struct
+import hashlib
+from pathlib import Path
+
+MAGIC = b"VPS1"
+HEADER = struct.Struct("<4sIQH")
+
+# Size of the blocks a signature is made of
+BLOCK_SIZE = 64 * 1024
+# Files smaller than this are always sent whole
+DELTA_MIN_SIZE = 1024 * 1024
+# Bytes searched one at a time for a shifted block once the files stop matching,
+# before falling back to checking whole blocks only
+SEARCH_LIMIT = 256 * 1024
+
+_MODULUS = 65521
+
+
+# Directory holding the cached signatures
+def signature_dir():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "vimpi" / "signatures"
+
+
+def _strong(data):
+    return hashlib.md5(data).digest()
+
+
+class Signature:
+    # Checksums of the blocks of one version of a file: a weak Adler-32 that can
+    # be rolled one byte at a time and an MD5 to confirm a match.
+    def __init__(self, size, block_size, weak, strong):
+        self.size = size
+        self.block_size = block_size
+        self.weak = weak
+        self.strong = strong
+        self.__table = None
+
+    def __len__(self):
+        return len(self.weak)
+
+    def block_length(self, index):
+        return min(self.block_size, self.size - index * self.block_size)
+
+    # Indices of the full blocks by weak checksum
+    def table(self):
+        if self.__table is None:
+            self.__table = {}
+            for index in range(len(self.weak)):
+                if self.block_length(index) == self.block_size:
+                    self.__table.setdefault(self.weak[index], []).append(index)
+        return self.__table
+
+    def encode(self):
+        return HEADER.pack(MAGIC, self.block_size, self.size, 16) + self.weak.tobytes() + b"".join(self.strong)
+
+    @classmethod
+    def decode(cls, data):
+        magic, block_size, size, strong_size = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("not a signature")
+        count = -(-size // block_size)
+        weak = array.array("I")
+        weak.frombytes(data[HEADER.size:HEADER.size + 4 * count])
+        position = HEADER.size + 4 * count
+        strong = [data[position + strong_size * index:position + strong_size * (index + 1)] for index in range(count)]
+        if len(weak) != count or len(data) != position + strong_size * count:
+            raise ValueError("truncated signature")
+        return cls(size, block_size, weak, strong)
+
+
+def signature(path, block_size=BLOCK_SIZE):
+    weak = array.array("I")
+    strong = []
+    size = 0
+    with open(path, "rb") as source:
+        while True:
+            block = source.read(block_size)
+            if not block:
+                break
+            weak.append(zlib.adler32(block))
+            strong.append(_strong(block))
+            size += len(block)
+    return Signature(size, block_size, weak, strong)
+
+
+# Compare a file with the signature of an older version of it. The result is a
+# list of segments (old_offset, new_offset, length) covering the new file in
+# order: old_offset is where the bytes can be copied from in the old version,
+# or None for bytes that must be sent. Adjacent segments are merged.
+def delta(path, old_signature, search_limit=SEARCH_LIMIT):
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+
+    block_size = old_signature.block_size
+    table = old_signature.table()
+    segments = []
+
+    def add(old_offset, new_offset, length):
+        if segments:
+            last_old, last_new, last_length = segments[-1]
+            if last_old is None and old_offset is None:
+                segments[-1] = (None, last_new, last_length + length)
+                return
+            if last_old is not None and old_offset is not None and last_old + last_length == old_offset:
+                segments[-1] = (last_old, last_new, last_length + length)
+                return
+        segments.append((old_offset, new_offset, length))
+
+    with open(path, "rb") as source, mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        position = literal_start = 0
+        expected = 0
+        rolling = None
+        searched = 0
+
+        while position + block_size <= size:
+            if rolling is None:
+                checksum = zlib.adler32(view[position:position + block_size])
+                low, high = checksum & 0xFFFF, checksum >> 16
+            else:
+                low, high = rolling
+                checksum = (high << 16) | low
+
+            candidates = table.get(checksum)
+            if candidates:
+                strong = _strong(view[position:position + block_size])
+                # Prefer the block following the last one matched
+                ordered = [expected] + candidates if expected in candidates else candidates
+                match = next((index for index in ordered if old_signature.strong[index] == strong), None)
+                if match is not None:
+                    if literal_start < position:
+                        add(None, literal_start, position - literal_start)
+                    add(match * block_size, position, block_size)
+                    position += block_size
+                    literal_start = position
+                    expected = match + 1
+                    rolling = None
+                    searched = 0
+                    continue
+
+            if searched >= search_limit:
+                # Too far from the last match: only look at whole blocks from here
+                position += block_size
+                rolling = None
+                continue
+
+            if position + block_size < size:
+                out_byte, in_byte = view[position], view[position + block_size]
+                low = (low - out_byte + in_byte) % _MODULUS
+                high = (high - block_size * out_byte + low - 1) % _MODULUS
+                rolling = (low, high)
+            position += 1
+            searched += 1
+
+        # The last block of the old version may be shorter than the others
+        tail_index = len(old_signature) - 1
+        tail_length = old_signature.block_length(tail_index) if tail_index >= 0 else 0
+        if 0 < tail_length < block_size and size - tail_length >= literal_start:
+            tail_start = size - tail_length
+            if _strong(view[tail_start:size]) == old_signature.strong[tail_index]:
+                if literal_start < tail_start:
+                    add(None, literal_start, tail_start - literal_start)
+                add(tail_index * block_size, tail_start, tail_length)
+                literal_start = size
+
+        if literal_start < size:
+            add(None, literal_start, size - literal_start)
+
+    return segments
+
+
+# Bytes that have to be sent for a delta
+def literal_size(segments):
+    return sum(length for old_offset, _, length in segments if old_offset is None)
+
+
+# Write the new version of a file to destination from the old version at base
+# and the sent bytes, read from source
+def apply_delta(segments, base, source, destination):
+    for old_offset, new_offset, length in segments:
+        if old_offset is None:
+            source.seek(new_offset)
+            data = source.read(length)
+        else:
+            base.seek(old_offset)
+            data = base.read(length)
+        destination.seek(new_offset)
+        destination.write(data)
+
+
+# Split a delta into multipart upload parts for stores that rebuild objects
+# from ranges of the old object. Each part is ('copy', old_offset, length) or
+# ('upload', new_offset, length); every part but the last holds at least
+# min_part_size bytes, and uploaded parts at most part_size.
+def plan_parts(segments, min_part_size, part_size):
+    parts = []
+    pending_start = pending_length = 0
+
+    def flush_pending():
+        start, remaining = pending_start, pending_length
+        while remaining > 0:
+            # Never leave a last piece smaller than the minimum behind
+            length = remaining if remaining < part_size + min_part_size else part_size
+            parts.append(('upload', start, length))
+            start += length
+            remaining -= length
+
+    for old_offset, new_offset, length in segments:
+        if old_offset is not None and pending_length and pending_length < min_part_size:
+            # Send the start of the copied range too, so the pending part is big enough
+            taken = min(length, min_part_size - pending_length)
+            pending_length += taken
+            old_offset += taken
+            new_offset += taken
+            length -= taken
+
+        if old_offset is not None and length >= min_part_size:
+            flush_pending()
+            parts.append(('copy', old_offset, length))
+            pending_start, pending_length = new_offset + length, 0
+        elif length:
+            if not pending_length:
+                pending_start = new_offset
+            pending_length += length
+
+    flush_pending()
+    return parts
+
+
+class SignatureCache:
+    # Signatures of files as they were last sent, keyed by their id on the
+    # target. Each entry carries a token (size and mtime, ETag...) naming the
+    # version it describes, and is only returned for that version.
+    def __init__(self, directory=None):
+        self.directory = Path(directory) if directory else signature_dir()
+
+    def __path(self, key):
+        return self.directory / (hashlib.sha1(str(key).encode("utf-8")).hexdigest() + ".sig")
+
+    def get(self, key, token):
+        try:
+            with open(self.__path(key), "rb") as cached:
+                data = cached.read()
+        except OSError:
+            return None
+
+        token = str(token).encode("utf-8")
+        length = int.from_bytes(data[:2], "little")
+        if data[2:2 + length] != token:
+            return None
+        try:
+            return Signature.decode(data[2 + length:])
+        except (ValueError, struct.error):
+            return None
+
+    def put(self, key, token, file_signature):
+        token = str(token).encode("utf-8")
+        path = self.__path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_suffix(".tmp")
+        with open(temporary_path, "wb") as cached:
+            cached.write(len(token).to_bytes(2, "little") + token + file_signature.encode())
+        os.replace(temporary_path, path)
+
+    def discard(self, key):
+        try:
+            os.remove(self.__path(key))
+        except OSError:
+            pass
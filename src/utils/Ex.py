@@ -0,0 +1,637 @@
+import re
+
+# Commands by every name they can be typed with
+COMMAND_NAMES = {
+    "s": "substitute", "su": "substitute", "substitute": "substitute",
+    "g": "global_command", "gl": "global_command", "global": "global_command",
+    "v": "vglobal", "vg": "vglobal", "vglobal": "vglobal",
+    "sor": "sort", "sort": "sort",
+    "d": "delete", "de": "delete", "delete": "delete",
+    "y": "yank", "ya": "yank", "yank": "yank",
+    "m": "move", "mo": "move", "move": "move",
+    "t": "copy", "co": "copy", "copy": "copy",
+    "j": "join", "jo": "join", "join": "join",
+    ">": "shift_right", "<": "shift_left",
+    "norm": "normal", "normal": "normal",
+    "p": "print", "print": "print",
+}
+# Commands :s and :g apply to the current line, the others to the whole file
+WHOLE_FILE = {"global_command", "vglobal", "sort"}
+# Changes smaller than this many lines aren't reported, like Vim's 'report'
+REPORT = 2
+
+ADDRESS_PATTERN = re.compile(r"""\s*(?:(?P<base>[.$]|\d+|'[a-z<>]|/(?:\\.|[^/])*/?|\?(?:\\.|[^?])*\??)|(?=[+-]))
+                                 (?P<offsets>(?:\s*[+-]\d*)*)""", re.X)
+NAME_PATTERN = re.compile(r"\s*([a-zA-Z]+|[<>]+)(!?)")
+
+
+class ExError(Exception):
+    pass
+
+
+# Python regex for a Vim pattern, in Vim's default "magic" syntax or \v
+def translate_pattern(pattern):
+    ignore_case = False
+    if "\\c" in pattern:
+        ignore_case = True
+        pattern = pattern.replace("\\c", "")
+    pattern = pattern.replace("\\C", "")
+
+    very_magic = False
+    out = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        index += 1
+        if char == "\\" and index < len(pattern):
+            escaped = pattern[index]
+            index += 1
+            if escaped == "v":
+                very_magic = True
+            elif escaped in "mMV":
+                very_magic = False
+            elif very_magic:
+                out.append(re.escape(escaped) if escaped in "()|{}+?=<>@" else "\\" + escaped)
+            elif escaped in "()|":
+                out.append(escaped)
+            elif escaped == "{":
+                end = pattern.find("}", index)
+                if end < 0:
+                    raise ExError(f"Missing }} in pattern: {pattern}")
+                out.append(braces(pattern[index:end]))
+                index = end + 1
+            elif escaped in "+?":
+                out.append(escaped)
+            elif escaped == "=":
+                out.append("?")
+            elif escaped in "<>":
+                out.append(r"\b")
+            elif escaped in CHARACTER_CLASSES:
+                out.append(CHARACTER_CLASSES[escaped])
+            else:
+                out.append(re.escape(escaped))
+        elif very_magic:
+            if char in "<>":
+                out.append(r"\b")
+            elif char == "=":
+                out.append("?")
+            elif char == "{":
+                end = pattern.find("}", index)
+                if end < 0:
+                    raise ExError(f"Missing }} in pattern: {pattern}")
+                out.append(braces(pattern[index:end]))
+                index = end + 1
+            else:
+                out.append(char)
+        elif char == "[":
+            # Bracket expressions read the same in both syntaxes
+            end = bracket_end(pattern, index)
+            out.append(pattern[index - 1:end])
+            index = end
+        elif char in "()|{}+?":
+            out.append("\\" + char)
+        else:
+            out.append(char)
+    try:
+        return re.compile("".join(out), re.IGNORECASE if ignore_case else 0)
+    except re.error as error:
+        raise ExError(f"Invalid pattern {pattern!r}: {error}")
+
+
+CHARACTER_CLASSES = {
+    "s": r"\s", "S": r"\S", "d": r"\d", "D": r"\D", "w": r"\w", "W": r"\W", "t": r"\t", "n": r"\n",
+    "a": "[A-Za-z]", "A": "[^A-Za-z]", "l": "[a-z]", "L": "[^a-z]", "u": "[A-Z]", "U": "[^A-Z]",
+    "x": "[0-9A-Fa-f]", "X": "[^0-9A-Fa-f]", "h": "[A-Za-z_]", "H": "[^A-Za-z_]",
+}
+
+
+# Python quantifier for the inside of Vim's \{...}; \{-...} is the lazy form
+def braces(inside):
+    lazy = inside.startswith("-")
+    inside = inside.lstrip("-")
+    quantifier = "{" + inside + "}" if inside else "*"
+    return quantifier + "?" if lazy else quantifier
+
+
+def bracket_end(pattern, index):
+    if index < len(pattern) and pattern[index] == "^":
+        index += 1
+    if index < len(pattern) and pattern[index] == "]":
+        index += 1
+    while index < len(pattern) and pattern[index] != "]":
+        index += 2 if pattern[index] == "\\" else 1
+    return min(index + 1, len(pattern))
+
+
+# Split "/pattern/rest" at its unescaped delimiters, into at most count parts
+def split_delimited(text, count):
+    delimiter = text[0]
+    parts = []
+    current = []
+    index = 1
+    while index < len(text) and len(parts) < count - 1:
+        char = text[index]
+        if char == "\\" and index + 1 < len(text):
+            if text[index + 1] == delimiter:
+                current.append(delimiter)
+            else:
+                current.append(text[index:index + 2])
+            index += 2
+            continue
+        if char == delimiter:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+        index += 1
+    parts.append("".join(current) + text[index:])
+    return parts
+
+
+class Replacement:
+    # Vim's replacement string: & and \0-\9 for the match and its groups, \r
+    # or \n for a line break, \u \l \U \L \e \E changing case. Without case
+    # changes it becomes a template re.sub expands by itself.
+    def __init__(self, text):
+        self.parts = []
+        self.case_changes = False
+        literal = []
+        index = 0
+        while index < len(text):
+            char = text[index]
+            if char == "\\" and index + 1 < len(text):
+                escaped = text[index + 1]
+                index += 2
+                if escaped.isdigit():
+                    self.__add_literal(literal)
+                    self.parts.append(("group", int(escaped)))
+                elif escaped in "rn":
+                    literal.append("\n")
+                elif escaped == "t":
+                    literal.append("\t")
+                elif escaped in "uUlLeE":
+                    self.__add_literal(literal)
+                    self.parts.append(("case", escaped))
+                    self.case_changes = True
+                else:
+                    literal.append(escaped)
+                continue
+            index += 1
+            if char == "&":
+                self.__add_literal(literal)
+                self.parts.append(("group", 0))
+            else:
+                literal.append(char)
+        self.__add_literal(literal)
+        self.splits_lines = any(kind == "text" and "\n" in value for kind, value in self.parts)
+
+    def __add_literal(self, literal):
+        if literal:
+            self.parts.append(("text", "".join(literal)))
+            literal.clear()
+
+    # What re.sub takes: a template string when possible, a function otherwise
+    def compile(self):
+        if not self.case_changes:
+            template = []
+            for kind, value in self.parts:
+                template.append(value.replace("\\", "\\\\") if kind == "text" else f"\\g<{value}>")
+            return "".join(template)
+        return self.__expand
+
+    def __expand(self, match):
+        out = []
+        one_shot = None
+        until_end = None
+        for kind, value in self.parts:
+            if kind == "case":
+                if value in "ul":
+                    one_shot = value
+                elif value in "UL":
+                    until_end = value
+                else:
+                    until_end = None
+                continue
+            text = value if kind == "text" else (match.group(value) or "")
+            if until_end == "U":
+                text = text.upper()
+            elif until_end == "L":
+                text = text.lower()
+            if one_shot and text:
+                text = (text[0].upper() if one_shot == "u" else text[0].lower()) + text[1:]
+                one_shot = None
+            out.append(text)
+        return "".join(out)
+
+
+class Ex:
+    # Ex commands over a LineBuffer: [range]s/pattern/replacement/[flags],
+    # [range]g/pattern/command and v (or g!), [range]sort [!][i][n][u][r]
+    # [/pattern/], and d, y, m, t, j, >, <, normal. Ranges are built from
+    # addresses like ., $, N, 'x marks, /pattern/ and ?pattern? with + and -
+    # offsets, or %. Each command makes one pass over the lines it covers,
+    # building the new list of lines at once: the caller writes the result
+    # back as a single edit. Patterns use Vim's syntax.
+    def __init__(self):
+        self.last_pattern = None
+        self.last_substitute = None
+
+    # Run text on buffer; returns a message to show, or None
+    def run(self, buffer, text, vim):
+        text = text.lstrip(" :")
+        current = buffer.cursor[0]
+        start, end, rest = self.parse_range(buffer, text, current, vim)
+        match = NAME_PATTERN.match(rest)
+        if not rest.strip():
+            if end is None:
+                raise ExError("No command")
+            # A bare address moves to that line
+            buffer.cursor = (min(end, buffer.line_count - 1), 0)
+            return None
+        if match is None:
+            raise ExError(f"Not an editor command: {text}")
+        name = match.group(1)
+        if name[0] in "<>":
+            # >> shifts twice
+            command, argument = ("shift_right" if name[0] == ">" else "shift_left"), str(len(name))
+        else:
+            command, argument = COMMAND_NAMES.get(name), None
+            if command is None:
+                raise ExError(f"Not an editor command: {text}")
+        bang = bool(match.group(2))
+        rest = rest[match.end():]
+        if start is None:
+            if command in WHOLE_FILE:
+                start, end = 0, buffer.line_count - 1
+            else:
+                start = end = current
+        if start > end:
+            start, end = end, start
+        if end >= buffer.line_count:
+            raise ExError("Invalid range")
+        if command == "vglobal":
+            command, bang = "global_command", True
+        return getattr(self, command)(buffer, start, end, rest if argument is None else argument, bang, vim)
+
+    # (start, end, rest of the text); start and end are None without a range
+    def parse_range(self, buffer, text, current, vim):
+        if text.startswith("%"):
+            return 0, buffer.line_count - 1, text[1:]
+        addresses = []
+        position = 0
+        while True:
+            match = ADDRESS_PATTERN.match(text, position)
+            if match is None or match.end() == position:
+                break
+            current = self.address(buffer, match.group("base"), match.group("offsets"), current, vim)
+            addresses.append(current)
+            position = match.end()
+            separator = text[position:position + 1]
+            if separator not in (",", ";"):
+                break
+            position += 1
+            if separator == ",":
+                current = buffer.cursor[0]
+        if not addresses:
+            return None, None, text
+        return addresses[0], addresses[-1], text[position:]
+
+    def address(self, buffer, base, offsets, current, vim):
+        last = buffer.line_count - 1
+        if base is None or base == ".":
+            row = current
+        elif base == "$":
+            row = last
+        elif base.isdigit():
+            row = max(int(base) - 1, 0)
+        elif base.startswith("'"):
+            mark = vim.marks.get(base[1]) if vim is not None else None
+            if mark is None:
+                raise ExError(f"Mark not set: {base[1]}")
+            row = mark[0]
+        else:
+            forward = base[0] == "/"
+            pattern = base[1:-1] if len(base) > 1 and base[-1] == base[0] else base[1:]
+            row = self.search_line(buffer, self.pattern(pattern), current, forward)
+        for sign, amount in re.findall(r"([+-])(\d*)", offsets or ""):
+            step = int(amount) if amount else 1
+            row += step if sign == "+" else -step
+        if row < 0 or row > last:
+            raise ExError("Invalid range")
+        return row
+
+    def search_line(self, buffer, regex, current, forward):
+        count = buffer.line_count
+        for step in range(1, count + 1):
+            row = (current + step) % count if forward else (current - step) % count
+            if regex.search(buffer.lines[row]):
+                return row
+        raise ExError(f"Pattern not found: {regex.pattern}")
+
+    # Compiled pattern; an empty one stands for the last pattern used
+    def pattern(self, text):
+        if not text:
+            if self.last_pattern is None:
+                raise ExError("No previous regular expression")
+            return self.last_pattern
+        self.last_pattern = translate_pattern(text)
+        return self.last_pattern
+
+    # Replace lines start to end with new_lines
+    def splice(self, buffer, start, end, new_lines):
+        buffer.lines[start:end + 1] = new_lines
+        if not buffer.lines:
+            buffer.lines.append("")
+
+    def substitute(self, buffer, start, end, argument, bang, vim, rows=None):
+        argument = argument.strip()
+        if argument and not argument[0].isalnum() and argument[0] not in ' "|\\':
+            pattern, replacement, flags = (split_delimited(argument, 3) + ["", ""])[:3]
+            if "~" in replacement and self.last_substitute is not None:
+                replacement = replacement.replace("~", self.last_substitute[1])
+            self.last_substitute = (pattern, replacement)
+        else:
+            # :s alone, or with flags only, repeats the last substitution
+            if self.last_substitute is None:
+                raise ExError("No previous substitute regular expression")
+            (pattern, replacement), flags = self.last_substitute, argument
+        regex = self.pattern(pattern)
+        flags = flags.strip()
+        if "c" in flags:
+            raise ExError("Confirmed substitution (c flag) is not supported")
+        if "i" in flags or "I" in flags:
+            regex = re.compile(regex.pattern, re.IGNORECASE if "i" in flags else 0)
+        count_only = "n" in flags
+        replace_all = "g" in flags
+        trailing_count = re.search(r"\d+$", flags)
+        if trailing_count:
+            start = end
+            end = min(start + int(trailing_count.group()) - 1, buffer.line_count - 1)
+
+        compiled = Replacement(replacement)
+        template = compiled.compile()
+        subn = regex.subn
+        limit = 0 if replace_all else 1
+        lines = buffer.lines
+        substitutions = changed_lines = 0
+        last_changed = None
+        new_lines = []
+        append = new_lines.append
+        selected = range(start, end + 1) if rows is None else rows
+        if rows is not None:
+            new_lines = lines[start:end + 1]
+        for row in selected:
+            line = lines[row]
+            if count_only:
+                found = len(regex.findall(line)) if replace_all else int(regex.search(line) is not None)
+                new, made = line, found
+            else:
+                new, made = subn(template, line, limit)
+            if made:
+                substitutions += made
+                changed_lines += 1
+                last_changed = row
+            if rows is None:
+                append(new)
+            else:
+                new_lines[row - start] = new
+        if not substitutions:
+            if "e" in flags:
+                return None
+            raise ExError(f"Pattern not found: {pattern or regex.pattern}")
+        if not count_only:
+            if compiled.splits_lines:
+                new_lines = [piece for line in new_lines for piece in line.split("\n")]
+            self.splice(buffer, start, end, new_lines)
+            buffer.cursor = (min(last_changed, buffer.line_count - 1), 0)
+        if count_only or substitutions > REPORT:
+            verb = "matches" if count_only else "substitutions"
+            return f"{substitutions} {verb} on {changed_lines} lines"
+        return None
+
+    def global_command(self, buffer, start, end, argument, bang, vim):
+        argument = argument.strip()
+        if not argument or argument[0].isalnum():
+            raise ExError("Regular expression missing from :global")
+        pattern, command = (split_delimited(argument, 2) + [""])[:2]
+        regex = self.pattern(pattern)
+        search = regex.search
+        lines = buffer.lines
+        rows = [row for row in range(start, end + 1) if (search(lines[row]) is None) == bang]
+        if not rows:
+            raise ExError(f"Pattern not found: {pattern}")
+        command = command.strip() or "p"
+        name_match = NAME_PATTERN.match(command)
+        name = COMMAND_NAMES.get(name_match.group(1)) if name_match else None
+        rest = command[name_match.end():] if name_match else ""
+
+        # The common commands run as one pass over the marked lines
+        if name == "delete":
+            marked = set(rows)
+            kept = [line for row, line in enumerate(lines[start:end + 1], start) if row not in marked]
+            text = "\n".join(lines[row] for row in rows) + "\n"
+            vim.registers.copy(text, rest.strip() or None, True)
+            self.splice(buffer, start, end, kept)
+            buffer.cursor = (min(rows[0], buffer.line_count - 1), 0)
+            return f"{len(rows)} fewer lines" if len(rows) > REPORT else None
+        if name == "substitute":
+            return self.substitute(buffer, start, end, rest, False, vim, rows=rows)
+        if name == "move" and rest.strip() == "0":
+            marked = [lines[row] for row in rows]
+            marked_set = set(rows)
+            unmarked = [line for row, line in enumerate(lines) if row not in marked_set]
+            buffer.lines[:] = marked[::-1] + unmarked
+            buffer.cursor = (0, 0)
+            return None
+        if name == "copy" and rest.strip() == "$":
+            buffer.lines.extend(lines[row] for row in rows)
+            buffer.cursor = (buffer.line_count - 1, 0)
+            return None
+        if name == "print":
+            return f"{len(rows)} matching lines"
+        if name in ("normal", "join", "shift_right", "shift_left", "yank", "copy"):
+            return self.each_line(buffer, rows, command, vim)
+        raise ExError(f"Not supported with :global: {command}")
+
+    # Run command on each of rows, following the lines as they shift
+    def each_line(self, buffer, rows, command, vim):
+        shift = 0
+        for row in rows:
+            row += shift
+            if row >= buffer.line_count:
+                break
+            before = buffer.line_count
+            buffer.cursor = (row, 0)
+            self.run(buffer, command, vim)
+            shift += buffer.line_count - before
+        return None
+
+    def sort(self, buffer, start, end, argument, bang, vim):
+        options = argument.strip()
+        regex = None
+        if options and not options[0].isalnum() and options[0] not in "! ":
+            pattern, options = (split_delimited(options, 2) + [""])[:2]
+            regex = self.pattern(pattern)
+        elif "/" in options:
+            head, _, tail = options.partition("/")
+            pattern, rest = (split_delimited("/" + tail, 2) + [""])[:2]
+            regex = self.pattern(pattern)
+            options = head + rest
+        ignore_case = "i" in options
+        numeric = "n" in options
+        unique = "u" in options
+        on_match = "r" in options
+
+        def part(line):
+            if regex is None:
+                return line
+            match = regex.search(line)
+            if match is None:
+                return line
+            return match.group() if on_match else line[match.end():]
+
+        if numeric:
+            number = re.compile(r"-?\d+")
+
+            def key(line):
+                match = number.search(part(line))
+                return (1, int(match.group())) if match else (0, 0)
+        elif ignore_case:
+            def key(line):
+                return part(line).casefold()
+        else:
+            key = part if regex is not None else None
+
+        lines = sorted(buffer.lines[start:end + 1], key=key, reverse=bang)
+        if unique:
+            kept = []
+            previous = object()
+            for line in lines:
+                value = key(line) if key is not None else line
+                if value != previous:
+                    kept.append(line)
+                previous = value
+            lines = kept
+        self.splice(buffer, start, end, lines)
+        buffer.cursor = (start, 0)
+        return None
+
+    def delete(self, buffer, start, end, argument, bang, vim):
+        register, end = self.register_and_count(argument, end, buffer)
+        text = "\n".join(buffer.lines[start:end + 1]) + "\n"
+        vim.registers.copy(text, register, True)
+        self.splice(buffer, start, end, [])
+        buffer.cursor = (min(start, buffer.line_count - 1), 0)
+        removed = end - start + 1
+        return f"{removed} fewer lines" if removed > REPORT else None
+
+    def yank(self, buffer, start, end, argument, bang, vim):
+        register, end = self.register_and_count(argument, end, buffer)
+        vim.registers.copy("\n".join(buffer.lines[start:end + 1]) + "\n", register)
+        return None
+
+    # ":d x 3" deletes three lines from the end of the range into register x
+    def register_and_count(self, argument, end, buffer):
+        register = None
+        argument = argument.strip()
+        if argument and not argument[0].isdigit():
+            register, argument = argument[0], argument[1:].strip()
+        if argument.isdigit():
+            end = min(end + int(argument) - 1, buffer.line_count - 1)
+        return register, end
+
+    def target_row(self, buffer, argument, vim):
+        argument = argument.strip()
+        if argument == "0":
+            return -1
+        _, row, rest = self.parse_range(buffer, argument, buffer.cursor[0], vim)
+        if row is None or rest.strip():
+            raise ExError(f"Invalid address: {argument}")
+        return row
+
+    def move(self, buffer, start, end, argument, bang, vim):
+        target = self.target_row(buffer, argument, vim)
+        if start <= target < end:
+            raise ExError("Cannot move a range of lines into itself")
+        moved = buffer.lines[start:end + 1]
+        if target >= end:
+            buffer.lines[start:end + 1] = []
+            insert_at = target - len(moved) + 1
+        else:
+            buffer.lines[start:end + 1] = []
+            insert_at = target + 1
+        buffer.lines[insert_at:insert_at] = moved
+        buffer.cursor = (insert_at + len(moved) - 1, 0)
+        return None
+
+    def copy(self, buffer, start, end, argument, bang, vim):
+        target = self.target_row(buffer, argument, vim)
+        copied = buffer.lines[start:end + 1]
+        buffer.lines[target + 1:target + 1] = copied
+        buffer.cursor = (target + len(copied), 0)
+        return None
+
+    def join(self, buffer, start, end, argument, bang, vim):
+        if start == end:
+            end = start + 1
+        if end >= buffer.line_count:
+            raise ExError("Nothing to join")
+        lines = buffer.lines[start:end + 1]
+        if bang:
+            joined = "".join(lines)
+        else:
+            joined = lines[0].rstrip()
+            for line in lines[1:]:
+                line = line.strip()
+                if line:
+                    joined = f"{joined} {line}" if joined and not line.startswith(")") else joined + line
+        self.splice(buffer, start, end, [joined])
+        buffer.cursor = (start, 0)
+        return None
+
+    def shift(self, buffer, start, end, levels, right):
+        indent = buffer.indent
+        lines = buffer.lines
+        for row in range(start, end + 1):
+            line = lines[row]
+            for _ in range(levels):
+                if right:
+                    line = indent + line if line else line
+                elif line.startswith("\t"):
+                    line = line[1:]
+                else:
+                    line = line[min(len(line) - len(line.lstrip(" ")), len(indent)):]
+            lines[row] = line
+        buffer.cursor = (end, 0)
+        return None
+
+    def shift_right(self, buffer, start, end, argument, bang, vim):
+        return self.shift(buffer, start, end, int(argument), True)
+
+    def shift_left(self, buffer, start, end, argument, bang, vim):
+        return self.shift(buffer, start, end, int(argument), False)
+
+    # :normal keys, on each line of the range, in a fresh engine on the same lines
+    def normal(self, buffer, start, end, argument, bang, vim):
+        keys = argument.lstrip()
+        if not keys:
+            raise ExError("Argument required")
+        engine = type(vim)(buffer, registers=vim.registers)
+        engine.macros = vim.macros
+        shift = 0
+        for row in range(start, end + 1):
+            row += shift
+            if row >= buffer.line_count:
+                break
+            before = buffer.line_count
+            engine.cursor = buffer.cursor = (row, 0)
+            engine.run_keys(keys)
+            # An unfinished command or insert ends there, as after <esc>
+            engine.run_keys("<esc>")
+            shift += buffer.line_count - before
+        buffer.cursor = engine.cursor
+        return None
+
+    def print(self, buffer, start, end, argument, bang, vim):
+        return f"{end - start + 1} lines"
+
@@ -0,0 +1,253 @@
+import os
+import re
+import codecs
+import ctypes
+import select
+import struct
+import threading
+from collections import deque
+
+from src.utils.Sniff import FileKind
+
+# Lines of a followed file kept in memory; older ones scroll away
+MAX_LINES = 10_000
+# Bytes read from a followed file at a time
+READ_CHUNK = 1024 * 1024
+# Longest wait between checks of a followed file, events or not
+POLL_INTERVAL = 0.5
+
+# inotify(7) flags
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+# What a file, or the directory it is rotated in, does when a log grows or turns over
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+# Every line break str.splitlines(), and so the editor, splits lines on
+LINE_BREAKS = re.compile("\r\n|[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+
+
+class LogTail:
+    # A growing file read from where the last read stopped. The lines read are
+    # kept in a ring of max_lines, with the line still being written kept apart,
+    # so memory stays bounded however long the file grows. A file that is moved
+    # away and replaced, as log rotation does, is finished and the new one read
+    # from its start; a file cut short is read again from its start.
+    def __init__(self, path, kind=None, max_lines=MAX_LINES):
+        self.path = str(path)
+        self.kind = kind or FileKind()
+        self.lines = deque(maxlen=max_lines)
+        self.partial = ""
+        # Bumped by every read that adds text, so a copy of the text can tell which reads it holds
+        self.version = 0
+        self.__file = None
+        self.__offset = 0
+        self.__decoder = None
+        self.__carry = ""
+        self.__lock = threading.Lock()
+        self.__open(from_end=True)
+
+    def __open(self, from_end=False):
+        try:
+            self.__file = open(self.path, "rb")
+        except OSError:
+            self.__file = None
+            return
+        self.__decoder = codecs.getincrementaldecoder(self.kind.encoding)(errors="replace")
+        self.__carry = ""
+        if from_end:
+            self.__offset = self.__start_of_last_lines()
+        else:
+            # A file that replaced a rotated one starts with its own byte order mark
+            bom = self.kind.bom
+            self.__offset = len(bom) if bom and self.__file.read(len(bom)) == bom else 0
+        self.__file.seek(self.__offset)
+
+    # Offset of the first of the last max_lines lines, found by reading back from
+    # the end of the file, so a huge log isn't read whole only to drop most of it
+    def __start_of_last_lines(self):
+        file = self.__file
+        size = os.fstat(file.fileno()).st_size
+        bom = len(self.kind.bom)
+        newline = "\n".encode(self.kind.encoding)
+        wanted = self.lines.maxlen + 1
+        position = size
+        while position > bom:
+            start = max(position - READ_CHUNK, bom)
+            file.seek(start)
+            block = file.read(position - start + len(newline) - 1)
+            found = len(block)
+            while True:
+                found = block.rfind(newline, 0, found)
+                if found == -1:
+                    break
+                # Only a match on a character boundary is a line break in wider encodings
+                if (start + found - bom) % len(newline) == 0:
+                    wanted -= 1
+                    if wanted == 0:
+                        return start + found + len(newline)
+            position = start
+        return bom
+
+    def __stat(self):
+        try:
+            return os.stat(self.path)
+        except OSError:
+            return None
+
+    # Read what was written since the last read. Returns the text added, with
+    # "\n" line breaks, the number of lines dropped from the start of the ring to
+    # make room, and "rotated", "truncated" or None for what happened to the file
+    def read(self, limit=READ_CHUNK):
+        with self.__lock:
+            event = None
+            if self.__file is None:
+                self.__open()
+                if self.__file is None:
+                    return "", 0, None
+                event = "rotated"
+
+            current = self.__stat()
+            opened = os.fstat(self.__file.fileno())
+            if opened.st_size < self.__offset:
+                # Read again from the start, on the next read
+                self.__file.seek(0)
+                self.__offset = 0
+                self.__decoder.reset()
+                self.__carry = ""
+                text, event = "", "truncated"
+            elif current is not None and (current.st_ino, current.st_dev) != (opened.st_ino, opened.st_dev):
+                # Finish the file that was moved away; the new one is read next time
+                text = self.__decode(self.__file.read(), final=True)
+                self.__file.close()
+                self.__open()
+                event = "rotated"
+            else:
+                data = self.__file.read(limit)
+                self.__offset += len(data)
+                text = self.__decode(data)
+
+            if event is not None and (self.partial or text) and not text.endswith("\n"):
+                # The line cut off by a rotation or truncation ends there
+                text += "\n"
+            if not text:
+                return "", 0, event
+            return text, self.__append(text), event
+
+    def __decode(self, data, final=False):
+        text = self.__carry + self.__decoder.decode(data, final)
+        self.__carry = ""
+        # A "\r" at the end may be the first half of a "\r\n" still being written
+        if text.endswith("\r") and not final:
+            text, self.__carry = text[:-1], "\r"
+        return LINE_BREAKS.sub("\n", text)
+
+    def __append(self, text):
+        pieces = (self.partial + text).split("\n")
+        self.partial = pieces.pop()
+        before = len(self.lines)
+        self.lines.extend(pieces)
+        self.version += 1
+        return before + len(pieces) - len(self.lines)
+
+    # True when a read stopped at its limit with more of the file left to read
+    def has_more(self):
+        with self.__lock:
+            if self.__file is None:
+                return False
+            return os.fstat(self.__file.fileno()).st_size > self.__offset
+
+    # The lines kept and the version they are at
+    def snapshot(self):
+        with self.__lock:
+            return "\n".join([*self.lines, self.partial]), self.version
+
+    def close(self):
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+
+
+class PollingWatcher:
+    # Checks the file every interval, where inotify isn't available
+    def __init__(self, path, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.__stopped = threading.Event()
+
+    # Wait for the file to change, or for timeout seconds; False once stopped
+    def wait(self, timeout=None):
+        return not self.__stopped.wait(self.interval if timeout is None else min(timeout, self.interval))
+
+    # Make wait return False, from any thread
+    def stop(self):
+        self.__stopped.set()
+
+    def close(self):
+        self.stop()
+
+
+class InotifyWatcher:
+    # Wakes up as soon as the file or the directory it lives in changes. The
+    # directory is watched as well because rotation replaces the file in it.
+    def __init__(self, path, interval=POLL_INTERVAL):
+        self.interval = interval
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.__add_watch = libc.inotify_add_watch
+        self.__fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.__fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.__stopped = False
+        # A pipe written by stop wakes a wait up at once
+        self.__wake_read, self.__wake_write = os.pipe()
+        directory = os.path.dirname(os.path.abspath(path))
+        if self.__add_watch(self.__fd, os.fsencode(directory), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            self.close()
+            raise OSError(error, f"Could not watch {directory}")
+
+    def wait(self, timeout=None):
+        if self.__stopped or self.__fd is None:
+            return False
+        timeout = self.interval if timeout is None else min(timeout, self.interval)
+        readable, _, _ = select.select([self.__fd, self.__wake_read], [], [], timeout)
+        if self.__wake_read in readable:
+            return False
+        if self.__fd in readable:
+            # Which events they were doesn't matter: the file is read again either way
+            try:
+                while os.read(self.__fd, 64 * EVENT_HEADER.size):
+                    pass
+            except BlockingIOError:
+                pass
+        return True
+
+    def stop(self):
+        if not self.__stopped and self.__fd is not None:
+            self.__stopped = True
+            os.write(self.__wake_write, b"x")
+
+    # Release the watch; only from the thread that waits on it
+    def close(self):
+        if self.__fd is None:
+            return
+        self.__stopped = True
+        for fd in (self.__fd, self.__wake_read, self.__wake_write):
+            os.close(fd)
+        self.__fd = None
+
+
+# inotify where the system has it, polling everywhere else
+def watch(path, interval=POLL_INTERVAL):
+    try:
+        return InotifyWatcher(path, interval)
+    except (OSError, AttributeError):
+        return PollingWatcher(path, interval)
@@ -0,0 +1,84 @@
+import os
+import re
+import mmap
+
+BYTES_PER_ROW = 16
+# Bytes searched between checks for cancellation
+SEARCH_CHUNK = 16 * 1024 * 1024
+# Where the hex and ASCII columns of a row start, as laid out by Sniff.hex_lines
+HEX_COLUMN = 10
+ASCII_COLUMN = HEX_COLUMN + BYTES_PER_ROW * 3 + 2
+
+
+class HexFile:
+    # A file mapped read-only into memory: rows are read as they are drawn and
+    # searches run over the mapping, so the memory used stays the same for a
+    # file of a few bytes or a few GB.
+    def __init__(self, path):
+        self.path = str(path)
+        with open(path, "rb") as file:
+            self.size = os.fstat(file.fileno()).st_size
+            # An empty file can't be mapped
+            self.__map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+    @property
+    def rows(self):
+        return max(-(-self.size // BYTES_PER_ROW), 1)
+
+    def read(self, offset, length):
+        if self.__map is None:
+            return b""
+        return self.__map[offset:offset + length]
+
+    def row(self, index):
+        return self.read(index * BYTES_PER_ROW, BYTES_PER_ROW)
+
+    # Offset of the first match of pattern from start on, wrapping around to the
+    # top of the file; None if there is none or cancelled() said to stop
+    def find(self, pattern, start=0, cancelled=lambda: False):
+        if self.__map is None or not pattern:
+            return None
+        start = min(max(start, 0), self.size)
+        for first, last in ((start, self.size), (0, min(start + len(pattern) - 1, self.size))):
+            for chunk_start in range(first, last, SEARCH_CHUNK):
+                if cancelled():
+                    return None
+                # Overlap the next chunk so a match across the boundary is found
+                chunk_end = min(chunk_start + SEARCH_CHUNK + len(pattern) - 1, last)
+                found = self.__map.find(pattern, chunk_start, chunk_end)
+                if found != -1:
+                    return found
+        return None
+
+    def close(self):
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+
+
+# Bytes to search for: a quoted string, or hex bytes like "de ad be ef" or "0xdeadbeef"
+def parse_pattern(text):
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "\"'":
+        return text[1:-1].encode("utf-8")
+    digits = re.sub(r"0x|[\s,]", "", text, flags=re.IGNORECASE)
+    if not digits or len(digits) % 2:
+        raise ValueError(f"Not a byte pattern: {text!r}")
+    return bytes.fromhex(digits)
+
+
+# Offset to jump to: decimal or 0x hex, +n/-n from current, or a percentage of size
+def parse_offset(text, current=0, size=0):
+    text = text.strip().replace("_", "")
+    try:
+        if text.endswith("%"):
+            return int(size * float(text[:-1]) / 100)
+        relative = text[:1] if text[:1] in ("+", "-") else ""
+        value = int(text[len(relative):], 0)
+    except ValueError:
+        raise ValueError(f"Not an offset: {text!r}") from None
+    if relative == "+":
+        return current + value
+    if relative == "-":
+        return current - value
+    return value
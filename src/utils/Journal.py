@@ -0,0 +1,218 @@
+import os
+import struct
+import hashlib
+import threading
+from pathlib import Path
+
+MAGIC = b"VPJ1"
+HEADER = struct.Struct("<4sQq")
+
+# Seconds between batched writes and fsyncs of the pending edits
+FSYNC_INTERVAL = 2.0
+# Journals bigger than this are compacted after a flush
+COMPACT_SIZE = 256 * 1024
+
+
+# Directory holding the swap journals, kept out of the synced tree
+def journal_dir():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "vimpi" / "swap"
+
+
+def write_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, position):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+# Location just after text when it is inserted at start
+def _end_location(start, text):
+    row, column = start
+    newlines = text.count("\n")
+    if not newlines:
+        return row, column + len(text)
+    return row + newlines, len(text) - text.rindex("\n") - 1
+
+
+def encode_ops(ops):
+    out = bytearray()
+    for (start_row, start_column), (end_row, end_column), text in ops:
+        data = text.encode("utf-8")
+        for value in (start_row, start_column, end_row, end_column, len(data)):
+            write_varint(out, value)
+        out += data
+    return bytes(out)
+
+
+# Decode records, ignoring a torn record left at the end by a crash
+def decode_ops(data):
+    ops = []
+    position = 0
+    while position < len(data):
+        try:
+            values = []
+            for _ in range(5):
+                value, position = read_varint(data, position)
+                values.append(value)
+        except IndexError:
+            break
+        if position + values[4] > len(data):
+            break
+        text = data[position:position + values[4]].decode("utf-8")
+        position += values[4]
+        ops.append(((values[0], values[1]), (values[2], values[3]), text))
+    return ops
+
+
+# Merge edits made while typing so the journal holds one insert per run of keys
+def coalesce(ops):
+    merged = []
+    for op in ops:
+        if merged:
+            start, end, text = merged[-1]
+            op_start, op_end, op_text = op
+            if start == end:
+                text_end = _end_location(start, text)
+                if op_start == op_end == text_end:
+                    merged[-1] = (start, end, text + op_text)
+                    continue
+                if not op_text and op_end == text_end and "\n" not in text and op_start[0] == start[0] \
+                        and start[1] <= op_start[1]:
+                    merged[-1] = (start, end, text[:op_start[1] - start[1]])
+                    continue
+        merged.append(op)
+    return merged
+
+
+class SwapJournal:
+    # Append-only log of the edits made to one file since it was last saved. Each
+    # record replaces the range start..end with text, so replaying the records on
+    # the file the journal was started from restores the unsaved buffer.
+    def __init__(self, path, directory=None):
+        self.path = str(path)
+        directory = Path(directory) if directory else journal_dir()
+        self.journal_path = directory / (hashlib.sha1(self.path.encode("utf-8")).hexdigest() + ".swp")
+        self.__pending = []
+        self.__compacted_size = 0
+        # Guards the pending edits; record() only ever waits on this one
+        self.__lock = threading.Lock()
+        # Held across taking a batch, writing it and compacting, so flushes from
+        # several workers land one after the other, in order, and reset() can't
+        # remove the journal under a batch that is still being written
+        self.__io_lock = threading.Lock()
+
+    # Queue one edit; the cost does not depend on the size of the document
+    def record(self, start, end, text):
+        with self.__lock:
+            pending = self.__pending
+            pending.append((tuple(start), tuple(end), text))
+            if len(pending) > 1:
+                pending[-2:] = coalesce(pending[-2:])
+
+    def has_pending(self):
+        return bool(self.__pending)
+
+    # Whether there are edits since the last save, flushed or not
+    def has_edits(self):
+        return self.has_pending() or self.journal_path.exists()
+
+    # Append the pending edits to the journal and fsync it
+    def flush(self):
+        with self.__io_lock:
+            with self.__lock:
+                ops, self.__pending = self.__pending, []
+            if not ops:
+                return
+
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.journal_path, "ab") as journal:
+                if journal.tell() == 0:
+                    journal.write(self.__header())
+                journal.write(encode_ops(ops))
+                journal.flush()
+                os.fsync(journal.fileno())
+
+                size = journal.tell()
+
+            # Only compact again once the journal has doubled, so flushes stay cheap
+            if size > max(COMPACT_SIZE, 2 * self.__compacted_size):
+                self.__compact()
+
+    # Rewrite the journal with its records merged
+    def compact(self):
+        with self.__io_lock:
+            self.__compact()
+
+    def __compact(self):
+        ops = self.__read_ops()
+        if ops is None:
+            return
+
+        temporary_path = self.journal_path.with_suffix(".tmp")
+        with open(temporary_path, "wb") as journal:
+            journal.write(self.__header_from(self.journal_path))
+            journal.write(encode_ops(coalesce(ops)))
+            journal.flush()
+            os.fsync(journal.fileno())
+            self.__compacted_size = journal.tell()
+        os.replace(temporary_path, self.journal_path)
+
+    # Edits left behind by a previous session, or an empty list. A journal whose
+    # file changed on disk since it was started cannot be replayed and is dropped.
+    def recover(self):
+        with self.__io_lock:
+            ops = self.__read_ops()
+            if ops is not None and self.__header_from(self.journal_path) == self.__header():
+                return ops
+        if ops is not None:
+            self.discard()
+        return []
+
+    # Start over once the buffer has been written to disk
+    def reset(self):
+        self.discard()
+
+    # Drops the pending edits, and waits for a flush in progress so the batch it
+    # is writing goes with the journal rather than outliving it
+    def discard(self):
+        with self.__lock:
+            self.__pending = []
+        with self.__io_lock:
+            self.__compacted_size = 0
+            try:
+                os.remove(self.journal_path)
+            except OSError:
+                pass
+
+    def __header(self):
+        try:
+            stat = os.stat(self.path)
+            return HEADER.pack(MAGIC, stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return HEADER.pack(MAGIC, 0, 0)
+
+    def __header_from(self, journal_path):
+        with open(journal_path, "rb") as journal:
+            return journal.read(HEADER.size)
+
+    def __read_ops(self):
+        try:
+            with open(self.journal_path, "rb") as journal:
+                data = journal.read()
+        except OSError:
+            return None
+        if len(data) < HEADER.size or data[:4] != MAGIC:
+            return None
+        return decode_ops(data[HEADER.size:])
@@ -0,0 +1,333 @@
+from bisect import bisect_right
+from itertools import accumulate
+
+from rich.cells import cell_len
+from textual._wrap import compute_wrap_offsets
+from textual.document._document_navigator import DocumentNavigator
+from textual.document._wrapped_document import WrappedDocument
+from textual.expand_tabs import get_tab_widths
+from textual.geometry import Offset, clamp
+
+# Lines longer than this many characters, like a minified bundle, are measured
+# through a column map, wrapped by character and drawn without syntax highlighting
+LONG_LINE_LIMIT = 10_000
+# Characters per chunk of a column map
+CHUNK = 4096
+
+
+# True when some line of text is longer than limit
+def has_long_line(text, limit=LONG_LINE_LIMIT):
+    return len(text) > limit and max(map(len, text.split("\n"))) > limit
+
+
+# Cell reached after drawing text from start_cell, tabs going to the next tab stop
+def segment_end(text, start_cell, tab_width):
+    if "\t" not in text:
+        return start_cell + cell_len(text)
+    cell = start_cell
+    *parts, last = text.split("\t")
+    for part in parts:
+        cell += cell_len(part)
+        cell += tab_width - cell % tab_width
+    return cell + cell_len(last)
+
+
+# How a chunk moves the cell position: (cells, None) without tabs, or the cells
+# before its first tab and the cells after that tab's stop
+def chunk_shape(text, tab_width):
+    head, tab, tail = text.partition("\t")
+    if not tab:
+        return cell_len(text), None
+    return cell_len(head), segment_end(tail, 0, tab_width)
+
+
+class ColumnMap:
+    # Maps the columns of one long line to screen cells and back. The line is
+    # cut into chunks whose widths are measured the first time a lookup gets
+    # past them, so a lookup costs a bisect plus a walk through one chunk, and
+    # an edit only remeasures the chunks it touched and the positions after it.
+    def __init__(self, line, tab_width=4):
+        self.line = line
+        self.tab_width = tab_width
+        self.lengths = [min(CHUNK, len(line) - start) for start in range(0, len(line), CHUNK)] or [0]
+        self.shapes = [None] * len(self.lengths)
+        self.starts = list(accumulate(self.lengths, initial=0))
+        # Cell at the start of each chunk measured so far
+        self.cells = [0]
+
+    # Measure chunks until the cell at the start of chunk is known
+    def _measure(self, chunk):
+        cells = self.cells
+        tab_width = self.tab_width
+        while len(cells) <= chunk:
+            index = len(cells) - 1
+            shape = self.shapes[index]
+            if shape is None:
+                start = self.starts[index]
+                shape = self.shapes[index] = chunk_shape(self.line[start:start + self.lengths[index]], tab_width)
+            before, after = shape
+            cell = cells[-1] + before
+            if after is not None:
+                cell += tab_width - cell % tab_width + after
+            cells.append(cell)
+
+    @property
+    def width(self):
+        self._measure(len(self.lengths))
+        return self.cells[-1]
+
+    # Cell where column starts
+    def cell(self, column):
+        column = clamp(column, 0, len(self.line))
+        chunk = min(bisect_right(self.starts, column), len(self.lengths)) - 1
+        self._measure(chunk)
+        return segment_end(self.line[self.starts[chunk]:column], self.cells[chunk], self.tab_width)
+
+    # Column drawn over cell; the length of the line past its end
+    def column_at(self, cell):
+        cells = self.cells
+        while cells[-1] <= cell and len(cells) <= len(self.lengths):
+            self._measure(len(cells))
+        chunk = bisect_right(cells, cell) - 1
+        if chunk >= len(self.lengths):
+            return len(self.line)
+        position = cells[chunk]
+        column = self.starts[chunk]
+        end = column + self.lengths[chunk]
+        line = self.line
+        tab_width = self.tab_width
+        while column < end:
+            character = line[column]
+            position += tab_width - position % tab_width if character == "\t" else cell_len(character)
+            if position > cell:
+                return column
+            column += 1
+        return column
+
+    # Columns [start, end) of the line were replaced, giving line
+    def replace(self, start, end, line):
+        first = min(bisect_right(self.starts, start), len(self.lengths)) - 1
+        last = min(bisect_right(self.starts, end), len(self.lengths)) - 1
+        span_start = self.starts[first]
+        span_end = self.starts[last + 1] + len(line) - len(self.line)
+        lengths = [min(CHUNK, span_end - offset) for offset in range(span_start, span_end, CHUNK)]
+        self.lengths[first:last + 1] = lengths
+        self.shapes[first:last + 1] = [None] * len(lengths)
+        if not self.lengths:
+            self.lengths, self.shapes = [0], [None]
+        self.line = line
+        self.starts = list(accumulate(self.lengths, initial=0))
+        del self.cells[first + 1:]
+
+
+class WrapOffsets:
+    # Wrap points of a long line: one every width cells, at the first column
+    # that starts there. Looked up as the rows are drawn or the cursor moves
+    # through them, rather than all when the line is wrapped.
+    def __init__(self, column_map, width):
+        self.column_map = column_map
+        self.width = width
+        line = column_map.line
+        self.count = column_map.cell(len(line) - 1) // width if line else 0
+        self.found = {}
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[item] for item in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        column = self.found.get(index)
+        if column is None:
+            cell = (index + 1) * self.width
+            column = self.column_map.column_at(cell)
+            if self.column_map.cell(column) < cell:
+                column += 1
+            self.found[index] = column
+        return column
+
+    def __iter__(self):
+        return (self[index] for index in range(self.count))
+
+
+class LongLineWrappedDocument(WrappedDocument):
+    # WrappedDocument that wraps, measures and locates long lines through their
+    # column maps instead of going over the whole line. Maps are kept per row,
+    # updated by edits within the line and moved along when rows shift.
+    def __init__(self, document, width=0, tab_width=4, limit=LONG_LINE_LIMIT):
+        self.limit = limit
+        self._column_maps = {}
+        super().__init__(document, width, tab_width)
+
+    # The rows are all wrapped already; summing them up on every rendered row
+    # made drawing a long file cost the whole file per row
+    @property
+    def height(self):
+        return len(self._offset_to_line_info)
+
+    def is_long(self, row):
+        return len(self.document[row]) > self.limit
+
+    def column_map(self, row):
+        line = self.document[row]
+        column_map = self._column_maps.get(row)
+        if column_map is None or column_map.line is not line or column_map.tab_width != self._tab_width:
+            column_map = self._column_maps[row] = ColumnMap(line, self._tab_width)
+        return column_map
+
+    # Cells taken by the row, without the cursor's space at the end
+    def line_width(self, row):
+        if self.is_long(row):
+            return self.column_map(row).width
+        return cell_len(self.document[row].expandtabs(self._tab_width))
+
+    # (wrap offsets, tab widths) of a row
+    def _wrap_line(self, row, line):
+        width = self._width
+        tab_width = self._tab_width
+        if len(line) > self.limit:
+            return (WrapOffsets(self.column_map(row), width) if width else []), []
+        tab_sections = get_tab_widths(line, tab_width)
+        wrap_offsets = (
+            compute_wrap_offsets(line, width, tab_width, precomputed_tab_sections=tab_sections)
+            if width
+            else []
+        )
+        return wrap_offsets, [tab for _, tab in tab_sections]
+
+    # Wrap the rows of lines, which start at row and y, into the lists given
+    def _wrap_rows(self, row, y, lines, wrap_offsets, tab_widths, offset_to_line_info, line_index_to_offsets):
+        for row, line in enumerate(lines, row):
+            offsets, tabs = self._wrap_line(row, line)
+            wrap_offsets.append(offsets)
+            tab_widths.append(tabs)
+            sections = len(offsets) + 1
+            offset_to_line_info.extend((row, section) for section in range(sections))
+            line_index_to_offsets.append(list(range(y, y + sections)))
+            y += sections
+
+    def wrap(self, width, tab_width=None):
+        self._width = width
+        if tab_width:
+            self._tab_width = tab_width
+        self._column_maps = {}
+        self._wrap_offsets = []
+        self._tab_width_cache = []
+        self._offset_to_line_info = []
+        self._line_index_to_offsets = []
+        self._wrap_rows(
+            0, 0, self.document.lines, self._wrap_offsets, self._tab_width_cache,
+            self._offset_to_line_info, self._line_index_to_offsets,
+        )
+
+    # Same as WrappedDocument.wrap_range, with the column maps kept up to date
+    def wrap_range(self, start, old_end, new_end):
+        old_max_index = len(self._line_index_to_offsets) - 1
+        new_max_index = self.document.line_count - 1
+        start_row = clamp(start[0], 0, min(old_max_index, new_max_index))
+        old_end_row = clamp(old_end[0], 0, old_max_index)
+        new_end_row = clamp(new_end[0], 0, new_max_index)
+        top, old_bottom = sorted((start_row, old_end_row))
+        new_bottom = max(start_row, new_end_row)
+        line_shift = new_bottom - old_bottom
+
+        maps = {}
+        for row, column_map in self._column_maps.items():
+            if row < top:
+                maps[row] = column_map
+            elif row > old_bottom:
+                maps[row + line_shift] = column_map
+            elif top == old_bottom == new_bottom:
+                # An edit within the line: remeasure from the edited chunk on
+                column_map.replace(start[1], old_end[1], self.document[row])
+                maps[row] = column_map
+        self._column_maps = maps
+
+        top_y = self._line_index_to_offsets[top][0]
+        old_bottom_y = self._line_index_to_offsets[old_bottom][-1]
+        wrap_offsets, tab_widths, offset_to_line_info, line_index_to_offsets = [], [], [], []
+        self._wrap_rows(
+            top, top_y, self.document.lines[top:new_bottom + 1],
+            wrap_offsets, tab_widths, offset_to_line_info, line_index_to_offsets,
+        )
+        self._offset_to_line_info[top_y:old_bottom_y + 1] = offset_to_line_info
+        self._line_index_to_offsets[top:old_bottom + 1] = line_index_to_offsets
+        self._tab_width_cache[top:old_bottom + 1] = tab_widths
+        self._wrap_offsets[top:old_bottom + 1] = wrap_offsets
+
+        offset_shift = len(offset_to_line_info) - (old_bottom_y - top_y + 1)
+        if line_shift:
+            line_info = self._offset_to_line_info
+            for y in range(top_y + len(offset_to_line_info), len(line_info)):
+                row, section = line_info[y]
+                line_info[y] = (row + line_shift, section)
+        if offset_shift:
+            line_offsets = self._line_index_to_offsets
+            for row in range(top + len(line_index_to_offsets), len(line_offsets)):
+                line_offsets[row] = [y + offset_shift for y in line_offsets[row]]
+
+    # Column where section of a long row starts
+    def _section_start(self, row, section):
+        return self._wrap_offsets[row][section - 1] if section else 0
+
+    def location_to_offset(self, location):
+        row, column = location
+        row = clamp(row, 0, len(self._line_index_to_offsets) - 1)
+        if not self.is_long(row):
+            return super().location_to_offset(location)
+        column_map = self.column_map(row)
+        section = bisect_right(self._wrap_offsets[row], column)
+        x = column_map.cell(column) - column_map.cell(self._section_start(row, section))
+        return Offset(x, self._line_index_to_offsets[row][section])
+
+    def offset_to_location(self, offset):
+        row, column = super().offset_to_location(offset)
+        if self._width or not self.is_long(row):
+            return row, column
+        return row, self.get_target_document_column(row, max(offset.x, 0), 0)
+
+    def get_target_document_column(self, line_index, x_offset, y_offset):
+        if not self.is_long(line_index):
+            return super().get_target_document_column(line_index, x_offset, y_offset)
+        row = line_index % len(self._wrap_offsets)
+        wrap_offsets = self._wrap_offsets[row]
+        section = y_offset % (len(wrap_offsets) + 1)
+        column_map = self.column_map(row)
+        column = column_map.column_at(column_map.cell(self._section_start(row, section)) + x_offset)
+        if section < len(wrap_offsets):
+            column = min(column, wrap_offsets[section] - 1)
+        return column
+
+    def get_tab_widths(self, line_index):
+        if self.is_long(line_index):
+            return [tab for _, tab in get_tab_widths(self.document[line_index], self._tab_width)]
+        return super().get_tab_widths(line_index)
+
+
+class LongLineNavigator(DocumentNavigator):
+    # Moving up or down measures the cursor's place on screen; for long lines
+    # that goes through the column map instead of the whole wrapped line
+    def get_location_above(self, location):
+        if not self._wrapped_document.is_long(location[0]):
+            return super().get_location_above(location)
+        x, y = self._wrapped_document.location_to_offset(location)
+        if y == 0:
+            return 0, 0
+        return self._location_at(max(x, self.last_x_offset), y - 1)
+
+    def get_location_below(self, location):
+        wrapped = self._wrapped_document
+        if not wrapped.is_long(location[0]):
+            return super().get_location_below(location)
+        x, y = wrapped.location_to_offset(location)
+        if y + 1 >= wrapped.height:
+            return location[0], len(self._document[location[0]])
+        return self._location_at(max(x, self.last_x_offset), y + 1)
+
+    def _location_at(self, x, y):
+        row, section = self._wrapped_document._offset_to_line_info[y]
+        return row, self._wrapped_document.get_target_document_column(row, x, section)
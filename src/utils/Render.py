@@ -0,0 +1,67 @@
+import sys
+
+# Time between two screen updates; Textual paints at most this often
+FRAME_INTERVAL = 1 / 60
+# Last row of the screen, whatever its size: an edit that shifts the rows
+# below it dirties everything down to the bottom
+TO_BOTTOM = sys.maxsize
+
+
+class DirtyRows:
+    # Rows of the display that changed since the last repaint, kept as one
+    # range: edits and cursor moves add the rows they touched, and the next
+    # repaint takes them all at once.
+    def __init__(self):
+        self.first = None
+        self.last = None
+
+    def add(self, first, last=None):
+        last = first if last is None else last
+        if self.first is None:
+            self.first, self.last = first, last
+        else:
+            self.first, self.last = min(self.first, first), max(self.last, last)
+
+    def add_all(self):
+        self.add(0, TO_BOTTOM)
+
+    # (first, last) and forget them; None when nothing changed
+    def take(self):
+        if self.first is None:
+            return None
+        rows = (self.first, self.last)
+        self.first = self.last = None
+        return rows
+
+    def __bool__(self):
+        return self.first is not None
+
+
+class TypingBatch:
+    # Keys typed in a burst, like a held key or a paste typed out by the
+    # terminal, gathered into one edit. The edit goes in once the keys queued
+    # behind the first one are handled, so the slower the editor runs, the
+    # more keys each edit takes instead of typing falling behind.
+    def __init__(self):
+        self.parts = []
+        self.selection = None
+
+    # Add text typed over selection; True when it starts a new batch, which
+    # needs a flush scheduled
+    def add(self, text, selection):
+        self.parts.append(text)
+        if len(self.parts) > 1:
+            return False
+        self.selection = selection
+        return True
+
+    # (text, selection) to write, or None when nothing is waiting
+    def take(self):
+        if not self.parts:
+            return None
+        text = "".join(self.parts)
+        self.parts = []
+        return text, self.selection
+
+    def __bool__(self):
+        return bool(self.parts)
@@ -0,0 +1,98 @@
+from bisect import bisect_left, bisect_right
+
+# Documents bigger than this are scanned off the event loop, in chunks
+LARGE_DOCUMENT = 256 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class SearchIndex:
+    # Sorted character offsets of every match of the current query
+    def __init__(self, text=""):
+        self.text = text
+        self.query = ""
+        self.matches = []
+        self.__line_starts = None
+
+    # Replace the indexed text, dropping every previous result
+    def set_text(self, text):
+        self.text = text
+        self.query = ""
+        self.matches = []
+        self.__line_starts = None
+
+    def is_large(self):
+        return len(self.text) > LARGE_DOCUMENT
+
+    # Search for query, reusing the previous result set when the query only grew
+    def search(self, query):
+        if not query:
+            self.query, self.matches = "", []
+        elif self.query and query.startswith(self.query):
+            # Every match of the longer query is also a match of the shorter one
+            text = self.text
+            self.matches = [offset for offset in self.matches if text.startswith(query, offset)]
+            self.query = query
+        else:
+            for _ in self.scan(query):
+                pass
+
+        return self.matches
+
+    # Full scan in chunks, yielding after each one so a worker can stop between chunks
+    def scan(self, query, chunk_size=CHUNK_SIZE):
+        text = self.text
+        matches = []
+        overlap = len(query) - 1
+
+        for chunk_start in range(0, max(len(text), 1), chunk_size):
+            # Matches may start anywhere in the chunk but can run past its end
+            chunk_end = min(chunk_start + chunk_size + overlap, len(text))
+            offset = text.find(query, chunk_start, chunk_end)
+            while offset != -1 and offset < chunk_start + chunk_size:
+                matches.append(offset)
+                offset = text.find(query, offset + 1, chunk_end)
+            yield chunk_end
+
+        self.query, self.matches = query, matches
+
+    # First match strictly after offset, wrapping around the end of the document
+    def next_match(self, offset):
+        if not self.matches:
+            return None
+        index = bisect_right(self.matches, offset)
+        return self.matches[index % len(self.matches)]
+
+    # Last match strictly before offset, wrapping around the start of the document
+    def previous_match(self, offset):
+        if not self.matches:
+            return None
+        index = bisect_left(self.matches, offset) - 1
+        return self.matches[index]
+
+    # Matches starting in [start, end), used to limit highlighting to the viewport
+    def matches_between(self, start, end):
+        return self.matches[bisect_left(self.matches, start):bisect_left(self.matches, end)]
+
+    def line_starts(self):
+        if self.__line_starts is None:
+            starts = [0]
+            text = self.text
+            offset = text.find("\n")
+            while offset != -1:
+                starts.append(offset + 1)
+                offset = text.find("\n", offset + 1)
+            self.__line_starts = starts
+
+        return self.__line_starts
+
+    # Convert a character offset to a (row, column) location
+    def location_of(self, offset):
+        starts = self.line_starts()
+        row = bisect_right(starts, offset) - 1
+        return row, offset - starts[row]
+
+    # Convert a (row, column) location to a character offset
+    def offset_of(self, location):
+        row, column = location
+        starts = self.line_starts()
+        return starts[min(row, len(starts) - 1)] + column
@@ -0,0 +1,137 @@
+import codecs
+
+# Bytes read to tell what a file holds before opening it
+SNIFF_SIZE = 8192
+# Bytes decoded at a time when a text file is read
+READ_CHUNK = 1024 * 1024
+# Share of control characters above which a file is binary
+BINARY_CONTROL_RATIO = 0.3
+
+# Longest first: the UTF-32 LE mark starts with the UTF-16 LE one
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+# Every byte but the control characters that turn up in text
+_TEXT_BYTES = bytes([*range(32, 256), *b"\t\n\r\f\b\x1b"])
+# Tried in order on text that isn't UTF-8; latin-1 decodes anything
+FALLBACK_ENCODINGS = ("cp1252", "latin-1")
+
+
+class FileKind:
+    # What the start of a file says about it: binary or not, and for text the
+    # encoding, byte order mark and line ending to read and save it with
+    def __init__(self, binary=False, encoding="utf-8", bom=b"", newline="\n", size=0):
+        self.binary = binary
+        self.encoding = encoding
+        self.bom = bom
+        self.newline = newline
+        self.size = size
+
+    def __eq__(self, other):
+        return isinstance(other, FileKind) and self.header() == other.header()
+
+    def __repr__(self):
+        return f"FileKind({'binary' if self.binary else self.encoding}, bom={self.bom!r}, newline={self.newline!r})"
+
+    # JSON form, for buffer swap files
+    def header(self):
+        return {"binary": self.binary, "encoding": self.encoding, "bom": self.bom.hex(),
+                "newline": self.newline, "size": self.size}
+
+    @classmethod
+    def from_header(cls, header):
+        if header is None:
+            return cls()
+        return cls(header["binary"], header["encoding"], bytes.fromhex(header["bom"]), header["newline"], header["size"])
+
+
+# UTF-16 without a byte order mark: ASCII text leaves every other byte zero
+def _utf16_without_bom(sample):
+    even, odd = sample[0::2], sample[1::2]
+    if len(odd) < 2:
+        return None
+    if odd.count(0) > len(odd) * 0.4 and even.count(0) < len(even) * 0.05:
+        return "utf-16-le"
+    if even.count(0) > len(even) * 0.4 and odd.count(0) < len(odd) * 0.05:
+        return "utf-16-be"
+    return None
+
+
+# Line ending used most in text, "\n" when there are none
+def detect_newline(text):
+    crlf = text.count("\r\n")
+    counts = {"\n": text.count("\n") - crlf, "\r\n": crlf, "\r": text.count("\r") - crlf}
+    return max(counts, key=lambda newline: (counts[newline], newline == "\n"))
+
+
+# Tell what sample, the first bytes of a file of size bytes, holds
+def sniff_bytes(sample, size=None):
+    size = len(sample) if size is None else size
+    complete = size <= len(sample)
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(sample[len(bom):], complete)
+            return FileKind(False, encoding, bom, detect_newline(text), size)
+
+    encoding = _utf16_without_bom(sample) if b"\0" in sample else None
+    if encoding is None:
+        if b"\0" in sample or len(sample.translate(None, _TEXT_BYTES)) > len(sample) * BINARY_CONTROL_RATIO:
+            return FileKind(binary=True, size=size)
+        for encoding in ("utf-8", *FALLBACK_ENCODINGS):
+            try:
+                # A character cut off at the end of the sample is not an error
+                text = codecs.getincrementaldecoder(encoding)().decode(sample, complete)
+                break
+            except UnicodeDecodeError:
+                continue
+    else:
+        text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(sample, complete)
+    return FileKind(False, encoding, b"", detect_newline(text), size)
+
+
+# Tell what the file at path holds from its first SNIFF_SIZE bytes
+def sniff(path):
+    with open(path, "rb") as file:
+        sample = file.read(SNIFF_SIZE)
+        size = file.seek(0, 2)
+    return sniff_bytes(sample, size)
+
+
+# The text of a file of the kind sniffed, decoded a chunk at a time, with its
+# line endings turned into "\n" like a file opened in text mode
+def read_text(path, kind, chunk_size=READ_CHUNK):
+    decoder = codecs.getincrementaldecoder(kind.encoding)(errors="replace")
+    parts = []
+    with open(path, "rb") as file:
+        file.seek(len(kind.bom))
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b"", True))
+    text = "".join(parts)
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+# Bytes to save text as, in the encoding and line endings it was read with.
+# Raises UnicodeEncodeError for text the encoding can't hold, rather than losing it
+def encode_text(text, kind):
+    if kind.newline != "\n":
+        text = text.replace("\n", kind.newline)
+    return kind.bom + text.encode(kind.encoding)
+
+
+# Offset, hex and ASCII columns for data found at offset, 16 bytes a line, as the hex view shows them
+def hex_lines(data, offset=0, width=16):
+    lines = []
+    for start in range(0, len(data), width):
+        row = data[start:start + width]
+        hex_part = " ".join(f"{byte:02x}" for byte in row)
+        ascii_part = "".join(chr(byte) if 32 <= byte < 127 else "." for byte in row)
+        lines.append(f"{offset + start:08x}  {hex_part:<{width * 3 - 1}}  |{ascii_part}|")
+    return lines
+
@@ -0,0 +1,476 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Transfers at least this big run in parallel, smaller ones go first one by one
+LARGE_FILE = 8 * 1024 * 1024
+
+
+class SyncTarget(ABC):
+    # Storage a local folder can be synchronized with. Folders and files are
+    # addressed by ids chosen by the target; entries returned by list_entries
+    # are dicts with id, name, modified (unix timestamp, whole seconds),
+    # is_folder and size (bytes, 0 when unknown).
+
+    # Transfers the target can take at once
+    max_parallel = 1
+    # SyncStats to report retries to, set by whoever watches the sync
+    stats = None
+    # BandwidthLimiter pacing the transfers, if any
+    limiter = None
+
+    # Id of the folder called name at the top of the storage, created if missing
+    @abstractmethod
+    def get_or_create_folder(self, folder_name):
+        raise NotImplementedError
+
+    # Id of the folder called name at the top of the storage, or None
+    @abstractmethod
+    def find_folder(self, folder_name):
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_entries(self, folder_id):
+        raise NotImplementedError
+
+    # Id of the new folder, or False if it could not be created
+    @abstractmethod
+    def create_folder(self, name, parent_id):
+        raise NotImplementedError
+
+    # Store the local file as name in parent_id, replacing file_id when given.
+    # The stored modification time matches the local file.
+    @abstractmethod
+    def upload(self, local_path, name, parent_id, file_id=None):
+        raise NotImplementedError
+
+    # Write file_id to local_path, with the stored modification time
+    @abstractmethod
+    def download(self, file_id, local_path, update=False):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, file_id):
+        raise NotImplementedError
+
+
+# Modification time of a local file, in the whole seconds targets keep
+def local_timestamp(path):
+    return int(os.path.getmtime(path))
+
+
+class SyncOperation:
+    # One step of a sync plan. Operations inside a folder that doesn't exist on
+    # the target yet point at the operation creating it through parent_op, as
+    # the folder id is only known once that operation has run.
+    FIELDS = ('index', 'kind', 'local_path', 'name', 'parent_id', 'parent_op', 'file_id', 'size', 'update')
+
+    def __init__(self, index, kind, local_path, name, parent_id=None, parent_op=None, file_id=None, size=0,
+                 update=False):
+        self.index = index
+        self.kind = kind
+        self.local_path = str(local_path)
+        self.name = name
+        self.parent_id = parent_id
+        self.parent_op = parent_op
+        self.file_id = file_id
+        self.size = size
+        self.update = update
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def describe(self):
+        if self.kind == 'conflict':
+            return f"conflict        {self.local_path} (file on one side, folder on the other)"
+        if self.kind in ('upload', 'download'):
+            replacing = self.update if self.kind == 'download' else self.file_id is not None
+            kind = f"{'update' if replacing else 'new'} {self.kind}"
+            return f"{kind:<15} {self.local_path} ({self.size} bytes)"
+        return f"{self.kind:<15} {self.local_path}"
+
+
+class SyncPlan:
+    # Every operation a sync pass needs, worked out before anything is sent.
+    # Operations are kept in walk order, so a folder's creation always comes
+    # before what goes into it. Saved plans log each finished operation to a
+    # second file, so a pass interrupted by a crash can resume where it stopped.
+    KINDS = ('create_folder', 'mkdir', 'upload', 'download', 'conflict')
+
+    def __init__(self, local_path, folder_id, folder_name=None, operations=None):
+        self.local_path = str(local_path)
+        self.folder_id = folder_id
+        self.folder_name = folder_name
+        self.operations = operations or []
+        # Results of finished operations by index: the id of a created folder, or True
+        self.results = {}
+        self.path = None
+        self.__lock = threading.Lock()
+
+    def add(self, kind, local_path, name, **fields):
+        operation = SyncOperation(len(self.operations), kind, local_path, name, **fields)
+        self.operations.append(operation)
+        return operation
+
+    def count(self, kind):
+        return sum(1 for operation in self.operations if operation.kind == kind)
+
+    def bytes(self, kind):
+        return sum(operation.size for operation in self.operations if operation.kind == kind)
+
+    def pending(self):
+        return [operation for operation in self.operations
+                if operation.index not in self.results and operation.kind != 'conflict']
+
+    def summary(self):
+        lines = [
+            f"{self.count('upload')} uploads ({self.bytes('upload')} bytes), "
+            f"{self.count('download')} downloads ({self.bytes('download')} bytes)",
+            f"{self.count('create_folder')} remote folders and {self.count('mkdir')} local folders to create",
+        ]
+        if self.count('conflict'):
+            lines.append(f"{self.count('conflict')} conflicts left alone")
+        if self.results:
+            lines.append(f"{len(self.results)} of {len(self.operations)} operations already done")
+        if not any(operation.kind != 'conflict' for operation in self.operations):
+            lines.append("Everything is up to date.")
+        return "\n".join(lines)
+
+    def describe(self):
+        return "\n".join(operation.describe() for operation in self.operations)
+
+    def __done_path(self):
+        return Path(str(self.path) + ".done")
+
+    def save(self, path):
+        self.path = Path(path)
+        data = {'local_path': self.local_path, 'folder_id': self.folder_id, 'folder_name': self.folder_name,
+                'operations': [operation.to_dict() for operation in self.operations]}
+        temporary_path = self.path.with_name(self.path.name + ".tmp")
+        with open(temporary_path, "w") as plan_file:
+            json.dump(data, plan_file)
+        os.replace(temporary_path, self.path)
+        try:
+            os.remove(self.__done_path())
+        except OSError:
+            pass
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as plan_file:
+            data = json.load(plan_file)
+        plan = cls(data['local_path'], data['folder_id'], data['folder_name'],
+                   [SyncOperation(**operation) for operation in data['operations']])
+        plan.path = Path(path)
+
+        # A torn last line is an operation that didn't finish logging, it runs again
+        try:
+            with open(plan.__done_path()) as done_file:
+                for line in done_file:
+                    if line.endswith("\n"):
+                        index, result = json.loads(line)
+                        plan.results[index] = result
+        except OSError:
+            pass
+        return plan
+
+    def mark_done(self, operation, result=True):
+        with self.__lock:
+            self.results[operation.index] = result
+            if self.path is not None:
+                with open(self.__done_path(), "a") as done_file:
+                    done_file.write(json.dumps([operation.index, result]) + "\n")
+
+    # Remove the plan and its log once it has run to the end
+    def discard(self):
+        if self.path is not None:
+            for path in (self.path, self.__done_path()):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class SyncEngine:
+    # Two-way synchronization of a local folder with a folder of a SyncTarget.
+    # A file found on one side only is copied over, and for a file found on
+    # both the newer copy wins. Folders found on both sides are always walked,
+    # since a folder's own modification time says nothing about its subfolders.
+    # A pass first builds a SyncPlan from the listings, then executes it.
+    def __init__(self, target, stats=None, budget=None):
+        self.target = target
+        # Optional SyncStats fed as the pass goes
+        self.stats = stats
+        # Optional RequestBudget every request to the target waits on
+        self.budget = budget
+        # Compression counters of the last pass, for targets that compress
+        self.compression_pass = None
+
+    # Verifies if file was modified or not
+    def compare_files(self, local_timestamp, remote_timestamp):
+        if local_timestamp > remote_timestamp:
+            return 'local'
+        elif local_timestamp < remote_timestamp:
+            return 'remote'
+        return False
+
+    def synchronize(self, local_path, folder_id):
+        self.execute(self.plan(local_path, folder_id))
+
+    # Plan the pass without changing anything. A folder_id of None means the
+    # top folder, folder_name, doesn't exist on the target yet.
+    def plan(self, local_path, folder_id, folder_name=None):
+        plan = SyncPlan(local_path, folder_id, folder_name)
+        for _ in self.walk(local_path, folder_id, plan, folder_name):
+            pass
+        return plan
+
+    # Plan the tree one folder at a time, yielding the local path of each
+    # folder once it is done. Folders still to visit wait on an explicit stack
+    # as (local path, id, creating operation) triples; a folder's listings are
+    # dropped before the walk moves on, so memory doesn't grow with the depth
+    # of the tree.
+    def walk(self, local_path, folder_id, plan=None, folder_name=None):
+        plan = plan if plan is not None else SyncPlan(local_path, folder_id, folder_name)
+        parent_op = None
+        if folder_id is None:
+            parent_op = plan.add('create_folder', local_path, folder_name).index
+
+        pending = [(Path(local_path), folder_id, parent_op)]
+        while pending:
+            local_path, folder_id, parent_op = pending.pop()
+            subfolders = self.plan_folder(plan, local_path, folder_id, parent_op)
+            # Reversed so folders are visited in name order
+            pending.extend(reversed(subfolders))
+            yield local_path
+
+    # Plan the files of one folder and return its subfolders to visit
+    def plan_folder(self, plan, local_path, folder_id, parent_op=None):
+        print("------------- Synchronizing folder '{}' -------------".format(local_path), end="\r")
+
+        # Index both listings by name, keeping the first remote entry of a repeated name
+        remote_entries = {}
+        if folder_id is not None:
+            if self.budget is not None:
+                self.budget.acquire()
+            if self.stats is not None:
+                self.stats.record_request()
+            for entry in self.target.list_entries(folder_id):
+                remote_entries.setdefault(entry['name'], entry)
+        local_entries = {}
+        if os.path.isdir(local_path):
+            with os.scandir(local_path) as scanner:
+                for item in scanner:
+                    local_entries[item.name] = item
+        elif remote_entries or folder_id is not None:
+            plan.add('mkdir', local_path, local_path.name)
+
+        parent = {'parent_id': folder_id, 'parent_op': parent_op}
+        subfolders = []
+        for name in sorted(local_entries.keys() | remote_entries.keys()):
+            local_absolute_path = local_path / name
+            entry = remote_entries.get(name)
+            local_entry = local_entries.get(name)
+
+            # IF file is only on local (UPLOAD)
+            if entry is None:
+                if local_entry.is_dir():
+                    created = plan.add('create_folder', local_absolute_path, name, **parent)
+                    subfolders.append((local_absolute_path, None, created.index))
+                else:
+                    plan.add('upload', local_absolute_path, name, size=local_entry.stat().st_size, **parent)
+
+            # A file on one side and a folder on the other can't be reconciled
+            elif local_entry is not None and local_entry.is_dir() != entry['is_folder']:
+                plan.add('conflict', local_absolute_path, name, file_id=entry['id'], **parent)
+
+            elif entry['is_folder']:
+                subfolders.append((local_absolute_path, entry['id'], None))
+
+            # IF file is only on the target (DOWNLOAD)
+            elif local_entry is None:
+                plan.add('download', local_absolute_path, name, file_id=entry['id'], size=entry.get('size', 0),
+                         **parent)
+
+            # Same file in both origins, the newer one wins
+            else:
+                modified = self.compare_files(int(local_entry.stat().st_mtime), entry['modified'])
+                if modified == 'local':
+                    plan.add('upload', local_absolute_path, name, file_id=entry['id'],
+                             size=local_entry.stat().st_size, **parent)
+                elif modified == 'remote':
+                    plan.add('download', local_absolute_path, name, file_id=entry['id'],
+                             size=entry.get('size', 0), update=True, **parent)
+
+        return subfolders
+
+    # Run the operations of a plan not done yet. Folders are created first, in
+    # plan order. Then small files are sent smallest first, for early progress,
+    # while the large ones run in parallel when the target allows it.
+    # progress(done, total) is called after each operation, possibly from
+    # several threads; once cancelled() returns True the operations not
+    # started yet are left for a later pass.
+    def execute(self, plan, max_workers=None, progress=None, cancelled=None):
+        stats = getattr(self.target, 'compression_stats', None)
+        before = stats.snapshot() if stats is not None else None
+        max_workers = max_workers or self.target.max_parallel
+
+        pending = plan.pending()
+        finished = [0]
+        lock = threading.Lock()
+
+        def step(operation):
+            if cancelled is not None and cancelled():
+                return
+            self.perform(plan, operation)
+            if progress is not None:
+                with lock:
+                    finished[0] += 1
+                    done = finished[0]
+                progress(done, len(pending))
+
+        if self.stats is not None:
+            self.stats.start_pass(len(pending), sum(operation.size for operation in pending))
+
+        try:
+            for operation in pending:
+                if operation.kind in ('create_folder', 'mkdir'):
+                    step(operation)
+
+            transfers = [operation for operation in pending if operation.kind in ('upload', 'download')]
+            small = sorted((operation for operation in transfers if operation.size < LARGE_FILE),
+                           key=lambda operation: operation.size)
+            large = sorted((operation for operation in transfers if operation.size >= LARGE_FILE),
+                           key=lambda operation: operation.size, reverse=True)
+
+            if max_workers > 1 and large:
+                with ThreadPoolExecutor(max_workers=max_workers - 1) as executor:
+                    futures = [executor.submit(step, operation) for operation in large]
+                    for operation in small:
+                        step(operation)
+                    for future in futures:
+                        future.result()
+            else:
+                for operation in small + large:
+                    step(operation)
+        finally:
+            if self.stats is not None:
+                self.stats.end_pass()
+
+        for operation in plan.operations:
+            if operation.kind == 'conflict':
+                print("\nSkipping '{}': file on one side and folder on the other.".format(operation.local_path))
+
+        if stats is not None:
+            self.compression_pass = stats.since(before)
+            if getattr(self.target, 'compression', None) is not None:
+                print("\n" + self.compression_pass.summary())
+
+    # Run one operation within the request budget, keeping the stats
+    def perform(self, plan, operation):
+        if self.budget is not None and operation.kind != 'mkdir':
+            self.budget.acquire()
+        if self.stats is None:
+            self.run_operation(plan, operation)
+            return
+        self.stats.start_operation(operation)
+        started = time.monotonic()
+        succeeded = False
+        try:
+            succeeded = self.run_operation(plan, operation)
+        finally:
+            self.stats.finish_operation(operation, time.monotonic() - started, succeeded)
+
+    # True once the operation is done; one that failed stays pending for the next pass
+    def run_operation(self, plan, operation):
+        parent_id = operation.parent_id
+        if operation.parent_op is not None:
+            parent_id = plan.results.get(operation.parent_op, False)
+            if parent_id is False:
+                # The folder it goes into could not be created
+                return False
+
+        local_path = Path(operation.local_path)
+        if operation.kind == 'mkdir':
+            os.makedirs(local_path, exist_ok=True)
+            result = True
+        elif operation.kind == 'create_folder':
+            if parent_id is None:
+                result = self.target.get_or_create_folder(operation.name)
+            else:
+                result = self.target.create_folder(operation.name, parent_id)
+            if result is False:
+                # Left pending, so the folder and everything in it are tried again next pass
+                return False
+        elif operation.kind == 'upload':
+            # Drive reports a failed upload by returning False rather than raising
+            if self.target.upload(local_path, operation.name, parent_id, operation.file_id) is False:
+                return False
+            result = True
+        else:
+            os.makedirs(local_path.parent, exist_ok=True)
+            self.target.download(operation.file_id, local_path, operation.update)
+            result = True
+
+        plan.mark_done(operation, result)
+        return True
+
+
+# Sync target named on the command line: drive, local:DIRECTORY or s3:BUCKET
+def open_target(name, credentials_path):
+    if name == 'drive':
+        from src.utils.Utils import Drive
+        from src.utils.BlobCache import BlobCache
+        return Drive(credentials_path=Path(credentials_path), cache=BlobCache())
+    kind, _, location = name.partition(':')
+    if kind == 'local':
+        from src.utils.Backends import LocalDirectoryBackend
+        return LocalDirectoryBackend(location)
+    if kind == 's3':
+        from src.utils.Backends import S3Backend
+        return S3Backend(location)
+    raise ValueError(f"unknown target {name!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.utils.Sync",
+                                     description="Synchronize a local folder, or show what a sync would do.")
+    parser.add_argument("local_path")
+    parser.add_argument("--target", default="drive", help="drive (default), local:DIRECTORY or s3:BUCKET")
+    parser.add_argument("--folder", default="vim_pi", help="folder at the top of the target")
+    parser.add_argument("--credentials", default=".", help="folder holding the Drive credentials")
+    parser.add_argument("--dry-run", action="store_true", help="print the plan and change nothing")
+    parser.add_argument("--plan", help="save the plan to this file, or resume the one saved there")
+    args = parser.parse_args(argv)
+
+    target = open_target(args.target, args.credentials)
+    engine = SyncEngine(target)
+
+    if args.plan and os.path.exists(args.plan) and not args.dry_run:
+        plan = SyncPlan.load(args.plan)
+        print(f"Resuming the plan saved in {args.plan}")
+    else:
+        plan = engine.plan(args.local_path, target.find_folder(args.folder), args.folder)
+        if args.plan:
+            plan.save(args.plan)
+
+    print()
+    if args.dry_run:
+        print(plan.describe())
+        print(plan.summary())
+        return 0
+
+    print(plan.summary())
+    engine.execute(plan)
+    plan.discard()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.Sync import SyncEngine
+from src.utils.SyncStats import SyncStats
+from src.utils.SyncService import IDLE, CONNECTING, SYNCING, PAUSED, WAITING, ERROR, STOPPED
+
+
+class RequestBudget:
+    # Requests per minute shared by every root, as a token bucket refilling
+    # continuously. burst is how many requests can go at once after a quiet
+    # spell. acquire() blocks until a request may be sent.
+    def __init__(self, per_minute, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, per_minute / 10.0)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.waited = 0.0
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.__lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+                self.waited += wait
+            self.sleep(wait)
+
+
+class SyncRoot:
+    # One local folder and the folder of a target it is kept in sync with.
+    # Roots of higher priority are served first; roots of the same priority
+    # split the transfers by share. connect() builds the target.
+    def __init__(self, path, connect, folder="vim_pi", interval=60.0, priority=0, share=1.0):
+        self.path = os.path.abspath(path)
+        self.connect = connect
+        self.folder = folder
+        self.interval = interval
+        self.priority = priority
+        self.share = share
+        self.target = None
+        self.engine = None
+        self.state = IDLE
+        self.text = ""
+        self.passes = 0
+        self.last_error = None
+        self.paused = False
+        # Clock time the next pass is due, right away at first
+        self.due = 0.0
+        # Bytes served so far over share, to split transfers between equal roots
+        self.served = 0.0
+
+    def holds(self, path):
+        path = os.path.abspath(path)
+        return path == self.path or path.startswith(self.path.rstrip(os.sep) + os.sep)
+
+
+class SyncScheduler:
+    # Keeps several roots in sync from one thread, with one pool of transfer
+    # workers and one request budget shared by all of them. Each round lists
+    # the roots that are due, highest priority first, creates their folders,
+    # then hands their transfers to the pool: the focused root (holding the
+    # file being edited) before anything else, then by priority, then in
+    # proportion to the roots' shares, smallest files first within a root.
+    # The controls are those of SyncService, optionally limited to the root
+    # holding a path. An optional BandwidthLimiter, shared by all roots too,
+    # paces the transfers and holds rounds outside its transfer windows.
+    def __init__(self, roots, max_workers=4, requests_per_minute=None, jitter=0.1, on_status=None, stats=None,
+                 seed=None, clock=time.monotonic, limiter=None):
+        self.roots = list(roots)
+        self.max_workers = max_workers
+        self.budget = RequestBudget(requests_per_minute) if requests_per_minute else None
+        self.jitter = jitter
+        self.on_status = on_status
+        self.stats = stats or SyncStats()
+        self.clock = clock
+        self.limiter = limiter
+        self.focused = None
+        self.__random = random.Random(seed)
+        self.__stopped = threading.Event()
+        self.__wake = threading.Event()
+        self.__lock = threading.Lock()
+
+    def __set_state(self, root, state, text):
+        root.state = state
+        root.text = text
+        if self.on_status is not None:
+            self.on_status(root, state, text)
+
+    def root_for(self, path):
+        for root in self.roots:
+            if root.holds(path):
+                return root
+        return None
+
+    def __selected(self, path):
+        if path is None:
+            return self.roots
+        root = self.root_for(path)
+        return [root] if root is not None else []
+
+    # Serve the root holding path first from now on, and sync it soon
+    def focus(self, path):
+        root = self.root_for(path)
+        if root is not None:
+            self.focused = root
+            self.sync_now(path)
+        return root
+
+    def sync_now(self, path=None):
+        for root in self.__selected(path):
+            root.due = 0.0
+        self.__wake.set()
+
+    def pause(self, path=None):
+        for root in self.__selected(path):
+            root.paused = True
+            self.__set_state(root, PAUSED, "Sync paused.")
+
+    def resume(self, path=None):
+        for root in self.__selected(path):
+            root.paused = False
+            self.__set_state(root, IDLE, "Sync resumed.")
+        self.__wake.set()
+
+    def stop(self):
+        self.__stopped.set()
+        self.__wake.set()
+
+    def is_stopped(self):
+        return self.__stopped.is_set()
+
+    def __next_delay(self, root):
+        spread = root.interval * self.jitter
+        return max(0.0, root.interval + self.__random.uniform(-spread, spread))
+
+    # Roots in the order they are served
+    def __order_key(self, root):
+        return (root is not self.focused, -root.priority)
+
+    def run(self):
+        try:
+            while not self.__stopped.is_set():
+                if self.limiter is not None and not self.limiter.in_window():
+                    for root in self.roots:
+                        if not root.paused:
+                            self.__set_state(root, WAITING, "Waiting for the transfer window.")
+                    self.__wake.wait(self.limiter.seconds_until_window())
+                    self.__wake.clear()
+                    continue
+
+                now = self.clock()
+                due = [root for root in self.roots if not root.paused and root.due <= now]
+                if due:
+                    self.run_round(due)
+                    continue
+                waiting = [root.due - now for root in self.roots if not root.paused]
+                self.__wake.wait(min(waiting) if waiting else None)
+                self.__wake.clear()
+        finally:
+            for root in self.roots:
+                self.__set_state(root, STOPPED, "Sync stopped.")
+
+    def run_round(self, roots):
+        # Scheduled up front, so a sync_now() arriving during the round isn't lost
+        for root in roots:
+            root.due = self.clock() + self.__next_delay(root)
+
+        plans = {}
+        for root in sorted(roots, key=self.__order_key):
+            if self.__stopped.is_set():
+                return
+            plan = self.__prepare(root)
+            if plan is not None:
+                plans[root] = plan
+
+        queues = {}
+        for root, plan in plans.items():
+            root.served = 0.0
+            transfers = [operation for operation in plan.pending() if operation.kind in ('upload', 'download')]
+            queues[root] = deque(sorted(transfers, key=lambda operation: operation.size))
+        self.stats.start_pass(sum(len(queue) for queue in queues.values()),
+                              sum(operation.size for queue in queues.values() for operation in queue))
+        try:
+            self.__transfer(plans, queues)
+        finally:
+            self.stats.end_pass()
+
+        for root in plans:
+            root.passes += 1
+            if root.state == SYNCING:
+                self.__set_state(root, IDLE, f"Synchronized ({len(plans[root].operations)} changes).")
+
+    # List a root and create its missing folders; None if that failed
+    def __prepare(self, root):
+        try:
+            if root.target is None:
+                self.__set_state(root, CONNECTING, "Connecting...")
+                root.target = root.connect()
+                root.target.stats = self.stats
+                root.target.limiter = self.limiter
+                root.engine = SyncEngine(root.target, self.stats, self.budget)
+
+            self.__set_state(root, SYNCING, "Looking for changes...")
+            plan = root.engine.plan(root.path, root.target.get_or_create_folder(root.folder))
+            for operation in plan.pending():
+                if operation.kind in ('create_folder', 'mkdir'):
+                    root.engine.perform(plan, operation)
+            return plan
+        except Exception as error:
+            root.last_error = error
+            self.__set_state(root, ERROR, f"Sync failed: {error}")
+            return None
+
+    # Root whose transfer goes next, among those below their target's limit of
+    # transfers at once, and whether roots at their limit still have transfers waiting
+    def __pick(self, queues, running):
+        waiting = [root for root, queue in queues.items() if queue and not root.paused]
+        ready = [root for root in waiting if running[root] < root.target.max_parallel]
+        if not ready:
+            return None, bool(waiting)
+        return min(ready, key=lambda root: (self.__order_key(root), root.served / root.share)), False
+
+    def __transfer(self, plans, queues):
+        slots = threading.Semaphore(self.max_workers)
+        # Transfers in flight per root; Drive, for one, takes a single upload at a time
+        running = {root: 0 for root in queues}
+        finished = threading.Condition(self.__lock)
+        futures = []
+
+        def run(root, operation):
+            try:
+                root.engine.perform(plans[root], operation)
+            except Exception as error:
+                root.last_error = error
+                self.__set_state(root, ERROR, f"Sync failed: {error}")
+            finally:
+                with finished:
+                    running[root] -= 1
+                    finished.notify_all()
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while not self.__stopped.is_set():
+                if self.limiter is not None and not self.limiter.in_window():
+                    # The rest waits for the next window
+                    break
+                slots.acquire()
+                with finished:
+                    root, blocked = self.__pick(queues, running)
+                    while root is None and blocked and not self.__stopped.is_set():
+                        finished.wait()
+                        root, blocked = self.__pick(queues, running)
+                    if root is None:
+                        slots.release()
+                        break
+                    operation = queues[root].popleft()
+                    root.served += max(operation.size, 1)
+                    running[root] += 1
+                futures.append(executor.submit(run, root, operation))
+        for future in futures:
+            future.result()
@@ -0,0 +1,135 @@
+import random
+import threading
+
+from src.utils.Sync import SyncEngine
+from src.utils.SyncStats import SyncStats
+
+IDLE = 'idle'
+CONNECTING = 'connecting'
+SYNCING = 'syncing'
+PAUSED = 'paused'
+# Outside the transfer windows of the limiter
+WAITING = 'waiting'
+ERROR = 'error'
+STOPPED = 'stopped'
+
+
+class SyncService:
+    # Keeps a local folder in sync with a SyncTarget in the background: one
+    # pass right away, then one every interval seconds, give or take jitter (a
+    # fraction of the interval) so machines sharing a folder don't all hit the
+    # store at once. run() blocks until stop() and is meant for a worker
+    # thread; stop, pause, resume and sync_now can be called from any thread.
+    # connect() builds the target inside run(), so authentication doesn't
+    # block the caller either. Changes of state are reported through
+    # on_status(state, text) and transfer progress through
+    # on_progress(done, total), both called from the service thread; stats
+    # collects the counters of every pass. An optional BandwidthLimiter paces
+    # the transfers and holds passes outside its transfer windows.
+    def __init__(self, connect, local_path, folder_name="vim_pi", interval=60.0, jitter=0.1, on_status=None,
+                 on_progress=None, seed=None, stats=None, limiter=None):
+        self.connect = connect
+        self.local_path = local_path
+        self.folder_name = folder_name
+        self.interval = interval
+        self.jitter = jitter
+        self.on_status = on_status
+        self.on_progress = on_progress
+        self.stats = stats or SyncStats()
+        self.limiter = limiter
+        self.state = IDLE
+        self.target = None
+        self.passes = 0
+        self.last_error = None
+        self.__random = random.Random(seed)
+        self.__stopped = threading.Event()
+        self.__paused = threading.Event()
+        # Set to cut the wait before the next pass short
+        self.__wake = threading.Event()
+
+    def __set_state(self, state, text):
+        self.state = state
+        if self.on_status is not None:
+            self.on_status(state, text)
+
+    # Seconds to wait before the next pass
+    def next_delay(self):
+        spread = self.interval * self.jitter
+        return max(0.0, self.interval + self.__random.uniform(-spread, spread))
+
+    def stop(self):
+        self.__stopped.set()
+        self.__wake.set()
+
+    # Finish the operation in progress, then wait for resume()
+    def pause(self):
+        self.__paused.set()
+
+    def resume(self):
+        self.__paused.clear()
+        self.__wake.set()
+
+    # Start a pass now instead of waiting for the interval to end
+    def sync_now(self):
+        self.__wake.set()
+
+    def is_paused(self):
+        return self.__paused.is_set()
+
+    def is_stopped(self):
+        return self.__stopped.is_set()
+
+    def __interrupted(self):
+        return self.__stopped.is_set() or self.__paused.is_set() or not self.__in_window()
+
+    def __in_window(self):
+        return self.limiter is None or self.limiter.in_window()
+
+    def run(self):
+        try:
+            while not self.__stopped.is_set():
+                if self.__paused.is_set():
+                    self.__set_state(PAUSED, "Sync paused.")
+                    while self.__paused.is_set() and not self.__stopped.is_set():
+                        self.__wake.wait()
+                        self.__wake.clear()
+                    continue
+
+                if not self.__in_window():
+                    self.__set_state(WAITING, "Waiting for the transfer window.")
+                    self.__wake.wait(self.limiter.seconds_until_window())
+                    self.__wake.clear()
+                    continue
+
+                self.run_pass()
+                if self.__stopped.is_set():
+                    break
+                self.__wake.wait(self.next_delay())
+                self.__wake.clear()
+        finally:
+            self.__set_state(STOPPED, "Sync stopped.")
+
+    # One synchronization; a failure is reported and the next pass tries again
+    def run_pass(self):
+        try:
+            if self.target is None:
+                self.__set_state(CONNECTING, "Connecting...")
+                self.target = self.connect()
+                self.target.stats = self.stats
+                self.target.limiter = self.limiter
+
+            self.__set_state(SYNCING, "Looking for changes...")
+            engine = SyncEngine(self.target, self.stats)
+            plan = engine.plan(self.local_path, self.target.get_or_create_folder(self.folder_name))
+            total = len(plan.pending())
+            self.__set_state(SYNCING, f"Synchronizing {total} changes..." if total else "Up to date.")
+            engine.execute(plan, progress=self.on_progress, cancelled=self.__interrupted)
+        except Exception as error:
+            self.last_error = error
+            self.__set_state(ERROR, f"Sync failed: {error}")
+            return False
+
+        self.passes += 1
+        if not self.__interrupted():
+            self.__set_state(IDLE, f"Synchronized ({total} changes).")
+        return True
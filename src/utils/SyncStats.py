@@ -0,0 +1,151 @@
+import time
+import threading
+from collections import deque
+
+# Seconds of finished transfers the rate is measured over
+RATE_WINDOW = 10.0
+# Finished files kept for display
+RECENT_FILES = 8
+
+
+class SyncStats:
+    # Live counters of sync passes, for the dashboard. The engine reports
+    # listings and operations as they start and finish, targets report retries;
+    # transfer threads update them while the UI reads them with snapshot().
+    # Requests count one per listing or operation, however many HTTP requests
+    # the target needed for it.
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.passes = 0
+        self.files = 0
+        self.bytes = 0
+        self.requests = 0
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self.queued = 0
+        self.pass_total_bytes = 0
+        self.pass_done_bytes = 0
+        self.pass_started = None
+        self.in_flight = {}
+        self.recent = deque(maxlen=RECENT_FILES)
+        # (time, bytes) of finished transfers inside the rate window
+        self.__transfers = deque()
+        # Times of the requests of the last minute
+        self.__request_times = deque()
+        self.__lock = threading.Lock()
+
+    def __trim(self, now):
+        while self.__transfers and self.__transfers[0][0] < now - RATE_WINDOW:
+            self.__transfers.popleft()
+        while self.__request_times and self.__request_times[0] < now - 60:
+            self.__request_times.popleft()
+
+    def start_pass(self, operations, total_bytes):
+        with self.__lock:
+            self.queued = operations
+            self.pass_total_bytes = total_bytes
+            self.pass_done_bytes = 0
+            self.pass_started = self.clock()
+
+    def end_pass(self):
+        with self.__lock:
+            self.passes += 1
+            self.queued = 0
+            self.pass_started = None
+
+    def record_request(self):
+        with self.__lock:
+            now = self.clock()
+            self.requests += 1
+            self.__request_times.append(now)
+            self.__trim(now)
+
+    def record_retry(self, delay):
+        with self.__lock:
+            self.retries += 1
+            self.backoff_seconds += delay
+
+    def start_operation(self, operation):
+        with self.__lock:
+            self.queued = max(0, self.queued - 1)
+            self.in_flight[operation.index] = operation
+
+    def finish_operation(self, operation, seconds, succeeded=True):
+        with self.__lock:
+            now = self.clock()
+            self.in_flight.pop(operation.index, None)
+            if operation.kind != 'mkdir':
+                self.requests += 1
+                self.__request_times.append(now)
+            if operation.kind in ('upload', 'download'):
+                self.pass_done_bytes += operation.size
+                if succeeded:
+                    self.files += 1
+                    self.bytes += operation.size
+                    self.__transfers.append((now, operation.size))
+                    self.recent.appendleft((operation.kind, operation.local_path, operation.size, seconds))
+            self.__trim(now)
+
+    # Bytes per second over the last RATE_WINDOW seconds
+    def rate(self):
+        with self.__lock:
+            now = self.clock()
+            self.__trim(now)
+            return sum(size for _, size in self.__transfers) / RATE_WINDOW
+
+    def snapshot(self):
+        rate = self.rate()
+        with self.__lock:
+            self.__trim(self.clock())
+            remaining = self.pass_total_bytes - self.pass_done_bytes
+            eta = None
+            if self.pass_started is not None and rate > 0:
+                eta = remaining / rate
+            return {
+                'rate': rate,
+                'queued': self.queued,
+                'in_flight': [operation.local_path for operation in self.in_flight.values()],
+                'requests_per_minute': len(self.__request_times),
+                'requests': self.requests,
+                'retries': self.retries,
+                'backoff_seconds': self.backoff_seconds,
+                'pass_done_bytes': self.pass_done_bytes,
+                'pass_total_bytes': self.pass_total_bytes,
+                'eta': eta,
+                'recent': list(self.recent),
+                'files': self.files,
+                'bytes': self.bytes,
+                'passes': self.passes,
+            }
+
+
+def format_bytes(size):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024 or unit == 'GiB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "--"
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
+
+
+# Dashboard text for a snapshot
+def describe(snapshot):
+    lines = [
+        f"Rate {format_bytes(snapshot['rate'])}/s   ETA {format_seconds(snapshot['eta'])}   "
+        f"{format_bytes(snapshot['pass_done_bytes'])} of {format_bytes(snapshot['pass_total_bytes'])} this pass",
+        f"Queued {snapshot['queued']}   In flight {len(snapshot['in_flight'])}   "
+        f"Requests {snapshot['requests_per_minute']}/min   "
+        f"Retries {snapshot['retries']} ({format_seconds(snapshot['backoff_seconds'])} backing off)",
+    ]
+    for path in snapshot['in_flight']:
+        lines.append(f"  > {path}")
+    if snapshot['recent']:
+        lines.append("Recently synchronized:")
+        for kind, path, size, seconds in snapshot['recent']:
+            lines.append(f"  {'^' if kind == 'upload' else 'v'} {path} ({format_bytes(size)}, {seconds:.1f}s)")
+    return "\n".join(lines)
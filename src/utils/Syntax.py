@@ -0,0 +1,100 @@
+import os
+
+from textual.document._document import Document, _utf8_encode
+from textual.document._syntax_aware_document import SyntaxAwareDocument
+
+# Documents with more characters than this are opened without a parser
+SYNTAX_SIZE_LIMIT = 4 * 1024 * 1024
+# Above this many lines only the rows around the viewport are highlighted
+BACKGROUND_LINE_LIMIT = 100_000
+# Rows highlighted around the viewport, and per background step
+VIEWPORT_MARGIN = 50
+BACKGROUND_CHUNK = 2000
+
+EXTENSION_LANGUAGES = {
+    ".py": "python",
+    ".pyw": "python",
+    ".js": "javascript",
+    ".mjs": "javascript",
+    ".cjs": "javascript",
+    ".json": "json",
+    ".md": "markdown",
+    ".html": "html",
+    ".htm": "html",
+    ".css": "css",
+    ".tcss": "css",
+    ".go": "go",
+    ".java": "java",
+    ".kt": "kotlin",
+    ".rs": "rust",
+    ".sql": "sql",
+    ".toml": "toml",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".sh": "bash",
+    ".bash": "bash",
+}
+
+
+# Language name for a file, or None if it should be shown as plain text
+def detect_language(path, size=0):
+    if size > SYNTAX_SIZE_LIMIT:
+        return None
+    return EXTENSION_LANGUAGES.get(os.path.splitext(str(path))[1].lower())
+
+
+class IndexedSyntaxDocument(SyntaxAwareDocument):
+    # SyntaxAwareDocument finds the byte offset of a location by encoding every
+    # line above it and reparses the file on every edit. This keeps the running
+    # offsets of the rows instead, valid up to the first row touched by an edit
+    # since they were computed, and only marks the edited range on the syntax
+    # tree; the incremental reparse runs once typing pauses, through reparse().
+    _row_offsets = None
+    _valid_rows = 0
+    needs_reparse = False
+
+    def replace_range(self, start, end, text):
+        top, bottom = sorted((start, end))
+        start_byte = self._location_to_byte_offset(top)
+        start_point = self._location_to_point(top)
+        old_end_byte = self._location_to_byte_offset(bottom)
+        old_end_point = self._location_to_point(bottom)
+
+        result = Document.replace_range(self, start, end, text)
+        self._valid_rows = min(self._valid_rows, top[0] + 1)
+
+        self._syntax_tree.edit(
+            start_byte=start_byte,
+            old_end_byte=old_end_byte,
+            new_end_byte=start_byte + len(_utf8_encode(text)),
+            start_point=start_point,
+            old_end_point=old_end_point,
+            new_end_point=self._location_to_point(result.end_location),
+        )
+        self.needs_reparse = True
+
+        return result
+
+    # Reparse the ranges edited since the last parse, reusing the rest of the tree
+    def reparse(self):
+        if self.needs_reparse:
+            self._syntax_tree = self._parser.parse(self._read_callable, self._syntax_tree)
+            self.needs_reparse = False
+
+    def _location_to_byte_offset(self, location):
+        row, column = location
+        lines = self._lines
+        offsets = self._row_offsets
+        if offsets is None:
+            offsets = self._row_offsets = [0]
+        del offsets[max(self._valid_rows, 1):]
+
+        target = min(row, len(lines))
+        newline_width = len(self.newline)
+        while len(offsets) <= target:
+            previous = len(offsets) - 1
+            offsets.append(offsets[previous] + len(_utf8_encode(lines[previous])) + newline_width)
+        self._valid_rows = len(offsets)
+
+        bytes_on_left = len(_utf8_encode(lines[row][:column])) if row < len(lines) else 0
+        return offsets[target] + bytes_on_left
@@ -0,0 +1,185 @@
+import time
+import threading
+from datetime import datetime, timedelta
+
+# Bytes moved between two checks of the buckets
+CHUNK_SIZE = 256 * 1024
+# Rate used while the editor is slow and no limit is set, before backoff
+BACKOFF_RATE = 1024 * 1024
+# Keystroke latency above which sync backs off, and below which it speeds up again
+SLOW_KEYSTROKE = 0.05
+FAST_KEYSTROKE = 0.02
+# Lowest fraction of the rate backoff goes down to
+MIN_FACTOR = 1 / 32
+# Seconds without a keystroke after which backoff halves, as the editor is idle
+IDLE_RECOVERY = 1.0
+
+
+class TokenBucket:
+    # rate bytes per second on average, in bursts of at most capacity bytes.
+    # consume() blocks until the bytes may go; it can be called from several
+    # threads, which then share the rate.
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity or max(rate, CHUNK_SIZE)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.__lock = threading.Lock()
+
+    def consume(self, amount, rate=None):
+        rate = rate or self.rate
+        with self.__lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * rate)
+            self.updated = now
+            # Going into debt lets a chunk bigger than the bucket through, followed by a longer wait
+            self.tokens -= amount
+            wait = -self.tokens / rate if self.tokens < 0 else 0
+        if wait:
+            self.sleep(wait)
+        return wait
+
+
+class TransferWindow:
+    # A daily time range transfers are allowed in, like "22:00-07:00"
+    def __init__(self, text):
+        start, _, end = text.partition("-")
+        self.start = datetime.strptime(start.strip(), "%H:%M").time()
+        self.end = datetime.strptime(end.strip(), "%H:%M").time()
+
+    def contains(self, moment):
+        now = moment.time()
+        if self.start <= self.end:
+            return self.start <= now < self.end
+        return now >= self.start or now < self.end
+
+    # Seconds from moment until the window opens, 0 inside it
+    def seconds_until_open(self, moment):
+        if self.contains(moment):
+            return 0.0
+        opening = datetime.combine(moment.date(), self.start)
+        if opening <= moment:
+            opening += timedelta(days=1)
+        return (opening - moment).total_seconds()
+
+
+class BandwidthLimiter:
+    # Paces background transfers: separate upload and download limits in bytes
+    # per second (None for no limit), optional daily transfer windows, and a
+    # backoff factor that drops while the editor reports slow keystrokes and
+    # recovers once they are fast again, or once the user stops typing.
+    def __init__(self, upload_rate=None, download_rate=None, windows=(), clock=time.monotonic, sleep=time.sleep,
+                 now=datetime.now):
+        self.upload_rate = upload_rate
+        self.download_rate = download_rate
+        self.windows = [TransferWindow(window) if isinstance(window, str) else window for window in windows]
+        self.now = now
+        self.factor = 1.0
+        self.latency = 0.0
+        self.waited = 0.0
+        self.clock = clock
+        self.__reported = clock()
+        self.__up = TokenBucket(upload_rate or BACKOFF_RATE, clock=clock, sleep=sleep)
+        self.__down = TokenBucket(download_rate or BACKOFF_RATE, clock=clock, sleep=sleep)
+        self.__lock = threading.Lock()
+
+    def in_window(self):
+        return self.seconds_until_window() == 0
+
+    # Seconds until transfers are allowed, 0 when they are now
+    def seconds_until_window(self):
+        if not self.windows:
+            return 0.0
+        moment = self.now()
+        return min(window.seconds_until_open(moment) for window in self.windows)
+
+    # Latest keystroke latency seen by the editor, in seconds
+    def report_latency(self, seconds):
+        with self.__lock:
+            self.__recover()
+            self.__reported = self.clock()
+            # Smoothed, so a single slow key doesn't stall the sync
+            self.latency = 0.7 * self.latency + 0.3 * seconds
+            if self.latency > SLOW_KEYSTROKE:
+                self.factor = max(MIN_FACTOR, self.factor / 2)
+            elif self.latency < FAST_KEYSTROKE:
+                self.factor = min(1.0, self.factor * 2)
+
+    # Keystrokes are only reported while the user types, so every IDLE_RECOVERY
+    # seconds without one doubles the factor and halves the latency remembered
+    def __recover(self):
+        idle = int((self.clock() - self.__reported) / IDLE_RECOVERY)
+        if idle and self.factor < 1.0:
+            self.factor = min(1.0, self.factor * 2 ** idle)
+            self.latency /= 2 ** idle
+            self.__reported += idle * IDLE_RECOVERY
+
+    def __consume(self, bucket, rate, amount):
+        with self.__lock:
+            self.__recover()
+            factor = self.factor
+        if rate is None and factor >= 1.0:
+            return
+        wait = bucket.consume(amount, (rate or BACKOFF_RATE) * factor)
+        with self.__lock:
+            self.waited += wait
+
+    def consume_upload(self, amount):
+        self.__consume(self.__up, self.upload_rate, amount)
+
+    def consume_download(self, amount):
+        self.__consume(self.__down, self.download_rate, amount)
+
+    def reader(self, stream):
+        return ThrottledReader(stream, self.consume_upload)
+
+    def writer(self, stream):
+        return ThrottledWriter(stream, self.consume_download)
+
+
+class ThrottledReader:
+    # Binary stream wrapper pacing reads, for uploads
+    def __init__(self, stream, consume, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.consume = consume
+        self.chunk_size = chunk_size
+
+    # Reads in chunks whatever the size asked for, so the pacing stays smooth
+    def read(self, size=-1):
+        if size is not None and size < 0:
+            size = None
+        chunks = []
+        total = 0
+        while size is None or total < size:
+            wanted = self.chunk_size if size is None else min(self.chunk_size, size - total)
+            data = self.stream.read(wanted)
+            if not data:
+                break
+            self.consume(len(data))
+            chunks.append(data)
+            total += len(data)
+        return b"".join(chunks)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class ThrottledWriter:
+    # Binary stream wrapper pacing writes, for downloads
+    def __init__(self, stream, consume, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.consume = consume
+        self.chunk_size = chunk_size
+
+    def write(self, data):
+        view = memoryview(data)
+        for start in range(0, len(view), self.chunk_size):
+            chunk = view[start:start + self.chunk_size]
+            self.consume(len(chunk))
+            self.stream.write(chunk)
+        return len(view)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
@@ -0,0 +1,147 @@
+import os
+import hashlib
+from pathlib import Path
+
+from textual.widgets.text_area import Edit, EditResult
+
+from src.utils.Journal import write_varint, read_varint
+
+MAGIC = b"VPU1"
+
+# Size limits applied when an undo file is written, oldest batches go first
+MAX_BATCHES = 1000
+MAX_BYTES = 1024 * 1024
+
+
+# Directory holding the persistent undo files
+def undo_dir():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "vimpi" / "undo"
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+def _zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value):
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def _write_text(out, text):
+    data = text.encode("utf-8")
+    write_varint(out, len(data))
+    out += data
+
+
+def _read_text(data, position):
+    length, position = read_varint(data, position)
+    return data[position:position + length].decode("utf-8"), position + length
+
+
+# One undo batch. Rows are stored as deltas, from the previous edit for the
+# start of each edit and from the start for its other locations, so typical
+# batches of nearby edits take a handful of bytes plus their text.
+def encode_batch(edits):
+    out = bytearray()
+    write_varint(out, len(edits))
+    previous_row = 0
+    for edit in edits:
+        (from_row, from_column), (to_row, to_column) = edit.from_location, edit.to_location
+        end_row, end_column = edit._edit_result.end_location
+        write_varint(out, int(edit.maintain_selection_offset))
+        write_varint(out, _zigzag(from_row - previous_row))
+        write_varint(out, from_column)
+        write_varint(out, _zigzag(to_row - from_row))
+        write_varint(out, to_column)
+        write_varint(out, _zigzag(end_row - from_row))
+        write_varint(out, end_column)
+        _write_text(out, edit.text)
+        _write_text(out, edit._edit_result.replaced_text)
+        previous_row = from_row
+    return bytes(out)
+
+
+def decode_batch(data, position=0):
+    count, position = read_varint(data, position)
+    edits = []
+    previous_row = 0
+    for _ in range(count):
+        values = []
+        for _ in range(7):
+            value, position = read_varint(data, position)
+            values.append(value)
+        maintain, from_row, from_column, to_row, to_column, end_row, end_column = values
+        from_row = previous_row + _unzigzag(from_row)
+        text, position = _read_text(data, position)
+        replaced_text, position = _read_text(data, position)
+
+        edit = Edit(text, (from_row, from_column), (from_row + _unzigzag(to_row), to_column), bool(maintain))
+        edit._edit_result = EditResult((from_row + _unzigzag(end_row), end_column), replaced_text)
+        edits.append(edit)
+        previous_row = from_row
+    return edits, position
+
+
+class UndoStore:
+    # Undo history saved per file. Each file records the hash of the text its
+    # newest batch leads to, and is only used when the buffer holds that text.
+    def __init__(self, directory=None, max_batches=MAX_BATCHES, max_bytes=MAX_BYTES):
+        self.directory = Path(directory) if directory else undo_dir()
+        self.max_batches = max_batches
+        self.max_bytes = max_bytes
+
+    def undo_path(self, path):
+        return self.directory / (hashlib.sha1(str(path).encode("utf-8")).hexdigest() + ".undo")
+
+    # Batches, oldest first, saved for path when its text hashed to content_hash
+    def load(self, path, content_hash):
+        try:
+            with open(self.undo_path(path), "rb") as undo_file:
+                data = undo_file.read()
+        except OSError:
+            return []
+        if data[:4] != MAGIC or data[4:24] != content_hash:
+            return []
+
+        batches = []
+        position = 24
+        try:
+            while position < len(data):
+                edits, position = decode_batch(data, position)
+                batches.append(edits)
+        except (IndexError, UnicodeDecodeError):
+            return []
+        return batches
+
+    def save(self, path, content_hash, batches):
+        encoded = []
+        size = 0
+        for batch in reversed(batches[-self.max_batches:]):
+            data = encode_batch(batch)
+            if size + len(data) > self.max_bytes:
+                break
+            encoded.append(data)
+            size += len(data)
+
+        undo_path = self.undo_path(path)
+        if not encoded:
+            self.discard(path)
+            return
+
+        undo_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = undo_path.with_suffix(".tmp")
+        with open(temporary_path, "wb") as undo_file:
+            undo_file.write(MAGIC + content_hash)
+            for data in reversed(encoded):
+                undo_file.write(data)
+        os.replace(temporary_path, undo_path)
+
+    def discard(self, path):
+        try:
+            os.remove(self.undo_path(path))
+        except OSError:
+            pass
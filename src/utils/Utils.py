@@ -3,18 +3,21 @@ import time
 import re
 import calendar
 from datetime import datetime
-import pathlib
 import pickle
 import os
 import io
+import hashlib
 from pathlib import Path
 
 from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
 from google.oauth2 import service_account
 
+from src.utils.Backends import GoogleDriveBackend, BackendQuotaError, FOLDER_MIME_TYPE
+from src.utils.Sync import SyncTarget, SyncEngine
+from src.utils.Compression import ENCODING_KEY, CompressionStats, compressed_upload, restore_download
+
 
 class Utils:
     # Return list of all files in specified folder
@@ -50,9 +53,27 @@ class Utils:
 
 
 
-class Drive:
-    def __init__(self, credentials_path: Path = Path("."), use_service_account: bool = False):
-        self.__service = self.__authenticate(credentials_path, use_service_account)
+class Drive(SyncTarget):
+    # Transfers stay one at a time: the Google client shares one HTTP connection
+    # that isn't safe to use from several threads.
+    max_parallel = 1
+
+    # Retries of a request rejected for quota reasons, with exponential backoff
+    MAX_RETRIES = 5
+    RETRY_DELAY = 1.0
+
+    def __init__(self, credentials_path: Path = Path("."), use_service_account: bool = False, backend=None,
+                 compression=None, cache=None):
+        if backend is None:
+            backend = GoogleDriveBackend(self.__authenticate(credentials_path, use_service_account))
+        self.backend = backend
+        # Optional CompressionPolicy; compressed files are marked in their appProperties
+        self.compression = compression
+        self.compression_stats = CompressionStats()
+        # Optional BlobCache serving downloads whose bytes were fetched before
+        self.cache = cache
+        # md5Checksum and modification time of the files seen in listings, by id
+        self.__listed = {}
 
     def __authenticate(self, credentials_path: Path, use_service_account: bool):
         creds = None
@@ -88,24 +109,50 @@ class Drive:
 
         return build('drive', 'v3', credentials=creds)
 
+    # Transfers are paced in the backend, which moves the file contents
+    @property
+    def limiter(self):
+        return self.backend.limiter
+
+    @limiter.setter
+    def limiter(self, limiter):
+        self.backend.limiter = limiter
+
     def get_service(self):
-        return self.__service
-    
+        return getattr(self.backend, 'service', None)
+
+    # Run a backend call, backing off and retrying while it hits quota limits
+    def _call(self, method, *args, **kwargs):
+        for attempt in range(self.MAX_RETRIES):
+            try:
+                return method(*args, **kwargs)
+            except BackendQuotaError:
+                delay = self.RETRY_DELAY * 2 ** attempt
+                if self.stats is not None:
+                    self.stats.record_retry(delay)
+                time.sleep(delay)
+        return method(*args, **kwargs)
+
     def delete_file_or_folder(self, file_id):
         try:
-            self.__service.files().delete(fileId=file_id).execute()
+            self._call(self.backend.delete, file_id)
             print(f"Deleted file or folder with ID: {file_id}")
         except Exception as e:
             print(f"An error occurred while deleting file or folder: {e}")
 
     # List all files inside specified Drive folder
     def list_files(self, folder_id):
-        # Call API
-        response = self.__service.files().list(q="'{}' in parents".format(folder_id),
-                                               fields='files(id,name,modifiedTime,mimeType)').execute()
+        # Call API, following every page of the listing
+        files = []
+        page_token = None
+        while True:
+            page, page_token = self._call(self.backend.list_files, folder_id, page_token)
+            files.extend(page)
+            if page_token is None:
+                break
 
         # Return all file names
-        files_dic = {"all": response.get('files', []), "names": []}
+        files_dic = {"all": files, "names": []}
         for item in files_dic['all']:
             files_dic['names'].append(item['name'])
 
@@ -115,29 +162,35 @@ class Drive:
     def download_file(self, filename, local_path, file_id, update=False):
         local_absolute_path = Path(f"{local_path}") / f"{filename}"
 
-        # Request for download API
-        request = self.__service.files().get_media(fileId=file_id)
+        # Same bytes as a file downloaded before: no need to fetch them again
+        listed = self.__listed.get(file_id)
+        if self.cache is not None and listed is not None and self.cache.get(listed[0], local_absolute_path):
+            os.utime(local_absolute_path, (listed[1], listed[1]))
+            print("\nFile '{}' restored from the local cache in folder '{}'.".format(filename, local_absolute_path))
+            return
 
         # File stream
         fh = io.BytesIO()
 
-        # Setup request and file stream
-        downloader = MediaIoBaseDownload(fh, request)
-
         # Wait while file is being downloaded
-        done = False
-        while done is False:
-            done = downloader.next_chunk()
+        self._call(self.backend.download_file, file_id, fh)
+        metadata = self._call(self.backend.get_metadata, file_id)
+        encoding = metadata.get('appProperties', {}).get(ENCODING_KEY)
 
-        # Save download buffer to file
+        # Save download buffer to file, decompressed if it was stored compressed
+        fh.seek(0)
         with open(local_absolute_path, 'wb') as out:
-            out.write(fh.getbuffer())
+            restore_download(fh, out, encoding, self.compression_stats)
 
         # Change local modification time to match remote
-        modified_time = self.__service.files().get(fileId=file_id, fields='modifiedTime').execute()['modifiedTime']
+        modified_time = metadata['modifiedTime']
         modified_timestamp = Utils.convert_datetime_timestamp(modified_time)
         os.utime(local_absolute_path, (modified_timestamp, modified_timestamp))
 
+        if self.cache is not None:
+            # Keyed by the bytes actually received, like Drive's md5Checksum of them
+            self.cache.put(hashlib.md5(fh.getbuffer()).hexdigest(), local_absolute_path)
+
         if update != False:
             print("\nLocal file '{}' updated successfully in folder '{}'.".format(filename, local_absolute_path))
         else:
@@ -148,22 +201,25 @@ class Drive:
     def upload_file(self, filename, local_path, folder_id, update=False):
         local_absolute_path = Path(f"{local_path}") / f"{filename}"
 
-        # Custom file metadata for upload (modification time matches local)
+        # Modification time of the remote file matches local
         modified_timestamp = Utils.get_local_file_timestamp(local_absolute_path)
-        file_metadata = {'name': filename, 'modifiedTime': Utils.convert_timestamp_datetime(modified_timestamp),
-                         'parents': [folder_id]}
-
-        # File definitions for upload
-        media = MediaFileUpload(local_absolute_path)
+        modified_time = Utils.convert_timestamp_datetime(modified_timestamp)
 
         # Send POST request for upload API
         try:
+            with compressed_upload(local_absolute_path, self.compression,
+                                   self.compression_stats) as (send_path, encoding):
+                if update != False:
+                    # Always set the encoding, a None value clears the one of an older upload
+                    uploaded_file = self._call(self.backend.update_file, update, send_path, modified_time,
+                                               {ENCODING_KEY: encoding})
+                else:
+                    uploaded_file = self._call(self.backend.create_file, filename, folder_id, send_path,
+                                               modified_time, {ENCODING_KEY: encoding} if encoding else None)
+
             if update != False:
-                uploaded_file = self.__service.files().update(fileId=update, media_body=media).execute()
                 print("\nRemote file '{}' updated successfully in folder '{}'.".format(filename, local_absolute_path))
             else:
-                uploaded_file = self.__service.files().create(body=file_metadata, media_body=media,
-                                                              fields='id').execute()
                 print("\nFile '{}' uploaded successfully in folder '{}'.".format(filename, local_absolute_path))
 
             return uploaded_file
@@ -174,12 +230,9 @@ class Drive:
 
     # Create folder with respective parent Folder ID
     def upload_folder(self, foldername, folder_id):
-        # Custom folder metadata for upload
-        folder_metadata = {'name': foldername, 'parents': [folder_id], 'mimeType': 'application/vnd.google-apps.folder'}
-
         try:
             # Send POST request for upload API
-            uploaded_folder = self.__service.files().create(body=folder_metadata).execute()
+            uploaded_folder = self._call(self.backend.create_folder, foldername, folder_id)
             print('\nRemote folder created: {}'.format(uploaded_folder['name']))
 
             return uploaded_folder['id']
@@ -201,88 +254,45 @@ class Drive:
 
     # Recursive method to synchronize all folder and files
     def synchronize(self, local_path, folder_id):
-        print("------------- Synchronizing folder '{}' -------------".format(local_path), end="\r")
+        SyncEngine(self).synchronize(local_path, folder_id)
 
-        # Check if local path exists, if not, creates folder
-        if not os.path.exists(local_path):
-            os.makedirs(local_path)
+    # SyncTarget interface, on top of the Drive requests above
+    def list_entries(self, folder_id):
+        entries = []
+        for item in self.list_files(folder_id)['all']:
+            modified = Utils.convert_datetime_timestamp(item['modifiedTime'])
+            if item.get('md5Checksum'):
+                self.__listed[item['id']] = (item['md5Checksum'], modified)
+            entries.append({'id': item['id'], 'name': item['name'], 'modified': modified,
+                            'is_folder': item['mimeType'] == FOLDER_MIME_TYPE, 'size': int(item.get('size', 0))})
+        return entries
 
-        # List remote and local files
-        drive_files = self.list_files(folder_id)
-        local_files = Utils.list_local_files(local_path)
+    def create_folder(self, name, parent_id):
+        return self.upload_folder(name, parent_id)
 
-        # Compare files with same name in both origins and check which is newer, updating
-        same_files = list(set(drive_files['names']) & set(local_files))
-        for sm_file in same_files:
-            local_absolute_path = pathlib.Path(f"{local_path}") / f"{sm_file}"
+    def upload(self, local_path, name, parent_id, file_id=None):
+        return self.upload_file(name, Path(local_path).parent, parent_id, file_id or False)
 
-            remote_file_data = next(
-                item for item in drive_files['all'] if item["name"] == sm_file)  # Filter to respective file
-            remote_file_data["modifiedTime"] = Utils.convert_datetime_timestamp(remote_file_data["modifiedTime"])
+    def download(self, file_id, local_path, update=False):
+        self.download_file(Path(local_path).name, Path(local_path).parent, file_id, update)
 
-            local_file_data = {}
-            local_file_data["name"] = sm_file
-            local_file_data["modifiedTime"] = Utils.get_local_file_timestamp(local_absolute_path)
+    def delete(self, file_id):
+        self.delete_file_or_folder(file_id)
 
-            # Checks if files were modified on any origin
-            modified = self.compare_files(local_file_data, remote_file_data)
-
-            if modified == 'local':
-                if os.path.isdir(local_absolute_path):
-                    self.synchronize(local_absolute_path, remote_file_data['id'])
-                else:
-                    self.upload_file(sm_file, local_path, folder_id, remote_file_data['id'])
-
-            elif modified == 'remote':
-                if remote_file_data["mimeType"] == 'application/vnd.google-apps.folder':
-                    self.synchronize(local_absolute_path, remote_file_data['id'])
-                else:
-                    self.download_file(sm_file, local_path, remote_file_data['id'], True)
-
-        # Compare different files in both origins and download/upload what is needed
-        different_files = list(set(drive_files['names']) ^ set(local_files))
-        for diff_file in different_files:
-            # IF file is only on Google Drive (DOWNLOAD)
-            if diff_file in drive_files['names']:
-                for remote_file in drive_files['all']:
-                    if remote_file['name'] == diff_file:
-                        if remote_file['mimeType'] == 'application/vnd.google-apps.folder':
-                            local_absolute_path = Path(f"{local_path}") / f"{diff_file}"
-                            self.synchronize(local_absolute_path,
-                                             remote_file['id'])  # Recursive to download files inside folders
-                        else:
-                            self.download_file(remote_file['name'], local_path, remote_file['id'])
-
-            # IF file is only on local (UPLOAD)
-            else:
-                local_absolute_path = Path(f"{local_path}") / f"{diff_file}"
-
-                # Check if path redirects to a file or folder
-                if os.path.isdir(local_absolute_path):
-                    created_folder_id = self.upload_folder(diff_file, folder_id)
-                    if created_folder_id != False:
-                        self.synchronize(local_absolute_path,
-                                         created_folder_id)  # Recursive to upload files inside folders
-                else:
-                    self.upload_file(diff_file, local_path, folder_id)
+    def find_folder(self, folder_name):
+        return self._call(self.backend.find_folder, folder_name, 'root')
 
     # Check if folder exists, if not, create it
     def get_or_create_folder(self, folder_name):
         # Search for the folder in the root directory (parent is 'root')
-        query = f"name = '{folder_name}' and mimeType = 'application/vnd.google-apps.folder' and 'root' in parents"
-        response = self.__service.files().list(q=query, fields='files(id, name)').execute()
-        files = response.get('files', [])
+        folder_id = self.find_folder(folder_name)
 
-        if files:
+        if folder_id:
             # Folder exists, return its ID
-            folder_id = files[0]['id']
             print(f"Folder '{folder_name}' found with ID: {folder_id}")
             return folder_id
         else:
             # Folder does not exist, create it
-            folder_metadata = {'name': folder_name, 'mimeType': 'application/vnd.google-apps.folder',
-                               'parents': ['root']}
-            created_folder = self.__service.files().create(body=folder_metadata, fields='id').execute()
-            folder_id = created_folder['id']
+            folder_id = self._call(self.backend.create_folder, folder_name, 'root')['id']
             print(f"Folder '{folder_name}' created with ID: {folder_id}")
             return folder_id
@@ -0,0 +1,1505 @@
+import re
+import sys
+
+from src.utils.Clipboard import Registers
+from src.utils.Ex import Ex
+
+NORMAL = 'normal'
+INSERT = 'insert'
+VISUAL = 'visual'
+VISUAL_LINE = 'visual line'
+COMMAND = 'command'
+
+ESCAPE = '<esc>'
+ENTER = '<cr>'
+BACKSPACE = '<bs>'
+DELETE = '<del>'
+TAB = '<tab>'
+# Typed "<" is written <lt>, so a key text like "<esc>" stays unambiguous
+LESS_THAN = '<lt>'
+
+KEY_PATTERN = re.compile(r'<[^<>\s]+>|.', re.S)
+BRACKETS = {'(': ')', '[': ']', '{': '}'}
+CLOSING_BRACKETS = {closing: opening for opening, closing in BRACKETS.items()}
+# Column j and k aim for after $
+END_OF_LINE = sys.maxsize
+
+
+# Keys of a key text like "dw" or "ihello<esc>"
+def parse_keys(text):
+    return KEY_PATTERN.findall(text)
+
+
+def key_text(keys):
+    return "".join(keys)
+
+
+# Text a key types in insert mode, None for keys that type nothing
+def typed_text(key, tab="\t"):
+    if key == LESS_THAN:
+        return "<"
+    if key == ENTER:
+        return "\n"
+    if key == TAB:
+        return tab
+    if len(key) == 1:
+        return key
+    return None
+
+
+# 0 for blanks, 1 for word characters, 2 for punctuation; WORDs only tell blanks apart
+def char_class(char, big=False):
+    if char.isspace():
+        return 0
+    if big or char.isalnum() or char == '_':
+        return 1
+    return 2
+
+
+def first_non_blank(line):
+    stripped = len(line) - len(line.lstrip())
+    return stripped if stripped < len(line) else max(len(line) - 1, 0)
+
+
+class LineBuffer:
+    # Text as a list of lines, with the editing primitives the engine needs and
+    # an undo history of its own. Macros and repeats run on one of these, away
+    # from the widget; locations are (row, column) pairs, like TextArea's.
+    def __init__(self, text="", cursor=(0, 0), indent="    "):
+        self.lines = text.split("\n") if isinstance(text, str) else list(text) or [""]
+        self.cursor = cursor
+        self.indent = indent
+        self.__undo = []
+        self.__redo = []
+        self.__group = None
+
+    @property
+    def text(self):
+        return "\n".join(self.lines)
+
+    @property
+    def line_count(self):
+        return len(self.lines)
+
+    def line(self, row):
+        return self.lines[row]
+
+    def get_text(self, start, end):
+        (start_row, start_column), (end_row, end_column) = start, end
+        if start_row == end_row:
+            return self.lines[start_row][start_column:end_column]
+        return "\n".join([self.lines[start_row][start_column:]] + self.lines[start_row + 1:end_row]
+                         + [self.lines[end_row][:end_column]])
+
+    def __replace(self, start, end, text):
+        (start_row, start_column), (end_row, end_column) = start, end
+        before = self.lines[start_row][:start_column]
+        after = self.lines[end_row][end_column:]
+        new_lines = (before + text + after).split("\n")
+        self.lines[start_row:end_row + 1] = new_lines
+        return (start_row + len(new_lines) - 1, len(new_lines[-1]) - len(after))
+
+    # Replace the text from start to end, returning where the new text ends
+    def replace(self, start, end, text):
+        old_text = self.get_text(start, end)
+        new_end = self.__replace(start, end, text)
+        if self.__group is None:
+            self.__group = []
+            self.__undo.append(self.__group)
+        self.__group.append((start, new_end, old_text))
+        self.__redo.clear()
+        return new_end
+
+    def show(self, cursor, selection=None):
+        self.cursor = cursor
+
+    # The next edit starts a new undo step
+    def checkpoint(self):
+        self.__group = None
+
+    def undo(self):
+        return self.__swap(self.__undo, self.__redo)
+
+    def redo(self):
+        return self.__swap(self.__redo, self.__undo)
+
+    def __swap(self, source, destination):
+        self.__group = None
+        if not source:
+            return False
+        group = source.pop()
+        inverse = []
+        for start, end, text in reversed(group):
+            inverse.append((start, self.__replace(start, end, text), self.get_text(start, end)))
+        destination.append(inverse)
+        self.cursor = group[0][0]
+        return True
+
+    def shadow(self):
+        return self
+
+    def apply(self, shadow):
+        if shadow is self:
+            return
+        change = changed_lines(self.lines, shadow.lines)
+        if change is not None:
+            start, end, text = change
+            self.replace(start, end, text)
+        self.cursor = shadow.cursor
+
+
+class TextAreaBuffer:
+    # The engine's view of a TextArea: edits go through the widget, so they
+    # reach its undo history, the swap journal and the screen. Repeats and
+    # macros run on a LineBuffer copy of the lines and come back as one edit.
+    def __init__(self, text_area):
+        self.text_area = text_area
+
+    @property
+    def line_count(self):
+        return self.text_area.document.line_count
+
+    @property
+    def cursor(self):
+        return self.text_area.cursor_location
+
+    @property
+    def indent(self):
+        text_area = self.text_area
+        return "\t" if text_area.indent_type == "tabs" else " " * text_area.indent_width
+
+    def line(self, row):
+        return self.text_area.document.get_line(row)
+
+    def get_text(self, start, end):
+        return self.text_area.document.get_text_range(start, end)
+
+    def replace(self, start, end, text):
+        return self.text_area.replace(text, start, end, maintain_selection_offset=False).end_location
+
+    def show(self, cursor, selection=None):
+        self.text_area.selection = selection or (cursor, cursor)
+        self.text_area.scroll_cursor_visible()
+
+    def checkpoint(self):
+        self.text_area.history.checkpoint()
+
+    def undo(self):
+        self.text_area.undo()
+
+    def redo(self):
+        self.text_area.redo()
+
+    def shadow(self):
+        # Only the list is copied; the lines themselves are shared
+        return LineBuffer(self.text_area.document.lines, self.cursor, self.indent)
+
+    # Write the lines that differ in shadow back as a single edit
+    def apply(self, shadow):
+        change = changed_lines(self.text_area.document.lines, shadow.lines)
+        if change is not None:
+            start, end, text = change
+            self.text_area.replace(text, start, end, maintain_selection_offset=False)
+        self.show(shadow.cursor)
+
+
+# The single replacement turning lines old into new, as (start, end, text);
+# None when they are the same
+def changed_lines(old, new):
+    shortest = min(len(old), len(new))
+    prefix = 0
+    while prefix < shortest and (old[prefix] is new[prefix] or old[prefix] == new[prefix]):
+        prefix += 1
+    suffix = 0
+    while (suffix < shortest - prefix
+           and (old[-1 - suffix] is new[-1 - suffix] or old[-1 - suffix] == new[-1 - suffix])):
+        suffix += 1
+    if prefix == len(old) == len(new):
+        return None
+    if prefix + suffix == shortest:
+        # Whole lines were added or removed: take a neighbour along, so both sides have a line
+        if prefix:
+            prefix -= 1
+        else:
+            suffix -= 1
+    last_row = len(old) - suffix - 1
+    return (prefix, 0), (last_row, len(old[last_row])), "\n".join(new[prefix:len(new) - suffix])
+
+
+class Motion:
+    # Moves the cursor: move(vim, location, count, char) returns the new
+    # location, or None when the motion fails. count is None when none was
+    # typed; char is the key read after the motion's own, for motions like f.
+    def __init__(self, move, linewise=False, inclusive=False, argument=False, keep_column=False, column=None):
+        self.move = move
+        self.linewise = linewise
+        self.inclusive = inclusive
+        self.argument = argument
+        # j and k aim for the column the cursor had before them
+        self.keep_column = keep_column
+        # Column later vertical motions aim for, instead of the one reached
+        self.column = column
+
+
+class TextObject:
+    # Selects text around the cursor for an operator or in visual mode:
+    # select(vim, location, count) returns (start, end, linewise) with end
+    # excluded, or None
+    def __init__(self, select):
+        self.select = select
+
+
+class Operator:
+    # Acts on the text a motion or text object went over:
+    # apply(vim, start, end, linewise, register), end excluded. line_key
+    # repeated right after the operator (dd, >>, guu) acts on whole lines.
+    def __init__(self, apply, line_key, change=True):
+        self.apply = apply
+        self.line_key = line_key
+        self.change = change
+
+
+class Action:
+    # Anything else: run(vim, count, char)
+    def __init__(self, run, change=False, argument=False):
+        self.run = run
+        self.change = change
+        self.argument = argument
+
+
+class Shortcut:
+    # A key standing for an operator and motion, like x for dl; a motion key of
+    # None stands for the operator's line form
+    def __init__(self, operator, motion=None):
+        self.operator = operator
+        self.motion = motion
+
+
+class Keymap:
+    # Key sequences compiled into a trie of dicts, so dispatching costs one
+    # lookup per key whatever the number of bindings
+    def __init__(self, bindings=None):
+        self.root = {}
+        for keys, command in (bindings or {}).items():
+            self.bind(keys, command)
+
+    def bind(self, keys, command):
+        node = self.root
+        keys = parse_keys(keys)
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+            if not isinstance(node, dict):
+                raise ValueError(f"{key_text(keys)!r} extends a shorter binding")
+        if isinstance(node.get(keys[-1]), dict):
+            raise ValueError(f"{key_text(keys)!r} is the prefix of a longer binding")
+        node[keys[-1]] = command
+
+    def lookup(self, keys):
+        node = self.root
+        for key in parse_keys(keys):
+            node = node[key]
+        return node
+
+
+# Motions
+
+def move_left(vim, location, count, char):
+    row, column = location
+    if column == 0:
+        return None
+    return (row, max(column - (count or 1), 0))
+
+
+def move_right(vim, location, count, char):
+    row, column = location
+    length = len(vim.buffer.line(row))
+    last = length if vim.operator is not None else length - 1
+    if column >= last:
+        return None
+    return (row, min(column + (count or 1), last))
+
+
+def move_down(vim, location, count, char):
+    row = min(location[0] + (count or 1), vim.buffer.line_count - 1)
+    return (row, vim.column_for(row)) if row != location[0] else None
+
+
+def move_up(vim, location, count, char):
+    row = max(location[0] - (count or 1), 0)
+    return (row, vim.column_for(row)) if row != location[0] else None
+
+
+def line_start(vim, location, count, char):
+    return (location[0], 0)
+
+
+def line_first_char(vim, location, count, char):
+    return (location[0], first_non_blank(vim.buffer.line(location[0])))
+
+
+def line_end(vim, location, count, char):
+    row = min(location[0] + (count or 1) - 1, vim.buffer.line_count - 1)
+    return (row, max(len(vim.buffer.line(row)) - 1, 0))
+
+
+def next_line_start(vim, location, count, char):
+    row = location[0] + (count or 1)
+    if row >= vim.buffer.line_count:
+        return None
+    return (row, first_non_blank(vim.buffer.line(row)))
+
+
+def previous_line_start(vim, location, count, char):
+    row = location[0] - (count or 1)
+    if row < 0:
+        return None
+    return (row, first_non_blank(vim.buffer.line(row)))
+
+
+def goto_line(vim, location, count, char, default=None):
+    last = vim.buffer.line_count - 1
+    row = min(count - 1, last) if count else (last if default is None else default)
+    return (row, first_non_blank(vim.buffer.line(row)))
+
+
+def word_forward(vim, location, count, char, big=False):
+    buffer = vim.buffer
+    row, column = location
+    last_row = buffer.line_count - 1
+    line = buffer.line(row)
+    if row == last_row and column >= len(line) - 1 and vim.operator is None:
+        return None
+    steps = count or 1
+    for step in range(steps):
+        start_row, start_line = row, line
+        if column < len(line):
+            kind = char_class(line[column], big)
+            while kind and column < len(line) and char_class(line[column], big) == kind:
+                column += 1
+        while True:
+            if column >= len(line):
+                if row == last_row:
+                    return (row, len(line))
+                row, column = row + 1, 0
+                line = buffer.line(row)
+                if not line:
+                    break
+            elif line[column].isspace():
+                column += 1
+            else:
+                break
+        if vim.operator is not None and step == steps - 1 and row != start_row:
+            # An operator stops at the end of the last word, not on the next line
+            return (start_row, len(start_line))
+    return (row, column)
+
+
+def word_end(vim, location, count, char, big=False):
+    buffer = vim.buffer
+    row, column = location
+    last_row = buffer.line_count - 1
+    line = buffer.line(row)
+    for _ in range(count or 1):
+        column += 1
+        while True:
+            if column >= len(line):
+                if row == last_row:
+                    end = (row, max(len(line) - 1, 0))
+                    return end if end > location else None
+                row, column = row + 1, 0
+                line = buffer.line(row)
+            elif line[column].isspace():
+                column += 1
+            else:
+                break
+        kind = char_class(line[column], big)
+        while column + 1 < len(line) and char_class(line[column + 1], big) == kind:
+            column += 1
+    return (row, column)
+
+
+def word_backward(vim, location, count, char, big=False):
+    buffer = vim.buffer
+    row, column = location
+    if location == (0, 0):
+        return None
+    line = buffer.line(row)
+    for _ in range(count or 1):
+        while True:
+            if column == 0:
+                if row == 0:
+                    return (0, 0)
+                row -= 1
+                line = buffer.line(row)
+                column = len(line)
+                if not line:
+                    break
+            elif line[column - 1].isspace():
+                column -= 1
+            else:
+                break
+        if not line:
+            continue
+        kind = char_class(line[column - 1], big)
+        while column > 0 and char_class(line[column - 1], big) == kind:
+            column -= 1
+    return (row, column)
+
+
+def find_char(vim, location, count, char, forward=True, till=False):
+    row, column = location
+    line = vim.buffer.line(row)
+    text = typed_text(char)
+    if text is None or text == "\n":
+        return None
+    position = column
+    for step in range(count or 1):
+        # t starts one further, so repeating it doesn't stick before the same character
+        skip = 1 if till and step == 0 else 0
+        if forward:
+            position = line.find(text, position + 1 + skip)
+        else:
+            position = line.rfind(text, 0, max(position - skip, 0))
+        if position < 0:
+            return None
+    if till:
+        position += -1 if forward else 1
+    return (row, position)
+
+
+def paragraph_forward(vim, location, count, char):
+    buffer = vim.buffer
+    row = location[0]
+    last = buffer.line_count - 1
+    if row == last:
+        return None
+    for _ in range(count or 1):
+        while row < last and not buffer.line(row):
+            row += 1
+        while row < last and buffer.line(row):
+            row += 1
+    line = buffer.line(row)
+    return (row, len(line)) if row == last and line else (row, 0)
+
+
+def paragraph_backward(vim, location, count, char):
+    buffer = vim.buffer
+    row = location[0]
+    if location == (0, 0):
+        return None
+    for _ in range(count or 1):
+        while row > 0 and not buffer.line(row):
+            row -= 1
+        while row > 0 and buffer.line(row):
+            row -= 1
+    return (row, 0)
+
+
+def chars_forward(buffer, row, column):
+    while row < buffer.line_count:
+        line = buffer.line(row)
+        for index in range(column, len(line)):
+            yield row, index, line[index]
+        row, column = row + 1, 0
+
+
+def chars_backward(buffer, row, column):
+    while row >= 0:
+        line = buffer.line(row)
+        for index in range(min(column, len(line) - 1), -1, -1):
+            yield row, index, line[index]
+        row -= 1
+        column = len(buffer.line(row)) - 1 if row >= 0 else 0
+
+
+# Location of the bracket matching the one at location
+def matching_bracket(buffer, location):
+    row, column = location
+    bracket = buffer.line(row)[column]
+    if bracket in BRACKETS:
+        other, chars = BRACKETS[bracket], chars_forward(buffer, row, column)
+    else:
+        other, chars = CLOSING_BRACKETS[bracket], chars_backward(buffer, row, column)
+    depth = 0
+    for found_row, found_column, found in chars:
+        if found == bracket:
+            depth += 1
+        elif found == other:
+            depth -= 1
+            if depth == 0:
+                return (found_row, found_column)
+    return None
+
+
+def match_pair(vim, location, count, char):
+    row, column = location
+    line = vim.buffer.line(row)
+    for index in range(column, len(line)):
+        if line[index] in BRACKETS or line[index] in CLOSING_BRACKETS:
+            return matching_bracket(vim.buffer, (row, index))
+    return None
+
+
+# Text objects
+
+def word_object(vim, location, count, inner=True, big=False):
+    row, column = location
+    line = vim.buffer.line(row)
+    if not line:
+        return ((row, 0), (row, 0), False)
+    column = min(column, len(line) - 1)
+    start = end = column
+    kind = char_class(line[column], big)
+    while start > 0 and char_class(line[start - 1], big) == kind:
+        start -= 1
+    while end < len(line) and char_class(line[end], big) == kind:
+        end += 1
+    for _ in range((count or 1) - 1):
+        if end >= len(line):
+            break
+        kind = char_class(line[end], big)
+        while end < len(line) and char_class(line[end], big) == kind:
+            end += 1
+    if not inner:
+        if kind:
+            trailing = end
+            while trailing < len(line) and line[trailing].isspace():
+                trailing += 1
+            if trailing > end:
+                end = trailing
+            else:
+                while start > 0 and line[start - 1].isspace():
+                    start -= 1
+        elif end < len(line):
+            kind = char_class(line[end], big)
+            while end < len(line) and char_class(line[end], big) == kind:
+                end += 1
+    return ((row, start), (row, end), False)
+
+
+def pair_object(vim, location, count, inner=True, opening='(', closing=')'):
+    buffer = vim.buffer
+    row, column = location
+    opened_at = None
+    depth = 0
+    for found_row, found_column, found in chars_backward(buffer, row, column):
+        if found == closing and (found_row, found_column) != location:
+            depth += 1
+        elif found == opening:
+            if depth == 0:
+                opened_at = (found_row, found_column)
+                break
+            depth -= 1
+    if opened_at is None:
+        return None
+    closed_at = matching_bracket(buffer, opened_at)
+    if closed_at is None:
+        return None
+    if inner:
+        return ((opened_at[0], opened_at[1] + 1), closed_at, False)
+    return (opened_at, (closed_at[0], closed_at[1] + 1), False)
+
+
+def quote_object(vim, location, count, inner=True, quote='"'):
+    row, column = location
+    line = vim.buffer.line(row)
+    quotes = [index for index, char in enumerate(line) if char == quote and (index == 0 or line[index - 1] != "\\")]
+    for opened_at, closed_at in zip(quotes[::2], quotes[1::2]):
+        if column <= closed_at:
+            break
+    else:
+        return None
+    if inner:
+        return ((row, opened_at + 1), (row, closed_at), False)
+    end = closed_at + 1
+    while end < len(line) and line[end].isspace():
+        end += 1
+    start = opened_at
+    if end == closed_at + 1:
+        while start > 0 and line[start - 1].isspace():
+            start -= 1
+    return ((row, start), (row, end), False)
+
+
+def paragraph_object(vim, location, count, inner=True):
+    buffer = vim.buffer
+    row = location[0]
+    last = buffer.line_count - 1
+    blank = not buffer.line(row)
+    start = end = row
+    while start > 0 and (not buffer.line(start - 1)) == blank:
+        start -= 1
+    while end < last and (not buffer.line(end + 1)) == blank:
+        end += 1
+    if not inner:
+        while end < last and not buffer.line(end + 1):
+            end += 1
+    return ((start, 0), (end, len(buffer.line(end))), True)
+
+
+# Operators
+
+def delete_operator(vim, start, end, linewise, register):
+    vim.store(start, end, linewise, register, cut=True)
+    vim.remove(start, end, linewise)
+    if linewise:
+        row = min(start[0], vim.buffer.line_count - 1)
+        vim.cursor = (row, first_non_blank(vim.buffer.line(row)))
+    else:
+        vim.cursor = start
+
+
+def yank_operator(vim, start, end, linewise, register):
+    vim.store(start, end, linewise, register)
+    vim.cursor = (start[0], vim.cursor[1]) if linewise else start
+
+
+def change_operator(vim, start, end, linewise, register):
+    vim.store(start, end, linewise, register, cut=True)
+    if linewise:
+        end = (end[0], len(vim.buffer.line(end[0])))
+        start = (start[0], 0)
+    vim.cursor = vim.buffer.replace(start, end, "") if start != end else start
+    vim.enter_insert()
+
+
+def shift_lines(vim, start, end, register, right=True):
+    buffer = vim.buffer
+    indent = buffer.indent
+    for row in range(start[0], end[0] + 1):
+        line = buffer.line(row)
+        if right:
+            if line:
+                buffer.replace((row, 0), (row, 0), indent)
+        else:
+            blanks = len(line) - len(line.lstrip(" \t"))
+            width = 1 if line[:1] == "\t" else min(blanks, len(indent))
+            if width:
+                buffer.replace((row, 0), (row, width), "")
+    vim.cursor = (start[0], first_non_blank(buffer.line(start[0])))
+
+
+def indent_operator(vim, start, end, linewise, register):
+    shift_lines(vim, start, end, register, right=True)
+
+
+def dedent_operator(vim, start, end, linewise, register):
+    shift_lines(vim, start, end, register, right=False)
+
+
+def case_operator(convert):
+    def apply(vim, start, end, linewise, register):
+        if linewise:
+            start, end = (start[0], 0), (end[0], len(vim.buffer.line(end[0])))
+        text = vim.buffer.get_text(start, end)
+        converted = convert(text)
+        if converted != text:
+            vim.buffer.replace(start, end, converted)
+        vim.cursor = start
+    return apply
+
+
+# Actions
+
+def insert_before(vim, count, char):
+    vim.enter_insert(count)
+
+
+def insert_after(vim, count, char):
+    row, column = vim.cursor
+    if vim.buffer.line(row):
+        vim.cursor = (row, column + 1)
+    vim.enter_insert(count)
+
+
+def insert_line_start(vim, count, char):
+    vim.cursor = (vim.cursor[0], first_non_blank(vim.buffer.line(vim.cursor[0])))
+    vim.enter_insert(count)
+
+
+def insert_line_end(vim, count, char):
+    vim.cursor = (vim.cursor[0], len(vim.buffer.line(vim.cursor[0])))
+    vim.enter_insert(count)
+
+
+def open_line_below(vim, count, char):
+    row = vim.cursor[0]
+    vim.cursor = vim.buffer.replace((row, len(vim.buffer.line(row))), (row, len(vim.buffer.line(row))), "\n")
+    vim.enter_insert(count)
+
+
+def open_line_above(vim, count, char):
+    row = vim.cursor[0]
+    vim.buffer.replace((row, 0), (row, 0), "\n")
+    vim.cursor = (row, 0)
+    vim.enter_insert(count)
+
+
+def put_text(vim, count, char, before=False):
+    text = vim.registers.paste(vim.register)
+    if not text:
+        return False
+    buffer = vim.buffer
+    row, column = vim.cursor
+    if text.endswith("\n"):
+        # Whole lines go above or below the cursor line
+        lines = "\n".join([text[:-1]] * (count or 1))
+        if before:
+            buffer.replace((row, 0), (row, 0), lines + "\n")
+        else:
+            end = (row, len(buffer.line(row)))
+            buffer.replace(end, end, "\n" + lines)
+            row += 1
+        vim.cursor = (row, first_non_blank(buffer.line(row)))
+    else:
+        if not before and buffer.line(row):
+            column += 1
+        end = buffer.replace((row, column), (row, column), text * (count or 1))
+        vim.cursor = (end[0], max(end[1] - 1, 0))
+
+
+def put_before(vim, count, char):
+    return put_text(vim, count, char, before=True)
+
+
+def join_lines(vim, count, char):
+    buffer = vim.buffer
+    row = vim.cursor[0]
+    joins = max((count or 2) - 1, 1)
+    if row + 1 >= buffer.line_count:
+        return False
+    for _ in range(min(joins, buffer.line_count - 1 - row)):
+        line = buffer.line(row)
+        following = buffer.line(row + 1).lstrip()
+        kept = line.rstrip()
+        separator = "" if not kept or not following or following.startswith(")") else " "
+        buffer.replace((row, len(kept)), (row + 1, len(buffer.line(row + 1)) - len(following)), separator)
+        vim.cursor = (row, len(kept))
+
+
+def replace_chars(vim, count, char):
+    row, column = vim.cursor
+    line = vim.buffer.line(row)
+    text = typed_text(char, vim.buffer.indent)
+    count = count or 1
+    if text is None or column + count > len(line):
+        return False
+    if text == "\n":
+        vim.buffer.replace((row, column), (row, column + count), "\n")
+        vim.cursor = (row + 1, 0)
+    else:
+        vim.buffer.replace((row, column), (row, column + count), text * count)
+        vim.cursor = (row, column + count - 1)
+
+
+def toggle_case(vim, count, char):
+    row, column = vim.cursor
+    line = vim.buffer.line(row)
+    if not line:
+        return False
+    end = min(column + (count or 1), len(line))
+    text = line[column:end]
+    if text.swapcase() != text:
+        vim.buffer.replace((row, column), (row, end), text.swapcase())
+    vim.cursor = (row, min(end, len(line) - 1))
+
+
+def undo(vim, count, char):
+    for _ in range(count or 1):
+        vim.buffer.undo()
+    vim.cursor = vim.buffer.cursor
+
+
+def redo(vim, count, char):
+    for _ in range(count or 1):
+        vim.buffer.redo()
+    vim.cursor = vim.buffer.cursor
+
+
+def repeat_change(vim, count, char):
+    vim.repeat(count)
+
+
+def record_macro(vim, count, char):
+    return vim.start_recording(char)
+
+
+def play_macro(vim, count, char):
+    return vim.play(char, count)
+
+
+def visual_mode(vim, count, char):
+    vim.enter_visual(VISUAL)
+
+
+def visual_line_mode(vim, count, char):
+    vim.enter_visual(VISUAL_LINE)
+
+
+def swap_anchor(vim, count, char):
+    vim.anchor, vim.cursor = vim.cursor, vim.anchor
+
+
+def command_line(vim, count, char):
+    vim.enter_command()
+
+
+def escape(vim, count, char):
+    vim.leave_visual()
+
+
+MOTIONS = {
+    "h": Motion(move_left),
+    "<left>": Motion(move_left),
+    "<bs>": Motion(move_left),
+    "l": Motion(move_right),
+    "<right>": Motion(move_right),
+    " ": Motion(move_right),
+    "j": Motion(move_down, linewise=True, keep_column=True),
+    "<down>": Motion(move_down, linewise=True, keep_column=True),
+    "k": Motion(move_up, linewise=True, keep_column=True),
+    "<up>": Motion(move_up, linewise=True, keep_column=True),
+    "0": Motion(line_start),
+    "<home>": Motion(line_start),
+    "^": Motion(line_first_char),
+    "$": Motion(line_end, inclusive=True, column=END_OF_LINE),
+    "<end>": Motion(line_end, inclusive=True, column=END_OF_LINE),
+    "<cr>": Motion(next_line_start, linewise=True),
+    "+": Motion(next_line_start, linewise=True),
+    "-": Motion(previous_line_start, linewise=True),
+    "gg": Motion(lambda vim, location, count, char: goto_line(vim, location, count, char, 0), linewise=True),
+    "G": Motion(goto_line, linewise=True),
+    "w": Motion(word_forward),
+    "W": Motion(lambda vim, location, count, char: word_forward(vim, location, count, char, big=True)),
+    "b": Motion(word_backward),
+    "B": Motion(lambda vim, location, count, char: word_backward(vim, location, count, char, big=True)),
+    "e": Motion(word_end, inclusive=True),
+    "E": Motion(lambda vim, location, count, char: word_end(vim, location, count, char, big=True), inclusive=True),
+    "f": Motion(find_char, inclusive=True, argument=True),
+    "F": Motion(lambda vim, location, count, char: find_char(vim, location, count, char, forward=False),
+                argument=True),
+    "t": Motion(lambda vim, location, count, char: find_char(vim, location, count, char, till=True),
+                inclusive=True, argument=True),
+    "T": Motion(lambda vim, location, count, char: find_char(vim, location, count, char, forward=False, till=True),
+                argument=True),
+    # Stand for the last f, F, t or T, forwards and backwards; resolved by the engine
+    ";": Motion(None),
+    ",": Motion(None),
+    "}": Motion(paragraph_forward),
+    "{": Motion(paragraph_backward),
+    "%": Motion(match_pair, inclusive=True),
+}
+FIND_MOTIONS = {key: MOTIONS[key] for key in "fFtT"}
+FIND_KEYS = {motion: key for key, motion in FIND_MOTIONS.items()}
+
+TEXT_OBJECTS = {
+    "iw": TextObject(lambda vim, location, count: word_object(vim, location, count)),
+    "aw": TextObject(lambda vim, location, count: word_object(vim, location, count, inner=False)),
+    "iW": TextObject(lambda vim, location, count: word_object(vim, location, count, big=True)),
+    "aW": TextObject(lambda vim, location, count: word_object(vim, location, count, inner=False, big=True)),
+    "ip": TextObject(lambda vim, location, count: paragraph_object(vim, location, count)),
+    "ap": TextObject(lambda vim, location, count: paragraph_object(vim, location, count, inner=False)),
+}
+for _keys, (_opening, _closing) in {"(": "()", ")": "()", "b": "()", "[": "[]", "]": "[]", "{": "{}",
+                                    "}": "{}", "B": "{}", "<lt>": "<>", ">": "<>"}.items():
+    for _inner, _prefix in ((True, "i"), (False, "a")):
+        TEXT_OBJECTS[_prefix + _keys] = TextObject(
+            lambda vim, location, count, inner=_inner, opening=_opening, closing=_closing:
+            pair_object(vim, location, count, inner, opening, closing))
+for _quote in "\"'`":
+    for _inner, _prefix in ((True, "i"), (False, "a")):
+        TEXT_OBJECTS[_prefix + _quote] = TextObject(
+            lambda vim, location, count, inner=_inner, quote=_quote: quote_object(vim, location, count, inner, quote))
+
+OPERATORS = {
+    "d": Operator(delete_operator, "d"),
+    "c": Operator(change_operator, "c"),
+    "y": Operator(yank_operator, "y", change=False),
+    ">": Operator(indent_operator, ">"),
+    "<lt>": Operator(dedent_operator, "<lt>"),
+    "g~": Operator(case_operator(str.swapcase), "~"),
+    "gu": Operator(case_operator(str.lower), "u"),
+    "gU": Operator(case_operator(str.upper), "U"),
+}
+
+ACTIONS = {
+    "i": Action(insert_before, change=True),
+    "<insert>": Action(insert_before, change=True),
+    "a": Action(insert_after, change=True),
+    "I": Action(insert_line_start, change=True),
+    "A": Action(insert_line_end, change=True),
+    "o": Action(open_line_below, change=True),
+    "O": Action(open_line_above, change=True),
+    "p": Action(put_text, change=True),
+    "P": Action(put_before, change=True),
+    "J": Action(join_lines, change=True),
+    "r": Action(replace_chars, change=True, argument=True),
+    "~": Action(toggle_case, change=True),
+    "u": Action(undo),
+    "<c-r>": Action(redo),
+    ".": Action(repeat_change),
+    "q": Action(record_macro, argument=True),
+    "@": Action(play_macro, argument=True),
+    "v": Action(visual_mode),
+    "V": Action(visual_line_mode),
+    ":": Action(command_line),
+    "<esc>": Action(escape),
+}
+
+SHORTCUTS = {
+    "x": Shortcut("d", "l"),
+    "<del>": Shortcut("d", "l"),
+    "X": Shortcut("d", "h"),
+    "D": Shortcut("d", "$"),
+    "C": Shortcut("c", "$"),
+    "s": Shortcut("c", "l"),
+    "S": Shortcut("c"),
+    "Y": Shortcut("y"),
+}
+
+VISUAL_ACTIONS = {
+    "x": Shortcut("d"),
+    "<del>": Shortcut("d"),
+    "s": Shortcut("c"),
+    "~": Shortcut("g~"),
+    "u": Shortcut("gu"),
+    "U": Shortcut("gU"),
+    "J": Action(join_lines, change=True),
+    "o": Action(swap_anchor),
+    "v": Action(visual_mode),
+    "V": Action(visual_line_mode),
+    ":": Action(command_line),
+    "<esc>": Action(escape),
+}
+
+NORMAL_KEYMAP = Keymap({**MOTIONS, **OPERATORS, **ACTIONS, **SHORTCUTS})
+PENDING_KEYMAP = Keymap({**MOTIONS, **TEXT_OBJECTS})
+VISUAL_KEYMAP = Keymap({**MOTIONS, **TEXT_OBJECTS, **OPERATORS, **VISUAL_ACTIONS})
+
+
+class Vim:
+    # Modal editing on a buffer (a LineBuffer or a TextAreaBuffer): normal,
+    # insert, visual (by character or by line) and command-line modes, driven
+    # one key at a time through feed(). Keys are characters, or names like
+    # <esc>, <cr> and <c-r>. Commands are [count]["x]operator[count]motion,
+    # [count]["x]action and the like, looked up in keymap tries. Registers
+    # follow Clipboard's interface; macros are kept apart from them. Repeats
+    # (.) and macros (@x) run on a LineBuffer copy of the lines, come back as
+    # a single edit and stop at the first failing command, as Vim's do.
+    # With native_insert the keys typed in insert mode are only recorded, and
+    # feed() returns False so the widget inserts them itself. Lines entered
+    # after : are handed to on_command(vim, text), which can run them as ex
+    # commands through execute().
+    def __init__(self, buffer, registers=None, on_command=None, native_insert=False):
+        self.buffer = buffer
+        self.ex = Ex()
+        self.registers = registers if registers is not None else Registers()
+        self.on_command = on_command
+        self.native_insert = native_insert
+        self.mode = NORMAL
+        self.cursor = buffer.cursor
+        self.anchor = None
+        self.command_text = ""
+        self.marks = {}
+        self.macros = {}
+        self.last_find = None
+        self.failed = False
+        self.register = None
+        self.operator = None
+        self.__node = NORMAL_KEYMAP.root
+        self.__keys = []
+        self.__count = ""
+        self.__motion_count = ""
+        self.__argument = None
+        self.__column = 0
+        self.__changing = False
+        self.__insert_count = 1
+        self.__insert_keys = []
+        self.__dot = None
+        self.__recording = None
+        self.__appending = False
+        self.__macro_keys = []
+        self.__last_macro = None
+        self.__replaying = 0
+
+    @property
+    def recording(self):
+        return self.__recording
+
+    # Keys of the command in progress
+    @property
+    def pending(self):
+        return key_text(self.__keys)
+
+    # Mode line text, like "-- INSERT --" or the command being typed
+    def status(self):
+        if self.mode == COMMAND:
+            return ":" + self.command_text
+        text = {INSERT: "-- INSERT --", VISUAL: "-- VISUAL --", VISUAL_LINE: "-- VISUAL LINE --"}.get(self.mode, "")
+        if self.__recording is not None:
+            text = f"{text} recording @{self.__recording}".strip()
+        return text
+
+    # Column vertical motions aim for on row
+    def column_for(self, row):
+        return min(self.__column, max(len(self.buffer.line(row)) - 1, 0))
+
+    def run_keys(self, text):
+        for key in parse_keys(text):
+            self.feed(key)
+
+    # Handle one key; False when the widget should handle it instead
+    def feed(self, key):
+        if self.__recording is not None and not self.__replaying:
+            self.__macro_keys.append(key)
+        return self.__feed(key)
+
+    def __feed(self, key):
+        if self.mode == INSERT:
+            return self.__insert_key(key)
+        if self.mode == COMMAND:
+            return self.__command_key(key)
+
+        idle = not self.__keys
+        if idle:
+            self.failed = False
+            if self.mode == NORMAL and not self.__replaying:
+                # The cursor may have moved with the mouse or the arrow keys
+                self.cursor = self.__clamp(self.buffer.cursor)
+        self.__keys.append(key)
+
+        if self.__argument is not None:
+            callback, self.__argument = self.__argument, None
+            if key == ESCAPE:
+                return self.__reset()
+            return callback(key)
+
+        root = self.__root()
+        if self.__node is root:
+            if key.isdigit() and len(key) == 1 and (key != "0" or self.__current_count()):
+                if self.operator is None:
+                    self.__count += key
+                else:
+                    self.__motion_count += key
+                return True
+            if key == '"' and self.operator is None:
+                self.__argument = self.__set_register
+                return True
+            if self.operator is not None and key == self.operator.line_key:
+                return self.__operate(self.operator, None)
+
+        command = self.__node.get(key)
+        if command is None:
+            self.__reset()
+            self.failed = True
+            # Unknown keys like <c-s> are left to the widget when nothing is pending
+            return not (idle and len(key) > 1 and key != LESS_THAN)
+        if isinstance(command, dict):
+            self.__node = command
+            return True
+        self.__node = self.__root()
+        return self.__run(command)
+
+    def __root(self):
+        if self.operator is not None:
+            return PENDING_KEYMAP.root
+        if self.mode in (VISUAL, VISUAL_LINE):
+            return VISUAL_KEYMAP.root
+        return NORMAL_KEYMAP.root
+
+    def __current_count(self):
+        return self.__motion_count if self.operator is not None else self.__count
+
+    def __set_register(self, key):
+        self.register = typed_text(key)
+        return True
+
+    # Count typed for the command: the product of the operator's and the motion's
+    def __total_count(self):
+        counts = [int(count) for count in (self.__count, self.__motion_count) if count]
+        if not counts:
+            return None
+        total = 1
+        for count in counts:
+            total *= count
+        return total
+
+    def __clamp(self, location):
+        row = min(max(location[0], 0), self.buffer.line_count - 1)
+        length = len(self.buffer.line(row))
+        last = length if self.mode == INSERT else max(length - 1, 0)
+        return (row, min(max(location[1], 0), last))
+
+    def __run(self, command):
+        if command is ACTIONS["q"] and self.__recording is not None:
+            self.stop_recording()
+            return self.__done(change=False)
+        if getattr(command, "argument", False):
+            self.__argument = lambda key: self.__run_with(command, key)
+            return True
+        return self.__run_with(command, None)
+
+    def __run_with(self, command, char):
+        if isinstance(command, Motion):
+            return self.__motion(command, char)
+        if isinstance(command, TextObject):
+            return self.__text_object(command)
+        if isinstance(command, Operator):
+            if self.mode in (VISUAL, VISUAL_LINE):
+                return self.__visual_operate(command)
+            self.operator = command
+            self.__node = PENDING_KEYMAP.root
+            return True
+        if isinstance(command, Shortcut):
+            operator = OPERATORS[command.operator]
+            if self.mode in (VISUAL, VISUAL_LINE):
+                return self.__visual_operate(operator)
+            return self.__operate(operator, MOTIONS[command.motion] if command.motion else None)
+        return self.__action(command, char)
+
+    def __motion(self, motion, char):
+        if motion is MOTIONS[";"] or motion is MOTIONS[","]:
+            if self.last_find is None:
+                return self.__fail()
+            key, char = self.last_find
+            motion = FIND_MOTIONS[key.swapcase() if motion is MOTIONS[","] else key]
+        elif motion in FIND_KEYS:
+            self.last_find = (FIND_KEYS[motion], char)
+        if self.operator is not None:
+            return self.__operate(self.operator, motion, char)
+        target = motion.move(self, self.cursor, self.__total_count(), char)
+        if target is None:
+            return self.__fail()
+        self.cursor = self.__clamp(target)
+        if motion.column is not None:
+            self.__column = motion.column
+        elif not motion.keep_column:
+            self.__column = self.cursor[1]
+        return self.__done(change=False)
+
+    def __text_object(self, text_object):
+        selected = text_object.select(self, self.cursor, self.__total_count())
+        if selected is None:
+            return self.__fail()
+        start, end, linewise = selected
+        if self.operator is not None:
+            return self.__apply(self.operator, start, end, linewise)
+        # In visual mode the object becomes the selection
+        if linewise and self.mode == VISUAL:
+            self.mode = VISUAL_LINE
+        self.anchor = start
+        self.cursor = (end[0], max(end[1] - 1, 0)) if not linewise else (end[0], 0)
+        return self.__done(change=False)
+
+    # Apply operator from the cursor over motion, or over count lines when motion is None
+    def __operate(self, operator, motion, char=None):
+        self.operator = operator
+        count = self.__total_count()
+        start = self.cursor
+        if motion is None:
+            last = start[0] + (count or 1) - 1
+            if last >= self.buffer.line_count:
+                return self.__fail()
+            return self.__apply(operator, (start[0], 0), (last, len(self.buffer.line(last))), True)
+
+        if (operator is OPERATORS["c"] and motion in (MOTIONS["w"], MOTIONS["W"])
+                and start[1] < len(self.buffer.line(start[0]))
+                and not self.buffer.line(start[0])[start[1]].isspace()):
+            # cw changes to the end of the word, like ce
+            motion = MOTIONS["e"] if motion is MOTIONS["w"] else MOTIONS["E"]
+        target = motion.move(self, start, count, char)
+        if target is None:
+            return self.__fail()
+
+        start, end = sorted((start, target))
+        linewise = motion.linewise
+        if linewise:
+            start, end = (start[0], 0), (end[0], len(self.buffer.line(end[0])))
+        elif motion.inclusive:
+            end = (end[0], min(end[1] + 1, len(self.buffer.line(end[0]))))
+        elif end[1] == 0 and end[0] > start[0]:
+            # An exclusive motion ending at the start of a line stops at the end of the one before
+            end = (end[0] - 1, len(self.buffer.line(end[0] - 1)))
+            if start[1] <= first_non_blank(self.buffer.line(start[0])):
+                linewise = True
+                start = (start[0], 0)
+        return self.__apply(operator, start, end, linewise)
+
+    def __apply(self, operator, start, end, linewise):
+        if operator.change:
+            self.buffer.checkpoint()
+        operator.apply(self, start, end, linewise, self.register)
+        if self.mode != INSERT:
+            self.cursor = self.__clamp(self.cursor)
+        self.__column = self.cursor[1]
+        return self.__done(change=operator.change)
+
+    def __visual_operate(self, operator):
+        start, end, linewise = self.selection()
+        self.marks["<"], self.marks[">"] = start, (end[0], max(end[1] - 1, 0))
+        self.mode = NORMAL
+        self.anchor = None
+        if operator.change:
+            self.buffer.checkpoint()
+        operator.apply(self, start, end, linewise, self.register)
+        if self.mode != INSERT:
+            self.cursor = self.__clamp(self.cursor)
+        return self.__done(change=False)
+
+    def __action(self, action, char):
+        if action.change:
+            self.buffer.checkpoint()
+        if action.run(self, self.__total_count(), char) is False:
+            return self.__fail()
+        if self.mode == NORMAL:
+            self.cursor = self.__clamp(self.cursor)
+            self.__column = self.cursor[1]
+        return self.__done(change=action.change)
+
+    def __fail(self):
+        self.failed = True
+        self.__reset()
+        self.__show()
+        return True
+
+    def __reset(self):
+        self.__keys = []
+        self.__count = ""
+        self.__motion_count = ""
+        self.__argument = None
+        self.register = None
+        self.operator = None
+        self.__node = self.__root()
+        return True
+
+    def __done(self, change):
+        if change:
+            if self.mode == INSERT:
+                # The text typed is part of the change, up to <esc>
+                self.__changing = True
+            else:
+                self.__dot = list(self.__keys)
+        keys = self.__keys
+        self.__reset()
+        if self.__changing:
+            self.__keys = keys
+        self.__show()
+        return True
+
+    def __show(self):
+        if self.__replaying:
+            return
+        if self.mode in (VISUAL, VISUAL_LINE):
+            start, end, _ = self.selection()
+            forward = self.cursor >= self.anchor
+            self.buffer.show(self.cursor, (start, end) if forward else (end, start))
+        else:
+            self.buffer.show(self.cursor)
+
+    # Selected text in visual mode: (start, end, linewise), end excluded
+    def selection(self):
+        start, end = sorted((self.anchor, self.cursor))
+        if self.mode == VISUAL_LINE:
+            return ((start[0], 0), (end[0], len(self.buffer.line(end[0]))), True)
+        return (start, (end[0], min(end[1] + 1, len(self.buffer.line(end[0])))), False)
+
+    # Editing primitives for the commands
+
+    # Keep the text from start to end in the register being used
+    def store(self, start, end, linewise, register, cut=False):
+        text = self.buffer.get_text(start, end)
+        self.registers.copy(text + "\n" if linewise else text, register, cut)
+
+    def remove(self, start, end, linewise):
+        buffer = self.buffer
+        if not linewise:
+            buffer.replace(start, end, "")
+            return
+        first, last = start[0], end[0]
+        if last + 1 < buffer.line_count:
+            buffer.replace((first, 0), (last + 1, 0), "")
+        elif first > 0:
+            buffer.replace((first - 1, len(buffer.line(first - 1))), (last, len(buffer.line(last))), "")
+        else:
+            buffer.replace((0, 0), (last, len(buffer.line(last))), "")
+
+    def enter_insert(self, count=None):
+        self.mode = INSERT
+        self.__insert_count = count or 1
+        self.__insert_keys = []
+
+    def enter_visual(self, mode):
+        if self.mode == mode:
+            return self.leave_visual()
+        if self.mode == NORMAL:
+            self.anchor = self.cursor
+        self.mode = mode
+
+    def leave_visual(self):
+        if self.mode in (VISUAL, VISUAL_LINE):
+            start, end, _ = self.selection()
+            self.marks["<"], self.marks[">"] = start, (end[0], max(end[1] - 1, 0))
+            self.mode = NORMAL
+            self.anchor = None
+
+    def enter_command(self):
+        visual = self.mode in (VISUAL, VISUAL_LINE)
+        self.leave_visual()
+        self.mode = COMMAND
+        self.command_text = "'<,'>" if visual else ""
+
+    def __insert_key(self, key):
+        if self.__changing:
+            self.__keys.append(key)
+        if key == ESCAPE:
+            return self.__leave_insert()
+        self.__insert_keys.append(key)
+        if self.native_insert:
+            return False
+        self.__type(key)
+        return True
+
+    def __type(self, key):
+        buffer = self.buffer
+        row, column = self.cursor
+        if key == BACKSPACE:
+            if column:
+                self.cursor = (row, column - 1)
+                buffer.replace(self.cursor, (row, column), "")
+            elif row:
+                self.cursor = (row - 1, len(buffer.line(row - 1)))
+                buffer.replace(self.cursor, (row, 0), "")
+        elif key == DELETE:
+            if column < len(buffer.line(row)):
+                buffer.replace((row, column), (row, column + 1), "")
+            elif row + 1 < buffer.line_count:
+                buffer.replace((row, column), (row + 1, 0), "")
+        elif key in ("<left>", "<right>", "<up>", "<down>"):
+            target = MOTIONS[key].move(self, self.cursor, 1, None)
+            if target is not None:
+                self.cursor = (target[0], min(target[1] + (key == "<right>"), len(buffer.line(target[0]))))
+        else:
+            text = typed_text(key, buffer.indent)
+            if text is not None:
+                self.cursor = buffer.replace(self.cursor, self.cursor, text)
+
+    def __leave_insert(self):
+        if self.native_insert and not self.__replaying:
+            self.cursor = self.buffer.cursor
+        if self.__insert_count > 1:
+            # 3ihi<esc> types hi three times
+            native, self.native_insert = self.native_insert, False
+            try:
+                for _ in range(self.__insert_count - 1):
+                    for key in self.__insert_keys:
+                        self.__type(key)
+            finally:
+                self.native_insert = native
+        self.mode = NORMAL
+        row, column = self.cursor
+        self.cursor = self.__clamp((row, column - 1))
+        self.__column = self.cursor[1]
+        if self.__changing:
+            self.__dot = self.__keys
+            self.__changing = False
+        self.__keys = []
+        self.__show()
+        return True
+
+    def __command_key(self, key):
+        if key == ESCAPE:
+            self.mode = NORMAL
+            self.command_text = ""
+        elif key == BACKSPACE:
+            if not self.command_text:
+                self.mode = NORMAL
+            self.command_text = self.command_text[:-1]
+        elif key == ENTER:
+            text, self.command_text = self.command_text, ""
+            self.mode = NORMAL
+            if self.on_command is not None and text.strip():
+                self.on_command(self, text)
+            self.cursor = self.__clamp(self.cursor)
+            self.__show()
+        else:
+            text = typed_text(key)
+            if text is not None and text != "\n":
+                self.command_text += text
+        return True
+
+    # Repeat the last change, with count instead of its own if given
+    def repeat(self, count=None):
+        if not self.__dot:
+            return False
+        keys = self.__dot
+        if count:
+            keys = list(str(count)) + list(key_text(keys).lstrip("0123456789"))
+            keys = parse_keys(key_text(keys))
+        self.replay(keys)
+
+    # Record the keys typed from now on into register; an uppercase name appends to it
+    def start_recording(self, register):
+        register = typed_text(register)
+        if register is None or not register.isalnum():
+            return False
+        self.__recording = register.lower()
+        self.__appending = register.isupper()
+        self.__macro_keys = []
+
+    def stop_recording(self):
+        # The q that stopped the recording isn't part of it
+        keys = self.__macro_keys[:-1]
+        if self.__appending:
+            keys = self.macros.get(self.__recording, []) + keys
+        self.macros[self.__recording] = keys
+        self.__recording = None
+
+    # Play the macro in register count times; @@ plays the last one again
+    def play(self, register, count=None):
+        register = typed_text(register)
+        if register == "@":
+            register = self.__last_macro
+        if register not in self.macros:
+            return False
+        self.__last_macro = register
+        self.replay(self.macros[register] * (count or 1))
+
+    # Feed keys on a copy of the lines, stopping at the first failure
+    def replay(self, keys):
+        # Drop what is pending of the command that started the replay
+        self.__reset()
+        real = self.buffer
+        shadow = real.shadow()
+        shadow.cursor = self.cursor
+        self.buffer = shadow
+        self.__replaying += 1
+        native, self.native_insert = self.native_insert, False
+        try:
+            for key in keys:
+                self.__feed(key)
+                if self.failed:
+                    break
+        finally:
+            self.native_insert = native
+            self.__replaying -= 1
+            self.buffer = real
+        self.failed = False
+        shadow.cursor = self.cursor
+        real.apply(shadow)
+
+    # Run an ex command line like "%s/a/b/g" on a copy of the lines and write
+    # the result back as one edit; returns a message for the user, if any.
+    # Raises ExError when the command fails, leaving the text as it was.
+    def execute(self, text):
+        real = self.buffer
+        shadow = real.shadow()
+        if shadow is real:
+            shadow = LineBuffer(real.lines, self.cursor, real.indent)
+        shadow.cursor = self.cursor
+        message = self.ex.run(shadow, text, self)
+        real.checkpoint()
+        real.apply(shadow)
+        real.checkpoint()
+        self.cursor = self.__clamp(shadow.cursor)
+        self.__column = self.cursor[1]
+        return message
@@ -0,0 +1,86 @@
+# tests/test_blob_cache.py
+
+import os
+import hashlib
+
+from src.utils.BlobCache import BlobCache
+from src.utils.Utils import Drive
+from src.utils.Backends import FakeDriveBackend
+
+
+def checksum(data):
+    return hashlib.md5(data).hexdigest()
+
+
+def test_get_returns_what_was_put(tmp_path):
+    cache = BlobCache(tmp_path / "cache")
+    source = tmp_path / "source.txt"
+    source.write_bytes(b"cached bytes")
+
+    cache.put(checksum(b"cached bytes"), source)
+
+    assert cache.get(checksum(b"cached bytes"), tmp_path / "copy.txt")
+    assert (tmp_path / "copy.txt").read_bytes() == b"cached bytes"
+    assert not cache.get(checksum(b"something else"), tmp_path / "other.txt")
+    assert not (tmp_path / "other.txt").exists()
+    assert (cache.hits, cache.misses, cache.bytes_saved) == (1, 1, 12)
+
+
+def test_copies_are_independent_of_the_cache(tmp_path):
+    cache = BlobCache(tmp_path / "cache")
+    source = tmp_path / "source.txt"
+    source.write_bytes(b"original")
+    cache.put(checksum(b"original"), source)
+    cache.get(checksum(b"original"), tmp_path / "copy.txt")
+
+    (tmp_path / "copy.txt").write_bytes(b"edited")
+
+    assert cache.get(checksum(b"original"), tmp_path / "again.txt")
+    assert (tmp_path / "again.txt").read_bytes() == b"original"
+
+
+def test_least_recently_used_blobs_are_evicted(tmp_path):
+    cache = BlobCache(tmp_path / "cache", max_size=20)
+    for name in ("a", "b", "c"):
+        (tmp_path / name).write_bytes(name.encode() * 8)
+    cache.put(checksum(b"a" * 8), tmp_path / "a")
+    cache.put(checksum(b"b" * 8), tmp_path / "b")
+    cache.get(checksum(b"a" * 8), tmp_path / "a copy")
+
+    cache.put(checksum(b"c" * 8), tmp_path / "c")
+
+    assert checksum(b"a" * 8) in cache
+    assert checksum(b"b" * 8) not in cache
+    assert checksum(b"c" * 8) in cache
+    assert cache.size() == 16
+    # Recency is read back from disk by a new instance
+    assert BlobCache(tmp_path / "cache", max_size=20).size() == 16
+
+
+def test_hardlink_mode_shares_the_blob(tmp_path):
+    cache = BlobCache(tmp_path / "cache", hardlink=True)
+    source = tmp_path / "source.txt"
+    source.write_bytes(b"linked")
+    cache.put(checksum(b"linked"), source)
+
+    cache.get(checksum(b"linked"), tmp_path / "link.txt")
+
+    assert os.stat(tmp_path / "link.txt").st_nlink == 2
+
+
+def test_drive_downloads_identical_files_once(tmp_path):
+    backend = FakeDriveBackend()
+    drive = Drive(backend=backend, cache=BlobCache(tmp_path / "cache"))
+    for folder in ("first", "second"):
+        (tmp_path / "local" / folder).mkdir(parents=True)
+        (tmp_path / "local" / folder / "same.txt").write_text("the same content in two folders")
+    folder_id = drive.get_or_create_folder("vimpi")
+    drive.synchronize(tmp_path / "local", folder_id)
+
+    drive.synchronize(tmp_path / "copy", folder_id)
+
+    assert backend.requests['get_media'] == 1
+    for folder in ("first", "second"):
+        copy = tmp_path / "copy" / folder / "same.txt"
+        assert copy.read_text() == "the same content in two folders"
+        assert int(os.path.getmtime(copy)) == int(os.path.getmtime(tmp_path / "local" / folder / "same.txt"))
@@ -0,0 +1,80 @@
+from src.main import VimPi, TextViewer, FileExplorerAndEditorScreen
+from src.utils.Buffers import Buffer, BufferCache
+
+
+def test_lru_buffers_are_evicted_to_swap(tmp_path):
+    cache = BufferCache(memory_budget=Buffer("a", "x" * 1000).size() * 2, swap_dir=tmp_path)
+    for name in "abc":
+        cache.put(Buffer(name, name * 1000))
+
+    assert cache.has_pending_evictions()
+    cache.evict()
+    assert not cache.has_pending_evictions()
+    assert len(list(tmp_path.iterdir())) == 1
+    assert "a" in cache
+
+    # Reading the cold buffer back brings it into memory and drops its swap file
+    assert cache.get("a").text == "a" * 1000
+    cache.evict()
+    assert "b" in cache and cache.get("b").text == "b" * 1000
+    cache.close()
+
+
+async def test_switching_buffers_keeps_edits_and_history(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    first, second = tmp_path / "first.txt", tmp_path / "second.txt"
+    first.write_text("first")
+    second.write_text("second")
+
+    app = VimPi(str(tmp_path))
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        screen = app.screen
+        assert isinstance(screen, FileExplorerAndEditorScreen)
+        editor = app.query_one(TextViewer)
+
+        screen.load_new_file(screen.query_one("#FileExplorerPanel").TextViewerUpdated("first", str(first)))
+        editor.insert("edited ")
+        screen.load_new_file(screen.query_one("#FileExplorerPanel").TextViewerUpdated("second", str(second)))
+        assert editor.text == "second"
+
+        screen.switch_buffer(str(first))
+        assert editor.text == "edited first"
+        editor.undo()
+        assert editor.text == "first"
+
+
+def test_memory_is_counted_at_the_size_buffers_were_put_at(tmp_path):
+    cache = BufferCache(swap_dir=tmp_path)
+    buffer = Buffer("a", "short")
+    cache.put(buffer)
+    # Edited in place, then put back, as the editor does when switching away
+    buffer.text = "much longer" * 100
+    cache.put(buffer)
+    assert cache.memory_used() == buffer.size()
+    cache.remove("a")
+    assert cache.memory_used() == 0
+
+
+async def test_switching_back_does_not_parse_again(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    code, notes = tmp_path / "code.py", tmp_path / "notes.txt"
+    code.write_text("def f():\n    return 1\n")
+    notes.write_text("notes")
+
+    app = VimPi(str(tmp_path))
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        screen = app.screen
+        editor = app.query_one(TextViewer)
+        panel = screen.query_one("#FileExplorerPanel")
+        screen.load_new_file(panel.TextViewerUpdated(code.read_text(), str(code)))
+        parsed = editor.document
+        screen.load_new_file(panel.TextViewerUpdated("notes", str(notes)))
+
+        parses = []
+        monkeypatch.setattr(editor, "_set_document", lambda *args: parses.append(args))
+        screen.switch_buffer(str(code))
+        assert parses == []
+        assert editor.document is parsed and editor._highlight_query is not None
+        assert editor.text == "def f():\n    return 1\n"
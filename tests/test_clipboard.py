@@ -0,0 +1,143 @@
+# tests/test_clipboard.py
+
+import base64
+import threading
+
+from src.main import VimPi, TextViewer
+from src.utils.Clipboard import Registers, Clipboard, ClipboardHelper, write_osc52
+
+
+class FakeHelper:
+    def __init__(self, text=""):
+        self.text = text
+        self.copies = []
+        self.pastes = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def copy(self, text):
+        self.release.wait(5)
+        self.copies.append(text)
+        self.text = text
+
+    def paste(self):
+        self.pastes += 1
+        return self.text
+
+
+def test_registers_follow_vim():
+    registers = Registers()
+    registers.set("copied")
+    registers.set("first cut", cut=True)
+    registers.set("second cut", cut=True)
+    registers.set("named", "a")
+    registers.set(" more", "A")
+    registers.set("gone", "_")
+
+    assert registers.get() == "named more"
+    assert registers.get("0") == "copied"
+    assert registers.get("1") == "second cut"
+    assert registers.get("2") == "first cut"
+    assert registers.get("a") == "named more"
+    assert registers.get("_") is None
+
+
+def test_copy_does_not_wait_for_the_system_clipboard():
+    helper = FakeHelper()
+    helper.release.clear()
+    clipboard = Clipboard(helper=helper, osc52=False)
+
+    clipboard.copy("one")
+    assert clipboard.paste() == "one"
+    clipboard.copy("two")
+    clipboard.copy("three")
+    helper.release.set()
+
+    assert clipboard.flush(timeout=5)
+    # Copies piling up while the helper is busy are sent once, latest first
+    assert helper.copies[-1] == "three"
+    assert "two" not in helper.copies
+    assert helper.pastes == 0
+
+
+def test_named_registers_stay_in_the_editor():
+    helper = FakeHelper()
+    clipboard = Clipboard(helper=helper, osc52=False)
+
+    clipboard.copy("private", "q")
+
+    assert clipboard.flush(timeout=5)
+    assert helper.copies == []
+    assert clipboard.paste("q") == "private"
+
+
+def test_system_register_paste_does_not_wait_for_the_helper():
+    helper = FakeHelper("from elsewhere")
+    clipboard = Clipboard(helper=helper, osc52=False)
+    clipboard.copy("ours")
+    assert clipboard.flush(timeout=5)
+
+    # A copy on its way and a paste from "+ both run on the clipboard thread
+    helper.release.clear()
+    clipboard.copy("newer")
+    assert clipboard.paste("+") == "newer"
+    helper.release.set()
+    assert clipboard.flush(timeout=5)
+    # Read again after the copy, for the next paste
+    assert helper.pastes == 1
+
+    helper.text = "copied in another window"
+    clipboard.refresh_system()
+    assert clipboard.flush(timeout=5)
+    assert clipboard.paste("+") == "copied in another window"
+
+
+def test_osc52_sequence_decodes_to_the_text():
+    written = []
+    text = "héllo " * 300000
+
+    assert write_osc52(written.append, text, limit=4 * 1024 * 1024)
+
+    sequence = "".join(written)
+    assert sequence.startswith("\x1b]52;c;") and sequence.endswith("\a")
+    assert base64.b64decode(sequence[7:-1]).decode("utf-8") == text
+    assert not write_osc52(written.append, text, limit=1024)
+
+
+def test_helper_streams_large_text(tmp_path):
+    target = tmp_path / "clipboard.txt"
+    helper = ClipboardHelper(["sh", "-c", f"cat > '{target}'"], ["cat", str(target)])
+    text = "0123456789\n" * 300000
+
+    helper.copy(text)
+
+    assert helper.paste() == text
+
+
+async def test_copy_and_paste_in_editor():
+    app = VimPi()
+    helper = FakeHelper()
+    app.clipboard = Clipboard(helper=helper, osc52=False)
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        editor = app.query_one(TextViewer)
+        editor.disabled = False
+        editor.load_text("copy me\n")
+
+        editor.select_line(0)
+        editor.action_copy_selected_text()
+        editor.move_cursor((1, 0))
+        editor.action_paste_selected_text()
+        assert editor.text == "copy me\ncopy me"
+        assert helper.pastes == 0
+
+        # Another application copies something
+        assert app.clipboard.flush(timeout=5)
+        helper.text = "from elsewhere"
+        editor.action_paste_system_clipboard()
+        for _ in range(50):
+            await pilot.pause(0.02)
+            if editor.text.endswith("from elsewhere"):
+                break
+        assert editor.text.endswith("from elsewhere")
+        assert helper.pastes == 1
@@ -0,0 +1,104 @@
+# tests/test_compression.py
+
+import io
+import os
+
+import pytest
+
+from src.utils.Utils import Drive
+from src.utils.Sync import SyncEngine
+from src.utils.Backends import FakeDriveBackend, S3Backend, FakeS3Client
+from src.utils.Compression import (CompressionPolicy, CompressionStats, compress_stream, decompress_stream,
+                                   ENCODING_KEY, GZIP, ZSTD, zstandard)
+
+from conftest import make_tree
+
+LOG_TEXT = "".join(f"2024-10-01 12:00:{index % 60:02d} INFO request {index} served in 3ms\n" for index in range(2000))
+TREE = {"server.log": LOG_TEXT, "photo.jpg": os.urandom(20000), "small.txt": "tiny"}
+
+
+def algorithms():
+    return [GZIP, ZSTD] if zstandard is not None else [GZIP]
+
+
+@pytest.mark.parametrize("algorithm", algorithms())
+def test_stream_round_trip(algorithm):
+    compressed = io.BytesIO()
+    compress_stream(io.BytesIO(LOG_TEXT.encode()), compressed, algorithm)
+    compressed.seek(0)
+    restored = io.BytesIO()
+    decompress_stream(compressed, restored, algorithm)
+
+    assert restored.getvalue() == LOG_TEXT.encode()
+    assert len(compressed.getvalue()) < len(LOG_TEXT) // 5
+
+
+def test_policy_picks_by_type_and_size():
+    policy = CompressionPolicy(algorithm=GZIP)
+
+    assert policy.choose("notes.txt", 10000) == GZIP
+    assert policy.choose("server.log", 10000) == GZIP
+    assert policy.choose("data.json", 10000) == GZIP
+    assert policy.choose("notes.txt", 100) is None
+    assert policy.choose("photo.jpg", 10000) is None
+    assert policy.choose("archive.tar.gz", 10000) is None
+    assert policy.choose("blob.bin", 10000) is None
+
+
+def test_drive_round_trip_restores_content(tmp_path):
+    backend = FakeDriveBackend()
+    drive = Drive(backend=backend, compression=CompressionPolicy(algorithm=GZIP))
+    make_tree(tmp_path / "first", TREE)
+    folder_id = drive.get_or_create_folder("vim_pi")
+
+    drive.synchronize(tmp_path / "first", folder_id)
+    drive.synchronize(tmp_path / "second", folder_id)
+
+    stored = {item['name']: item for item in backend.files.values()}
+    assert stored["server.log"]['appProperties'] == {ENCODING_KEY: GZIP}
+    assert stored["photo.jpg"]['appProperties'] == {}
+    assert backend.bytes_uploaded < len(LOG_TEXT)
+    for name in ("server.log", "photo.jpg", "small.txt"):
+        assert (tmp_path / "second" / name).read_bytes() == (tmp_path / "first" / name).read_bytes()
+
+
+def test_plain_update_clears_encoding(tmp_path):
+    backend = FakeDriveBackend()
+    (tmp_path / "server.log").write_text(LOG_TEXT)
+    file_id = Drive(backend=backend, compression=CompressionPolicy(algorithm=GZIP)).upload_file(
+        "server.log", tmp_path, 'root')['id']
+
+    Drive(backend=backend).upload_file("server.log", tmp_path, 'root', file_id)
+    Drive(backend=backend).download_file("copy.log", tmp_path, file_id)
+
+    assert backend.files[file_id]['appProperties'] == {}
+    assert (tmp_path / "copy.log").read_text() == LOG_TEXT
+
+
+def test_s3_round_trip_and_pass_stats(tmp_path):
+    client = FakeS3Client()
+    target = S3Backend("bucket", client=client, compression=CompressionPolicy(algorithm=GZIP))
+    make_tree(tmp_path / "first", TREE)
+    folder_id = target.get_or_create_folder("vim_pi")
+    engine = SyncEngine(target)
+
+    engine.synchronize(tmp_path / "first", folder_id)
+    upload_pass = engine.compression_pass
+    engine.synchronize(tmp_path / "second", folder_id)
+    download_pass = engine.compression_pass
+
+    assert (tmp_path / "second" / "server.log").read_text() == LOG_TEXT
+    assert client.objects["vim_pi/server.log"]['Metadata']['encoding'] == GZIP
+    assert upload_pass.files == 3 and upload_pass.saved_bytes() > len(LOG_TEXT) // 2
+    assert download_pass.downloaded_files == 3 and download_pass.ratio() < 0.5
+
+
+def test_stats_since_snapshot():
+    stats = CompressionStats()
+    stats.record_upload(1000, 100)
+    before = stats.snapshot()
+    stats.record_upload(500, 500)
+
+    assert stats.since(before).files == 1
+    assert stats.since(before).saved_bytes() == 0
+    assert stats.saved_bytes() == 900
@@ -0,0 +1,130 @@
+# tests/test_delta.py
+
+import random
+
+import pytest
+
+from src.utils.Delta import (signature, delta, apply_delta, literal_size, plan_parts, SignatureCache,
+                             Signature)
+from src.utils import Backends
+from src.utils.Backends import LocalDirectoryBackend, S3Backend, FakeS3Client, S3_MIN_PART_SIZE
+
+MiB = 1024 * 1024
+
+
+@pytest.fixture
+def base_data():
+    return random.Random(7).randbytes(3 * MiB + 123)
+
+
+def edits(data):
+    return {
+        "unchanged": data,
+        "overwrite": data[:MiB] + b"edited" + data[MiB + 6:],
+        "insert": data[:MiB] + b"a new line\n" + data[MiB:],
+        "delete": data[:MiB] + data[MiB + 100:],
+        "append": data + b"more" * 1000,
+        "rewrite": bytes(reversed(data)),
+    }
+
+
+def rebuild(tmp_path, old_path, new_path, segments):
+    out_path = tmp_path / "out"
+    with open(old_path, "rb") as base, open(new_path, "rb") as source, open(out_path, "wb") as destination:
+        apply_delta(segments, base, source, destination)
+    return out_path.read_bytes()
+
+
+@pytest.mark.parametrize("edit", ["unchanged", "overwrite", "insert", "delete", "append", "rewrite"])
+def test_delta_rebuilds_new_version(tmp_path, base_data, edit):
+    old_path, new_path = tmp_path / "old", tmp_path / "new"
+    old_path.write_bytes(base_data)
+    new_data = edits(base_data)[edit]
+    new_path.write_bytes(new_data)
+
+    segments = delta(new_path, signature(old_path))
+
+    assert rebuild(tmp_path, old_path, new_path, segments) == new_data
+    assert sum(length for _, _, length in segments) == len(new_data)
+    if edit != "rewrite":
+        assert literal_size(segments) <= 2 * 64 * 1024 + 4000
+
+
+def test_plan_parts_respects_minimum_part_size():
+    segments = [(0, 0, 12 * MiB), (None, 12 * MiB, 100), (12 * MiB, 12 * MiB + 100, 2 * MiB),
+                (None, 14 * MiB + 100, 3 * MiB), (20 * MiB, 17 * MiB + 100, 9 * MiB)]
+
+    parts = plan_parts(segments, 5 * MiB, 8 * MiB)
+
+    assert all(length >= 5 * MiB for _, _, length in parts[:-1])
+    assert all(length <= 8 * MiB for kind, _, length in parts if kind == 'upload')
+    assert sum(length for _, _, length in parts) == 26 * MiB + 100
+    assert parts[0] == ('copy', 0, 12 * MiB)
+
+
+def test_signature_cache_checks_token(tmp_path, base_data):
+    (tmp_path / "file").write_bytes(base_data)
+    cache = SignatureCache(tmp_path / "cache")
+    file_signature = signature(tmp_path / "file")
+
+    cache.put("some/key", "etag-1", file_signature)
+
+    assert cache.get("some/key", "etag-2") is None
+    cached = cache.get("some/key", "etag-1")
+    assert isinstance(cached, Signature)
+    assert list(cached.weak) == list(file_signature.weak) and cached.strong == file_signature.strong
+
+
+def test_local_backend_writes_changed_blocks(tmp_path, base_data):
+    target = LocalDirectoryBackend(tmp_path / "nas", delta=True, signatures=SignatureCache(tmp_path / "cache"))
+    local_path = tmp_path / "data.bin"
+    local_path.write_bytes(base_data)
+    file_id = target.upload(local_path, "data.bin", "")
+
+    new_data = edits(base_data)["insert"]
+    local_path.write_bytes(new_data)
+    written = target.bytes_written
+    target.upload(local_path, "data.bin", "", file_id)
+
+    assert (tmp_path / "nas" / "data.bin").read_bytes() == new_data
+    assert target.bytes_written - written < len(new_data) // 10
+
+
+def test_interrupted_patch_leaves_the_old_version(tmp_path, base_data, monkeypatch):
+    target = LocalDirectoryBackend(tmp_path / "nas", delta=True, signatures=SignatureCache(tmp_path / "cache"))
+    local_path = tmp_path / "data.bin"
+    local_path.write_bytes(base_data)
+    file_id = target.upload(local_path, "data.bin", "")
+    remote_path = tmp_path / "nas" / "data.bin"
+    modified = remote_path.stat().st_mtime_ns
+
+    def interrupted(segments, base, source, destination):
+        destination.write(b"partial")
+        raise OSError("disk full")
+    monkeypatch.setattr(Backends, "apply_delta", interrupted)
+    # A small overwrite used to be patched into the live file
+    local_path.write_bytes(edits(base_data)["overwrite"])
+    with pytest.raises(OSError):
+        target.upload(local_path, "data.bin", "", file_id)
+
+    assert remote_path.read_bytes() == base_data
+    assert remote_path.stat().st_mtime_ns == modified
+    assert [path.name for path in remote_path.parent.iterdir()] == ["data.bin"]
+
+
+def test_s3_backend_copies_unchanged_ranges(tmp_path):
+    data = random.Random(3).randbytes(3 * S3_MIN_PART_SIZE)
+    client = FakeS3Client()
+    target = S3Backend("bucket", client=client, delta=True, signatures=SignatureCache(tmp_path / "cache"))
+    local_path = tmp_path / "data.bin"
+    local_path.write_bytes(data)
+    key = target.upload(local_path, "data.bin", "")
+
+    new_data = data[:S3_MIN_PART_SIZE] + b"changed" + data[S3_MIN_PART_SIZE + 7:]
+    local_path.write_bytes(new_data)
+    uploaded = client.bytes_uploaded
+    target.upload(local_path, "data.bin", "", key)
+
+    assert client.objects[key]['Body'] == new_data
+    assert client.bytes_copied >= S3_MIN_PART_SIZE
+    assert client.bytes_uploaded - uploaded < len(new_data)
@@ -0,0 +1,120 @@
+# tests/test_ex.py
+
+import time
+
+import pytest
+
+from src.main import VimPi, TextViewer
+from src.utils.Ex import ExError, translate_pattern
+from src.utils.Vim import Vim, LineBuffer
+
+
+def execute(text, command, cursor=(0, 0)):
+    buffer = LineBuffer(text, cursor)
+    vim = Vim(buffer)
+    vim.cursor = cursor
+    message = vim.execute(command)
+    return buffer.text, message
+
+
+@pytest.mark.parametrize("text, command, expected", [
+    ("foo foo\nfoo", "s/foo/bar/", "bar foo\nfoo"),
+    ("foo foo\nfoo", "%s/foo/bar/g", "bar bar\nbar"),
+    ("a\nb\nc\nd", "2,3s/$/!/", "a\nb!\nc!\nd"),
+    ("a\nb\nc\nd", "/c/,$s/^/-/", "a\nb\n-c\n-d"),
+    ("a\nb\nc\nd", ".+1;+1s/^/-/", "a\n-b\n-c\nd"),
+    ("one two", r"s/\(\w\+\) \(\w\+\)/\2 \1/", "two one"),
+    ("one two", r"s/\v(\w+) (\w+)/\2 \1/", "two one"),
+    ("snake_case", r"s/_\(\l\)/\u\1/g", "snakeCase"),
+    ("word", r"s/.*/\U&/", "WORD"),
+    ("a(b)", r"s/(b)/[&]/", "a[(b)]"),
+    ("a,b,c", r"s/,/\r/g", "a\nb\nc"),
+    ("Foo foo", "s/foo/x/gi", "x x"),
+    ("a1\nb\na2\nc", "g/a/d", "b\nc"),
+    ("a1\nb\na2\nc", "v/a/d", "a1\na2"),
+    ("a1\nb\na2\nc", "g!/a/d", "a1\na2"),
+    ("a1\nb\na2", "g/a/s/\\d/#/", "a#\nb\na#"),
+    ("1\n2\n3", "g/^/m0", "3\n2\n1"),
+    ("a\nb", "g/^/t$", "a\nb\na\nb"),
+    ("ab\ncd", "g/c/normal Ax", "ab\ncdx"),
+    ("c\na\nb\na", "sort", "a\na\nb\nc"),
+    ("c\na\nb\na", "sort u", "a\nb\nc"),
+    ("c\na\nB", "sort i", "a\nB\nc"),
+    ("x10\nx9\nx100\ny", "sort n", "y\nx9\nx10\nx100"),
+    ("x10\nx9\nx100", "sort! n", "x100\nx10\nx9"),
+    ("b 1\na 2", r"sort /\a /", "b 1\na 2"),
+    ("a\nb\nc\nd", "2,3d", "a\nd"),
+    ("a\nb\nc\nd", "1m$", "b\nc\nd\na"),
+    ("a\nb\nc\nd", "3,4m0", "c\nd\na\nb"),
+    ("a\nb\nc", "1t.", "a\na\nb\nc"),
+    ("a\n  b\nc", "%j", "a b c"),
+    ("a\nb", "%>", "    a\n    b"),
+    ("ab\ncd", "%norm Ax", "abx\ncdx"),
+])
+def test_commands(text, command, expected):
+    assert execute(text, command)[0] == expected
+
+
+def test_visual_range_and_last_pattern():
+    buffer = LineBuffer("a\nb\nc\nd")
+    vim = Vim(buffer)
+    vim.run_keys("jVj<esc>")
+    vim.execute("'<,'>s/$/!/")
+    assert buffer.text == "a\nb!\nc!\nd"
+    vim.execute("%s//?/")
+    assert buffer.text == "a?\nb!?\nc!?\nd?"
+
+
+def test_errors_leave_the_text_alone():
+    for command in ("s/x/y/", "frob", "9d", "g/x/d", "2,3m2"):
+        buffer = LineBuffer("a\nb\nc")
+        with pytest.raises(ExError):
+            Vim(buffer).execute(command)
+        assert buffer.text == "a\nb\nc"
+    assert execute("a", "s/x/y/e") == ("a", None)
+
+
+def test_substitution_is_reported_and_undone_at_once():
+    buffer = LineBuffer("foo\nfoo\nfoo\nbar")
+    vim = Vim(buffer)
+    assert vim.execute("%s/foo/x/") == "3 substitutions on 3 lines"
+    assert vim.execute("%s/x/y/n") == "3 matches on 3 lines"
+    vim.run_keys("u")
+    assert buffer.text == "foo\nfoo\nfoo\nbar"
+
+
+def test_vim_patterns():
+    assert translate_pattern(r"\<is\>").search("this is").start() == 5
+    assert translate_pattern(r"a\{2,}").fullmatch("aaa")
+    assert translate_pattern(r"a\{-1,}").match("aaa").group() == "a"
+    assert translate_pattern(r"[()]\+").fullmatch("()")
+    assert translate_pattern(r"a+").fullmatch("a+")
+    assert translate_pattern(r"\cABC").match("abc")
+
+
+def test_substitute_a_million_lines_in_one_pass():
+    buffer = LineBuffer([f"line {number} foo bar foo" for number in range(1_000_000)])
+    vim = Vim(buffer)
+    started = time.perf_counter()
+    assert vim.execute("%s/foo/baz/g") == "2000000 substitutions on 1000000 lines"
+    assert time.perf_counter() - started < 15
+    assert buffer.lines[-1] == "line 999999 baz bar baz"
+
+
+async def test_ex_commands_in_editor():
+    app = VimPi()
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        editor = app.query_one(TextViewer)
+        editor.disabled = False
+        editor.load_text("b\na\nc")
+        editor.focus()
+
+        await pilot.press("escape", *":sort", "enter")
+        assert editor.text == "a\nb\nc"
+        await pilot.press(*":%s/$/;/", "enter")
+        assert editor.text == "a;\nb;\nc;"
+        await pilot.press("u")
+        assert editor.text == "a\nb\nc"
+        await pilot.press(*":frob", "enter")
+        assert editor.text == "a\nb\nc"
@@ -0,0 +1,155 @@
+# tests/test_fake_drive.py
+
+import os
+import time
+
+import pytest
+
+from src.utils.Utils import Drive
+from src.utils.Sync import SyncEngine
+from src.utils.SyncStats import SyncStats
+from src.utils.Backends import FakeDriveBackend, BackendQuotaError
+from conftest import make_tree
+
+TREE = {
+    **{f"folder_{folder}/file_{index}.txt": f"content {folder} {index}" for folder in range(2) for index in range(3)},
+    "top.txt": "top level",
+}
+
+
+def remote_names(backend):
+    return sorted(item['name'] for item in backend.files.values() if item['id'] != 'root')
+
+
+def test_synchronize_uploads_tree(tmp_path):
+    backend = FakeDriveBackend()
+    drive = Drive(backend=backend)
+    make_tree(tmp_path / "local", TREE)
+
+    folder_id = drive.get_or_create_folder("vimpi")
+    drive.synchronize(tmp_path / "local", folder_id)
+
+    assert remote_names(backend).count("file_0.txt") == 2
+    assert "top.txt" in remote_names(backend)
+    assert backend.bytes_uploaded == sum(
+        os.path.getsize(os.path.join(path, name)) for path, _, names in os.walk(tmp_path / "local") for name in names)
+
+
+def test_unchanged_sync_only_lists(tmp_path):
+    backend = FakeDriveBackend()
+    drive = Drive(backend=backend)
+    make_tree(tmp_path / "local", TREE)
+    folder_id = drive.get_or_create_folder("vimpi")
+    drive.synchronize(tmp_path / "local", folder_id)
+
+    backend.requests.clear()
+    drive.synchronize(tmp_path / "local", folder_id)
+
+    assert set(backend.requests) == {'list'}
+
+
+def test_synchronize_downloads_into_empty_folder(tmp_path):
+    backend = FakeDriveBackend()
+    drive = Drive(backend=backend)
+    make_tree(tmp_path / "first", TREE)
+    folder_id = drive.get_or_create_folder("vimpi")
+    drive.synchronize(tmp_path / "first", folder_id)
+
+    drive.synchronize(tmp_path / "second", folder_id)
+
+    assert (tmp_path / "second" / "folder_1" / "file_2.txt").read_text() == "content 1 2"
+    assert int(os.path.getmtime(tmp_path / "second" / "top.txt")) == int(os.path.getmtime(tmp_path / "first" / "top.txt"))
+
+
+def test_list_files_follows_pages(tmp_path):
+    backend = FakeDriveBackend(page_size=2)
+    drive = Drive(backend=backend)
+    for index in range(5):
+        (tmp_path / f"file_{index}.txt").write_text(str(index))
+        drive.upload_file(f"file_{index}.txt", tmp_path, 'root')
+
+    files = drive.list_files('root')
+
+    assert sorted(files['names']) == [f"file_{index}.txt" for index in range(5)]
+    assert backend.requests['list'] == 3
+
+
+def test_quota_errors_are_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(Drive, "RETRY_DELAY", 0)
+    backend = FakeDriveBackend(quota_error_rate=0.3, seed=1)
+    drive = Drive(backend=backend)
+    make_tree(tmp_path / "local", TREE)
+
+    folder_id = drive.get_or_create_folder("vimpi")
+    drive.synchronize(tmp_path / "local", folder_id)
+
+    assert remote_names(backend).count("file_2.txt") == 2
+
+
+def test_quota_error_raised_after_retries(monkeypatch):
+    monkeypatch.setattr(Drive, "RETRY_DELAY", 0)
+    drive = Drive(backend=FakeDriveBackend(quota_error_rate=1.0))
+
+    with pytest.raises(BackendQuotaError):
+        drive.list_files('root')
+
+
+def test_failed_uploads_stay_pending(tmp_path, monkeypatch):
+    monkeypatch.setattr(Drive, "RETRY_DELAY", 0)
+    backend = FakeDriveBackend()
+    drive = Drive(backend=backend)
+    (tmp_path / "local").mkdir()
+    (tmp_path / "local" / "notes.txt").write_text("notes")
+    stats = SyncStats()
+    engine = SyncEngine(drive, stats)
+    plan = engine.plan(tmp_path / "local", drive.get_or_create_folder("vimpi"))
+
+    backend.quota_error_rate = 1.0
+    engine.execute(plan)
+
+    assert [operation.name for operation in plan.pending()] == ["notes.txt"]
+    assert stats.files == 0 and stats.bytes == 0
+
+
+def test_failed_folders_stay_pending_with_their_contents(tmp_path, monkeypatch):
+    monkeypatch.setattr(Drive, "RETRY_DELAY", 0)
+    backend = FakeDriveBackend()
+    drive = Drive(backend=backend)
+    (tmp_path / "local" / "notes").mkdir(parents=True)
+    (tmp_path / "local" / "notes" / "todo.txt").write_text("todo")
+    stats = SyncStats()
+    engine = SyncEngine(drive, stats)
+    remote_id = drive.get_or_create_folder("vimpi")
+    plan = engine.plan(tmp_path / "local", remote_id)
+
+    backend.quota_error_rate = 1.0
+    engine.execute(plan)
+    assert sorted(operation.name for operation in plan.pending()) == ["notes", "todo.txt"]
+    assert stats.files == 0
+
+    backend.quota_error_rate = 0.0
+    engine.execute(plan)
+    assert plan.pending() == []
+    assert "todo.txt" in remote_names(backend)
+
+
+def test_latency_is_added_per_request():
+    drive = Drive(backend=FakeDriveBackend(latency=0.01))
+
+    start = time.perf_counter()
+    drive.list_files('root')
+    drive.list_files('root')
+
+    assert time.perf_counter() - start >= 0.02
+
+
+def test_delete_removes_folder_contents(tmp_path):
+    backend = FakeDriveBackend()
+    drive = Drive(backend=backend)
+    make_tree(tmp_path / "local", TREE)
+    folder_id = drive.get_or_create_folder("vimpi")
+    drive.synchronize(tmp_path / "local", folder_id)
+
+    drive.delete_file_or_folder(folder_id)
+
+    assert remote_names(backend) == []
@@ -0,0 +1,155 @@
+# tests/test_follow.py
+
+import os
+import time
+import codecs
+import threading
+from types import SimpleNamespace
+
+from src.main import VimPi, TextViewer, FileExplorer
+from src.utils import Follow
+from src.utils.Follow import LogTail, InotifyWatcher, PollingWatcher, watch
+from src.utils.Sniff import FileKind
+
+
+def append(path, data):
+    with open(path, "ab") as file:
+        file.write(data)
+
+
+def read_all(tail):
+    added = []
+    while True:
+        text, dropped, event = tail.read(limit=7)
+        if not text and not tail.has_more():
+            return "".join(added)
+        added.append(text)
+
+
+def test_reads_only_what_was_added(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_bytes(b"one\ntwo\nthr")
+    tail = LogTail(path)
+    assert read_all(tail) == "one\ntwo\nthr"
+    assert (list(tail.lines), tail.partial) == (["one", "two"], "thr")
+
+    append(path, b"ee\r")
+    assert read_all(tail) == "ee"
+    # The "\r\n" split across writes is one line break
+    append(path, "\nfour\u2028five\n".encode("utf-8"))
+    assert read_all(tail) == "\nfour\nfive\n"
+    assert tail.snapshot() == ("one\ntwo\nthree\nfour\nfive\n", tail.version)
+    tail.close()
+
+
+def test_ring_keeps_the_last_lines(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_bytes(b"".join(b"line %d\n" % number for number in range(100)))
+    # Only the end of a long log is read
+    tail = LogTail(path, max_lines=10)
+    text, dropped, _ = tail.read()
+    assert text.splitlines() == [f"line {number}" for number in range(90, 100)]
+    assert dropped == 0
+
+    append(path, b"line 100\nline 101\n")
+    assert tail.read() == ("line 100\nline 101\n", 2, None)
+    assert list(tail.lines) == [f"line {number}" for number in range(92, 102)]
+
+
+def test_wide_encodings_start_on_a_line(tmp_path):
+    path = tmp_path / "app.log"
+    kind = FileKind(False, "utf-16-le", codecs.BOM_UTF16_LE)
+    # "਀" holds the bytes of "\n" off a character boundary
+    path.write_bytes(kind.bom + "a਀\nb\nc\n".encode("utf-16-le"))
+    tail = LogTail(path, kind, max_lines=2)
+    assert tail.read()[0] == "b\nc\n"
+
+
+def test_truncation_and_rotation(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_bytes(b"old\nhalf")
+    tail = LogTail(path)
+    read_all(tail)
+
+    path.write_bytes(b"new\n")
+    assert tail.read() == ("\n", 0, "truncated")
+    assert read_all(tail) == "new\n"
+
+    append(path, b"last words")
+    os.rename(path, tmp_path / "app.log.1")
+    path.write_bytes(b"fresh\n")
+    assert tail.read() == ("last words\n", 0, "rotated")
+    assert read_all(tail) == "fresh\n"
+    assert list(tail.lines) == ["old", "half", "new", "last words", "fresh"]
+
+
+def test_watchers_wake_on_writes_and_stop(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_bytes(b"")
+    watcher = watch(path, interval=5)
+    assert isinstance(watcher, InotifyWatcher)
+    threading.Timer(0.1, append, (path, b"x")).start()
+    started = time.perf_counter()
+    assert watcher.wait()
+    assert time.perf_counter() - started < 2
+    watcher.close()
+
+    watcher = watch(path, interval=5)
+    threading.Timer(0.1, watcher.stop).start()
+    started = time.perf_counter()
+    assert not watcher.wait()
+    assert time.perf_counter() - started < 2
+    watcher.close()
+
+    polling = PollingWatcher(path, interval=0.01)
+    assert polling.wait()
+    polling.stop()
+    assert not polling.wait()
+
+
+def test_falls_back_to_polling(tmp_path, monkeypatch):
+    def unavailable(*args):
+        raise OSError("no inotify")
+    monkeypatch.setattr(Follow, "InotifyWatcher", unavailable)
+    assert isinstance(watch(tmp_path / "app.log"), PollingWatcher)
+
+
+async def wait_for_text(pilot, editor, text):
+    for _ in range(100):
+        if editor.text == text:
+            return
+        await pilot.pause(0.05)
+    assert editor.text == text
+
+
+async def test_follow_mode_appends_to_a_read_only_buffer(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    path = tmp_path / "app.log"
+    path.write_bytes(b"started\n")
+    app = VimPi(str(tmp_path))
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        app.query_one(FileExplorer).file_selected(SimpleNamespace(path=path))
+        await pilot.pause()
+        editor = app.query_one(TextViewer)
+        await pilot.press("ctrl+t")
+        await wait_for_text(pilot, editor, "started\n")
+        assert editor.read_only and editor.journal is None
+
+        append(path, b"request 1\nrequest 2\n")
+        await wait_for_text(pilot, editor, "started\nrequest 1\nrequest 2\n")
+        assert editor.cursor_location == (3, 0)
+        assert not editor.history.undo_stack
+
+        await pilot.press("ctrl+s")
+        await pilot.pause()
+        assert path.read_bytes() == b"started\nrequest 1\nrequest 2\n"
+
+        # Stopping loads the whole file for editing again
+        await pilot.press("ctrl+t")
+        await pilot.pause()
+        assert not editor.read_only and editor.journal is not None
+        append(path, b"request 3\n")
+        await pilot.pause(0.3)
+        assert editor.text == "started\nrequest 1\nrequest 2\n"
+        assert not app.screen.followers
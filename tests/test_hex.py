@@ -0,0 +1,113 @@
+# tests/test_hex.py
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.main import VimPi, HexView, TextViewer, FileExplorer
+from src.utils import Hex
+from src.utils.Hex import HexFile, parse_pattern, parse_offset
+
+
+def test_hex_file_reads_rows(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(40)))
+    hex_file = HexFile(path)
+    assert (hex_file.size, hex_file.rows) == (40, 3)
+    assert hex_file.row(2) == bytes(range(32, 40))
+    assert hex_file.read(38, 10) == b"\x26\x27"
+    hex_file.close()
+
+    path.write_bytes(b"")
+    empty = HexFile(path)
+    assert (empty.rows, empty.row(0), empty.find(b"x")) == (1, b"", None)
+
+
+def test_find_crosses_chunks_and_wraps_around(tmp_path, monkeypatch):
+    monkeypatch.setattr(Hex, "SEARCH_CHUNK", 8)
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"\0" * 6 + b"\xde\xad\xbe\xef" + b"\0" * 30 + b"\xde\xad")
+    hex_file = HexFile(path)
+    assert hex_file.find(b"\xde\xad\xbe\xef") == 6
+    assert hex_file.find(b"\xde\xad", 7) == 40
+    assert hex_file.find(b"\xde\xad\xbe\xef", 7) == 6
+    assert hex_file.find(b"\xca\xfe") is None
+    assert hex_file.find(b"\xde\xad", cancelled=lambda: True) is None
+
+
+def test_parse_pattern_and_offset():
+    assert parse_pattern("de ad, BE EF") == b"\xde\xad\xbe\xef"
+    assert parse_pattern("0x7f454c46") == b"\x7fELF"
+    assert parse_pattern("'ELF'") == b"ELF"
+    with pytest.raises(ValueError):
+        parse_pattern("abc")
+    assert parse_offset("4096") == 4096
+    assert parse_offset("0x1f00") == 0x1F00
+    assert parse_offset("+16", current=32) == 48
+    assert parse_offset("-0x10", current=32) == 16
+    assert parse_offset("50%", size=1000) == 500
+    with pytest.raises(ValueError):
+        parse_offset("end")
+
+
+async def open_file(pilot, app, path):
+    await pilot.press("ctrl+f")
+    app.query_one(FileExplorer).file_selected(SimpleNamespace(path=path))
+    await pilot.pause()
+    return app.query_one(HexView)
+
+
+def screen_text(view, y):
+    return "".join(segment.text for segment in view.render_line(y))
+
+
+async def test_binary_file_opens_in_the_hex_view(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    path = tmp_path / "program"
+    data = b"\x7fELF\x02\x01\x01" + bytes(300) + b"\xde\xad\xbe\xef" + bytes(100)
+    path.write_bytes(data)
+    app = VimPi(str(tmp_path))
+    async with app.run_test() as pilot:
+        view = await open_file(pilot, app, path)
+        assert view.display and not app.query_one(TextViewer).display
+        assert app.focused is view
+        assert screen_text(view, 0).startswith("00000000  7f 45 4c 46 02 01 01 00")
+
+        await pilot.press("ctrl+g", *"0x100", "enter")
+        await pilot.pause()
+        assert view.cursor == 0x100
+        assert app.focused is view
+
+        await pilot.press("ctrl+k", *"de ad", "enter")
+        for _ in range(100):
+            if view.match is not None:
+                break
+            await pilot.pause(0.05)
+        assert view.cursor == 307
+        assert view.match == (307, 2)
+        assert screen_text(view, 307 // 16 - view.scroll_offset.y).startswith(f"{307 // 16 * 16:08x}")
+
+        # Binary files are never written back
+        await pilot.press("ctrl+s")
+        await pilot.pause()
+        assert path.read_bytes() == data
+
+
+async def test_huge_file_opens_and_jumps_quickly(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    path = tmp_path / "disk.img"
+    size = 3 * 1024 ** 3
+    with open(path, "wb") as file:
+        file.write(b"\0\x01\x02")
+        file.seek(size - 4)
+        file.write(b"tail")
+    app = VimPi(str(tmp_path))
+    async with app.run_test() as pilot:
+        started = time.perf_counter()
+        view = await open_file(pilot, app, path)
+        await pilot.press("end")
+        await pilot.pause()
+        assert time.perf_counter() - started < 3
+        assert view.cursor == size - 1
+        assert "74 61 69 6c" in screen_text(view, size // 16 - 1 - view.scroll_offset.y)
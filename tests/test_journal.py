@@ -0,0 +1,112 @@
+import os
+import threading
+
+from src.main import VimPi, TextViewer
+from src.utils import Journal
+from src.utils.Journal import SwapJournal, coalesce, encode_ops, decode_ops
+
+
+def test_typing_is_coalesced_into_one_record():
+    ops = [((0, 0), (0, 0), "h"), ((0, 1), (0, 1), "e"), ((0, 2), (0, 2), "y"), ((0, 2), (0, 3), "")]
+    assert coalesce(ops) == [((0, 0), (0, 0), "he")]
+
+
+def test_torn_record_is_ignored():
+    data = encode_ops([((1, 2), (1, 2), "abc"), ((3, 0), (4, 0), "")])
+    assert decode_ops(data[:-1]) == [((1, 2), (1, 2), "abc")]
+
+
+def test_journal_is_replayed_only_against_its_base(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("hello")
+
+    journal = SwapJournal(path, directory=tmp_path / "swap")
+    journal.record((0, 5), (0, 5), " world")
+    journal.flush()
+    assert SwapJournal(path, directory=tmp_path / "swap").recover() == [((0, 5), (0, 5), " world")]
+
+    path.write_text("changed on disk")
+    os.utime(path, ns=(0, 0))
+    assert SwapJournal(path, directory=tmp_path / "swap").recover() == []
+    assert not journal.journal_path.exists()
+
+
+# fsync that holds the first flush until released
+def hold_first_fsync(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    fsync = os.fsync
+
+    def held(fd):
+        if not started.is_set():
+            started.set()
+            release.wait(5)
+        fsync(fd)
+    monkeypatch.setattr(Journal.os, "fsync", held)
+    return started, release
+
+
+def test_flushes_land_in_order(tmp_path, monkeypatch):
+    path = tmp_path / "notes.txt"
+    path.write_text("a\nb\n")
+    journal = SwapJournal(path, directory=tmp_path / "swap")
+    started, release = hold_first_fsync(monkeypatch)
+
+    journal.record((0, 0), (0, 0), "first ")
+    first = threading.Thread(target=journal.flush)
+    first.start()
+    started.wait(5)
+    journal.record((1, 0), (1, 0), "second ")
+    second = threading.Thread(target=journal.flush)
+    second.start()
+    # The second batch waits for the first to be written
+    second.join(0.1)
+    assert second.is_alive()
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert journal.recover() == [((0, 0), (0, 0), "first "), ((1, 0), (1, 0), "second ")]
+
+
+def test_reset_drops_a_batch_being_written(tmp_path, monkeypatch):
+    path = tmp_path / "notes.txt"
+    path.write_text("hello")
+    journal = SwapJournal(path, directory=tmp_path / "swap")
+    started, release = hold_first_fsync(monkeypatch)
+
+    journal.record((0, 5), (0, 5), " world")
+    flush = threading.Thread(target=journal.flush)
+    flush.start()
+    started.wait(5)
+    reset = threading.Thread(target=journal.reset)
+    reset.start()
+    release.set()
+    flush.join(5)
+    reset.join(5)
+
+    assert not journal.journal_path.exists()
+    assert not journal.has_pending()
+    assert journal.recover() == []
+
+
+async def test_unsaved_edits_are_recovered(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    path = tmp_path / "notes.txt"
+    path.write_text("hello")
+
+    app = VimPi(str(tmp_path))
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        screen = app.screen
+        screen.load_new_file(screen.query_one("#FileExplorerPanel").TextViewerUpdated("hello", str(path)))
+        editor = app.query_one(TextViewer)
+        editor.insert(" world", (0, 5))
+        editor.journal.flush()
+
+    # A new session opening the unsaved file gets the edits back
+    app = VimPi(str(tmp_path))
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        screen = app.screen
+        screen.load_new_file(screen.query_one("#FileExplorerPanel").TextViewerUpdated("hello", str(path)))
+        assert app.query_one(TextViewer).text == "hello world"
@@ -0,0 +1,136 @@
+# tests/test_long_lines.py
+
+import time
+import random
+
+from rich.cells import cell_len
+from textual.document._document import Document
+from textual.expand_tabs import expand_tabs_inline
+
+from src.main import VimPi, TextViewer
+from src.utils import LongLines
+from src.utils.LongLines import ColumnMap, LongLineWrappedDocument, has_long_line
+
+
+def cells(line, column):
+    return cell_len(expand_tabs_inline(line[:column], 4))
+
+
+def test_column_map_matches_expanded_text(monkeypatch):
+    monkeypatch.setattr(LongLines, "CHUNK", 5)
+    line = "ab\tc 漢字\t\tx" * 7
+    column_map = ColumnMap(line)
+    assert column_map.width == cells(line, len(line))
+    for column in range(len(line)):
+        assert column_map.cell(column) == cells(line, column)
+        assert column_map.column_at(column_map.cell(column)) == column
+    # Both cells of a wide character belong to it
+    assert column_map.column_at(column_map.cell(5) + 1) == 5
+    assert column_map.column_at(10_000) == len(line)
+
+
+def test_column_map_follows_edits(monkeypatch):
+    monkeypatch.setattr(LongLines, "CHUNK", 5)
+    line = "x\ty漢" * 20
+    column_map = ColumnMap(line)
+    assert column_map.width == cells(line, len(line))
+    for start, end, text in [(3, 3, "\t\t"), (10, 40, ""), (0, 2, "漢" * 12), (5, 6, "ab")]:
+        line = line[:start] + text + line[end:]
+        column_map.replace(start, end, line)
+        assert [column_map.cell(column) for column in range(len(line) + 1)] == [
+            cells(line, column) for column in range(len(line) + 1)
+        ]
+
+
+def test_has_long_line():
+    assert not has_long_line("short\nlines", limit=5)
+    assert has_long_line("short\nlonger", limit=5)
+
+
+def test_wrapping_long_lines_matches_after_edits(monkeypatch):
+    monkeypatch.setattr(LongLines, "CHUNK", 7)
+    characters = "ab \t漢"
+    random_source = random.Random(7)
+    for width in (0, 8, 13):
+        document = Document("\n".join(
+            "".join(random_source.choice(characters) for _ in range(random_source.randrange(60)))
+            for _ in range(5)
+        ))
+        wrapped = LongLineWrappedDocument(document, width, limit=20)
+        for _ in range(30):
+            start_row = random_source.randrange(document.line_count)
+            end_row = min(start_row + random_source.randrange(2), document.line_count - 1)
+            start = (start_row, random_source.randrange(len(document[start_row]) + 1))
+            end = max(start, (end_row, random_source.randrange(len(document[end_row]) + 1)))
+            text = "".join(random_source.choice(characters + "\n") for _ in range(random_source.randrange(8)))
+            result = document.replace_range(start, end, text)
+            wrapped.wrap_range(start, end, result.end_location)
+
+            fresh = LongLineWrappedDocument(document, width, limit=20)
+            assert [list(offsets) for offsets in wrapped._wrap_offsets] == [list(offsets) for offsets in fresh._wrap_offsets]
+            assert wrapped._offset_to_line_info == fresh._offset_to_line_info
+            assert wrapped._line_index_to_offsets == fresh._line_index_to_offsets
+            for row in range(document.line_count):
+                if len(document[row]) <= 20:
+                    continue
+                for column in range(len(document[row]) + 1):
+                    offset = wrapped.location_to_offset((row, column))
+                    assert wrapped.offset_to_location(offset) == (row, column)
+
+
+async def open_editor(pilot, app, text, language=None):
+    await pilot.press("ctrl+f")
+    editor = app.query_one(TextViewer)
+    editor.disabled = False
+    editor.load_text(text)
+    editor.language = language
+    editor.focus()
+    await pilot.pause()
+    return editor
+
+
+def screen_text(editor, y):
+    return "".join(segment.text for segment in editor.render_line(y))
+
+
+async def test_long_line_is_drawn_a_screen_at_a_time():
+    app = VimPi()
+    async with app.run_test() as pilot:
+        line = "".join(f"{{\"key{number}\":[{number}]}}," for number in range(2000))
+        editor = await open_editor(pilot, app, f"x = 1\n{line}\ny = 2", "python")
+        assert not editor.is_syntax_aware
+        width = editor.size.width - editor.gutter_width
+
+        await pilot.press("down", "end")
+        await pilot.pause()
+        assert editor.cursor_location == (1, len(line))
+        assert screen_text(editor, 1).endswith(line[-(width - 1):] + " ")
+        # Typing at the end of the line widens the document
+        await pilot.press(*"ok")
+        await pilot.pause()
+        assert editor.document[1] == line + "ok"
+        assert screen_text(editor, 1).rstrip().endswith(line[-10:] + "ok")
+
+        editor.soft_wrap = True
+        await pilot.pause()
+        editor.move_cursor((1, 0))
+        await pilot.press("down")
+        # Wrapped by character, a row of cells at a time
+        wrap_width = editor.wrap_width
+        assert editor.cursor_location == (1, wrap_width)
+        y = 2 - editor.scroll_offset.y
+        assert screen_text(editor, y)[editor.gutter_width:].startswith(line[wrap_width:wrap_width * 2])
+
+
+async def test_cursor_motion_in_a_huge_line_stays_fast():
+    app = VimPi()
+    async with app.run_test() as pilot:
+        line = "{\"key\":\"value\t\",\"n\":[1,2,3]}," * 100_000
+        editor = await open_editor(pilot, app, f"start\n{line}\nend")
+        editor.move_cursor((1, len(line) // 2))
+        await pilot.pause()
+        started = time.perf_counter()
+        await pilot.press("right", "down", "up", "end", "home", "x")
+        await pilot.pause()
+        assert time.perf_counter() - started < 3
+        assert editor.document[1].startswith("x{")
@@ -0,0 +1,73 @@
+# tests/test_render.py
+
+from textual import events
+
+from src.main import VimPi, TextViewer
+from src.utils.Render import DirtyRows, TypingBatch, TO_BOTTOM
+
+
+def test_dirty_rows_merge_until_taken():
+    dirty = DirtyRows()
+    assert not dirty and dirty.take() is None
+    dirty.add(5)
+    dirty.add(2, 3)
+    assert dirty.take() == (2, 5)
+    dirty.add(4)
+    dirty.add_all()
+    assert dirty.take() == (0, TO_BOTTOM)
+    assert dirty.take() is None
+
+
+def test_typing_batch_keeps_the_first_selection():
+    batch = TypingBatch()
+    assert batch.add("a", ((0, 0), (0, 2)))
+    assert not batch.add("b", ((0, 1), (0, 1)))
+    assert batch.take() == ("ab", ((0, 0), (0, 2)))
+    assert not batch and batch.take() is None
+
+
+async def open_editor(pilot, app, text):
+    await pilot.press("ctrl+f")
+    editor = app.query_one(TextViewer)
+    editor.disabled = False
+    editor.load_text(text)
+    editor.focus()
+    await pilot.pause()
+    return editor
+
+
+async def test_burst_of_keys_is_one_edit():
+    app = VimPi()
+    async with app.run_test() as pilot:
+        editor = await open_editor(pilot, app, "first\nsecond")
+        edits = []
+        edit = editor.edit
+        editor.edit = lambda change: edits.append(change.text) or edit(change)
+        for character in "hello":
+            editor.post_message(events.Key(character, character))
+        # Keys pressed one at a time go in one at a time
+        await pilot.press("space", "w")
+        assert editor.text == "hello wfirst\nsecond"
+        assert edits == ["hello", " ", "w"]
+        # Keys that aren't typed text see everything typed before them
+        await pilot.press("backspace")
+        assert editor.text == "hello first\nsecond"
+
+
+async def test_typing_repaints_only_its_row():
+    app = VimPi()
+    async with app.run_test() as pilot:
+        editor = await open_editor(pilot, app, "a wide first line\n" + "\n".join(["row"] * 30))
+        await pilot.press("down", "down")
+        await pilot.pause()
+        rendered = []
+        render_line = editor.render_line
+        editor.render_line = lambda y: rendered.append(y) or render_line(y)
+        await pilot.press("x")
+        await pilot.pause()
+        assert set(rendered) == {2}
+        # A new line moves every row below it
+        rendered.clear()
+        await pilot.press("enter")
+        await pilot.pause()
+        assert max(rendered) > 10
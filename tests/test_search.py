@@ -0,0 +1,59 @@
+from src.main import VimPi, TextViewer
+from src.utils.Search import SearchIndex
+
+
+def test_incremental_search_reuses_matches():
+    index = SearchIndex("foo food fool\nfoo")
+    assert index.search("foo") == [0, 4, 9, 14]
+    assert index.search("food") == [4]
+    assert index.search("fo") == [0, 4, 9, 14]
+
+
+def test_chunked_scan_finds_matches_across_chunk_boundaries():
+    text = "ab" * 1000
+    index = SearchIndex(text)
+    for _ in index.scan("ba", chunk_size=7):
+        pass
+    assert index.matches == [i for i in range(1, len(text) - 1, 2)]
+
+
+def test_next_and_previous_wrap_around():
+    index = SearchIndex("x.x.x")
+    index.search("x")
+    assert index.next_match(0) == 2
+    assert index.next_match(4) == 0
+    assert index.previous_match(0) == 4
+    assert index.location_of(4) == (0, 4)
+
+
+async def test_find_next_in_editor():
+    app = VimPi()
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        editor = app.query_one(TextViewer)
+        editor.disabled = False
+        editor.load_text("one\ntwo one\nthree one")
+
+        editor.search("one")
+        assert editor.selection.start == (0, 0)
+
+        editor.action_find_next()
+        assert editor.selection.start == (1, 4)
+        editor.action_find_previous()
+        assert editor.selection.start == (0, 0)
+
+
+async def test_scrollbar_follows_the_editor():
+    app = VimPi()
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        editor = app.query_one(TextViewer)
+        editor.disabled = False
+        editor.load_text("\n".join(f"line {number} one" for number in range(300)))
+        editor.search("one")
+        await pilot.pause()
+
+        editor.scroll_to(y=120, animate=False)
+        await pilot.pause()
+        assert editor.scroll_y == 120
+        assert editor.vertical_scrollbar.position == 120
@@ -0,0 +1,116 @@
+# tests/test_sniff.py
+
+import codecs
+from types import SimpleNamespace
+
+import pytest
+
+from src.main import VimPi, TextViewer, FileExplorer
+from src.utils.Buffers import Buffer, BufferCache
+from src.utils.Sniff import FileKind, sniff, sniff_bytes, read_text, encode_text, hex_lines
+
+
+@pytest.mark.parametrize("data, encoding, bom, newline", [
+    (b"plain\ntext\n", "utf-8", b"", "\n"),
+    ("café\r\nnaïve\r\n".encode("utf-8"), "utf-8", b"", "\r\n"),
+    (codecs.BOM_UTF8 + b"marked\rold mac\r", "utf-8", codecs.BOM_UTF8, "\r"),
+    (codecs.BOM_UTF16_LE + "wide\n".encode("utf-16-le"), "utf-16-le", codecs.BOM_UTF16_LE, "\n"),
+    (codecs.BOM_UTF16_BE + "wide\n".encode("utf-16-be"), "utf-16-be", codecs.BOM_UTF16_BE, "\n"),
+    (codecs.BOM_UTF32_LE + "wider\n".encode("utf-32-le"), "utf-32-le", codecs.BOM_UTF32_LE, "\n"),
+    ("no mark\r\n".encode("utf-16-le"), "utf-16-le", b"", "\r\n"),
+    ("café €5\n".encode("cp1252"), "cp1252", b"", "\n"),
+    (b"\x81\x8d\xe9\n", "latin-1", b"", "\n"),
+])
+def test_sniffs_text(data, encoding, bom, newline):
+    kind = sniff_bytes(data)
+    assert (kind.binary, kind.encoding, kind.bom, kind.newline) == (False, encoding, bom, newline)
+
+
+def test_sniffs_binary():
+    assert sniff_bytes(b"\x7fELF\x02\x01\x01\x00\x00\x00").binary
+    assert sniff_bytes(bytes(range(1, 32)) * 4).binary
+    assert not sniff_bytes(b"\x1b[31mred\x1b[0m\tok\n").binary
+
+
+def test_character_cut_off_by_the_sample_is_not_an_error():
+    data = "é".encode("utf-8") * 10
+    assert sniff_bytes(data[:5], size=len(data)).encoding == "utf-8"
+    assert sniff_bytes(data[:5]).encoding == "cp1252"
+
+
+def test_read_and_save_round_trip(tmp_path):
+    path = tmp_path / "legacy.txt"
+    original = codecs.BOM_UTF8 + "été\r\nhiver\r\n".encode("utf-8")
+    path.write_bytes(original)
+    kind = sniff(path)
+    text = read_text(path, kind, chunk_size=3)
+    assert text == "été\nhiver\n"
+    assert encode_text(text, kind) == original
+
+    path.write_bytes("naïve\n€".encode("cp1252"))
+    kind = sniff(path)
+    assert read_text(path, kind) == "naïve\n€"
+
+
+def test_sniffing_reads_only_the_start(tmp_path):
+    path = tmp_path / "image.bin"
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n\0\0\0\rIHDR")
+        file.truncate(3 * 1024 ** 3)
+    kind = sniff(path)
+    assert kind.binary and kind.size == 3 * 1024 ** 3
+    assert hex_lines(b"\x89PNG\r\n\x1a\n\0\0\0\rIHDR") == [
+        "00000000  89 50 4e 47 0d 0a 1a 0a 00 00 00 0d 49 48 44 52  |.PNG........IHDR|"
+    ]
+    assert hex_lines(b"ab", offset=16) == ["00000010  61 62" + " " * 42 + "  |ab|"]
+
+
+def test_kind_survives_buffer_swap(tmp_path):
+    cache = BufferCache(memory_budget=0, swap_dir=tmp_path)
+    buffer = Buffer("legacy.txt", "text")
+    buffer.kind = FileKind(False, "utf-16-be", codecs.BOM_UTF16_BE, "\r\n", 10)
+    cache.put(buffer)
+    cache.put(Buffer("other.txt", "more"))
+    cache.evict()
+    assert cache.get("legacy.txt").kind == buffer.kind
+
+
+async def open_file(pilot, app, path):
+    await pilot.press("ctrl+f")
+    app.query_one(FileExplorer).file_selected(SimpleNamespace(path=path))
+    await pilot.pause()
+    return app.query_one(TextViewer)
+
+
+async def test_legacy_file_is_saved_as_it_was_read(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    path = tmp_path / "notes.txt"
+    path.write_bytes("café\r\nbar\r\n".encode("cp1252"))
+    app = VimPi(str(tmp_path))
+    async with app.run_test() as pilot:
+        editor = await open_file(pilot, app, path)
+        assert editor.text == "café\nbar\n"
+        editor.focus()
+        await pilot.press("x", "ctrl+s")
+        await pilot.pause()
+    assert path.read_bytes() == "xcafé\r\nbar\r\n".encode("cp1252")
+
+
+async def test_text_the_encoding_cant_hold_is_not_saved(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    path = tmp_path / "notes.txt"
+    original = "café\r\n".encode("cp1252")
+    path.write_bytes(original)
+    with pytest.raises(UnicodeEncodeError):
+        encode_text("日本", sniff(path))
+
+    app = VimPi(str(tmp_path))
+    async with app.run_test() as pilot:
+        editor = await open_file(pilot, app, path)
+        editor.insert("日本")
+        notifications = []
+        monkeypatch.setattr(app.screen, "notify", lambda message, **kwargs: notifications.append(message))
+        app.screen.action_save_current_file()
+        await pilot.pause()
+    assert path.read_bytes() == original
+    assert "cp1252" in notifications[-1]
@@ -0,0 +1,253 @@
+# tests/test_sync.py
+
+import os
+
+import pytest
+
+from src.utils.Sync import SyncTarget, SyncEngine, SyncPlan, LARGE_FILE
+from src.utils.Backends import LocalDirectoryBackend, S3Backend, FakeS3Client
+from conftest import make_tree
+
+TREE = {"notes/todo.txt": "buy milk", "notes/deep/idea.txt": "sync everything", "empty": None, "top.txt": "top level"}
+
+
+def read_tree(root):
+    return {os.path.relpath(os.path.join(path, name), root): open(os.path.join(path, name)).read()
+            for path, _, names in os.walk(root) for name in names}
+
+
+# Remove a tree made of single folder chains, deepest folder first
+def remove_deep_tree(root):
+    folders = [root]
+    while True:
+        children = [entry for entry in os.scandir(folders[-1]) if entry.is_dir()]
+        if not children:
+            break
+        folders.append(folders[-1] / children[0].name)
+    for folder in reversed(folders):
+        for entry in os.scandir(folder):
+            if entry.is_dir():
+                os.rmdir(entry.path)
+            else:
+                os.remove(entry.path)
+    os.rmdir(root)
+
+
+def set_mtime(path, timestamp):
+    os.utime(path, (timestamp, timestamp))
+
+
+@pytest.fixture(params=["local", "s3"])
+def target(request, tmp_path):
+    if request.param == "local":
+        return LocalDirectoryBackend(tmp_path / "nas")
+    return S3Backend("bucket", client=FakeS3Client())
+
+
+def test_round_trip(target, tmp_path):
+    make_tree(tmp_path / "first", TREE)
+    folder_id = target.get_or_create_folder("vim_pi")
+
+    SyncEngine(target).synchronize(tmp_path / "first", folder_id)
+    SyncEngine(target).synchronize(tmp_path / "second", folder_id)
+
+    assert read_tree(tmp_path / "second") == read_tree(tmp_path / "first")
+    assert (tmp_path / "second" / "empty").is_dir()
+    assert int(os.path.getmtime(tmp_path / "second" / "top.txt")) == int(os.path.getmtime(tmp_path / "first" / "top.txt"))
+
+
+def test_newer_copy_wins_inside_subfolders(target, tmp_path):
+    make_tree(tmp_path / "first", TREE)
+    folder_id = target.get_or_create_folder("vim_pi")
+    engine = SyncEngine(target)
+    engine.synchronize(tmp_path / "first", folder_id)
+    engine.synchronize(tmp_path / "second", folder_id)
+
+    # Edit nested files without touching the folders' own modification times
+    edited = tmp_path / "first" / "notes" / "deep" / "idea.txt"
+    edited.write_text("edited on first")
+    set_mtime(edited, os.path.getmtime(edited) + 10)
+    engine.synchronize(tmp_path / "first", folder_id)
+    engine.synchronize(tmp_path / "second", folder_id)
+
+    assert (tmp_path / "second" / "notes" / "deep" / "idea.txt").read_text() == "edited on first"
+
+
+def test_unchanged_sync_moves_nothing(tmp_path):
+    client = FakeS3Client()
+    target = S3Backend("bucket", client=client)
+    make_tree(tmp_path / "local", TREE)
+    folder_id = target.get_or_create_folder("vim_pi")
+    SyncEngine(target).synchronize(tmp_path / "local", folder_id)
+
+    client.requests.clear()
+    SyncEngine(target).synchronize(tmp_path / "local", folder_id)
+
+    assert set(client.requests) == {'list'}
+
+
+def test_multipart_upload_runs_parts_in_parallel(tmp_path):
+    client = FakeS3Client(latency=0.02)
+    target = S3Backend("bucket", client=client, part_size=1024, max_workers=4)
+    data = os.urandom(10 * 1024 + 17)
+    (tmp_path / "big.bin").write_bytes(data)
+
+    key = target.upload(tmp_path / "big.bin", "big.bin", target.get_or_create_folder("vim_pi"))
+    target.download(key, tmp_path / "copy.bin")
+
+    assert client.requests['upload_part'] == 11
+    assert client.max_concurrent_parts > 1
+    assert (tmp_path / "copy.bin").read_bytes() == data
+    assert client.objects[key]['ETag'].endswith('-11"')
+
+
+def test_failed_multipart_upload_is_aborted(tmp_path, monkeypatch):
+    client = FakeS3Client()
+    target = S3Backend("bucket", client=client, part_size=1024)
+    (tmp_path / "big.bin").write_bytes(os.urandom(4096))
+
+    def fail(**arguments):
+        raise ConnectionError("connection reset")
+    monkeypatch.setattr(client, "upload_part", fail)
+
+    with pytest.raises(ConnectionError):
+        target.upload(tmp_path / "big.bin", "big.bin", "")
+
+    assert client.requests['abort_multipart'] == 1
+    assert "big.bin" not in client.objects
+
+
+def test_s3_listing_follows_pages(tmp_path):
+    client = FakeS3Client(max_keys=2)
+    target = S3Backend("bucket", client=client)
+    for index in range(5):
+        (tmp_path / f"file_{index}.txt").write_text(str(index))
+        target.upload(tmp_path / f"file_{index}.txt", f"file_{index}.txt", "")
+
+    assert sorted(entry['name'] for entry in target.list_entries("")) == [f"file_{index}.txt" for index in range(5)]
+
+
+def test_delete_folder(target, tmp_path):
+    make_tree(tmp_path / "local", TREE)
+    folder_id = target.get_or_create_folder("vim_pi")
+    SyncEngine(target).synchronize(tmp_path / "local", folder_id)
+
+    notes = next(entry for entry in target.list_entries(folder_id) if entry['name'] == "notes")
+    target.delete(notes['id'])
+
+    assert "notes" not in [entry['name'] for entry in target.list_entries(folder_id)]
+
+
+def test_deep_tree_does_not_hit_recursion_limit(tmp_path):
+    depth = 1200
+    deepest = tmp_path / "local"
+    deepest.mkdir()
+    # One level at a time, pathlib's mkdir(parents=True) recurses itself
+    for _ in range(depth):
+        deepest = deepest / "d"
+        deepest.mkdir()
+    (deepest / "bottom.txt").write_text("found me")
+    target = LocalDirectoryBackend(tmp_path / "nas")
+
+    try:
+        SyncEngine(target).synchronize(tmp_path / "local", target.get_or_create_folder("vim_pi"))
+
+        assert (tmp_path / "nas" / "vim_pi" / os.path.join(*["d"] * depth) / "bottom.txt").read_text() == "found me"
+    finally:
+        # shutil.rmtree recurses too, so pytest couldn't clean these up later
+        for root in (tmp_path / "local", tmp_path / "nas" / "vim_pi"):
+            remove_deep_tree(root)
+
+
+def test_each_folder_is_listed_once(tmp_path):
+    client = FakeS3Client()
+    target = S3Backend("bucket", client=client)
+    for folder in range(5):
+        for subfolder in range(3):
+            path = tmp_path / "local" / f"folder_{folder}" / f"sub_{subfolder}"
+            path.mkdir(parents=True)
+            for index in range(20):
+                (path / f"file_{index}.txt").write_text(str(index))
+    folder_id = target.get_or_create_folder("vim_pi")
+    SyncEngine(target).synchronize(tmp_path / "local", folder_id)
+
+    client.requests.clear()
+    visited = list(SyncEngine(target).walk(tmp_path / "local", folder_id))
+
+    assert len(visited) == 1 + 5 + 5 * 3
+    assert client.requests == {'list': len(visited)}
+    assert visited[1] == tmp_path / "local" / "folder_0"
+
+
+def test_plan_lists_operations_without_changing_anything(target, tmp_path):
+    make_tree(tmp_path / "local", TREE)
+    engine = SyncEngine(target)
+
+    assert target.find_folder("vim_pi") is None
+    plan = engine.plan(tmp_path / "local", None, "vim_pi")
+
+    assert target.find_folder("vim_pi") is None
+    kinds = [operation.kind for operation in plan.operations]
+    assert kinds.count('create_folder') == 4
+    assert kinds.count('upload') == 3
+    assert plan.bytes('upload') == len("buy milk") + len("sync everything") + len("top level")
+
+    engine.execute(plan)
+    assert target.find_folder("vim_pi") is not None
+    engine.synchronize(tmp_path / "copy", target.find_folder("vim_pi"))
+    assert read_tree(tmp_path / "copy") == read_tree(tmp_path / "local")
+    assert engine.plan(tmp_path / "local", target.find_folder("vim_pi")).pending() == []
+
+
+def test_small_files_go_before_large_ones(tmp_path):
+    uploaded = []
+
+    class RecordingTarget(LocalDirectoryBackend):
+        def upload(self, local_path, name, parent_id, file_id=None):
+            uploaded.append(name)
+            return super().upload(local_path, name, parent_id, file_id)
+
+    (tmp_path / "local").mkdir()
+    (tmp_path / "local" / "a_large.bin").write_bytes(b"x" * LARGE_FILE)
+    (tmp_path / "local" / "b_medium.txt").write_bytes(b"x" * 1000)
+    (tmp_path / "local" / "c_small.txt").write_bytes(b"x")
+    target = RecordingTarget(tmp_path / "nas")
+
+    engine = SyncEngine(target)
+    engine.execute(engine.plan(tmp_path / "local", target.get_or_create_folder("vim_pi")), max_workers=1)
+
+    assert uploaded == ["c_small.txt", "b_medium.txt", "a_large.bin"]
+
+
+def test_saved_plan_resumes_where_it_stopped(tmp_path):
+    make_tree(tmp_path / "local", TREE)
+    target = LocalDirectoryBackend(tmp_path / "nas")
+    engine = SyncEngine(target)
+    plan = engine.plan(tmp_path / "local", None, "vim_pi")
+    plan.save(tmp_path / "plan.json")
+
+    # Run the folder creations and the first upload, then "crash"
+    for operation in plan.operations:
+        if operation.kind == 'upload':
+            engine.run_operation(plan, operation)
+            break
+        engine.run_operation(plan, operation)
+    (tmp_path / "local" / "notes" / "todo.txt").write_text("changed after the crash")
+
+    resumed = SyncPlan.load(tmp_path / "plan.json")
+    assert [operation.name for operation in resumed.pending()] == ["deep", "todo.txt", "idea.txt"]
+    engine.execute(resumed)
+    resumed.discard()
+
+    assert read_tree(tmp_path / "nas" / "vim_pi")["top.txt"] == "top level"
+    assert read_tree(tmp_path / "nas" / "vim_pi")[os.path.join("notes", "todo.txt")] == "changed after the crash"
+    assert not (tmp_path / "plan.json").exists()
+
+
+def test_targets_must_implement_every_operation():
+    class ListOnly(SyncTarget):
+        def list_entries(self, folder_id):
+            return []
+
+    with pytest.raises(TypeError):
+        ListOnly()
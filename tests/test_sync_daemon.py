@@ -0,0 +1,83 @@
+# tests/test_sync_daemon.py
+
+import json
+import threading
+
+import pytest
+
+from src.synchronize import SyncDaemon, DaemonClient, load_config, request_sync, create_key, key_path, main
+from conftest import wait_for
+
+
+def test_load_config_resolves_roots_next_to_the_file(tmp_path):
+    (tmp_path / "sync.json").write_text(json.dumps({"interval": 5, "roots": [{"path": "notes"}]}))
+
+    config = load_config(tmp_path / "sync.json")
+
+    assert config["interval"] == 5 and config["jitter"] == 0.1
+    assert config["roots"] == [{"path": str(tmp_path / "notes"), "folder": "vim_pi", "target": "drive", "interval": 5,
+                                "priority": 0, "share": 1.0}]
+
+
+def test_clients_share_one_daemon(tmp_path):
+    (tmp_path / "notes").mkdir()
+    (tmp_path / "sync.json").write_text(json.dumps({
+        "interval": 3600,
+        "roots": [{"path": "notes", "target": f"local:{tmp_path / 'nas'}"}],
+    }))
+    address = str(tmp_path / "s.sock")
+    authkey = b"test key"
+    daemon = SyncDaemon(load_config(tmp_path / "sync.json"), address=address)
+    daemon.start()
+    server = threading.Thread(target=daemon.serve, args=(authkey,))
+    server.start()
+    wait_for(lambda: daemon.listener is not None)
+
+    with DaemonClient(address, authkey) as client:
+        wait_for(lambda: client.send("status")["roots"][str(tmp_path / "notes")]["passes"] == 1)
+
+    # Two editor sessions asking for a sync after a save
+    (tmp_path / "notes" / "todo.txt").write_text("saved")
+    assert request_sync(tmp_path / "notes" / "todo.txt", address, authkey)
+    assert request_sync(tmp_path / "notes" / "todo.txt", address, authkey)
+    wait_for(lambda: (tmp_path / "nas" / "vim_pi" / "todo.txt").exists())
+    assert not request_sync(tmp_path / "elsewhere.txt", address, authkey)
+
+    with DaemonClient(address, authkey) as client:
+        assert client.send("stop") == {"ok": True}
+    server.join(timeout=5)
+    assert not server.is_alive()
+    assert not request_sync(tmp_path / "notes" / "todo.txt", address, authkey)
+
+
+def test_second_daemon_refuses_to_start(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    (tmp_path / "sync.json").write_text(json.dumps({"interval": 3600, "roots": []}))
+    config = load_config(tmp_path / "sync.json")
+    authkey = create_key()
+    daemon = SyncDaemon(config)
+    daemon.start()
+    server = threading.Thread(target=daemon.serve, args=(authkey,))
+    server.start()
+    wait_for(lambda: daemon.listener is not None)
+
+    with pytest.raises(OSError):
+        SyncDaemon(config).serve(b"another key")
+    assert main(["run", "--config", str(tmp_path / "sync.json")]) == 1
+    # The running daemon keeps its socket and its clients keep their key
+    assert key_path().read_bytes() == authkey
+    with DaemonClient() as client:
+        assert client.send("stop") == {"ok": True}
+    server.join(timeout=5)
+
+    # A socket left behind by a daemon that died is taken over
+    open(daemon.address, "w").close()
+    stale = SyncDaemon(config)
+    stale.start()
+    server = threading.Thread(target=stale.serve, args=(authkey,))
+    server.start()
+    wait_for(lambda: stale.listener is not None)
+    stale.stop()
+    server.join(timeout=5)
+    assert not server.is_alive()
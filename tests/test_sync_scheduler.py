@@ -0,0 +1,101 @@
+# tests/test_sync_scheduler.py
+
+import time
+import threading
+
+from src.utils.Backends import LocalDirectoryBackend
+from src.utils.SyncScheduler import SyncScheduler, SyncRoot, RequestBudget
+
+
+def make_roots(tmp_path, uploaded, settings):
+    class RecordingTarget(LocalDirectoryBackend):
+        def upload(self, local_path, name, parent_id, file_id=None):
+            uploaded.append(name)
+            return super().upload(local_path, name, parent_id, file_id)
+
+    roots = []
+    for name, files, options in settings:
+        (tmp_path / name).mkdir()
+        for index in range(files):
+            (tmp_path / name / f"{name}_{index}.txt").write_text("x" * 100)
+        roots.append(SyncRoot(tmp_path / name, lambda name=name: RecordingTarget(tmp_path / "nas" / name), **options))
+    return roots
+
+
+def test_focused_root_goes_first_then_priority(tmp_path):
+    uploaded = []
+    roots = make_roots(tmp_path, uploaded, [("low", 2, {}), ("high", 2, {"priority": 5}), ("edited", 2, {})])
+    scheduler = SyncScheduler(roots, max_workers=1)
+    scheduler.focus(tmp_path / "edited" / "edited_0.txt")
+
+    scheduler.run_round(roots)
+
+    assert [name.split("_")[0] for name in uploaded] == ["edited"] * 2 + ["high"] * 2 + ["low"] * 2
+    assert all(root.passes == 1 for root in roots)
+    assert (tmp_path / "nas" / "low" / "vim_pi" / "low_1.txt").exists()
+
+
+def test_roots_of_equal_priority_split_transfers_by_share(tmp_path):
+    uploaded = []
+    roots = make_roots(tmp_path, uploaded, [("big", 12, {"share": 3.0}), ("small", 12, {"share": 1.0})])
+    scheduler = SyncScheduler(roots, max_workers=1)
+
+    scheduler.run_round(roots)
+
+    first = [name.split("_")[0] for name in uploaded[:8]]
+    assert first.count("big") == 6 and first.count("small") == 2
+    assert len(uploaded) == 24
+
+
+def test_sync_now_during_a_round_is_kept(tmp_path):
+    roots = make_roots(tmp_path, [], [("notes", 1, {"interval": 3600})])
+    scheduler = SyncScheduler(roots)
+    scheduler.run_round(roots)
+    assert roots[0].due > scheduler.clock()
+
+    scheduler.sync_now(tmp_path / "notes" / "notes_0.txt")
+    assert roots[0].due == 0.0
+
+
+def test_request_budget_spaces_requests_out():
+    now = [0.0]
+    budget = RequestBudget(60, burst=2, clock=lambda: now[0], sleep=lambda seconds: now.__setitem__(0, now[0] + seconds))
+
+    for _ in range(5):
+        budget.acquire()
+
+    # Two right away, then one a second
+    assert now[0] == 3.0
+    assert budget.waited == 3.0
+
+
+def test_transfers_stay_within_each_targets_limit(tmp_path):
+    running, most = {}, {}
+    lock = threading.Lock()
+
+    class SlowTarget(LocalDirectoryBackend):
+        def upload(self, local_path, name, parent_id, file_id=None):
+            root = name.split("_")[0]
+            with lock:
+                running[root] = running.get(root, 0) + 1
+                most[root] = max(most.get(root, 0), running[root])
+            time.sleep(0.02)
+            with lock:
+                running[root] -= 1
+            return super().upload(local_path, name, parent_id, file_id)
+
+    class DriveLike(SlowTarget):
+        max_parallel = 1
+
+    roots = []
+    for name, target in (("drive", DriveLike), ("nas", SlowTarget)):
+        (tmp_path / name).mkdir()
+        for index in range(6):
+            (tmp_path / name / f"{name}_{index}.txt").write_text("x")
+        roots.append(SyncRoot(tmp_path / name, lambda name=name, target=target: target(tmp_path / "remote" / name)))
+    scheduler = SyncScheduler(roots, max_workers=4)
+
+    scheduler.run_round(roots)
+
+    assert most["drive"] == 1 and most["nas"] > 1
+    assert len(list((tmp_path / "remote" / "drive" / "vim_pi").iterdir())) == 6
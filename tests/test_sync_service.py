@@ -0,0 +1,108 @@
+# tests/test_sync_service.py
+
+import threading
+
+from src.main import VimPi
+from src.utils.Utils import Drive
+from src.utils.Backends import LocalDirectoryBackend, FakeDriveBackend
+from src.utils.SyncService import SyncService, IDLE, PAUSED, STOPPED
+from conftest import wait_for
+
+
+def start(service):
+    thread = threading.Thread(target=service.run)
+    thread.start()
+    return thread
+
+
+def test_passes_run_on_demand_and_stop_promptly(tmp_path):
+    (tmp_path / "local").mkdir()
+    (tmp_path / "local" / "first.txt").write_text("one")
+    states = []
+    service = SyncService(lambda: LocalDirectoryBackend(tmp_path / "nas"), tmp_path / "local", interval=3600,
+                          on_status=lambda state, text: states.append(state))
+    thread = start(service)
+
+    wait_for(lambda: service.passes == 1)
+    assert (tmp_path / "nas" / "vim_pi" / "first.txt").read_text() == "one"
+
+    (tmp_path / "local" / "second.txt").write_text("two")
+    service.sync_now()
+    wait_for(lambda: service.passes == 2)
+    assert (tmp_path / "nas" / "vim_pi" / "second.txt").read_text() == "two"
+
+    service.stop()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert IDLE in states and states[-1] == STOPPED
+
+
+def test_pause_holds_passes_until_resumed(tmp_path):
+    (tmp_path / "local").mkdir()
+    service = SyncService(lambda: LocalDirectoryBackend(tmp_path / "nas"), tmp_path / "local", interval=3600)
+    thread = start(service)
+    wait_for(lambda: service.passes == 1)
+
+    service.pause()
+    service.sync_now()
+    wait_for(lambda: service.state == PAUSED)
+    assert service.passes == 1
+
+    service.resume()
+    wait_for(lambda: service.passes == 2)
+    service.stop()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_failed_connection_is_retried(tmp_path):
+    (tmp_path / "local").mkdir()
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("offline")
+        return LocalDirectoryBackend(tmp_path / "nas")
+
+    service = SyncService(connect, tmp_path / "local", interval=0.01)
+    thread = start(service)
+    wait_for(lambda: service.passes == 1)
+    service.stop()
+    thread.join(timeout=5)
+
+    assert isinstance(service.last_error, ConnectionError)
+    assert len(attempts) == 2
+
+
+def test_delay_stays_within_jitter():
+    service = SyncService(None, ".", interval=60, jitter=0.1, seed=1)
+    delays = [service.next_delay() for _ in range(200)]
+
+    assert all(54 <= delay <= 66 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+async def test_sync_screen_runs_in_background_and_stops_on_quit(tmp_path):
+    (tmp_path / "notes.txt").write_text("hello")
+    app = VimPi(CURRENT_DIR=str(tmp_path))
+    async with app.run_test() as pilot:
+        app.action_enable_drive_sync()
+        await pilot.pause()
+        screen = app.screen
+        backend = FakeDriveBackend()
+        screen.drive = Drive(backend=backend)
+
+        await pilot.click("#sync-button")
+        for _ in range(100):
+            if screen.drive_status == IDLE:
+                break
+            await pilot.pause(0.05)
+        assert screen.drive_status == IDLE
+        assert any(item['name'] == "notes.txt" for item in backend.files.values())
+        await pilot.pause(screen.DASHBOARD_REFRESH * 2)
+        assert "notes.txt" in str(screen.query_one("#sync-dashboard").renderable)
+
+        app.action_quit_app()
+        await pilot.pause()
+    assert app.sync_service.is_stopped()
@@ -0,0 +1,52 @@
+# tests/test_sync_stats.py
+
+from src.utils.Sync import SyncEngine, SyncOperation
+from src.utils.SyncStats import SyncStats, RATE_WINDOW, describe
+from src.utils.Backends import LocalDirectoryBackend
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_rate_and_eta_follow_finished_transfers():
+    clock = Clock()
+    stats = SyncStats(clock=clock)
+    stats.start_pass(3, 3000)
+    first = SyncOperation(0, 'upload', "a.txt", "a.txt", size=1000)
+    stats.start_operation(first)
+    assert stats.snapshot()['in_flight'] == ["a.txt"]
+    stats.finish_operation(first, 0.5)
+
+    snapshot = stats.snapshot()
+    assert snapshot['rate'] == 1000 / RATE_WINDOW
+    assert snapshot['eta'] == 2000 / snapshot['rate']
+    assert snapshot['queued'] == 2 and snapshot['in_flight'] == []
+    assert snapshot['recent'] == [('upload', "a.txt", 1000, 0.5)]
+
+    clock.now += RATE_WINDOW + 1
+    assert stats.snapshot()['rate'] == 0
+    clock.now += 60
+    assert stats.snapshot()['requests_per_minute'] == 0
+    assert stats.snapshot()['requests'] == 1
+
+
+def test_engine_feeds_the_counters(tmp_path):
+    (tmp_path / "local" / "sub").mkdir(parents=True)
+    (tmp_path / "local" / "one.txt").write_text("1" * 10)
+    (tmp_path / "local" / "sub" / "two.txt").write_text("2" * 20)
+    stats = SyncStats()
+    target = LocalDirectoryBackend(tmp_path / "nas")
+
+    SyncEngine(target, stats).synchronize(tmp_path / "local", target.get_or_create_folder("vim_pi"))
+
+    snapshot = stats.snapshot()
+    assert snapshot['files'] == 2 and snapshot['bytes'] == 30
+    # One listing (the new folder has nothing to list), one folder created and two uploads
+    assert snapshot['requests'] == 4
+    assert snapshot['passes'] == 1 and snapshot['queued'] == 0 and snapshot['eta'] is None
+    assert "Recently synchronized:" in describe(snapshot)
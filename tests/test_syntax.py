@@ -0,0 +1,63 @@
+import pytest
+from textual.document._document import Document
+from textual.document._syntax_aware_document import SyntaxAwareDocument
+
+from src.main import VimPi, TextViewer
+from src.utils.Syntax import IndexedSyntaxDocument, detect_language, SYNTAX_SIZE_LIMIT
+
+
+def test_language_detection():
+    assert detect_language("src/main.py") == "python"
+    assert detect_language("layout.TCSS") == "css"
+    assert detect_language("notes.txt") is None
+    assert detect_language("huge.py", SYNTAX_SIZE_LIMIT + 1) is None
+
+
+def test_indexed_offsets_match_after_edits():
+    pytest.importorskip("tree_sitter_languages")
+    text = "def f():\n    return 'é'\n\nx = 1\n"
+    indexed = IndexedSyntaxDocument(text, "python")
+    plain = SyntaxAwareDocument(text, "python")
+
+    for start, end, insert in [((1, 4), (1, 4), "a\nb"), ((0, 0), (0, 3), "async def"), ((3, 0), (4, 0), "")]:
+        indexed.replace_range(start, end, insert)
+        plain.replace_range(start, end, insert)
+        for row in range(plain.line_count):
+            location = (row, len(plain[row]))
+            assert indexed._location_to_byte_offset(location) == plain._location_to_byte_offset(location)
+
+    indexed.reparse()
+    assert str(indexed._syntax_tree.root_node.sexp()) == str(plain._syntax_tree.root_node.sexp())
+
+
+async def test_only_viewport_is_highlighted_at_first():
+    pytest.importorskip("tree_sitter_languages")
+    app = VimPi()
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        editor = app.query_one(TextViewer)
+        editor.language = "python"
+        editor.load_text("x = 1\n" * 5000)
+
+        covered_start, covered_end = editor._highlighted_rows
+        assert covered_start == 0 and covered_end < 5000
+        assert max(editor._highlights) < covered_end
+
+        # The rest of the file is highlighted in the background
+        await pilot.pause(1.0)
+        assert editor._highlighted_rows == (0, 5001)
+
+
+async def test_parsed_text_gets_an_indexed_document():
+    pytest.importorskip("tree_sitter_languages")
+    app = VimPi()
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        editor = app.query_one(TextViewer)
+        editor.language = "python"
+        editor.load_text("x = 1\n")
+        assert type(editor.document) is IndexedSyntaxDocument
+        assert editor._highlight_query is not None
+
+        editor.language = None
+        assert type(editor.document) is Document
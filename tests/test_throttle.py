@@ -0,0 +1,128 @@
+# tests/test_throttle.py
+
+import time as time_module
+import threading
+from datetime import datetime
+
+from src.utils.Utils import Drive
+from src.utils.Backends import LocalDirectoryBackend, FakeDriveBackend
+from src.utils.SyncService import SyncService, WAITING
+from src.utils.Throttle import (TokenBucket, TransferWindow, BandwidthLimiter, CHUNK_SIZE, SLOW_KEYSTROKE,
+                                MIN_FACTOR, IDLE_RECOVERY)
+
+KiB = 1024
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket_paces_after_the_burst():
+    time = FakeTime()
+    bucket = TokenBucket(100 * KiB, capacity=100 * KiB, clock=time.clock, sleep=time.sleep)
+
+    for _ in range(4):
+        bucket.consume(100 * KiB)
+
+    assert time.now == 3.0
+
+
+def test_upload_and_download_limits_are_separate(tmp_path):
+    time = FakeTime()
+    limiter = BandwidthLimiter(upload_rate=CHUNK_SIZE, download_rate=4 * CHUNK_SIZE, clock=time.clock,
+                               sleep=time.sleep)
+    target = LocalDirectoryBackend(tmp_path / "nas")
+    target.limiter = limiter
+    (tmp_path / "big.bin").write_bytes(b"x" * 4 * CHUNK_SIZE)
+
+    file_id = target.upload(tmp_path / "big.bin", "big.bin", "")
+    # The first chunk goes with the initial burst, one a second after that
+    assert time.now == 3.0
+
+    target.download(file_id, tmp_path / "copy.bin")
+    assert time.now == 3.0
+    target.download(file_id, tmp_path / "copy.bin")
+    assert time.now == 4.0
+    assert (tmp_path / "copy.bin").read_bytes() == b"x" * 4 * CHUNK_SIZE
+
+
+def test_drive_transfers_are_paced_in_the_backend(tmp_path):
+    time = FakeTime()
+    backend = FakeDriveBackend()
+    drive = Drive(backend=backend)
+    drive.limiter = BandwidthLimiter(upload_rate=CHUNK_SIZE, clock=time.clock, sleep=time.sleep)
+    (tmp_path / "notes.txt").write_bytes(b"n" * 3 * CHUNK_SIZE)
+
+    drive.upload(tmp_path / "notes.txt", "notes.txt", "root")
+
+    assert backend.limiter is drive.limiter
+    assert time.now == 2.0
+
+
+def test_transfer_window_across_midnight():
+    window = TransferWindow("22:00-07:00")
+
+    assert window.contains(datetime(2024, 5, 1, 23, 30))
+    assert window.contains(datetime(2024, 5, 2, 6, 59))
+    assert not window.contains(datetime(2024, 5, 2, 7, 0))
+    assert window.seconds_until_open(datetime(2024, 5, 2, 21, 0)) == 3600
+    assert window.seconds_until_open(datetime(2024, 5, 2, 23, 0)) == 0
+
+
+def test_slow_keystrokes_back_sync_off_until_typing_is_fast_again():
+    time = FakeTime()
+    limiter = BandwidthLimiter(clock=time.clock, sleep=time.sleep)
+    limiter.consume_upload(10 * CHUNK_SIZE)
+    assert time.now == 0
+
+    for _ in range(3):
+        limiter.report_latency(SLOW_KEYSTROKE * 4)
+    assert limiter.factor < 1
+    limiter.consume_upload(10 * CHUNK_SIZE)
+    assert time.now > 0
+
+    for _ in range(20):
+        limiter.report_latency(0.001)
+    assert limiter.factor == 1.0
+
+
+def test_backoff_recovers_once_typing_stops():
+    time = FakeTime()
+    limiter = BandwidthLimiter(clock=time.clock, sleep=time.sleep)
+    for _ in range(10):
+        limiter.report_latency(SLOW_KEYSTROKE * 4)
+    assert limiter.factor == MIN_FACTOR
+
+    time.now += IDLE_RECOVERY / 2
+    limiter.consume_upload(CHUNK_SIZE)
+    assert limiter.factor == MIN_FACTOR
+
+    time.now += 10 * IDLE_RECOVERY
+    before = time.now
+    limiter.consume_upload(10 * CHUNK_SIZE)
+    assert limiter.factor == 1.0 and time.now == before
+
+
+def test_service_waits_for_the_transfer_window(tmp_path):
+    (tmp_path / "local").mkdir()
+    limiter = BandwidthLimiter(windows=["02:00-03:00"], now=lambda: datetime(2024, 5, 2, 12, 0))
+    states = []
+    service = SyncService(lambda: LocalDirectoryBackend(tmp_path / "nas"), tmp_path / "local", limiter=limiter,
+                          on_status=lambda state, text: states.append(state))
+    thread = threading.Thread(target=service.run)
+    thread.start()
+    deadline = time_module.monotonic() + 5
+    while service.state != WAITING and time_module.monotonic() < deadline:
+        time_module.sleep(0.01)
+    service.stop()
+    thread.join(timeout=5)
+
+    assert states[0] == WAITING
+    assert service.passes == 0
@@ -0,0 +1,107 @@
+from textual.widgets.text_area import Edit, EditResult
+
+from src.main import VimPi, TextViewer
+from src.utils.Undo import UndoStore, encode_batch, decode_batch, text_hash
+
+
+def make_edit(text, start, end, result_end, replaced):
+    edit = Edit(text, start, end, False)
+    edit._edit_result = EditResult(result_end, replaced)
+    return edit
+
+
+def test_batches_round_trip():
+    batch = [make_edit("é\nx", (40, 2), (41, 0), (41, 1), "old"), make_edit("", (3, 1), (3, 4), (3, 1), "abc")]
+    decoded, _ = decode_batch(encode_batch(batch))
+    assert [(e.text, e.from_location, e.to_location, e._edit_result) for e in decoded] == \
+        [(e.text, e.from_location, e.to_location, e._edit_result) for e in batch]
+
+
+def test_store_keeps_newest_batches_within_limits(tmp_path):
+    store = UndoStore(tmp_path, max_batches=2)
+    batches = [[make_edit(str(i), (0, 0), (0, 0), (0, 1), "")] for i in range(5)]
+    store.save("file.txt", text_hash("text"), batches)
+
+    assert [b[0].text for b in store.load("file.txt", text_hash("text"))] == ["3", "4"]
+    assert store.load("file.txt", text_hash("other text")) == []
+
+
+async def test_undo_continues_into_saved_history(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    path = tmp_path / "notes.txt"
+    path.write_text("hello")
+
+    app = VimPi(str(tmp_path))
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        screen = app.screen
+        screen.load_new_file(screen.query_one("#FileExplorerPanel").TextViewerUpdated("hello", str(path)))
+        editor = app.query_one(TextViewer)
+        editor.insert(" world", (0, 5))
+        screen.action_save_current_file()
+        screen.action_close_current_file()
+
+        screen.load_new_file(screen.query_one("#FileExplorerPanel").TextViewerUpdated("hello world", str(path)))
+        assert editor.persisted_undo is None
+        editor.undo()
+        assert editor.text == "hello"
+        editor.redo()
+        assert editor.text == "hello world"
+
+
+async def test_saved_history_is_read_at_most_once(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    loads = []
+    load = UndoStore.load
+    monkeypatch.setattr(UndoStore, "load", lambda self, *args: loads.append(args) or load(self, *args))
+    for name in ("a.txt", "b.txt"):
+        (tmp_path / name).write_text(name)
+
+    app = VimPi(str(tmp_path))
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        screen = app.screen
+        explorer = screen.query_one("#FileExplorerPanel")
+        for name in ("a.txt", "b.txt", "a.txt", "b.txt"):
+            screen.load_new_file(explorer.TextViewerUpdated(name, str(tmp_path / name)))
+        assert loads == []
+
+        editor = app.query_one(TextViewer)
+        editor.insert("edited ", (0, 0))
+        for name in ("a.txt", "b.txt", "a.txt", "b.txt"):
+            screen.load_new_file(explorer.TextViewerUpdated(name, str(tmp_path / name)))
+        assert loads == []
+
+        screen.load_new_file(explorer.TextViewerUpdated("a.txt", str(tmp_path / "a.txt")))
+        screen.action_save_current_file()
+        editor.insert("more ", (0, 0))
+        screen.action_save_current_file()
+        assert len(loads) == 1
+
+
+async def test_closing_without_saving_keeps_the_saved_history(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    path = tmp_path / "notes.txt"
+    path.write_text("hello")
+
+    app = VimPi(str(tmp_path))
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        screen = app.screen
+        explorer = screen.query_one("#FileExplorerPanel")
+        screen.load_new_file(explorer.TextViewerUpdated("hello", str(path)))
+        editor = app.query_one(TextViewer)
+        editor.insert(" world", (0, 5))
+        screen.action_save_current_file()
+
+        # Edited and switched away from, then closed without saving
+        editor.insert("!", (0, 11))
+        (tmp_path / "other.txt").write_text("other")
+        screen.load_new_file(explorer.TextViewerUpdated("other", str(tmp_path / "other.txt")))
+        screen.load_new_file(explorer.TextViewerUpdated("hello world!", str(path)))
+        screen.action_close_current_file()
+
+        screen.load_new_file(explorer.TextViewerUpdated(path.read_text(), str(path)))
+        assert editor.text == "hello world"
+        editor.undo()
+        assert editor.text == "hello"
@@ -0,0 +1,110 @@
+# tests/test_vim.py
+
+import pytest
+
+from src.main import VimPi, TextViewer
+from src.utils.Vim import Vim, LineBuffer, Keymap, NORMAL, INSERT, VISUAL
+
+
+def run(text, keys, cursor=(0, 0)):
+    buffer = LineBuffer(text, cursor)
+    vim = Vim(buffer)
+    vim.run_keys(keys)
+    return buffer.text, vim
+
+
+@pytest.mark.parametrize("text, keys, expected", [
+    ("hello world foo", "dw", "world foo"),
+    ("hello world foo", "2dw", "foo"),
+    ("hello world foo", "d2w", "foo"),
+    ("hello world foo", "cwbye<esc>", "bye world foo"),
+    ("one two\nthree", "wdw", "one \nthree"),
+    ("a\nb\nc\nd", "2dd", "c\nd"),
+    ("a\nb\nc\nd", "jdG", "a"),
+    ("a\nb\nc\nd", "ddp", "b\na\nc\nd"),
+    ("abc def", "xp", "bac def"),
+    ("abcabc", "fcx;x", "abab"),
+    ("a b c", "$dFa", "c"),
+    ("foo(bar, baz) x", "fbdi(", "foo() x"),
+    ("foo(bar, baz) x", "fbda(", "foo x"),
+    ('say "hi there" ok', 'ci"yo<esc>', 'say "yo" ok'),
+    ("a\nb\n\nc", "dap", "c"),
+    ("x (a (b) c) y", "f(%x", "x (a (b) c y"),
+    ("line", ">>", "    line"),
+    ("    line", "<lt><lt>", "line"),
+    ("Hello World", "gUiw", "HELLO World"),
+    ("a\nb\nc", "3J", "a b c"),
+    ("hello", "3rx", "xxxlo"),
+    ("one two three", "vex", " two three"),
+    ("a\nb\nc", "Vjd", "c"),
+    ("foo bar", "3ix<esc>", "xxxfoo bar"),
+    ("a\nb", '"ayyj"ap', "a\nb\na"),
+    ("hello", "xxuu<c-r>", "ello"),
+])
+def test_commands(text, keys, expected):
+    assert run(text, keys)[0] == expected
+
+
+def test_counts_and_modes():
+    text, vim = run("one\ntwo\nthree", "2jv")
+    assert vim.cursor == (2, 0)
+    assert vim.mode == VISUAL
+    vim.run_keys("<esc>i")
+    assert vim.mode == INSERT
+    vim.run_keys("<esc>")
+    assert vim.mode == NORMAL
+
+
+def test_dot_repeats_the_last_change_with_its_text():
+    assert run("x\ny\nz", "ihi <esc>j.j.")[0] == "hi x\nhi y\nhi z"
+    assert run("a b c d e", "x3.")[0] == "c d e"
+
+
+def test_macro_stops_at_the_first_failing_motion():
+    text, vim = run("a1\na2\na3\na4\na5", "qqxjq100@q")
+    assert text == "1\n2\n3\n4\n5"
+    assert not vim.failed
+
+
+def test_macro_runs_at_buffer_speed():
+    lines = [f"{index} some text here" for index in range(20000)]
+    buffer = LineBuffer(lines)
+    vim = Vim(buffer)
+    vim.run_keys("qqA;<esc>0dwjq")
+    vim.run_keys("19999@q")
+    assert buffer.lines[0] == buffer.lines[-1] == "some text here;"
+
+
+def test_keymap_rejects_ambiguous_bindings():
+    keymap = Keymap({"gg": 1})
+    with pytest.raises(ValueError):
+        keymap.bind("g", 2)
+    assert keymap.lookup("gg") == 1
+
+
+def test_command_line_is_handed_over():
+    commands = []
+    vim = Vim(LineBuffer("a\nb"), on_command=lambda vim, text: commands.append(text))
+    vim.run_keys(":w<cr>Vj:s<cr>")
+    assert commands == ["w", "'<,'>s"]
+    assert vim.marks["<"] == (0, 0) and vim.marks[">"][0] == 1
+
+
+async def test_normal_mode_in_editor():
+    app = VimPi()
+    async with app.run_test() as pilot:
+        await pilot.press("ctrl+f")
+        editor = app.query_one(TextViewer)
+        editor.disabled = False
+        editor.load_text("first\nsecond\nthird")
+        editor.focus()
+
+        await pilot.press("escape", "d", "d")
+        assert editor.text == "second\nthird"
+        await pilot.press("q", "a", "A", "!", "escape", "j", "q", "@", "a")
+        assert editor.text == "second!\nthird!"
+        await pilot.press("u")
+        assert editor.text == "second!\nthird"
+        await pilot.press("i", "x")
+        assert editor.vim.mode == INSERT
+        assert "x" in editor.text